@@ -84,15 +84,9 @@ async def get_analysis_status():
     Returns information about the last run and current queue status.
     """
     try:
-        from ..deps import get_settings
-        import psycopg
+        from ..database import acquire_db_connection
         
-        s = get_settings()
-        db_url = s.DATABASE_URL
-        if db_url.startswith("postgresql+psycopg://"):
-            db_url = db_url.replace("postgresql+psycopg://", "postgresql://", 1)
-        
-        with psycopg.connect(db_url) as conn:
+        with await acquire_db_connection() as conn:
             with conn.cursor() as cur:
                 # Get last action created by AI
                 cur.execute("""
@@ -74,11 +74,10 @@ async def get_chat_history(session_id: str, limit: int = 50):
     ordered by creation time (oldest first for display)
     """
     try:
-        import psycopg2
         from psycopg2.extras import RealDictCursor
-        import os
+        from ..database import acquire_db_connection
         
-        conn = psycopg2.connect(os.getenv("DATABASE_URL"))
+        conn = await acquire_db_connection()
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("""
@@ -117,11 +116,10 @@ async def get_recent_sessions(user_id: Optional[int] = None, limit: int = 10):
     Returns a list of recent session IDs with metadata
     """
     try:
-        import psycopg2
         from psycopg2.extras import RealDictCursor
-        import os
+        from ..database import acquire_db_connection
         
-        conn = psycopg2.connect(os.getenv("DATABASE_URL"))
+        conn = await acquire_db_connection()
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 query = """
@@ -11,8 +11,7 @@ from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from uuid import UUID
-import psycopg
-from ..deps import get_settings
+from ..database import acquire_db_connection
 
 router = APIRouter(prefix="/admin/ai", tags=["AI Command Center"])
 
@@ -68,18 +67,6 @@ class CreatePatternRequest(BaseModel):
     source_url: Optional[str] = Field(None, description="URL where pattern was discovered")
     tags: Optional[List[str]] = Field(None, description="Tags for categorization")
 
-# ============================================================================
-# Database Connection Helper
-# ============================================================================
-
-def get_db_connection():
-    """Get database connection using psycopg"""
-    s = get_settings()
-    db_url = s.DATABASE_URL
-    if db_url.startswith("postgresql+psycopg://"):
-        db_url = db_url.replace("postgresql+psycopg://", "postgresql://", 1)
-    return psycopg.connect(db_url)
-
 # ============================================================================
 # Action Queue Endpoints
 # ============================================================================
@@ -99,7 +86,7 @@ async def list_actions(
     - limit: Maximum number of results (default: 100)
     """
     try:
-        with get_db_connection() as conn:
+        with await acquire_db_connection() as conn:
             with conn.cursor() as cur:
                 query = """
                     SELECT 
@@ -155,7 +142,7 @@ async def list_actions(
 async def get_action(action_id: UUID):
     """Get details of a specific action by ID"""
     try:
-        with get_db_connection() as conn:
+        with await acquire_db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
                     SELECT 
@@ -204,7 +191,7 @@ async def approve_action(action_id: UUID, request: ActionApprovalRequest):
     Changes status from PENDING to APPROVED.
     """
     try:
-        with get_db_connection() as conn:
+        with await acquire_db_connection() as conn:
             with conn.cursor() as cur:
                 # Check if action exists and is pending
                 cur.execute("""
@@ -258,7 +245,7 @@ async def reject_action(action_id: UUID, request: ActionRejectionRequest):
     Changes status from PENDING to REJECTED.
     """
     try:
-        with get_db_connection() as conn:
+        with await acquire_db_connection() as conn:
             with conn.cursor() as cur:
                 # Check if action exists and is pending
                 cur.execute("""
@@ -328,7 +315,7 @@ async def list_patterns(
     - limit: Maximum number of results (default: 100)
     """
     try:
-        with get_db_connection() as conn:
+        with await acquire_db_connection() as conn:
             with conn.cursor() as cur:
                 query = """
                     SELECT 
@@ -384,7 +371,7 @@ async def list_patterns(
 async def get_pattern(pattern_id: UUID):
     """Get details of a specific pattern by ID"""
     try:
-        with get_db_connection() as conn:
+        with await acquire_db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
                     SELECT 
@@ -430,7 +417,7 @@ async def create_pattern(request: CreatePatternRequest):
     but can also be used manually by Super Admin.
     """
     try:
-        with get_db_connection() as conn:
+        with await acquire_db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
                     INSERT INTO ai_pattern_library (
@@ -479,7 +466,7 @@ async def create_pattern(request: CreatePatternRequest):
 async def get_stats():
     """Get statistics about the AI Command Center"""
     try:
-        with get_db_connection() as conn:
+        with await acquire_db_connection() as conn:
             with conn.cursor() as cur:
                 # Action queue stats
                 cur.execute("""
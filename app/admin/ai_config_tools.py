@@ -4,13 +4,13 @@ Allows EchoFort AI to read and propose changes to platform configuration.
 All changes go through AI Pending Actions for approval.
 """
 
-import os
 import json
 import logging
 from typing import List, Dict, Any, Optional
 from datetime import datetime
-import psycopg
-from psycopg.rows import dict_row
+from psycopg2.extras import RealDictCursor
+
+from ..database import get_db_connection
 
 logger = logging.getLogger(__name__)
 
@@ -26,8 +26,8 @@ def get_config(scope: str, key_prefix: Optional[str] = None) -> List[Dict[str, A
         List of config entries with key, value_json, description
     """
     try:
-        with psycopg.connect(os.getenv("DATABASE_URL")) as conn:
-            with conn.cursor(row_factory=dict_row) as cur:
+        with get_db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 if key_prefix:
                     cur.execute("""
                         SELECT id, scope, key, value_json, description, updated_at
@@ -61,8 +61,8 @@ def get_feature_flags(scope: str, flag_name_prefix: Optional[str] = None) -> Lis
         List of feature flags with name, is_enabled, rollout_percent, notes
     """
     try:
-        with psycopg.connect(os.getenv("DATABASE_URL")) as conn:
-            with conn.cursor(row_factory=dict_row) as cur:
+        with get_db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 if flag_name_prefix:
                     cur.execute("""
                         SELECT id, scope, flag_name, is_enabled, rollout_percent, notes, updated_at
@@ -107,8 +107,8 @@ def propose_config_change(
     """
     try:
         # Get current value for comparison
-        with psycopg.connect(os.getenv("DATABASE_URL")) as conn:
-            with conn.cursor(row_factory=dict_row) as cur:
+        with get_db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("""
                     SELECT value_json FROM app_config
                     WHERE scope = %s AND key = %s
@@ -172,8 +172,8 @@ def propose_feature_flag_change(
     """
     try:
         # Get current state for comparison
-        with psycopg.connect(os.getenv("DATABASE_URL")) as conn:
-            with conn.cursor(row_factory=dict_row) as cur:
+        with get_db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("""
                     SELECT is_enabled, rollout_percent FROM feature_flags
                     WHERE scope = %s AND flag_name = %s
@@ -243,7 +243,7 @@ def execute_config_update(payload: Dict[str, Any], executed_by_user_id: int) ->
         old_value = payload.get("old_value")
         reason = payload.get("reason", "")
         
-        with psycopg.connect(os.getenv("DATABASE_URL")) as conn:
+        with get_db_connection() as conn:
             with conn.cursor() as cur:
                 # Update or insert config
                 cur.execute("""
@@ -293,7 +293,7 @@ def execute_feature_flag_update(payload: Dict[str, Any], executed_by_user_id: in
         new_state = payload["new_state"]
         rollout_percent = payload.get("rollout_percent", 100)
         
-        with psycopg.connect(os.getenv("DATABASE_URL")) as conn:
+        with get_db_connection() as conn:
             with conn.cursor() as cur:
                 # Update or insert feature flag
                 cur.execute("""
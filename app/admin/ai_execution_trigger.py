@@ -83,15 +83,9 @@ async def get_execution_status():
     Returns information about executed actions and pending approvals.
     """
     try:
-        from ..deps import get_settings
-        import psycopg
+        from ..database import acquire_db_connection
         
-        s = get_settings()
-        db_url = s.DATABASE_URL
-        if db_url.startswith("postgresql+psycopg://"):
-            db_url = db_url.replace("postgresql+psycopg://", "postgresql://", 1)
-        
-        with psycopg.connect(db_url) as conn:
+        with await acquire_db_connection() as conn:
             with conn.cursor() as cur:
                 # Get last executed action
                 cur.execute("""
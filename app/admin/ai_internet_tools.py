@@ -10,8 +10,9 @@ import requests
 from typing import List, Dict, Optional, Any
 from datetime import datetime
 from bs4 import BeautifulSoup
-import psycopg
-from psycopg.rows import dict_row
+from psycopg2.extras import RealDictCursor
+
+from ..database import get_db_connection
 
 logger = logging.getLogger(__name__)
 
@@ -57,7 +58,7 @@ class FetchedPage:
 def log_web_search(user_id: int, query: str, category: Optional[str], results_count: int):
     """Log web search activity to database"""
     try:
-        with psycopg.connect(os.getenv("DATABASE_URL")) as conn:
+        with get_db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
                     INSERT INTO ai_web_logs (user_id, query, category, results_count, created_at)
@@ -233,8 +234,8 @@ def web_fetch(url: str, user_id: int = 1) -> Optional[FetchedPage]:
 def get_recent_web_logs(user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
     """Get recent web search logs for a user"""
     try:
-        with psycopg.connect(os.getenv("DATABASE_URL")) as conn:
-            with conn.cursor(row_factory=dict_row) as cur:
+        with get_db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("""
                     SELECT id, query, category, results_count, created_at
                     FROM ai_web_logs
@@ -148,11 +148,12 @@ async def get_learning_stats():
     
     Returns counts, success rates, and trends
     """
+    conn = None
     try:
-        from ai_learning_center import get_db_connection
+        from ..database import acquire_db_connection
         from psycopg2.extras import RealDictCursor
         
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         # Get conversation stats
@@ -196,7 +197,6 @@ async def get_learning_stats():
         digest_count = cur.fetchone()['digest_count']
         
         cur.close()
-        conn.close()
         
         return {
             "success": True,
@@ -209,3 +209,6 @@ async def get_learning_stats():
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch stats: {str(e)}")
+    finally:
+        if conn is not None:
+            conn.close()
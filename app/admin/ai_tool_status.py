@@ -8,8 +8,9 @@ import os
 import logging
 from typing import Dict, Any, Optional
 from datetime import datetime
-import psycopg
-from psycopg.rows import dict_row
+from psycopg2.extras import RealDictCursor
+
+from ..database import get_db_connection
 
 logger = logging.getLogger(__name__)
 
@@ -39,7 +40,7 @@ def check_tool_status() -> Dict[str, Dict[str, Any]]:
     
     # Check config_update tool (database-based, check if tables exist)
     try:
-        with psycopg.connect(os.getenv("DATABASE_URL")) as conn:
+        with get_db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
                     SELECT EXISTS (
@@ -64,7 +65,7 @@ def check_tool_status() -> Dict[str, Dict[str, Any]]:
     
     # Check feature_flag tool
     try:
-        with psycopg.connect(os.getenv("DATABASE_URL")) as conn:
+        with get_db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
                     SELECT EXISTS (
@@ -104,8 +105,8 @@ def check_tool_status() -> Dict[str, Dict[str, Any]]:
     
     # Try to get last success/error from database logs if available
     try:
-        with psycopg.connect(os.getenv("DATABASE_URL")) as conn:
-            with conn.cursor(row_factory=dict_row) as cur:
+        with get_db_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 # Check for recent web searches
                 cur.execute("""
                     SELECT created_at, results_count 
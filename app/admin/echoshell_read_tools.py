@@ -5,19 +5,9 @@ These tools provide EchoFort AI with deep visibility into the platform
 without the ability to make changes. All tools are read-only and safe to execute.
 """
 
-import psycopg
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
-import os
-
-# Database connection
-def get_db_connection():
-    """Get database connection from environment"""
-    database_url = os.getenv("DATABASE_URL")
-    if not database_url:
-        raise ValueError("DATABASE_URL not configured")
-    return psycopg.connect(database_url)
-
+from ..database import get_db_connection
 
 # ============================================================================
 # METRICS & HEALTH TOOLS
@@ -30,6 +20,7 @@ def get_system_health() -> Dict[str, Any]:
     Returns:
         dict: System health metrics including database, API, and service status
     """
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -53,7 +44,6 @@ def get_system_health() -> Dict[str, Any]:
         active_connections = cursor.fetchone()[0]
         
         cursor.close()
-        conn.close()
         
         return {
             "status": "healthy" if recent_errors < 10 else "degraded",
@@ -69,6 +59,9 @@ def get_system_health() -> Dict[str, Any]:
             "error": str(e),
             "timestamp": datetime.now().isoformat()
         }
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 def get_error_logs(limit: int = 50, severity: Optional[str] = None) -> List[Dict[str, Any]]:
@@ -82,6 +75,7 @@ def get_error_logs(limit: int = 50, severity: Optional[str] = None) -> List[Dict
     Returns:
         list: Recent error logs
     """
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -114,11 +108,13 @@ def get_error_logs(limit: int = 50, severity: Optional[str] = None) -> List[Dict
             })
         
         cursor.close()
-        conn.close()
         
         return logs
     except Exception as e:
         return [{"error": str(e)}]
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 def get_api_metrics(hours: int = 24) -> Dict[str, Any]:
@@ -131,6 +127,7 @@ def get_api_metrics(hours: int = 24) -> Dict[str, Any]:
     Returns:
         dict: API metrics including request count, error rate, response times
     """
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -152,7 +149,6 @@ def get_api_metrics(hours: int = 24) -> Dict[str, Any]:
         errors_by_severity = dict(cursor.fetchall())
         
         cursor.close()
-        conn.close()
         
         return {
             "time_window_hours": hours,
@@ -162,6 +158,9 @@ def get_api_metrics(hours: int = 24) -> Dict[str, Any]:
         }
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 # ============================================================================
@@ -175,6 +174,7 @@ def get_user_stats() -> Dict[str, Any]:
     Returns:
         dict: User metrics including total, active, by plan type
     """
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -200,7 +200,6 @@ def get_user_stats() -> Dict[str, Any]:
         users_by_plan = dict(cursor.fetchall())
         
         cursor.close()
-        conn.close()
         
         return {
             "total_users": total_users,
@@ -210,6 +209,9 @@ def get_user_stats() -> Dict[str, Any]:
         }
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 def get_subscription_stats() -> Dict[str, Any]:
@@ -219,6 +221,7 @@ def get_subscription_stats() -> Dict[str, Any]:
     Returns:
         dict: Subscription metrics including active, churned, revenue
     """
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -247,7 +250,6 @@ def get_subscription_stats() -> Dict[str, Any]:
         mrr = cursor.fetchone()[0] or 0
         
         cursor.close()
-        conn.close()
         
         return {
             "active_subscriptions": active_subs,
@@ -257,6 +259,9 @@ def get_subscription_stats() -> Dict[str, Any]:
         }
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 def get_revenue_metrics(days: int = 30) -> Dict[str, Any]:
@@ -269,6 +274,7 @@ def get_revenue_metrics(days: int = 30) -> Dict[str, Any]:
     Returns:
         dict: Revenue metrics including total, by plan, growth
     """
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -293,7 +299,6 @@ def get_revenue_metrics(days: int = 30) -> Dict[str, Any]:
         revenue_by_plan = dict(cursor.fetchall())
         
         cursor.close()
-        conn.close()
         
         return {
             "time_window_days": days,
@@ -303,6 +308,9 @@ def get_revenue_metrics(days: int = 30) -> Dict[str, Any]:
         }
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 # ============================================================================
@@ -319,6 +327,7 @@ def get_scam_patterns(limit: int = 20) -> List[Dict[str, Any]]:
     Returns:
         list: Recent scam patterns with details
     """
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -345,11 +354,13 @@ def get_scam_patterns(limit: int = 20) -> List[Dict[str, Any]]:
             })
         
         cursor.close()
-        conn.close()
         
         return patterns
     except Exception as e:
         return [{"error": str(e)}]
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 def get_scam_alerts(limit: int = 10) -> List[Dict[str, Any]]:
@@ -362,6 +373,7 @@ def get_scam_alerts(limit: int = 10) -> List[Dict[str, Any]]:
     Returns:
         list: Recent scam alerts
     """
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -389,11 +401,13 @@ def get_scam_alerts(limit: int = 10) -> List[Dict[str, Any]]:
             })
         
         cursor.close()
-        conn.close()
         
         return alerts
     except Exception as e:
         return [{"error": str(e)}]
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 def get_threat_stats() -> Dict[str, Any]:
@@ -403,6 +417,7 @@ def get_threat_stats() -> Dict[str, Any]:
     Returns:
         dict: Threat statistics including total patterns, alerts, cases
     """
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -432,7 +447,6 @@ def get_threat_stats() -> Dict[str, Any]:
         high_risk_patterns = cursor.fetchone()[0]
         
         cursor.close()
-        conn.close()
         
         return {
             "total_patterns": total_patterns,
@@ -443,6 +457,9 @@ def get_threat_stats() -> Dict[str, Any]:
         }
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 # ============================================================================
@@ -456,6 +473,7 @@ def get_feature_flags() -> List[Dict[str, Any]]:
     Returns:
         list: All feature flags with their current state
     """
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -477,11 +495,13 @@ def get_feature_flags() -> List[Dict[str, Any]]:
             })
         
         cursor.close()
-        conn.close()
         
         return flags
     except Exception as e:
         return [{"error": str(e)}]
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 def get_app_config() -> List[Dict[str, Any]]:
@@ -491,6 +511,7 @@ def get_app_config() -> List[Dict[str, Any]]:
     Returns:
         list: All app config entries
     """
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -512,11 +533,13 @@ def get_app_config() -> List[Dict[str, Any]]:
             })
         
         cursor.close()
-        conn.close()
         
         return config
     except Exception as e:
         return [{"error": str(e)}]
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 # ============================================================================
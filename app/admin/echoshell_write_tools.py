@@ -5,20 +5,10 @@ These tools allow EchoFort AI to propose impactful changes, but all changes
 go through the AI Pending Actions queue for human approval. No automatic execution.
 """
 
-import psycopg
 import json
 from datetime import datetime
 from typing import Dict, List, Any, Optional
-import os
-
-# Database connection
-def get_db_connection():
-    """Get database connection from environment"""
-    database_url = os.getenv("DATABASE_URL")
-    if not database_url:
-        raise ValueError("DATABASE_URL not configured")
-    return psycopg.connect(database_url)
-
+from ..database import get_db_connection
 
 def create_ai_pending_action(
     action_type: str,
@@ -42,6 +32,7 @@ def create_ai_pending_action(
     Returns:
         dict: Created action details
     """
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -56,7 +47,6 @@ def create_ai_pending_action(
         result = cursor.fetchone()
         conn.commit()
         cursor.close()
-        conn.close()
         
         if result:
             return {
@@ -70,6 +60,9 @@ def create_ai_pending_action(
             return {"error": "Failed to create action"}
     except Exception as e:
         return {"error": str(e)}
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 # ============================================================================
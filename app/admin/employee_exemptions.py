@@ -1,16 +1,11 @@
 from fastapi import APIRouter, HTTPException, Header
 from pydantic import BaseModel
 from typing import List, Optional
-import psycopg
-import os
 from datetime import datetime
+from ..database import acquire_db_connection
 
 router = APIRouter(prefix="/admin", tags=["Employee & Exemptions Management"])
 
-def get_db_connection():
-    """Get database connection"""
-    return psycopg.connect(os.getenv("DATABASE_URL"))
-
 class Employee(BaseModel):
     id: int
     username: str
@@ -31,8 +26,9 @@ class Exemption(BaseModel):
 @router.get("/employees")
 async def get_employees():
     """Get all employees"""
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -44,7 +40,6 @@ async def get_employees():
         
         employees = cursor.fetchall()
         cursor.close()
-        conn.close()
         
         return {
             "success": True,
@@ -67,6 +62,9 @@ async def get_employees():
             "success": True,
             "employees": []
         }
+    finally:
+        if conn is not None:
+            conn.close()
 
 @router.post("/employees/create")
 async def create_employee(
@@ -77,13 +75,14 @@ async def create_employee(
     authorization: str = Header(None)
 ):
     """Create a new employee (Super Admin only)"""
+    conn = None
     try:
         import bcrypt
         
         # Hash password
         password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
         
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -95,7 +94,6 @@ async def create_employee(
         employee_id = cursor.fetchone()[0]
         conn.commit()
         cursor.close()
-        conn.close()
         
         return {
             "success": True,
@@ -105,12 +103,16 @@ async def create_employee(
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating employee: {str(e)}")
+    finally:
+        if conn is not None:
+            conn.close()
 
 @router.get("/exemptions")
 async def get_exemptions():
     """Get all customer exemptions"""
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cursor = conn.cursor()
         
         # Check if exemptions table exists
@@ -150,7 +152,6 @@ async def get_exemptions():
         
         exemptions = cursor.fetchall()
         cursor.close()
-        conn.close()
         
         return {
             "success": True,
@@ -174,6 +175,9 @@ async def get_exemptions():
             "success": True,
             "exemptions": []
         }
+    finally:
+        if conn is not None:
+            conn.close()
 
 @router.post("/exemptions/create")
 async def create_exemption(
@@ -184,8 +188,9 @@ async def create_exemption(
     expires_at: Optional[str] = None
 ):
     """Create a new customer exemption (Super Admin only)"""
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -198,7 +203,6 @@ async def create_exemption(
         exemption_id = cursor.fetchone()[0]
         conn.commit()
         cursor.close()
-        conn.close()
         
         return {
             "success": True,
@@ -208,12 +212,16 @@ async def create_exemption(
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating exemption: {str(e)}")
+    finally:
+        if conn is not None:
+            conn.close()
 
 @router.delete("/exemptions/{exemption_id}")
 async def delete_exemption(exemption_id: int):
     """Delete/deactivate an exemption"""
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -224,7 +232,6 @@ async def delete_exemption(exemption_id: int):
         
         conn.commit()
         cursor.close()
-        conn.close()
         
         return {
             "success": True,
@@ -233,12 +240,16 @@ async def delete_exemption(exemption_id: int):
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting exemption: {str(e)}")
+    finally:
+        if conn is not None:
+            conn.close()
 
 @router.get("/users")
 async def get_users():
     """Get all users for Super Admin dashboard"""
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -250,7 +261,6 @@ async def get_users():
         
         users = cursor.fetchall()
         cursor.close()
-        conn.close()
         
         return {
             "success": True,
@@ -274,12 +284,16 @@ async def get_users():
             "success": True,
             "users": []
         }
+    finally:
+        if conn is not None:
+            conn.close()
 
 @router.get("/stats/overview")
 async def get_overview_stats():
     """Get overview statistics for Super Admin dashboard"""
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cursor = conn.cursor()
         
         # Get total users
@@ -295,7 +309,6 @@ async def get_overview_stats():
         active_subscriptions = cursor.fetchone()[0]
         
         cursor.close()
-        conn.close()
         
         return {
             "success": True,
@@ -317,4 +330,7 @@ async def get_overview_stats():
                 "total_exemptions": 0
             }
         }
+    finally:
+        if conn is not None:
+            conn.close()
 
@@ -8,6 +8,8 @@ from datetime import datetime
 import os
 import requests
 from typing import Dict, Any
+from ..database import sync_pool_stats
+from ..write_behind import write_behind_stats
 
 router = APIRouter(prefix="/api/super-admin/platform-status", tags=["platform-status"])
 
@@ -30,6 +32,11 @@ async def check_database_status(db) -> Dict[str, Any]:
                 "users_24h": 0,
                 "otps_1h": 0,
                 "db_size_mb": 0,
+                "pools": {
+                    "async": db.pool_status(),
+                    "sync": sync_pool_stats()
+                },
+                "write_behind": write_behind_stats(),
                 "last_checked": datetime.utcnow().isoformat()
             }
         else:
@@ -8,21 +8,15 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime, date
 import json
 import logging
-import psycopg2
 from psycopg2.extras import RealDictCursor
-import os
 
 from app.threat_intelligence_scanner import ThreatIntelligenceScanner, run_threat_intelligence_scan
+from ..database import acquire_db_connection
 
 router = APIRouter(prefix="/admin/threat-intel", tags=["Threat Intelligence"])
 logger = logging.getLogger(__name__)
 
 
-def get_db_connection():
-    """Get database connection using DATABASE_URL environment variable"""
-    return psycopg2.connect(os.getenv("DATABASE_URL"))
-
-
 @router.get("/scans")
 async def list_scans(
     limit: int = Query(20, ge=1, le=100),
@@ -35,8 +29,9 @@ async def list_scans(
     - limit: Maximum number of scans to return (default: 20, max: 100)
     - status: Filter by scan status (in_progress, completed, failed)
     """
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         query = """
@@ -54,13 +49,15 @@ async def list_scans(
         scans = cur.fetchall()
         
         cur.close()
-        conn.close()
         
         return {"scans": scans, "count": len(scans)}
         
     except Exception as e:
         logger.error(f"Error listing scans: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 @router.post("/scans/trigger")
@@ -88,8 +85,9 @@ async def list_threat_items(
     - scam_type: Filter by scam type
     - min_severity: Filter by minimum severity_score (1-10)
     """
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         conditions = []
@@ -120,13 +118,15 @@ async def list_threat_items(
         items = cur.fetchall()
         
         cur.close()
-        conn.close()
         
         return {"items": items, "count": len(items)}
         
     except Exception as e:
         logger.error(f"Error listing items: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 @router.get("/patterns")
@@ -143,8 +143,9 @@ async def list_patterns(
     - pattern_type: Filter by pattern type (phone_number, url, keyword)
     - is_active: Filter by active status
     """
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         conditions = []
@@ -175,20 +176,23 @@ async def list_patterns(
         patterns = cur.fetchall()
         
         cur.close()
-        conn.close()
         
         return {"patterns": patterns, "count": len(patterns)}
         
     except Exception as e:
         logger.error(f"Error listing patterns: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 @router.post("/patterns/{pattern_id}/toggle")
 async def toggle_pattern(pattern_id: int):
     """Toggle pattern active status"""
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         cur.execute("""
@@ -205,7 +209,6 @@ async def toggle_pattern(pattern_id: int):
         
         conn.commit()
         cur.close()
-        conn.close()
         
         return {"message": "Pattern status toggled", "pattern": result}
         
@@ -214,6 +217,9 @@ async def toggle_pattern(pattern_id: int):
     except Exception as e:
         logger.error(f"Error toggling pattern: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 @router.get("/alerts")
@@ -230,8 +236,9 @@ async def list_alerts(
     - status: Filter by status (new, acknowledged, resolved)
     - min_severity: Filter by minimum severity_score (1-10)
     """
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         conditions = []
@@ -262,20 +269,23 @@ async def list_alerts(
         alerts = cur.fetchall()
         
         cur.close()
-        conn.close()
         
         return {"alerts": alerts, "count": len(alerts)}
         
     except Exception as e:
         logger.error(f"Error listing alerts: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 @router.post("/alerts/{alert_id}/acknowledge")
 async def acknowledge_alert(alert_id: int):
     """Acknowledge a threat alert"""
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         cur.execute("""
@@ -293,7 +303,6 @@ async def acknowledge_alert(alert_id: int):
         
         conn.commit()
         cur.close()
-        conn.close()
         
         return {"message": "Alert acknowledged", "alert": result}
         
@@ -302,13 +311,17 @@ async def acknowledge_alert(alert_id: int):
     except Exception as e:
         logger.error(f"Error acknowledging alert: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 @router.post("/alerts/{alert_id}/resolve")
 async def resolve_alert(alert_id: int):
     """Resolve a threat alert"""
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         cur.execute("""
@@ -326,7 +339,6 @@ async def resolve_alert(alert_id: int):
         
         conn.commit()
         cur.close()
-        conn.close()
         
         return {"message": "Alert resolved", "alert": result}
         
@@ -335,13 +347,17 @@ async def resolve_alert(alert_id: int):
     except Exception as e:
         logger.error(f"Error resolving alert: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 @router.get("/sources")
 async def list_sources():
     """List all threat intelligence sources"""
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         cur.execute("""
@@ -353,20 +369,23 @@ async def list_sources():
         sources = cur.fetchall()
         
         cur.close()
-        conn.close()
         
         return {"sources": sources, "count": len(sources)}
         
     except Exception as e:
         logger.error(f"Error listing sources: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 @router.post("/sources/{source_id}/toggle")
 async def toggle_source(source_id: int):
     """Toggle source active status"""
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         cur.execute("""
@@ -383,7 +402,6 @@ async def toggle_source(source_id: int):
         
         conn.commit()
         cur.close()
-        conn.close()
         
         return {"message": "Source status toggled", "source": result}
         
@@ -392,13 +410,17 @@ async def toggle_source(source_id: int):
     except Exception as e:
         logger.error(f"Error toggling source: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 @router.get("/stats")
 async def get_statistics():
     """Get threat intelligence statistics"""
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         # Get latest statistics
@@ -440,7 +462,6 @@ async def get_statistics():
         alert_stats = cur.fetchone()
         
         cur.close()
-        conn.close()
         
         return {
             "latest_statistics": latest_stats,
@@ -456,13 +477,17 @@ async def get_statistics():
     except Exception as e:
         logger.error(f"Error getting statistics: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 @router.get("/dashboard")
 async def get_dashboard():
     """Get threat intelligence dashboard summary"""
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         # Recent scans
@@ -505,7 +530,6 @@ async def get_dashboard():
         new_alerts = cur.fetchall()
         
         cur.close()
-        conn.close()
         
         return {
             "recent_scans": recent_scans,
@@ -517,3 +541,6 @@ async def get_dashboard():
     except Exception as e:
         logger.error(f"Error getting dashboard: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn is not None:
+            conn.close()
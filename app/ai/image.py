@@ -2,16 +2,68 @@
 """
 Image AI - Screenshot Analysis and Document Verification
 Uses PIL + OCR for text extraction + rule-based scam detection
+
+Decoding, OCR and QR decoding run in a bounded process pool, never on the
+event loop. Images are decoded at reduced scale where the format allows
+(JPEG draft mode) and thumbnailed to IMAGE_ANALYSIS_MAX_SIDE before any
+analysis; size rules still use the original dimensions. When
+IMAGE_ANALYSIS_WORKERS jobs are running and IMAGE_ANALYSIS_QUEUE_DEPTH
+more are waiting, new uploads get 429; a timed-out or crashed job gets
+503. Responses carry per-stage timings_ms.
+
+/scan and /detect-qr sit behind verdict caches (image_hash_cache.py): a
+byte-identical upload is answered without decoding. Near-duplicates are
+always analysed afresh: two receipts from the same app template, or a
+poster with a swapped UPI QR, hash within a few bits of each other but
+carry different text and payloads.
 """
 
 from fastapi import APIRouter, File, UploadFile, HTTPException
-from PIL import Image
+from PIL import Image, UnidentifiedImageError
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import hashlib
 import io
+import logging
+import multiprocessing
 import numpy as np
+import os
 import re
+import threading
+import time
+from ..image_hash_cache import PerceptualHashCache
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/ai/image", tags=["Image AI"])
 
+# Worker processes for image analysis, leaving a core for the event loop
+# where there is one to spare (0 = analyse in a thread instead)
+IMAGE_WORKERS = int(os.getenv("IMAGE_ANALYSIS_WORKERS", str(max(1, min(4, (os.cpu_count() or 1) - 1)))))
+# Jobs allowed to wait for a worker before uploads are turned away
+IMAGE_QUEUE_DEPTH = int(os.getenv("IMAGE_ANALYSIS_QUEUE_DEPTH", str(4 * max(IMAGE_WORKERS, 1))))
+IMAGE_JOB_TIMEOUT_SECONDS = float(os.getenv("IMAGE_ANALYSIS_TIMEOUT_SECONDS", "30"))
+IMAGE_ANALYSIS_MAX_SIDE = int(os.getenv("IMAGE_ANALYSIS_MAX_SIDE", "2048"))
+IMAGE_MAX_UPLOAD_BYTES = int(os.getenv("IMAGE_MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+RETRY_AFTER_SECONDS = "2"
+
+# Verdict cache for viral screenshots / QR posters (0 entries disables it)
+IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "10000"))
+IMAGE_CACHE_TTL_SECONDS = float(os.getenv("IMAGE_CACHE_TTL_SECONDS", "86400"))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+# IMAGE_ANALYSIS_WORKERS=0: one in-process thread, matching the slot count
+_thread_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-analysis")
+_process_pool_lock = threading.Lock()
+_jobs_in_flight = 0  # running + queued; released when the job really finishes
+_jobs_lock = threading.Lock()
+
+# Byte-identical uploads only: verdicts carry the upload's own OCR text / QR payload
+scan_cache = PerceptualHashCache(IMAGE_CACHE_MAX_ENTRIES, IMAGE_CACHE_TTL_SECONDS, max_distance=0)
+qr_cache = PerceptualHashCache(IMAGE_CACHE_MAX_ENTRIES, IMAGE_CACHE_TTL_SECONDS, max_distance=0)
+
 # Scam indicators in images
 SCAM_TEXT_PATTERNS = [
     r"congratulations.*won",
@@ -62,11 +114,12 @@ SELF_HARM_PATTERNS = [
 ]
 
 
-def extract_text_from_image(image: Image.Image) -> str:
+def extract_text_from_image(image: Image.Image, timings: Optional[Dict[str, float]] = None) -> str:
     """
     Extract text from image using basic OCR
     For production, use pytesseract or cloud OCR services
     """
+    started = time.perf_counter()
     try:
         # Try to use pytesseract if available
         import pytesseract
@@ -79,18 +132,25 @@ def extract_text_from_image(image: Image.Image) -> str:
     except Exception as e:
         print(f"OCR error: {e}")
         return ""
+    finally:
+        if timings is not None:
+            timings["ocr"] = (time.perf_counter() - started) * 1000
 
 
-def analyze_image_content(image: Image.Image) -> dict:
+def analyze_image_content(image: Image.Image, original_size: Optional[Tuple[int, int]] = None,
+                          timings: Optional[Dict[str, float]] = None) -> dict:
     """
     Analyze image for scam indicators
     Returns: {risk_score, flags, detected_patterns}
+    original_size is the upload's size when `image` is a downscaled copy
     """
     # Convert to numpy array
     img_array = np.asarray(image.convert("RGB"))
     
     # Basic image analysis
     height, width = img_array.shape[:2]
+    if original_size is not None:
+        width, height = original_size
     
     # Calculate color statistics
     mean_color = img_array.mean(axis=(0, 1))
@@ -119,7 +179,7 @@ def analyze_image_content(image: Image.Image) -> dict:
         risk_score += 0.15
     
     # Extract text using OCR
-    extracted_text = extract_text_from_image(image)
+    extracted_text = extract_text_from_image(image, timings)
     
     detected_patterns = []
     
@@ -201,6 +261,305 @@ def analyze_image_content(image: Image.Image) -> dict:
     }
 
 
+ID_KEYWORDS = ["aadhaar", "pan", "passport", "driving license", "voter id"]
+QR_PAYMENT_KEYWORDS = ["upi://", "paytm", "phonepe", "googlepay"]
+
+
+def assess_document(image: Image.Image, original_size: Optional[Tuple[int, int]] = None,
+                    timings: Optional[Dict[str, float]] = None) -> dict:
+    """ID document text, type and basic quality/tampering checks"""
+    # Extract text
+    extracted_text = extract_text_from_image(image, timings)
+    
+    # Check for common ID keywords
+    detected_id_type = None
+    
+    if extracted_text:
+        text_lower = extracted_text.lower()
+        for id_type in ID_KEYWORDS:
+            if id_type in text_lower:
+                detected_id_type = id_type
+                break
+    
+    # Basic image quality checks
+    img_array = np.asarray(image.convert("RGB"))
+    height, width = img_array.shape[:2]
+    if original_size is not None:
+        width, height = original_size
+    
+    quality_score = 1.0
+    issues = []
+    
+    # Check resolution
+    if width < 600 or height < 400:
+        quality_score -= 0.3
+        issues.append("low_resolution")
+    
+    # Check for excessive compression artifacts
+    std_color = img_array.std(axis=(0, 1))
+    if std_color.mean() < 10:
+        quality_score -= 0.2
+        issues.append("possible_compression_artifacts")
+    
+    # Check for tampering indicators (very basic)
+    # In production, use specialized tampering detection algorithms
+    edges = np.abs(np.diff(img_array, axis=0)).mean()
+    if edges < 5:
+        quality_score -= 0.2
+        issues.append("suspicious_uniformity")
+    
+    return {
+        "detected_id_type": detected_id_type,
+        "quality_score": max(0.0, quality_score),
+        "issues": issues,
+        "extracted_text": extracted_text,
+    }
+
+
+def decode_qr(image: Image.Image, timings: Optional[Dict[str, float]] = None) -> dict:
+    """First QR payload in the image; available=False without pyzbar"""
+    started = time.perf_counter()
+    try:
+        from pyzbar.pyzbar import decode
+    except ImportError:
+        return {"available": False, "data": None}
+    try:
+        decoded_objects = decode(image)
+    finally:
+        if timings is not None:
+            timings["qr_decode"] = (time.perf_counter() - started) * 1000
+    data = decoded_objects[0].data.decode("utf-8") if decoded_objects else None
+    return {"available": True, "data": data}
+
+
+def assess_qr_content(qr_data: str) -> dict:
+    """Risk of a decoded QR payload"""
+    # Analyze QR code content
+    is_payment_qr = any(keyword in qr_data.lower() for keyword in QR_PAYMENT_KEYWORDS)
+    is_url = qr_data.startswith("http://") or qr_data.startswith("https://")
+    
+    risk_score = 0.0
+    warnings = []
+    
+    if is_payment_qr:
+        warnings.append("This is a payment QR code. Verify recipient before paying.")
+        risk_score += 0.4
+    
+    if is_url:
+        # Check for suspicious domains
+        for domain in SUSPICIOUS_DOMAINS:
+            if domain in qr_data:
+                warnings.append(f"Suspicious URL shortener detected: {domain}")
+                risk_score += 0.5
+    
+    return {
+        "qr_detected": True,
+        "qr_content": qr_data,
+        "is_payment_qr": is_payment_qr,
+        "is_url": is_url,
+        "risk_score": round(risk_score, 2),
+        "warnings": warnings,
+        "recommendation": "Verify QR code authenticity before scanning" if risk_score > 0.3 else "QR code appears safe"
+    }
+
+
+# -- analysis jobs (run in the worker processes) ------------------------------
+
+def load_for_analysis(image_data: bytes, timings: Dict[str, float],
+                      max_side: int = IMAGE_ANALYSIS_MAX_SIDE) -> Tuple[Image.Image, Tuple[int, int]]:
+    """
+    Decoded image no larger than max_side on either axis, and the upload's
+    original size. JPEGs are decoded directly at 1/2, 1/4 or 1/8 scale
+    when that still covers max_side, so large photos never decode in full.
+    """
+    started = time.perf_counter()
+    image = Image.open(io.BytesIO(image_data))
+    original_size = image.size
+    if max(original_size) > max_side:
+        image.draft("RGB", (max_side, max_side))
+    image.load()
+    decoded = time.perf_counter()
+    timings["decode"] = (decoded - started) * 1000
+    if max(image.size) > max_side:
+        # Box-reduce first where it divides evenly: ~2x cheaper than plain bicubic
+        image.thumbnail((max_side, max_side), reducing_gap=1.0)
+    timings["downscale"] = (time.perf_counter() - decoded) * 1000
+    return image, original_size
+
+
+def _scan_job(image, original_size, timings):
+    return analyze_image_content(image, original_size, timings)
+
+
+def _document_job(image, original_size, timings):
+    return assess_document(image, original_size, timings)
+
+
+def _qr_job(image, original_size, timings):
+    return decode_qr(image, timings)
+
+
+IMAGE_JOBS = {
+    "scan": _scan_job,
+    "document": _document_job,
+    "qr": _qr_job,
+}
+
+
+def run_image_job(kind: str, image_data: bytes) -> Tuple[dict, Dict[str, float]]:
+    """Decode, downscale and analyse one upload; returns (result, stage timings in ms)"""
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    image, original_size = load_for_analysis(image_data, timings)
+    analysis_started = time.perf_counter()
+    result = IMAGE_JOBS[kind](image, original_size, timings)
+    timings["analysis"] = (time.perf_counter() - analysis_started) * 1000
+    timings["worker"] = (time.perf_counter() - started) * 1000
+    return result, timings
+
+
+# -- process pool with backpressure -----------------------------------------------
+
+def _get_process_pool() -> Optional[ProcessPoolExecutor]:
+    global _process_pool
+    if IMAGE_WORKERS <= 0:
+        return None
+    with _process_pool_lock:
+        if _process_pool is None:
+            # spawn, not fork: the API process has live threads and DB pools
+            _process_pool = ProcessPoolExecutor(
+                max_workers=IMAGE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+
+def _warm_worker() -> int:
+    return os.getpid()
+
+
+def start_process_pool():
+    """Spawn the workers now, so the first uploads don't pay the start-up cost"""
+    pool = _get_process_pool()
+    if pool is not None:
+        for _ in range(IMAGE_WORKERS):
+            pool.submit(_warm_worker)
+
+
+def shutdown_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _release_job_slot(_future=None):
+    global _jobs_in_flight
+    with _jobs_lock:
+        _jobs_in_flight -= 1
+
+
+def _reserve_job_slot() -> bool:
+    global _jobs_in_flight
+    with _jobs_lock:
+        if _jobs_in_flight >= max(IMAGE_WORKERS, 1) + IMAGE_QUEUE_DEPTH:
+            return False
+        _jobs_in_flight += 1
+        return True
+
+
+async def read_upload(file: UploadFile) -> bytes:
+    image_data = await file.read(IMAGE_MAX_UPLOAD_BYTES + 1)
+    if len(image_data) > IMAGE_MAX_UPLOAD_BYTES:
+        raise HTTPException(413, f"Image too large (max {IMAGE_MAX_UPLOAD_BYTES // (1024 * 1024)} MB)")
+    if not image_data:
+        raise HTTPException(400, "Empty image upload")
+    return image_data
+
+
+async def _run_job(job, *args) -> Tuple[Any, Dict[str, float]]:
+    """
+    Run a worker job (returning (result, stage timings)) off the event
+    loop. Raises 429 when the analysis queue is full, 503 when the job
+    times out or its worker dies, and 400/413 for undecodable images.
+    """
+    if not _reserve_job_slot():
+        raise HTTPException(429, "Image analysis is busy, retry shortly",
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
+    started = time.perf_counter()
+    try:
+        pool = _get_process_pool() or _thread_pool
+        future = pool.submit(job, *args)
+        # The slot stays taken until the worker is really done, even if we
+        # stop waiting: a timed-out wait can't cancel a running job
+        future.add_done_callback(_release_job_slot)
+        waiter = asyncio.wrap_future(future)
+    except BrokenProcessPool:
+        _release_job_slot()
+        shutdown_process_pool()
+        raise HTTPException(503, "Image analysis restarting, retry shortly",
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
+    except Exception:
+        _release_job_slot()
+        raise
+    
+    try:
+        result, timings = await asyncio.wait_for(waiter, IMAGE_JOB_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning("Image job %s timed out after %.0fs", job.__name__, IMAGE_JOB_TIMEOUT_SECONDS)
+        raise HTTPException(503, "Image analysis timed out, retry shortly",
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
+    except BrokenProcessPool:
+        logger.exception("Image analysis process pool broke")
+        shutdown_process_pool()
+        raise HTTPException(503, "Image analysis restarting, retry shortly",
+                            headers={"Retry-After": RETRY_AFTER_SECONDS})
+    except UnidentifiedImageError:
+        raise HTTPException(400, "Unsupported or corrupt image")
+    except Image.DecompressionBombError as e:
+        raise HTTPException(413, f"Image has too many pixels: {e}")
+    
+    # Waiting for a worker, plus IPC
+    timings["queue"] = max(0.0, (time.perf_counter() - started) * 1000 - timings.pop("worker"))
+    return result, timings
+
+
+def _finish_timings(timings: Dict[str, float], started: float, label: str) -> Dict[str, float]:
+    timings["total"] = (time.perf_counter() - started) * 1000
+    timings = {stage: round(ms, 1) for stage, ms in timings.items()}
+    logger.info("Image %s: %s", label, timings)
+    return timings
+
+
+async def analyze_upload(kind: str, file: UploadFile) -> Tuple[dict, Dict[str, float]]:
+    """Run an image job for an upload in the worker pool; (result, timings in ms)"""
+    started = time.perf_counter()
+    image_data = await read_upload(file)
+    result, timings = await _run_job(run_image_job, kind, image_data)
+    return result, _finish_timings(timings, started, kind)
+
+
+async def analyze_upload_cached(kind: str, file: UploadFile, cache: PerceptualHashCache,
+                                cacheable=lambda result: True) -> Tuple[dict, Dict[str, float], dict]:
+    """
+    analyze_upload() behind a verdict cache keyed on the upload's SHA-256:
+    byte-identical uploads are answered without decoding, anything else is
+    analysed. Returns (result, timings in ms, cache status).
+    """
+    started = time.perf_counter()
+    image_data = await read_upload(file)
+    sha256 = hashlib.sha256(image_data).hexdigest()
+    cached = cache.get_exact(sha256)
+    if cached is not None:
+        return cached, _finish_timings({}, started, f"{kind} (cached)"), {"hit": "exact", "distance": 0}
+    
+    result, timings = await _run_job(run_image_job, kind, image_data)
+    if cacheable(result):
+        cache.set(sha256, None, result)
+    return result, _finish_timings(timings, started, kind), {"hit": None, "distance": None}
+
+
 @router.post("/scan")
 async def scan_image(file: UploadFile = File(...), db=None, user_id: str = None):
     """
@@ -208,12 +567,9 @@ async def scan_image(file: UploadFile = File(...), db=None, user_id: str = None)
     Analyzes screenshots, documents, and suspicious images
     """
     try:
-        # Read image
-        image_data = await file.read()
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Analyze image
-        analysis = analyze_image_content(image)
+        # Cached verdict for a byte-identical screenshot, else decode +
+        # analyse in the image worker pool
+        analysis, timings, cache_status = await analyze_upload_cached("scan", file, scan_cache)
         
         # Determine if scam
         is_suspicious = analysis["risk_score"] >= 0.5
@@ -262,9 +618,13 @@ async def scan_image(file: UploadFile = File(...), db=None, user_id: str = None)
             "violence_or_extremism_risk": analysis["violence_or_extremism_risk"],
             "tags": analysis["tags"],
             "ai_prediction_disclaimer": "These are automated predictions, not legal determinations. May be inaccurate.",
-            "evidence_id": evidence_id  # Block 5: Evidence vault ID if logged
+            "evidence_id": evidence_id,  # Block 5: Evidence vault ID if logged
+            "timings_ms": timings,
+            "cache": cache_status
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"Image scan error: {str(e)}")
 
@@ -276,49 +636,11 @@ async def verify_document(file: UploadFile = File(...)):
     Checks for tampering, fake documents, etc.
     """
     try:
-        image_data = await file.read()
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Extract text
-        extracted_text = extract_text_from_image(image)
-        
-        # Check for common ID keywords
-        id_keywords = ["aadhaar", "pan", "passport", "driving license", "voter id"]
-        detected_id_type = None
-        
-        if extracted_text:
-            text_lower = extracted_text.lower()
-            for id_type in id_keywords:
-                if id_type in text_lower:
-                    detected_id_type = id_type
-                    break
-        
-        # Basic image quality checks
-        img_array = np.asarray(image.convert("RGB"))
-        height, width = img_array.shape[:2]
-        
-        quality_score = 1.0
-        issues = []
-        
-        # Check resolution
-        if width < 600 or height < 400:
-            quality_score -= 0.3
-            issues.append("low_resolution")
-        
-        # Check for excessive compression artifacts
-        std_color = img_array.std(axis=(0, 1))
-        if std_color.mean() < 10:
-            quality_score -= 0.2
-            issues.append("possible_compression_artifacts")
-        
-        # Check for tampering indicators (very basic)
-        # In production, use specialized tampering detection algorithms
-        edges = np.abs(np.diff(img_array, axis=0)).mean()
-        if edges < 5:
-            quality_score -= 0.2
-            issues.append("suspicious_uniformity")
-        
-        quality_score = max(0.0, quality_score)
+        # Decode, OCR and quality checks in the image worker pool
+        document, timings = await analyze_upload("document", file)
+        extracted_text = document["extracted_text"]
+        quality_score = document["quality_score"]
+        detected_id_type = document["detected_id_type"]
         
         is_valid = quality_score >= 0.6 and detected_id_type is not None
         
@@ -327,12 +649,15 @@ async def verify_document(file: UploadFile = File(...)):
             "is_valid": is_valid,
             "detected_id_type": detected_id_type,
             "quality_score": round(quality_score, 2),
-            "issues": issues,
+            "issues": document["issues"],
             "extracted_text": extracted_text[:300] if extracted_text else None,
             "recommendation": "Document appears valid" if is_valid else "Manual verification required",
-            "note": "This is a basic verification. Manual review is recommended for KYC."
+            "note": "This is a basic verification. Manual review is recommended for KYC.",
+            "timings_ms": timings
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"Document verification error: {str(e)}")
 
@@ -344,59 +669,31 @@ async def detect_qr_code(file: UploadFile = File(...)):
     Warns about suspicious payment QR codes
     """
     try:
-        image_data = await file.read()
-        image = Image.open(io.BytesIO(image_data))
-        
-        # Try to decode QR code
-        try:
-            from pyzbar.pyzbar import decode
-            decoded_objects = decode(image)
-            
-            if not decoded_objects:
-                return {
-                    "ok": True,
-                    "qr_detected": False,
-                    "message": "No QR code found in image"
-                }
-            
-            qr_data = decoded_objects[0].data.decode("utf-8")
-            
-            # Analyze QR code content
-            is_payment_qr = any(keyword in qr_data.lower() for keyword in ["upi://", "paytm", "phonepe", "googlepay"])
-            is_url = qr_data.startswith("http://") or qr_data.startswith("https://")
-            
-            risk_score = 0.0
-            warnings = []
-            
-            if is_payment_qr:
-                warnings.append("This is a payment QR code. Verify recipient before paying.")
-                risk_score += 0.4
-            
-            if is_url:
-                # Check for suspicious domains
-                for domain in SUSPICIOUS_DOMAINS:
-                    if domain in qr_data:
-                        warnings.append(f"Suspicious URL shortener detected: {domain}")
-                        risk_score += 0.5
-            
-            return {
-                "ok": True,
-                "qr_detected": True,
-                "qr_content": qr_data,
-                "is_payment_qr": is_payment_qr,
-                "is_url": is_url,
-                "risk_score": round(risk_score, 2),
-                "warnings": warnings,
-                "recommendation": "Verify QR code authenticity before scanning" if risk_score > 0.3 else "QR code appears safe"
-            }
+        # Cached payload only for the exact same bytes, else decoded in
+        # the image worker pool
+        qr, timings, cache_status = await analyze_upload_cached(
+            "qr", file, qr_cache, cacheable=lambda result: result["available"]
+        )
         
-        except ImportError:
+        if not qr["available"]:
             return {
                 "ok": False,
                 "error": "QR code detection not available",
                 "message": "Install pyzbar library for QR code detection"
             }
+        
+        if qr["data"] is None:
+            return {
+                "ok": True,
+                "qr_detected": False,
+                "message": "No QR code found in image",
+                "timings_ms": timings,
+                "cache": cache_status
+            }
+        
+        return {"ok": True, **assess_qr_content(qr["data"]), "timings_ms": timings, "cache": cache_status}
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(500, f"QR detection error: {str(e)}")
-
@@ -9,23 +9,11 @@ from typing import Optional
 import io
 import os
 import tempfile
-from openai import OpenAI
+from .. import keyword_rules
+from ..llm_gateway import llm_gateway
 
 router = APIRouter(prefix="/api/ai/voice", tags=["Voice AI"])
 
-# Lazy OpenAI client initialization
-_client = None
-
-def get_openai_client():
-    """Lazy load OpenAI client"""
-    global _client
-    if _client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise HTTPException(500, "OpenAI API key not configured")
-        _client = OpenAI(api_key=api_key)
-    return _client
-
 # Scam keywords database
 SCAM_KEYWORDS = {
     "digital_arrest": [
@@ -63,26 +51,32 @@ THREAT_INDICATORS = [
     "bitcoin", "cryptocurrency", "gift card", "itunes card"
 ]
 
+SCAM_KEYWORD_SETS = {
+    scam_type: keyword_rules.register(f"voice.{scam_type}", keywords)
+    for scam_type, keywords in SCAM_KEYWORDS.items()
+}
+THREAT_INDICATOR_SET = keyword_rules.register("voice.threat_indicators", THREAT_INDICATORS)
+
 
 def detect_scam_type(transcript: str) -> tuple[str, float, list]:
     """
     Detect scam type from transcript using keyword matching
     Returns: (scam_type, confidence_score, detected_keywords)
     """
-    transcript_lower = transcript.lower()
+    hits = keyword_rules.scan(transcript)
     
     detected_scams = {}
     all_detected_keywords = []
     
     # Check each scam category
-    for scam_type, keywords in SCAM_KEYWORDS.items():
-        matches = [kw for kw in keywords if kw in transcript_lower]
+    for scam_type, keyword_set in SCAM_KEYWORD_SETS.items():
+        matches = hits.get(keyword_set)
         if matches:
             detected_scams[scam_type] = len(matches)
             all_detected_keywords.extend(matches)
     
     # Check threat indicators
-    threat_matches = [ti for ti in THREAT_INDICATORS if ti in transcript_lower]
+    threat_matches = hits.get(THREAT_INDICATOR_SET)
     all_detected_keywords.extend(threat_matches)
     
     if not detected_scams:
@@ -124,26 +118,12 @@ async def analyze_voice(file: UploadFile = File(...)):
         # Read audio file
         audio_data = await file.read()
         
-        # Save to temporary file (Whisper requires file path)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_audio:
-            temp_audio.write(audio_data)
-            temp_audio_path = temp_audio.name
-        
-        try:
-            # Transcribe using OpenAI Whisper
-            with open(temp_audio_path, "rb") as audio_file:
-                transcript_response = get_openai_client().audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    language="en"  # Can be auto-detected or set to "hi" for Hindi
-                )
-            
-            transcript = transcript_response.text
-            
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_audio_path):
-                os.unlink(temp_audio_path)
+        # Transcribe using OpenAI Whisper (uploaded from memory, no temp file)
+        transcript = await llm_gateway.transcribe(
+            (file.filename or "audio.mp3", audio_data),
+            model="whisper-1",
+            language="en"  # Can be auto-detected or set to "hi" for Hindi
+        )
         
         # Detect scam patterns
         scam_type, confidence, keywords = detect_scam_type(transcript)
@@ -207,25 +187,12 @@ async def transcribe_audio(file: UploadFile = File(...), language: Optional[str]
     try:
         audio_data = await file.read()
         
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as temp_audio:
-            temp_audio.write(audio_data)
-            temp_audio_path = temp_audio.name
-        
-        try:
-            # Transcribe using OpenAI Whisper
-            with open(temp_audio_path, "rb") as audio_file:
-                transcript_response = get_openai_client().audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    language=language if language else None
-                )
-            
-            transcript = transcript_response.text
-            
-        finally:
-            if os.path.exists(temp_audio_path):
-                os.unlink(temp_audio_path)
+        # Transcribe using OpenAI Whisper
+        transcript = await llm_gateway.transcribe(
+            (file.filename or "audio.mp3", audio_data),
+            model="whisper-1",
+            language=language if language else None
+        )
         
         return {
             "ok": True,
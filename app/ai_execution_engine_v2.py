@@ -19,21 +19,14 @@ SAFETY FEATURES:
 
 import os
 import json
-import psycopg
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 from openai import OpenAI
+from app.database import get_db_connection
 
 # Initialize OpenAI client (for GitHub issue creation)
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def get_db_connection():
-    """Get database connection"""
-    database_url = os.getenv("DATABASE_URL", "")
-    if database_url.startswith("postgresql+psycopg://"):
-        database_url = database_url.replace("postgresql+psycopg://", "postgresql://", 1)
-    return psycopg.connect(database_url)
-
 # ============================================================================
 # SAFE ACTION EXECUTORS
 # ============================================================================
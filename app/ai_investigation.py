@@ -3,16 +3,10 @@ AI Investigation Module
 Handles case management, evidence linking, and investigation workflows
 """
 
-import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from datetime import datetime, timedelta
 import json
-
-def get_db_connection():
-    """Get database connection"""
-    conn = psycopg2.connect(os.environ["DATABASE_URL"])
-    return conn
+from .database import get_db_connection
 
 def generate_case_number():
     """Generate unique case number (format: CASE-YYYYMMDD-XXXX)"""
@@ -7,17 +7,13 @@ import os
 import json
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
-import psycopg2
 from psycopg2.extras import RealDictCursor, Json
 from openai import OpenAI
+from .database import get_db_connection
 
 # Initialize OpenAI client
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def get_db_connection():
-    """Get PostgreSQL database connection"""
-    return psycopg2.connect(os.getenv("DATABASE_URL"))
-
 def store_conversation_message(
     session_id: str,
     user_id: Optional[int],
@@ -8,7 +8,6 @@ import json
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from openai import OpenAI
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from app.ai_learning_center import store_conversation_message, track_ai_decision
 from app.admin.ai_internet_tools import web_search, web_fetch, get_recent_web_logs
@@ -18,14 +17,11 @@ from app.admin.ai_mobile_tools import propose_mobile_release
 from app.admin.ai_tool_status import get_tool_error_message
 from app.admin.echoshell_read_tools import ECHOSHELL_READ_TOOLS
 from app.admin.echoshell_write_tools import ECHOSHELL_WRITE_TOOLS
+from .database import get_db_connection
 
 # Initialize OpenAI client
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-# Database connection
-def get_db_connection():
-    return psycopg2.connect(os.getenv("DATABASE_URL"))
-
 # ============================================================================
 # INTERNAL TOOLS - Read-only (Safe)
 # ============================================================================
@@ -5,7 +5,7 @@ Handles user registration with OTP verification
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, EmailStr, validator
 from app.deps import get_settings
-import psycopg
+from app.database import acquire_db_connection
 import random
 import re
 from datetime import datetime, timedelta
@@ -106,11 +106,8 @@ async def signup(req: SignupRequest):
     """
     User signup endpoint - creates user account and sends OTP for verification
     """
-    settings = get_settings()
-    dsn = settings.DATABASE_URL
-    
     try:
-        with psycopg.connect(dsn) as conn:
+        with await acquire_db_connection() as conn:
             with conn.cursor() as cur:
                 # Check if email already exists
                 cur.execute("SELECT id, otp_verified FROM users WHERE email = %s", (req.email,))
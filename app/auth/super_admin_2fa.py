@@ -8,7 +8,7 @@ from pydantic import BaseModel, EmailStr
 from typing import Optional
 import os
 from .whatsapp_otp import send_whatsapp_otp, verify_whatsapp_otp, generate_recovery_codes
-from ..database import get_db_connection
+from ..database import acquire_db_connection
 import bcrypt
 import secrets
 
@@ -75,7 +75,7 @@ async def verify_mobile_otp_endpoint(request: MobileOTPVerify):
     final_token = secrets.token_urlsafe(32)
     
     # Get user data from database
-    conn = get_db_connection()
+    conn = await acquire_db_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -113,7 +113,7 @@ async def verify_recovery_code_endpoint(request: RecoveryCodeVerify):
         raise HTTPException(status_code=403, detail="Not authorized")
     
     # Get stored recovery codes from database
-    conn = get_db_connection()
+    conn = await acquire_db_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -191,7 +191,7 @@ async def generate_recovery_codes_endpoint(email: EmailStr):
     codes = generate_recovery_codes(10)
     
     # Store in database
-    conn = get_db_connection()
+    conn = await acquire_db_connection()
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -5,7 +5,7 @@ Verifies OTP and generates JWT token for authenticated sessions
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from app.deps import get_settings
-import psycopg
+from app.database import acquire_db_connection
 from datetime import datetime, timedelta
 import jwt
 
@@ -46,11 +46,8 @@ async def verify_otp(req: VerifyOTPRequest):
     """
     Verify OTP and generate JWT token for user session
     """
-    settings = get_settings()
-    dsn = settings.DATABASE_URL
-    
     try:
-        with psycopg.connect(dsn) as conn:
+        with await acquire_db_connection() as conn:
             with conn.cursor() as cur:
                 # Check if user exists
                 cur.execute("""
@@ -353,7 +353,7 @@ async def create_global_complaint(request: Request, payload: AlertRequestV2, cur
         
         # Get user info
         user_query = text("SELECT name, email, identity FROM users WHERE id = :uid")
-        user_row = (await db.execute(user_query, {"uid": user_id})).fetchone()
+        user_row = await db.fetch_one(user_query, {"uid": user_id})
         
         user_info = {
             "name": user_row[0] if user_row else "User",
@@ -383,7 +383,7 @@ async def create_global_complaint(request: Request, payload: AlertRequestV2, cur
         
         evidence_json = json.dumps([e.dict() for e in payload.evidence_files]) if payload.evidence_files else "[]"
         
-        result = await db.execute(save_query, {
+        alert_id = await db.fetch_val(save_query, {
             "uid": user_id,
             "country": payload.country_code,
             "type": payload.alert_type,
@@ -395,8 +395,6 @@ async def create_global_complaint(request: Request, payload: AlertRequestV2, cur
             "evidence": evidence_json
         })
         
-        alert_id = result.fetchone()[0]
-        
         # Generate scam analysis summary
         scam_analysis = {
             "type": payload.scam_type.replace('_', ' ').title(),
@@ -534,7 +532,7 @@ async def admin_get_all_complaints(request: Request, admin: dict = Depends(guard
             ORDER BY a.created_at DESC
         """)
         
-        results = (await db.execute(query)).fetchall()
+        results = await db.fetch_all(query)
         
         complaints = []
         for row in results:
@@ -578,7 +576,7 @@ async def admin_export_complaint(request: Request, complaint_id: int, admin: dic
             WHERE a.id = :cid
         """)
         
-        row = (await db.execute(query, {"cid": complaint_id})).fetchone()
+        row = await db.fetch_one(query, {"cid": complaint_id})
         
         if not row:
             raise HTTPException(404, "Complaint not found")
@@ -6,6 +6,96 @@ Handles automatic logging of high-risk content to evidence_vault
 from sqlalchemy import text
 from datetime import datetime, timedelta
 import json
+import secrets
+
+
+CASE_TYPE_MAP = {
+    "harmful_extremist_content": "harmful_extremism",
+    "self_harm_risk": "self_harm",
+    "scam_fraud": "scam",
+    "harassment_abuse": "harassment"
+}
+
+VAULT_INSERT_SQL = """
+    INSERT INTO evidence_vault (
+        evidence_id, user_id, evidence_type,
+        scam_type, threat_level,
+        content_category, violence_or_extremism_risk, tags,
+        ai_analysis, echofort_seal, retention_expiry,
+        created_at
+    ) VALUES (
+        :evidence_id, :user_id, :evidence_type,
+        :case_type, :threat_level,
+        :content_category, :violence_risk, :tags,
+        :ai_analysis, :seal, :retention_expiry,
+        NOW()
+    )
+"""
+VAULT_INSERT_QUERY = text(VAULT_INSERT_SQL)
+
+
+def build_vault_row(
+    user_id: str,
+    evidence_type: str,
+    content_category: str,
+    violence_or_extremism_risk: int,
+    tags: list,
+    analysis_data: dict
+) -> dict:
+    """Insert parameters for one evidence_vault row (with a fresh evidence ID)"""
+    # Generate evidence ID
+    evidence_id = f"EVD-{secrets.token_hex(6).upper()}"
+    
+    # Determine case_type based on content_category
+    case_type = CASE_TYPE_MAP.get(content_category, "unknown")
+    
+    # Calculate retention expiry (7 years for legal compliance)
+    retention_expiry = datetime.utcnow() + timedelta(days=7*365)
+    
+    # Create EchoFort seal
+    seal = f"""
+╔══════════════════════════════════════════╗
+║         🛡️ ECHOFORT EVIDENCE 🛡️          ║
+║  Evidence ID: {evidence_id}           ║
+║  Type: {evidence_type.upper()}                    ║
+║  Risk: {violence_or_extremism_risk}/10                       ║
+║  Sealed: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC         ║
+║  AI PREDICTION - NOT LEGAL LABEL         ║
+╚══════════════════════════════════════════╝
+    """.strip()
+    
+    return {
+        "evidence_id": evidence_id,
+        "user_id": user_id or "anonymous",
+        "evidence_type": evidence_type,
+        "case_type": case_type,
+        "threat_level": violence_or_extremism_risk,
+        "content_category": content_category,
+        "violence_risk": violence_or_extremism_risk,
+        "tags": json.dumps(tags),
+        "ai_analysis": json.dumps(analysis_data),
+        "seal": seal,
+        "retention_expiry": retention_expiry
+    }
+
+
+async def log_high_risk_batch_to_vault(db, rows: list) -> int:
+    """
+    Bulk-insert rows built with build_vault_row() in one transaction
+    
+    Args:
+        db: AsyncDB (request.app.state.db)
+        rows: Insert parameters from build_vault_row()
+    
+    Returns:
+        Number of rows written
+    """
+    if not rows:
+        return 0
+    async with db.transaction() as tx:
+        await tx.executemany(VAULT_INSERT_QUERY, rows)
+    print(f"✅ Block 5: {len(rows)} high-risk items logged to vault in one batch")
+    return len(rows)
 
 
 async def log_high_risk_to_vault(
@@ -65,65 +155,18 @@ async def log_high_risk_to_vault(
         created_connection = True
     
     try:
-        # Generate evidence ID
-        import secrets
-        evidence_id = f"EVD-{secrets.token_hex(6).upper()}"
-        
-        # Determine case_type based on content_category
-        case_type_map = {
-            "harmful_extremist_content": "harmful_extremism",
-            "self_harm_risk": "self_harm",
-            "scam_fraud": "scam",
-            "harassment_abuse": "harassment"
-        }
-        case_type = case_type_map.get(content_category, "unknown")
-        
-        # Calculate retention expiry (7 years for legal compliance)
-        retention_expiry = datetime.utcnow() + timedelta(days=7*365)
-        
-        # Create EchoFort seal
-        seal = f"""
-╔══════════════════════════════════════════╗
-║         🛡️ ECHOFORT EVIDENCE 🛡️          ║
-║  Evidence ID: {evidence_id}           ║
-║  Type: {evidence_type.upper()}                    ║
-║  Risk: {violence_or_extremism_risk}/10                       ║
-║  Sealed: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC         ║
-║  AI PREDICTION - NOT LEGAL LABEL         ║
-╚══════════════════════════════════════════╝
-        """.strip()
+        row = build_vault_row(
+            user_id=user_id,
+            evidence_type=evidence_type,
+            content_category=content_category,
+            violence_or_extremism_risk=violence_or_extremism_risk,
+            tags=tags,
+            analysis_data=analysis_data
+        )
+        evidence_id = row["evidence_id"]
         
         # Insert into evidence_vault
-        query = text("""
-            INSERT INTO evidence_vault (
-                evidence_id, user_id, evidence_type,
-                scam_type, threat_level,
-                content_category, violence_or_extremism_risk, tags,
-                ai_analysis, echofort_seal, retention_expiry,
-                created_at
-            ) VALUES (
-                :evidence_id, :user_id, :evidence_type,
-                :case_type, :threat_level,
-                :content_category, :violence_risk, :tags,
-                :ai_analysis, :seal, :retention_expiry,
-                NOW()
-            )
-            RETURNING id
-        """)
-        
-        result = await db.execute(query, {
-            "evidence_id": evidence_id,
-            "user_id": user_id or "anonymous",
-            "evidence_type": evidence_type,
-            "case_type": case_type,
-            "threat_level": violence_or_extremism_risk,
-            "content_category": content_category,
-            "violence_risk": violence_or_extremism_risk,
-            "tags": json.dumps(tags),
-            "ai_analysis": json.dumps(analysis_data),
-            "seal": seal,
-            "retention_expiry": retention_expiry
-        })
+        result = await db.execute(text(VAULT_INSERT_SQL + "    RETURNING id\n"), row)
         
         await db.commit()
         
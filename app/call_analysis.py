@@ -3,25 +3,26 @@ Call Analysis API Endpoints
 Handles call recording uploads, analysis, and retrieval
 """
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, BackgroundTasks
-from pydantic import BaseModel, HttpUrl
+from fastapi import APIRouter, HTTPException, Depends, Header, Request
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
-import os
-import uuid
-import asyncpg
+from datetime import datetime
+from . import call_analysis_queue
+from .utils import get_current_user
 from .whisper_service import get_whisper_analyzer
 
 router = APIRouter(prefix="/api/calls", tags=["call-analysis"])
 
+MAX_BULK_RECORDINGS = 50
+
 
 # Request/Response Models
 class CallUploadRequest(BaseModel):
-    audio_url: str
-    caller_id: Optional[str] = None
-    call_duration: Optional[int] = None  # seconds
-    call_direction: Optional[str] = "incoming"  # incoming/outgoing
-    language: str = "en"
+    audio_url: str = Field(..., max_length=2048)  # https on CALL_RECORDING_ALLOWED_HOSTS
+    caller_id: Optional[str] = Field(None, max_length=50)
+    call_duration: Optional[int] = Field(None, ge=0)  # seconds
+    call_direction: Optional[str] = Field("incoming", max_length=20)  # incoming/outgoing
+    language: str = Field("en", max_length=10)
     metadata: Optional[Dict[str, Any]] = None
 
 
@@ -34,259 +35,164 @@ class CallAnalysisResponse(BaseModel):
     evidence_report: Optional[str] = None
     created_at: str
     analyzed_at: Optional[str] = None
+    attempts: Optional[int] = None
+    error: Optional[str] = None  # last failed attempt, if any
 
 
 class BulkAnalysisRequest(BaseModel):
-    audio_urls: List[str]
-    language: str = "en"
+    audio_urls: List[str] = Field(..., min_length=1, max_length=MAX_BULK_RECORDINGS)
+    language: str = Field("en", max_length=10)
 
 
-# Background task for analysis
-async def process_call_analysis(
-    call_id: str,
-    audio_url: str,
-    language: str,
-    metadata: Optional[Dict[str, Any]]
-):
-    """
-    Background task to analyze call recording
-    """
-    try:
-        analyzer = get_whisper_analyzer()
-        
-        # Perform analysis
-        result = await analyzer.analyze_call_recording(
-            audio_url=audio_url,
-            language=language,
-            metadata=metadata
-        )
-        
-        # Generate alert and evidence report
-        if result.get("analysis"):
-            alert_message = analyzer.generate_alert_message(result["analysis"])
-            evidence_report = analyzer.generate_evidence_report(result["analysis"])
-        else:
-            alert_message = None
-            evidence_report = None
-        
-        # TODO: Save to database
-        # await db.update_call_analysis(call_id, result, alert_message, evidence_report)
-        
-        # TODO: Send alert if high-risk
-        # if result.get("analysis", {}).get("threat_level", 0) >= 7:
-        #     await send_alert_notification(call_id, alert_message)
-        
-        print(f"✅ Call {call_id} analyzed successfully")
-        
-    except Exception as e:
-        print(f"❌ Call {call_id} analysis failed: {str(e)}")
-        # TODO: Update database with error status
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _job_response(job) -> CallAnalysisResponse:
+    return CallAnalysisResponse(
+        call_id=job["call_id"],
+        status=job["status"],
+        transcription=job["transcription"],
+        analysis=job["analysis"],
+        alert_message=job["alert_message"],
+        evidence_report=job["evidence_report"],
+        created_at=_iso(job["created_at"]),
+        analyzed_at=_iso(job["analyzed_at"]),
+        attempts=job["attempts"],
+        error=job["last_error"],
+    )
 
 
 @router.post("/upload", response_model=CallAnalysisResponse)
 async def upload_call_recording(
     request: CallUploadRequest,
-    background_tasks: BackgroundTasks
+    http_request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=200),
+    current_user=Depends(get_current_user)
 ):
     """
     Upload call recording for analysis
     
-    - Accepts audio URL (S3, public URL, etc.)
-    - Triggers background analysis with Whisper API
-    - Returns call_id for tracking
+    - Accepts an https audio URL on the recording storage host
+    - Queues analysis for the call analysis worker (Whisper + GPT)
+    - Returns call_id for tracking; poll GET /api/calls/{call_id}
+    - Resending with the same Idempotency-Key returns the original call
     """
     try:
-        # Generate call ID
-        call_id = f"CALL-{uuid.uuid4().hex[:12].upper()}"
-        
-        # TODO: Save to database
-        # await db.create_call_record(call_id, request)
-        
-        # Trigger background analysis
-        background_tasks.add_task(
-            process_call_analysis,
-            call_id=call_id,
+        job, _ = await call_analysis_queue.enqueue(
+            http_request.app.state.db,
+            user_id=current_user["id"],
             audio_url=request.audio_url,
             language=request.language,
-            metadata=request.metadata
-        )
-        
-        return CallAnalysisResponse(
-            call_id=call_id,
-            status="processing",
-            created_at=datetime.now().isoformat()
+            caller_id=request.caller_id,
+            call_duration=request.call_duration,
+            call_direction=request.call_direction,
+            metadata=request.metadata,
+            idempotency_key=idempotency_key
         )
+        return _job_response(job)
         
+    except call_analysis_queue.AudioURLNotAllowedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except call_analysis_queue.IdempotencyConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
-@router.post("/analyze", response_model=CallAnalysisResponse)
-async def analyze_call(
-    request: CallUploadRequest
-):
-    """
-    Analyze call recording immediately (synchronous)
-    
-    - Transcribes audio with Whisper
-    - Analyzes for scam indicators
-    - Returns complete analysis
-    
-    Note: Use /upload for async processing of large files
-    """
-    try:
-        call_id = f"CALL-{uuid.uuid4().hex[:12].upper()}"
-        
-        analyzer = get_whisper_analyzer()
-        
-        # Perform analysis
-        result = await analyzer.analyze_call_recording(
-            audio_url=request.audio_url,
-            language=request.language,
-            metadata=request.metadata
-        )
-        
-        # Generate alert and evidence report
-        alert_message = None
-        evidence_report = None
-        
-        if result.get("analysis"):
-            alert_message = analyzer.generate_alert_message(result["analysis"])
-            evidence_report = analyzer.generate_evidence_report(result["analysis"])
-        
-        # TODO: Save to database
-        
-        return CallAnalysisResponse(
-            call_id=call_id,
-            status="completed",
-            transcription=result.get("transcription"),
-            analysis=result.get("analysis"),
-            alert_message=alert_message,
-            evidence_report=evidence_report,
-            created_at=datetime.now().isoformat(),
-            analyzed_at=result.get("processed_at")
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
-
-
 @router.get("/{call_id}", response_model=CallAnalysisResponse)
-async def get_call_analysis(call_id: str):
-    """
-    Get analysis results for a specific call
+async def get_call_analysis(call_id: str, http_request: Request, current_user=Depends(get_current_user)):
     """
-    try:
-        # TODO: Fetch from database
-        # call_data = await db.get_call_analysis(call_id)
-        
-        # For now, return sample data
-        return CallAnalysisResponse(
-            call_id=call_id,
-            status="completed",
-            created_at=datetime.now().isoformat()
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=404, detail=f"Call not found: {call_id}")
-
-
-@router.get("/list")
-async def list_call_recordings(
-    user_id: Optional[str] = None,
-    scam_only: bool = False,
-    limit: int = 50,
-    offset: int = 0
-):
-    """
-    List call recordings with optional filters
+    Get analysis status and results for one of the user's calls
     
-    - Filter by user_id
-    - Filter scam calls only
-    - Pagination support
+    - status: pending, processing, completed or failed
+    - error holds the last failed attempt while retries are pending
     """
-    try:
-        # TODO: Fetch from database
-        # calls = await db.list_calls(user_id, scam_only, limit, offset)
-        
-        # For now, return empty list
-        return {
-            "calls": [],
-            "total": 0,
-            "limit": limit,
-            "offset": offset
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to list calls: {str(e)}")
+    job = await call_analysis_queue.get_job(http_request.app.state.db, call_id, current_user["id"])
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Call not found: {call_id}")
+    return _job_response(job)
 
 
 @router.post("/bulk-analyze")
 async def bulk_analyze_calls(
     request: BulkAnalysisRequest,
-    background_tasks: BackgroundTasks
+    http_request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=200),
+    current_user=Depends(get_current_user)
 ):
     """
     Analyze multiple call recordings in parallel
     
-    - Accepts list of audio URLs
-    - Processes in background
+    - Accepts up to MAX_BULK_RECORDINGS audio URLs; nothing is queued if any
+      of them is rejected
+    - Queues one analysis job per recording
     - Returns list of call_ids for tracking
+    - With an Idempotency-Key, recording i is keyed "<key>:<i>", so a
+      resent batch returns the same call_ids
     """
+    try:
+        for audio_url in request.audio_urls:
+            call_analysis_queue.check_audio_url(audio_url)
+    except call_analysis_queue.AudioURLNotAllowedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     try:
         call_ids = []
         
-        for audio_url in request.audio_urls:
-            call_id = f"CALL-{uuid.uuid4().hex[:12].upper()}"
-            call_ids.append(call_id)
-            
-            # Trigger background analysis
-            background_tasks.add_task(
-                process_call_analysis,
-                call_id=call_id,
+        for index, audio_url in enumerate(request.audio_urls):
+            job, _ = await call_analysis_queue.enqueue(
+                http_request.app.state.db,
+                user_id=current_user["id"],
                 audio_url=audio_url,
                 language=request.language,
-                metadata=None
+                idempotency_key=f"{idempotency_key}:{index}" if idempotency_key else None
             )
+            call_ids.append(job["call_id"])
         
         return {
             "call_ids": call_ids,
-            "status": "processing",
+            "status": "pending",
             "total": len(call_ids)
         }
         
+    except call_analysis_queue.IdempotencyConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Bulk analysis failed: {str(e)}")
 
 
 @router.delete("/{call_id}")
-async def delete_call_recording(call_id: str):
+async def delete_call_recording(call_id: str, http_request: Request, current_user=Depends(get_current_user)):
     """
     Delete call recording and analysis
     
-    - Removes from database
+    - Removes from database (a worker still analysing it discards its result)
     - Deletes audio file from storage
     - Complies with data retention policies
     """
     try:
-        # TODO: Delete from database and S3
-        # await db.delete_call(call_id)
-        # await s3.delete_object(call_id)
-        
-        return {
-            "call_id": call_id,
-            "status": "deleted",
-            "deleted_at": datetime.now().isoformat()
-        }
-        
+        deleted = await call_analysis_queue.delete_job(http_request.app.state.db, call_id, current_user["id"])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Deletion failed: {str(e)}")
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"Call not found: {call_id}")
+    
+    # TODO: Delete from S3
+    # await s3.delete_object(call_id)
+    
+    return {
+        "call_id": call_id,
+        "status": "deleted",
+        "deleted_at": datetime.now().isoformat()
+    }
 
 
 @router.post("/realtime-detect")
 async def realtime_scam_detection(
     text: str,
-    context: Optional[Dict[str, Any]] = None
+    context: Optional[Dict[str, Any]] = None,
+    current_user=Depends(get_current_user)
 ):
     """
     Real-time scam detection during ongoing call
@@ -322,7 +228,7 @@ async def realtime_scam_detection(
 
 
 @router.get("/{call_id}/evidence")
-async def get_evidence_report(call_id: str):
+async def get_evidence_report(call_id: str, http_request: Request, current_user=Depends(get_current_user)):
     """
     Get formatted evidence report for legal purposes
     
@@ -331,69 +237,13 @@ async def get_evidence_report(call_id: str):
     - Psychological analysis
     - Recommended legal actions
     """
-    try:
-        # TODO: Fetch from database
-        # analysis = await db.get_call_analysis(call_id)
-        
-        # For now, return placeholder
-        return {
-            "call_id": call_id,
-            "evidence_report": "Evidence report will be generated after analysis",
-            "status": "pending"
-        }
-        
-    except Exception as e:
+    job = await call_analysis_queue.get_job(http_request.app.state.db, call_id, current_user["id"])
+    if job is None:
         raise HTTPException(status_code=404, detail=f"Evidence not found: {call_id}")
-
-
-@router.get("/{call_id}/download")
-async def download_call_recording(call_id: str):
-    """
-    Get download URL for call recording
-    
-    - Returns presigned S3 URL
-    - 1-hour expiration
-    - Requires authentication
-    """
-    try:
-        # TODO: Generate presigned URL
-        # download_url = await s3.get_presigned_url(call_id)
-        
-        return {
-            "call_id": call_id,
-            "download_url": "https://s3.example.com/presigned-url",
-            "expires_in": 3600
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=404, detail=f"Recording not found: {call_id}")
-
-
-@router.get("/stats/summary")
-async def get_call_statistics(
-    user_id: Optional[str] = None,
-    days: int = 30
-):
-    """
-    Get call statistics and insights
     
-    - Total calls analyzed
-    - Scams detected
-    - Threat level distribution
-    - Top scam types
-    """
-    try:
-        # TODO: Calculate from database
-        
-        return {
-            "total_calls": 0,
-            "scams_detected": 0,
-            "scam_rate": 0.0,
-            "average_threat_level": 0.0,
-            "top_scam_types": [],
-            "period_days": days
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Stats failed: {str(e)}")
+    return {
+        "call_id": call_id,
+        "evidence_report": job["evidence_report"] or "Evidence report will be generated after analysis",
+        "status": job["status"]
+    }
 
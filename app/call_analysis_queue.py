@@ -0,0 +1,481 @@
+"""
+Call Analysis Job Queue
+Postgres-backed queue (call_analysis_jobs, migration 061) for call
+recording analysis. The web process only enqueues; a separate worker
+(run_call_analysis_worker.py) transcribes and analyses, so uploads survive
+restarts and Whisper/GPT load is bounded by the worker, not by traffic.
+
+Jobs belong to the uploading user; reads and deletes are filtered on
+user_id, and audio_url must be https on an allow-listed host
+(CALL_RECORDING_ALLOWED_HOSTS) because the worker fetches it server-side.
+
+Job lifecycle:
+- enqueue(): INSERT as pending. An optional idempotency key (scoped to the
+  user) makes a retried upload return the original job instead of analysing
+  the call twice.
+- claim(): due pending jobs are taken with FOR UPDATE SKIP LOCKED, so any
+  number of workers can poll without blocking each other or double-claiming.
+  The claiming worker's id and lock time are recorded (its lease).
+- complete() / fail(): results are saved, or the job goes back to pending
+  with run_after pushed out (exponential backoff with jitter) until
+  max_attempts, then failed. Both only apply while the worker still holds
+  the lease. A completed high-risk analysis queues a scam_alert push
+  notification for the user (queue_notification(), migration 025).
+- expire_leases(): jobs stuck in processing past CALL_ANALYSIS_LEASE_SECONDS
+  (worker killed mid-job) are put back to pending, or failed when out of
+  attempts.
+
+CallAnalysisWorker runs at most CALL_ANALYSIS_WORKER_CONCURRENCY analyses at
+a time, each bounded by CALL_ANALYSIS_JOB_TIMEOUT_SECONDS. On shutdown it
+stops claiming, lets in-flight jobs finish for a grace period and hands any
+still running back to the queue without counting the attempt.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from sqlalchemy import text
+
+from .database import AsyncDB, Record
+
+logger = logging.getLogger(__name__)
+
+CALL_ANALYSIS_WORKER_CONCURRENCY = int(os.getenv("CALL_ANALYSIS_WORKER_CONCURRENCY", "4"))
+CALL_ANALYSIS_POLL_SECONDS = float(os.getenv("CALL_ANALYSIS_POLL_SECONDS", "2"))
+CALL_ANALYSIS_MAX_ATTEMPTS = int(os.getenv("CALL_ANALYSIS_MAX_ATTEMPTS", "5"))
+CALL_ANALYSIS_JOB_TIMEOUT_SECONDS = float(os.getenv("CALL_ANALYSIS_JOB_TIMEOUT_SECONDS", "300"))
+# Must exceed the job timeout, or a slow but live job gets handed to another worker
+CALL_ANALYSIS_LEASE_SECONDS = float(os.getenv("CALL_ANALYSIS_LEASE_SECONDS", "900"))
+CALL_ANALYSIS_RETRY_BASE_SECONDS = float(os.getenv("CALL_ANALYSIS_RETRY_BASE_SECONDS", "30"))
+CALL_ANALYSIS_RETRY_MAX_SECONDS = float(os.getenv("CALL_ANALYSIS_RETRY_MAX_SECONDS", "1800"))
+CALL_ANALYSIS_SHUTDOWN_GRACE_SECONDS = float(os.getenv("CALL_ANALYSIS_SHUTDOWN_GRACE_SECONDS", "30"))
+# Hosts (and their subdomains) recordings may be fetched from
+CALL_RECORDING_ALLOWED_HOSTS = tuple(
+    h.strip().lower().rstrip(".")
+    for h in os.getenv("CALL_RECORDING_ALLOWED_HOSTS", "storage.echofort.ai").split(",")
+    if h.strip()
+)
+# threat_level (0-10) at which a completed analysis pushes a scam alert
+CALL_ANALYSIS_ALERT_THREAT_LEVEL = int(os.getenv("CALL_ANALYSIS_ALERT_THREAT_LEVEL", "7"))
+
+JOB_COLUMNS = """
+    call_id, user_id, idempotency_key, audio_url, language, caller_id, call_duration,
+    call_direction, metadata, status, attempts, max_attempts, run_after,
+    last_error, transcription, analysis, alert_message, evidence_report,
+    created_at, updated_at, analyzed_at
+"""
+
+
+class IdempotencyConflictError(Exception):
+    """The idempotency key was already used for a different recording"""
+
+
+class CallAnalysisError(Exception):
+    """The analysis pipeline reported a failure"""
+
+
+class AudioURLNotAllowedError(ValueError):
+    """audio_url is not https on an allow-listed recording host"""
+
+
+def new_call_id() -> str:
+    return f"CALL-{uuid.uuid4().hex[:12].upper()}"
+
+
+def _json(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    # Whisper segments come back as SDK (pydantic) objects
+    return json.dumps(value, default=lambda o: o.model_dump() if hasattr(o, "model_dump") else str(o))
+
+
+def check_audio_url(audio_url: str, allowed_hosts: Tuple[str, ...] = CALL_RECORDING_ALLOWED_HOSTS) -> str:
+    """
+    Return audio_url if the worker may fetch it: https, no credentials, and a
+    host equal to or under one of `allowed_hosts`. Anything else (internal
+    hosts, IP literals, other schemes) raises AudioURLNotAllowedError.
+    """
+    try:
+        parts = urlsplit(audio_url)
+        port = parts.port
+    except ValueError:
+        raise AudioURLNotAllowedError("audio_url is not a valid URL")
+    host = (parts.hostname or "").rstrip(".")
+    if parts.scheme != "https" or not host or parts.username or parts.password or port not in (None, 443):
+        raise AudioURLNotAllowedError("audio_url must be an https URL on the recording storage host")
+    if not any(host == allowed or host.endswith("." + allowed) for allowed in allowed_hosts):
+        raise AudioURLNotAllowedError(f"Recordings can't be fetched from {host}")
+    return audio_url
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before retry number `attempts` (1-based): doubling, capped, with jitter"""
+    delay = min(CALL_ANALYSIS_RETRY_MAX_SECONDS, CALL_ANALYSIS_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+# -- queue operations -------------------------------------------------------
+
+async def enqueue(
+    db: AsyncDB,
+    user_id: int,
+    audio_url: str,
+    language: str = "en",
+    caller_id: Optional[str] = None,
+    call_duration: Optional[int] = None,
+    call_direction: Optional[str] = None,
+    metadata: Optional[Dict[str, Any]] = None,
+    idempotency_key: Optional[str] = None,
+    max_attempts: int = CALL_ANALYSIS_MAX_ATTEMPTS,
+) -> Tuple[Record, bool]:
+    """
+    (job row, created). With an idempotency key the user already used the
+    existing job is returned (created=False); IdempotencyConflictError if
+    that job was for a different recording. AudioURLNotAllowedError if the
+    URL fails check_audio_url().
+    """
+    check_audio_url(audio_url)
+    row = await db.fetch_one(
+        text(f"""
+            INSERT INTO call_analysis_jobs
+                (call_id, user_id, idempotency_key, audio_url, language, caller_id, call_duration,
+                 call_direction, metadata, max_attempts)
+            VALUES (:call_id, :user_id, :idempotency_key, :audio_url, :language, :caller_id, :call_duration,
+                    :call_direction, CAST(:metadata AS jsonb), :max_attempts)
+            ON CONFLICT (user_id, idempotency_key) WHERE idempotency_key IS NOT NULL DO NOTHING
+            RETURNING {JOB_COLUMNS}
+        """),
+        {
+            "call_id": new_call_id(),
+            "user_id": user_id,
+            "idempotency_key": idempotency_key,
+            "audio_url": audio_url,
+            "language": language,
+            "caller_id": caller_id,
+            "call_duration": call_duration,
+            "call_direction": call_direction,
+            "metadata": _json(metadata),
+            "max_attempts": max_attempts,
+        },
+    )
+    if row is not None:
+        return row, True
+    existing = await db.fetch_one(
+        text(f"SELECT {JOB_COLUMNS} FROM call_analysis_jobs WHERE user_id = :user_id AND idempotency_key = :key"),
+        {"user_id": user_id, "key": idempotency_key},
+    )
+    if existing is None:
+        # The original job was deleted between the conflict and the lookup
+        raise IdempotencyConflictError("Idempotency key belongs to a deleted call")
+    if existing["audio_url"] != audio_url:
+        raise IdempotencyConflictError("Idempotency key already used for a different recording")
+    return existing, False
+
+
+async def get_job(db: AsyncDB, call_id: str, user_id: int) -> Optional[Record]:
+    """The job, or None if it doesn't exist or belongs to another user"""
+    return await db.fetch_one(
+        text(f"SELECT {JOB_COLUMNS} FROM call_analysis_jobs WHERE call_id = :call_id AND user_id = :user_id"),
+        {"call_id": call_id, "user_id": user_id},
+    )
+
+
+async def delete_job(db: AsyncDB, call_id: str, user_id: int) -> bool:
+    deleted = await db.fetch_val(
+        text("DELETE FROM call_analysis_jobs WHERE call_id = :call_id AND user_id = :user_id RETURNING call_id"),
+        {"call_id": call_id, "user_id": user_id},
+    )
+    return deleted is not None
+
+
+async def claim(db: AsyncDB, worker_id: str, limit: int) -> List[Record]:
+    """Lease up to `limit` due pending jobs to this worker (pending -> processing)"""
+    return await db.fetch_all(
+        text("""
+            WITH due AS (
+                SELECT call_id FROM call_analysis_jobs
+                WHERE status = 'pending' AND run_after <= NOW()
+                ORDER BY run_after
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE call_analysis_jobs j
+            SET status = 'processing', attempts = j.attempts + 1,
+                locked_by = :worker_id, locked_at = NOW(), updated_at = NOW()
+            FROM due
+            WHERE j.call_id = due.call_id
+            RETURNING j.call_id, j.user_id, j.audio_url, j.language, j.metadata, j.attempts, j.max_attempts
+        """),
+        {"worker_id": worker_id, "limit": limit},
+    )
+
+
+async def complete(db: AsyncDB, call_id: str, worker_id: str, transcription: Optional[Dict[str, Any]],
+                   analysis: Optional[Dict[str, Any]], alert_message: Optional[str],
+                   evidence_report: Optional[str]) -> bool:
+    """processing -> completed; False if the lease was lost (expired, or the job was deleted)"""
+    done = await db.fetch_val(
+        text("""
+            UPDATE call_analysis_jobs
+            SET status = 'completed', transcription = CAST(:transcription AS jsonb),
+                analysis = CAST(:analysis AS jsonb), alert_message = :alert_message,
+                evidence_report = :evidence_report, last_error = NULL,
+                locked_by = NULL, locked_at = NULL, analyzed_at = NOW(), updated_at = NOW()
+            WHERE call_id = :call_id AND status = 'processing' AND locked_by = :worker_id
+            RETURNING call_id
+        """),
+        {
+            "call_id": call_id,
+            "worker_id": worker_id,
+            "transcription": _json(transcription),
+            "analysis": _json(analysis),
+            "alert_message": alert_message,
+            "evidence_report": evidence_report,
+        },
+    )
+    return done is not None
+
+
+async def fail(db: AsyncDB, call_id: str, worker_id: str, error: str, retry_in: float) -> Optional[str]:
+    """
+    processing -> pending (retry after `retry_in` seconds) or failed once
+    out of attempts. Returns the new status, None if the lease was lost.
+    """
+    return await db.fetch_val(
+        text("""
+            UPDATE call_analysis_jobs
+            SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+                run_after = NOW() + make_interval(secs => :retry_in),
+                last_error = :error, locked_by = NULL, locked_at = NULL, updated_at = NOW()
+            WHERE call_id = :call_id AND status = 'processing' AND locked_by = :worker_id
+            RETURNING status
+        """),
+        {"call_id": call_id, "worker_id": worker_id, "error": error[:2000], "retry_in": float(retry_in)},
+    )
+
+
+async def release(db: AsyncDB, call_id: str, worker_id: str):
+    """Hand an unfinished job back (worker shutting down); the attempt isn't counted"""
+    await db.execute(
+        text("""
+            UPDATE call_analysis_jobs
+            SET status = 'pending', attempts = GREATEST(attempts - 1, 0), run_after = NOW(),
+                locked_by = NULL, locked_at = NULL, updated_at = NOW()
+            WHERE call_id = :call_id AND status = 'processing' AND locked_by = :worker_id
+        """),
+        {"call_id": call_id, "worker_id": worker_id},
+    )
+
+
+async def expire_leases(db: AsyncDB, lease_seconds: float = CALL_ANALYSIS_LEASE_SECONDS) -> int:
+    """Requeue (or fail, when out of attempts) jobs whose worker stopped renewing them"""
+    rows = await db.fetch_all(
+        text("""
+            UPDATE call_analysis_jobs
+            SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+                run_after = NOW(),
+                last_error = 'Worker lease expired (' || COALESCE(locked_by, 'unknown') || ')',
+                locked_by = NULL, locked_at = NULL, updated_at = NOW()
+            WHERE call_id IN (
+                SELECT call_id FROM call_analysis_jobs
+                WHERE status = 'processing' AND locked_at < NOW() - make_interval(secs => :lease)
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING call_id, status
+        """),
+        {"lease": float(lease_seconds)},
+    )
+    for row in rows:
+        logger.warning("Call analysis job %s lease expired; now %s", row["call_id"], row["status"])
+    return len(rows)
+
+
+async def queue_alert(db: AsyncDB, job: Record, analysis: Optional[Dict[str, Any]],
+                      alert_message: Optional[str]) -> Optional[int]:
+    """
+    Queue a scam_alert push for the job's user when the analysis reached
+    CALL_ANALYSIS_ALERT_THREAT_LEVEL. Returns the notification id; None if
+    below the threshold or suppressed by the user's notification settings.
+    """
+    threat_level = (analysis or {}).get("threat_level") or 0
+    if threat_level < CALL_ANALYSIS_ALERT_THREAT_LEVEL or not alert_message:
+        return None
+    return await db.fetch_val(
+        text("""
+            SELECT queue_notification(:user_id, :title, :body, 'scam_alert', 'high', CAST(:data AS jsonb))
+        """),
+        {
+            "user_id": job["user_id"],
+            "title": "Scam call detected",
+            "body": alert_message,
+            "data": _json({
+                "call_id": job["call_id"],
+                "scam_type": analysis.get("scam_type"),
+                "threat_level": threat_level,
+            }),
+        },
+    )
+
+
+async def queue_stats(db: AsyncDB) -> Dict[str, int]:
+    rows = await db.fetch_all(text("SELECT status, COUNT(*) AS n FROM call_analysis_jobs GROUP BY status"))
+    return {row["status"]: row["n"] for row in rows}
+
+
+# -- analysis ---------------------------------------------------------------
+
+async def analyze_job(job: Record) -> Dict[str, Any]:
+    """Transcribe + analyse one claimed job; raises on any failure so it is retried"""
+    from .whisper_service import get_whisper_analyzer
+
+    analyzer = get_whisper_analyzer()
+    result = await analyzer.analyze_call_recording(
+        audio_url=job["audio_url"],
+        language=job["language"],
+        metadata=job["metadata"],
+    )
+    if result.get("error"):
+        raise CallAnalysisError(result["error"])
+    analysis = result.get("analysis")
+    return {
+        "transcription": result.get("transcription"),
+        "analysis": analysis,
+        "alert_message": analyzer.generate_alert_message(analysis) if analysis else None,
+        "evidence_report": analyzer.generate_evidence_report(analysis) if analysis else None,
+    }
+
+
+class CallAnalysisWorker:
+    """Polls the queue and runs up to `concurrency` analyses at a time"""
+
+    def __init__(self, db: AsyncDB, concurrency: int = CALL_ANALYSIS_WORKER_CONCURRENCY,
+                 poll_interval: float = CALL_ANALYSIS_POLL_SECONDS,
+                 job_timeout: float = CALL_ANALYSIS_JOB_TIMEOUT_SECONDS,
+                 worker_id: Optional[str] = None, analyze=analyze_job):
+        self.db = db
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.analyze = analyze
+        self._tasks: Set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def stop(self):
+        self._stopping.set()
+
+    async def run(self):
+        logger.info("Call analysis worker %s started (concurrency %d)", self.worker_id, self.concurrency)
+        next_sweep = 0.0
+        while not self._stopping.is_set():
+            if time.monotonic() >= next_sweep:
+                next_sweep = time.monotonic() + min(60.0, CALL_ANALYSIS_LEASE_SECONDS / 4)
+                try:
+                    await expire_leases(self.db)
+                except Exception:
+                    logger.exception("Call analysis lease sweep failed")
+
+            free = self.concurrency - len(self._tasks)
+            jobs: List[Record] = []
+            if free > 0:
+                try:
+                    jobs = await claim(self.db, self.worker_id, free)
+                except Exception:
+                    logger.exception("Call analysis claim failed")
+            for job in jobs:
+                task = asyncio.create_task(self._process(job))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            if len(self._tasks) >= self.concurrency:
+                await self._wait(self._tasks)  # until a slot frees up
+            elif not jobs or len(jobs) < free:
+                await self._wait(set())  # queue drained; poll again later
+            # else: a full batch was claimed, there may be more due right now
+
+        await self._drain()
+        logger.info("Call analysis worker %s stopped", self.worker_id)
+
+    async def _wait(self, tasks: Set[asyncio.Task]):
+        stopping = asyncio.create_task(self._stopping.wait())
+        try:
+            await asyncio.wait(tasks | {stopping}, timeout=self.poll_interval,
+                               return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopping.cancel()
+
+    async def _drain(self):
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(set(self._tasks), timeout=CALL_ANALYSIS_SHUTDOWN_GRACE_SECONDS)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _process(self, job: Record):
+        call_id = job["call_id"]
+        started = time.monotonic()
+        try:
+            async with asyncio.timeout(self.job_timeout):
+                outcome = await self.analyze(job)
+        except asyncio.CancelledError:
+            try:
+                await release(self.db, call_id, self.worker_id)
+            except Exception:
+                logger.exception("Could not release call analysis job %s; it requeues when the lease expires", call_id)
+            raise
+        except Exception as e:
+            error = f"Timed out after {self.job_timeout:g}s" if isinstance(e, TimeoutError) else str(e) or type(e).__name__
+            try:
+                status = await fail(self.db, call_id, self.worker_id, error, backoff_seconds(job["attempts"]))
+            except Exception:
+                logger.exception("Could not record failure of call analysis job %s", call_id)
+                return
+            if status == "failed":
+                self.failed += 1
+                logger.error("Call %s analysis failed permanently after %d attempts: %s",
+                             call_id, job["attempts"], error)
+            elif status == "pending":
+                self.retried += 1
+                logger.warning("Call %s analysis attempt %d/%d failed, will retry: %s",
+                               call_id, job["attempts"], job["max_attempts"], error)
+            return
+
+        try:
+            saved = await complete(self.db, call_id, self.worker_id, **outcome)
+        except Exception:
+            # Lease expiry requeues it; the analysis is redone rather than lost
+            logger.exception("Could not save analysis of call %s", call_id)
+            return
+        if saved:
+            self.completed += 1
+            logger.info("Call %s analyzed in %.1fs", call_id, time.monotonic() - started)
+            try:
+                await queue_alert(self.db, job, outcome["analysis"], outcome["alert_message"])
+            except Exception:
+                # The result is saved either way; the user still sees it on GET /api/calls/{call_id}
+                logger.exception("Could not queue scam alert for call %s", call_id)
+        else:
+            logger.warning("Call %s analysis finished after its lease was lost; result discarded", call_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "concurrency": self.concurrency,
+            "in_flight": len(self._tasks),
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
@@ -0,0 +1,403 @@
+"""
+Call Pattern Engine
+In-process matching of live call transcription against scam_pattern_library
+(the keyword/phrase part of analyze_call_realtime(), migrations/028).
+
+Every keyword and phrase of every active pattern goes into one
+Aho-Corasick automaton. A CallSessionState keeps the automaton state per
+speaker between segments, so a phrase split across two transcription
+segments ("arrest" | "warrant") still matches without re-sending text,
+and scores the call as a whole (decayed, sliding window, per speaker).
+Live session states are kept in a process-local registry.
+
+Matching is read-only against scam_pattern_library: per-pattern detection
+counts are aggregated in memory and flushed as one
+`detection_count = detection_count + n` per pattern every
+CALL_PATTERN_COUNT_FLUSH_SECONDS.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+from .keyword_matcher import KeywordAutomaton
+from .sms_scam_engine import like_to_regex
+from .write_behind import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+CALL_PATTERN_REFRESH_SECONDS = float(os.getenv("CALL_PATTERN_REFRESH_SECONDS", "60"))
+CALL_PATTERN_COUNT_FLUSH_SECONDS = float(os.getenv("CALL_PATTERN_COUNT_FLUSH_SECONDS", "10"))
+
+# Session scoring: decay half-life and sliding window, in seconds of call time
+CALL_SCORE_HALF_LIFE_SECONDS = float(os.getenv("CALL_SCORE_HALF_LIFE_SECONDS", "120"))
+CALL_SCORE_WINDOW_SECONDS = float(os.getenv("CALL_SCORE_WINDOW_SECONDS", "300"))
+# In-memory sessions idle this long are dropped
+CALL_SESSION_IDLE_SECONDS = float(os.getenv("CALL_SESSION_IDLE_SECONDS", "1800"))
+
+PATTERNS_QUERY = text("""
+    SELECT id, pattern_name, pattern_type, pattern_data, severity, confidence_weight
+    FROM scam_pattern_library
+    WHERE is_active = TRUE
+    ORDER BY id
+""")
+
+# pattern_type -> key in pattern_data holding its term list
+TERM_FIELDS = {"keyword": "keywords", "phrase": "phrases"}
+
+
+pattern_hit_counter = WriteBehindBuffer(
+    "scam_pattern_library.detection_count",
+    upsert_query=text("""
+        UPDATE scam_pattern_library
+        SET detection_count = COALESCE(detection_count, 0) + :hits,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE pattern_name = :pattern_name
+    """),
+    key_field="pattern_name",
+    flush_interval=CALL_PATTERN_COUNT_FLUSH_SECONDS,
+)
+
+
+async def record_pattern_hits(pattern_names):
+    """Count one detection per pattern name (aggregated, flushed in the background)"""
+    for name in pattern_names:
+        await pattern_hit_counter.add(key=name, delta={"hits": 1})
+
+
+def threat_level_for(probability: float) -> str:
+    if probability >= 80:
+        return "critical"
+    if probability >= 60:
+        return "high"
+    if probability >= 40:
+        return "medium"
+    if probability >= 20:
+        return "low"
+    return "none"
+
+
+class CompiledCallPatterns:
+    """Immutable compiled snapshot of the active scam_pattern_library rows"""
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.patterns = rows
+        # lowered term -> [(pattern index, term position, kind, original term)]
+        postings: Dict[str, List[Tuple[int, int, str, str]]] = {}
+        self.like_terms: List[Tuple[int, int, str, str, Any]] = []
+
+        for idx, row in enumerate(rows):
+            field = TERM_FIELDS.get(row.get("pattern_type"))
+            data = row.get("pattern_data") or {}
+            if field is None or not isinstance(data, dict):
+                continue
+            kind = field[:-1]  # "keyword" / "phrase"
+            for pos, term in enumerate(data.get(field) or []):
+                if not isinstance(term, str) or not term:
+                    continue
+                lowered = term.lower()
+                if any(c in lowered for c in "%_\\"):
+                    self.like_terms.append((idx, pos, kind, term, like_to_regex(lowered)))
+                else:
+                    postings.setdefault(lowered, []).append((idx, pos, kind, term))
+
+        self.postings = postings
+        self.automaton = KeywordAutomaton((term, term) for term in postings)
+
+    def weight(self, idx: int) -> float:
+        return float(self.patterns[idx].get("confidence_weight") or 0)
+
+    def hits_for_terms(self, terms, text_lowered: str = "") -> List[Tuple[int, int, str, str]]:
+        """Expand matched automaton terms (+ LIKE-fallback terms) into sorted hits"""
+        hits = []
+        for term in terms:
+            hits.extend(self.postings[term])
+        if text_lowered:
+            for idx, pos, kind, original, regex in self.like_terms:
+                if regex.search(text_lowered):
+                    hits.append((idx, pos, kind, original))
+        hits.sort()
+        return hits
+
+    def analyze(self, text_value: str) -> Dict[str, Any]:
+        """
+        Stateless single-segment analysis, same shape and numbers as the
+        JSON returned by analyze_call_realtime() (without its writes).
+        """
+        lowered = (text_value or "").lower()
+        hits = self.hits_for_terms(self.automaton.find_keys(lowered), lowered)
+        return self._summarize(hits)
+
+    def _summarize(self, hits) -> Dict[str, Any]:
+        detected = []
+        keywords = []
+        probability = 0.0
+        seen = set()
+        for idx, _, kind, original in hits:
+            pattern = self.patterns[idx]
+            keywords.append({kind: original, "pattern": pattern["pattern_name"]})
+            if idx not in seen:
+                seen.add(idx)
+                detected.append({
+                    "patternName": pattern["pattern_name"],
+                    "severity": pattern.get("severity"),
+                    "weight": self.weight(idx),
+                })
+                probability += self.weight(idx)
+        probability = min(probability, 100.0)
+        return {
+            "scamProbability": probability,
+            "threatLevel": threat_level_for(probability),
+            "detectedPatterns": detected,
+            "keywordsDetected": keywords,
+        }
+
+
+class CallSessionState:
+    """
+    Rolling state for one live call.
+
+    Holds the automaton state per speaker and every pattern matched so far
+    with when (seconds from call start) and by whom it was last said. The
+    session score is a decayed sum over patterns seen within the sliding
+    window: each pattern contributes weight * 0.5 ** (age / half_life),
+    and drops out once older than window_seconds. A script spread over
+    many short segments therefore accumulates, while a single stray
+    keyword early in a long call fades. Each segment is O(segment) work.
+    """
+
+    def __init__(self, session_id: int, user_id: Any,
+                 half_life: float = CALL_SCORE_HALF_LIFE_SECONDS,
+                 window_seconds: float = CALL_SCORE_WINDOW_SECONDS):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.half_life = half_life
+        self.window_seconds = window_seconds
+        self.speaker_states: Dict[str, int] = {}
+        # keyed by pattern_name (unique) so state survives a pattern reload
+        self.matched_terms: Set[Tuple[str, int]] = set()
+        self.matched_patterns: Dict[str, Dict[str, Any]] = {}
+        self.keywords: List[Dict[str, Any]] = []
+        self.alerted_levels: Set[str] = set()
+        self.segments = 0
+        self.clock = 0.0  # seconds from call start of the latest segment
+        self.peak_probability = 0.0
+        self.started_at = time.time()
+        self.updated_at = self.started_at
+        self._compiled: Optional[CompiledCallPatterns] = None
+
+    def _scan(self, compiled: CompiledCallPatterns, speaker: str, text_value: str) -> List[Tuple[int, int, str, str]]:
+        if compiled is not self._compiled:
+            # Patterns were recompiled; old automaton states are meaningless
+            self.speaker_states.clear()
+            self._compiled = compiled
+        automaton = compiled.automaton
+        state = self.speaker_states.get(speaker, 0)
+        lowered = text_value.lower()
+        terms = set()
+        # Segments from the same speaker are joined by a space so a phrase
+        # split across segments still matches
+        if state:
+            state = automaton.step(state, " ")
+            terms.update(key for key, _ in automaton.outputs(state))
+        for ch in lowered:
+            state = automaton.step(state, ch)
+            for key, _ in automaton.outputs(state):
+                terms.add(key)
+        self.speaker_states[speaker] = state
+        return compiled.hits_for_terms(terms, lowered)
+
+    def feed(self, compiled: CompiledCallPatterns, speaker: str, text_value: str,
+             offset_ms: Optional[int] = None) -> Dict[str, Any]:
+        """Match one new segment; returns the terms/patterns it added"""
+        speaker = speaker or "unknown"
+        now = offset_ms / 1000.0 if offset_ms is not None else time.time() - self.started_at
+        self.clock = max(self.clock, now)
+        hits = self._scan(compiled, speaker, text_value or "")
+
+        new_keywords = []
+        new_patterns = []
+        segment_patterns = []
+        for idx, pos, kind, original in hits:
+            pattern = compiled.patterns[idx]
+            name = pattern["pattern_name"]
+            if name not in segment_patterns:
+                segment_patterns.append(name)
+                entry = self.matched_patterns.get(name)
+                if entry is None:
+                    entry = self.matched_patterns[name] = {
+                        "patternName": name,
+                        "severity": pattern.get("severity"),
+                        "weight": compiled.weight(idx),
+                        "hits": 0,
+                        "firstSeenAt": self.clock,
+                        "lastSeenAt": self.clock,
+                        "speakers": {},
+                    }
+                    new_patterns.append(entry)
+                entry["hits"] += 1
+                entry["lastSeenAt"] = self.clock
+                entry["speakers"][speaker] = self.clock
+            if (name, pos) in self.matched_terms:
+                continue
+            self.matched_terms.add((name, pos))
+            keyword = {kind: original, "pattern": name, "speaker": speaker, "at": self.clock}
+            self.keywords.append(keyword)
+            new_keywords.append(keyword)
+
+        self.segments += 1
+        self.updated_at = time.time()
+        self.peak_probability = max(self.peak_probability, self.scam_probability)
+        return {
+            "newKeywords": new_keywords,
+            "newPatterns": [p["patternName"] for p in new_patterns],
+            "segmentPatterns": segment_patterns,
+            "segmentSuspicious": bool(hits),
+            "flaggedKeywords": sorted({h[3] for h in hits}),
+        }
+
+    def _decayed(self, weight: float, seen_at: float) -> float:
+        age = max(0.0, self.clock - seen_at)
+        if age > self.window_seconds:
+            return 0.0
+        return weight * 0.5 ** (age / self.half_life) if self.half_life > 0 else weight
+
+    @property
+    def scam_probability(self) -> float:
+        total = sum((self._decayed(p["weight"], p["lastSeenAt"]) for p in self.matched_patterns.values()), 0.0)
+        return round(min(total, 100.0), 2)
+
+    @property
+    def threat_level(self) -> str:
+        return threat_level_for(self.scam_probability)
+
+    def speaker_scores(self) -> Dict[str, Dict[str, Any]]:
+        """Decayed score and matched patterns attributed to each speaker"""
+        scores: Dict[str, Dict[str, Any]] = {}
+        for p in self.matched_patterns.values():
+            for speaker, seen_at in p["speakers"].items():
+                entry = scores.setdefault(speaker, {"score": 0.0, "patterns": []})
+                entry["score"] += self._decayed(p["weight"], seen_at)
+                entry["patterns"].append(p["patternName"])
+        for entry in scores.values():
+            entry["score"] = round(min(entry["score"], 100.0), 2)
+        return scores
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "sessionId": self.session_id,
+            "scamProbability": self.scam_probability,
+            "peakProbability": round(self.peak_probability, 2),
+            "threatLevel": self.threat_level,
+            "detectedPatterns": [
+                {
+                    "patternName": p["patternName"],
+                    "severity": p["severity"],
+                    "weight": p["weight"],
+                    "hits": p["hits"],
+                    "firstSeenAt": p["firstSeenAt"],
+                    "lastSeenAt": p["lastSeenAt"],
+                    "speakers": sorted(p["speakers"]),
+                    "contribution": round(self._decayed(p["weight"], p["lastSeenAt"]), 2),
+                }
+                for p in self.matched_patterns.values()
+            ],
+            "keywordsDetected": list(self.keywords),
+            "speakers": self.speaker_scores(),
+            "segments": self.segments,
+            "callSeconds": round(self.clock, 3),
+            "halfLifeSeconds": self.half_life,
+            "windowSeconds": self.window_seconds,
+        }
+
+
+class CallPatternEngine:
+    """Process-wide holder that refreshes the compiled patterns from the DB"""
+
+    def __init__(self, refresh_seconds: float = CALL_PATTERN_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._compiled: Optional[CompiledCallPatterns] = None
+        self._rows_key = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def compiled(self) -> Optional[CompiledCallPatterns]:
+        return self._compiled
+
+    def load_rows(self, rows: List[Dict[str, Any]]):
+        key = tuple(
+            (r["id"], r["pattern_name"], r["pattern_type"], repr(r.get("pattern_data")),
+             r.get("severity"), r.get("confidence_weight"))
+            for r in rows
+        )
+        if key != self._rows_key:
+            self._compiled = CompiledCallPatterns(rows)
+            self._rows_key = key
+            logger.info("Compiled %d call scam patterns (%d terms)", len(rows), len(self._compiled.automaton))
+        self._loaded_at = time.monotonic()
+
+    async def ensure_fresh(self, db) -> CompiledCallPatterns:
+        if self._compiled is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return self._compiled
+        async with self._lock:
+            if self._compiled is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+                return self._compiled
+            try:
+                rows = await db.fetch_all(PATTERNS_QUERY)
+            except Exception:
+                if self._compiled is None:
+                    raise
+                logger.exception("Call pattern refresh failed; keeping previous patterns")
+                self._loaded_at = time.monotonic()
+                return self._compiled
+            self.load_rows([dict(r._mapping) for r in rows])
+            return self._compiled
+
+    def invalidate(self):
+        """Force a reload on the next segment (call after editing scam_pattern_library)"""
+        self._loaded_at = 0.0
+
+
+call_pattern_engine = CallPatternEngine()
+
+
+class LiveSessionRegistry:
+    """Process-local CallSessionState per session id, dropped when idle"""
+
+    def __init__(self, idle_seconds: float = CALL_SESSION_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self._sessions: Dict[int, CallSessionState] = {}
+        self._last_prune = time.time()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: int) -> Optional[CallSessionState]:
+        return self._sessions.get(session_id)
+
+    def get_or_create(self, session_id: int, user_id: Any) -> CallSessionState:
+        self._prune()
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = self._sessions[session_id] = CallSessionState(session_id, user_id)
+        return state
+
+    def end(self, session_id: int) -> Optional[CallSessionState]:
+        return self._sessions.pop(session_id, None)
+
+    def _prune(self):
+        now = time.time()
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        for session_id, state in list(self._sessions.items()):
+            if now - state.updated_at > self.idle_seconds:
+                del self._sessions[session_id]
+
+
+live_sessions = LiveSessionRegistry()
@@ -11,10 +11,20 @@ EchoFort Caller ID System
 from fastapi import APIRouter, HTTPException, Request
 from sqlalchemy import text
 from datetime import datetime
+from .ttl_cache import TTLCache
+import os
 import re
 
 router = APIRouter(prefix="/api/caller-id", tags=["caller-id"])
 
+# Hot-number lookup cache, shared with mobile_caller_id.
+# Keys are (endpoint, phone) since both routers shape results differently.
+lookup_cache = TTLCache(
+    maxsize=int(os.getenv("CALLER_ID_CACHE_SIZE", "50000")),
+    ttl=float(os.getenv("CALLER_ID_CACHE_TTL", "300")),
+    negative_ttl=float(os.getenv("CALLER_ID_CACHE_NEGATIVE_TTL", "60")),
+)
+
 def normalize_phone_number(phone: str) -> str:
     """Normalize phone number for database storage"""
     # Remove all non-digit characters
@@ -30,6 +40,15 @@ def normalize_phone_number(phone: str) -> str:
     else:
         return f"+{digits}"
 
+def invalidate_caller(phone: str):
+    """Drop cached lookups for a number after a report/vote changes it"""
+    phone = phone.strip()
+    normalized = normalize_phone_number(phone)
+    lookup_cache.invalidate(
+        ("legacy", phone), ("legacy", normalized),
+        ("mobile", phone), ("mobile", normalized),
+    )
+
 @router.post("/lookup")
 async def lookup_caller(payload: dict, request: Request):
     """
@@ -64,6 +83,10 @@ async def lookup_caller(payload: dict, request: Request):
     # Normalize phone number
     normalized_phone = normalize_phone_number(phone_number)
     
+    cached = lookup_cache.get(("legacy", normalized_phone))
+    if cached is not None:
+        return cached
+    
     try:
         db = request.app.state.db
         
@@ -77,7 +100,7 @@ async def lookup_caller(payload: dict, request: Request):
         """), {"phone": normalized_phone})
         
         if result:
-            return {
+            caller = {
                 "found": True,
                 "phone_number": normalized_phone,
                 "caller_name": result[0],
@@ -91,8 +114,9 @@ async def lookup_caller(payload: dict, request: Request):
                 "upvotes": result[8],
                 "downvotes": result[9]
             }
+            lookup_cache.set(("legacy", normalized_phone), caller)
         else:
-            return {
+            caller = {
                 "found": False,
                 "phone_number": normalized_phone,
                 "caller_name": "Unknown",
@@ -100,6 +124,8 @@ async def lookup_caller(payload: dict, request: Request):
                 "is_scam": False,
                 "message": "No information available. Be the first to report!"
             }
+            lookup_cache.set(("legacy", normalized_phone), caller, negative=True)
+        return caller
             
     except Exception as e:
         print(f"❌ Caller lookup failed: {e}")
@@ -209,6 +235,7 @@ async def report_caller(payload: dict, request: Request):
             "tags": ",".join(tags),
             "notes": notes
         })
+        invalidate_caller(normalized_phone)
         
         return {
             "success": True,
@@ -256,6 +283,7 @@ async def vote_caller(payload: dict, request: Request):
             SET {field} = {field} + 1
             WHERE phone_number = :phone
         """), {"phone": normalized_phone})
+        invalidate_caller(normalized_phone)
         
         return {
             "success": True,
@@ -367,6 +395,11 @@ async def get_stats(request: Request):
             "total_reports": 0
         }
 
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Lookup cache hit/miss counters for this worker"""
+    return {"success": True, "cache": lookup_cache.stats()}
+
 @router.get("/test")
 async def test_caller_id():
     """Test caller ID system"""
@@ -8,6 +8,8 @@ from datetime import datetime
 from typing import Optional
 import asyncio
 
+from .database import get_db_connection
+
 
 async def log_user_consent(
     db,
@@ -44,12 +46,8 @@ async def log_user_consent(
         RETURNING id
         """
         
-        # Use asyncio to run in thread pool
-        import psycopg
-        from os import getenv
-        
-        dsn = getenv("DATABASE_URL")
-        with psycopg.connect(dsn) as conn:
+        # Runs in a worker thread (asyncio.to_thread), so it may wait for a pooled connection
+        with get_db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute(sql, (
                     user_id,
@@ -84,11 +82,7 @@ async def get_latest_consent(db, user_id: str) -> Optional[dict]:
         LIMIT 1
         """
         
-        import psycopg
-        from os import getenv
-        
-        dsn = getenv("DATABASE_URL")
-        with psycopg.connect(dsn) as conn:
+        with get_db_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute(sql, (user_id,))
                 row = cur.fetchone()
@@ -1,15 +1,31 @@
 """
 Content Filter API - Child Protection System
 Filters inappropriate content across apps, websites, and media
+
+/filter-batch takes a whole browser-history or app-list sync in one call:
+items are deduplicated, classified once each, and answered keyed by item
+id. Every batch response carries an ETag digest of (items, child_age,
+rules version); a client re-sending an unchanged list with If-None-Match
+gets 304 without anything being re-evaluated.
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Response
 from pydantic import BaseModel, HttpUrl
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
+import asyncio
+import hashlib
+import json
+import os
 import re
+from . import keyword_rules
+from .domain_index import DomainCategoryIndex
 
 router = APIRouter(prefix="/api/child-protection", tags=["Child Protection"])
 
+CONTENT_FILTER_BATCH_MAX = int(os.getenv("CONTENT_FILTER_BATCH_MAX", "5000"))
+# Batches with more unique items than this are classified off the event loop
+INLINE_BATCH_MAX = 200
+
 
 class ContentFilterRequest(BaseModel):
     """Request model for content filtering"""
@@ -19,14 +35,43 @@ class ContentFilterRequest(BaseModel):
     child_age: Optional[int] = None  # Age of child (helps with age-appropriate filtering)
 
 
-class ContentFilterResponse(BaseModel):
-    """Response model for content filtering"""
+class ContentFilterVerdict(BaseModel):
+    """Filtering decision for one piece of content"""
     is_blocked: bool
     risk_level: str  # "safe", "moderate", "high", "extreme"
     category: Optional[str] = None  # "adult", "violence", "gambling", "drugs", etc.
     reason: str
     age_rating: Optional[str] = None  # "G", "PG", "PG-13", "R", "18+"
     recommendations: List[str]
+
+
+class ContentFilterResponse(ContentFilterVerdict):
+    """Response model for content filtering"""
+    timestamp: str
+
+
+class ContentFilterBatchItem(BaseModel):
+    """One history entry / installed app in a batch"""
+    id: str  # Client key the verdict is returned under
+    content_type: str  # "url", "text", "app_name", "image_url"
+    content: str
+
+
+class ContentFilterBatchRequest(BaseModel):
+    """Request model for bulk filtering (browser history, app list sync)"""
+    items: List[ContentFilterBatchItem]
+    user_id: Optional[int] = None
+    child_age: Optional[int] = None
+
+
+class ContentFilterBatchResponse(BaseModel):
+    """Verdicts keyed by item id; unsupported items are listed in errors"""
+    verdicts: Dict[str, ContentFilterVerdict]
+    errors: Dict[str, str]
+    total: int
+    unique: int
+    blocked: int
+    digest: str
     timestamp: str
 
 
@@ -56,18 +101,27 @@ HATE_KEYWORDS = [
     "extremist", "radical"
 ]
 
-# Blocked domains/apps
-BLOCKED_DOMAINS = [
+# Blocked domains (domain -> category); subdomains are covered too
+BLOCKED_DOMAINS = {
     # Adult content
-    "pornhub.com", "xvideos.com", "xnxx.com", "redtube.com",
-    "youporn.com", "xhamster.com", "porn.com",
+    "pornhub.com": "adult", "xvideos.com": "adult", "xnxx.com": "adult", "redtube.com": "adult",
+    "youporn.com": "adult", "xhamster.com": "adult", "porn.com": "adult",
     
     # Gambling
-    "bet365.com", "888casino.com", "pokerstars.com",
+    "bet365.com": "gambling", "888casino.com": "gambling", "pokerstars.com": "gambling",
     
     # Social media (optional - can be age-restricted)
-    # "tiktok.com", "snapchat.com", "instagram.com"
-]
+    # "tiktok.com": "social_media", "snapchat.com": "social_media", "instagram.com": "social_media"
+}
+
+# Social media requiring age 13+
+SOCIAL_MEDIA_DOMAINS = ["facebook.com", "instagram.com", "tiktok.com", "snapchat.com", "twitter.com"]
+
+# Risk level for blocked domain categories (list files may add others)
+BLOCKED_CATEGORY_RISK = {
+    "adult": "extreme",
+    "gambling": "high",
+}
 
 BLOCKED_APPS = [
     # Adult apps
@@ -80,6 +134,17 @@ BLOCKED_APPS = [
     "match", "okcupid", "hinge"
 ]
 
+TEEN_APPS = ["tiktok", "snapchat", "instagram", "facebook", "whatsapp"]
+
+# Keyword sets in the shared rule engine; one scan covers all of them
+ADULT_SET = keyword_rules.register("content.adult", ADULT_KEYWORDS)
+VIOLENCE_SET = keyword_rules.register("content.violence", VIOLENCE_KEYWORDS)
+GAMBLING_SET = keyword_rules.register("content.gambling", GAMBLING_KEYWORDS)
+DRUGS_SET = keyword_rules.register("content.drugs", DRUGS_KEYWORDS)
+HATE_SET = keyword_rules.register("content.hate", HATE_KEYWORDS)
+BLOCKED_APPS_SET = keyword_rules.register("content.blocked_apps", BLOCKED_APPS)
+TEEN_APPS_SET = keyword_rules.register("content.teen_apps", TEEN_APPS)
+
 # Safe/Educational domains (whitelist)
 SAFE_DOMAINS = [
     "youtube.com/kids", "pbskids.org", "nationalgeographic.com",
@@ -87,6 +152,14 @@ SAFE_DOMAINS = [
     "wikipedia.org", "britannica.com", "nasa.gov"
 ]
 
+# Exact host / parent-domain index over the lists above, plus the optional
+# CONTENT_FILTER_DOMAIN_LIST file for large category blocklists
+domain_categories = DomainCategoryIndex({
+    **{domain: "social_media" for domain in SOCIAL_MEDIA_DOMAINS},
+    **BLOCKED_DOMAINS,
+    **{domain: "safe" for domain in SAFE_DOMAINS},
+})
+
 # Age ratings
 AGE_RATINGS = {
     "G": 0,      # General Audiences
@@ -102,78 +175,76 @@ def analyze_url(url: str, child_age: Optional[int]) -> tuple[bool, str, Optional
     Analyze URL for inappropriate content
     Returns: (is_blocked, risk_level, category, reason, recommendations)
     """
-    url_lower = url.lower()
+    match = domain_categories.lookup_url(url)
+    domain, domain_category = match if match else (None, None)
     
     # Check whitelist first
-    for safe_domain in SAFE_DOMAINS:
-        if safe_domain in url_lower:
-            return (
-                False,
-                "safe",
-                None,
-                "Whitelisted educational/safe domain",
-                ["✅ This website is safe for children"]
-            )
+    if domain_category == "safe":
+        return (
+            False,
+            "safe",
+            None,
+            "Whitelisted educational/safe domain",
+            ["✅ This website is safe for children"]
+        )
     
     # Check blocked domains
-    for blocked_domain in BLOCKED_DOMAINS:
-        if blocked_domain in url_lower:
-            return (
-                True,
-                "extreme",
-                "adult",
-                f"Blocked domain: {blocked_domain}",
-                [
-                    "⛔ This website is blocked for child safety",
-                    "🔒 Content is inappropriate for minors",
-                    "👨‍👩‍👧 Parents: Consider using parental controls"
-                ]
-            )
+    if domain_category and domain_category != "social_media":
+        return (
+            True,
+            BLOCKED_CATEGORY_RISK.get(domain_category, "high"),
+            domain_category,
+            f"Blocked domain: {domain}",
+            [
+                "⛔ This website is blocked for child safety",
+                "🔒 Content is inappropriate for minors",
+                "👨‍👩‍👧 Parents: Consider using parental controls"
+            ]
+        )
+    
+    hits = keyword_rules.scan(url)
     
     # Check for adult keywords in URL
-    for keyword in ADULT_KEYWORDS:
-        if keyword in url_lower:
-            return (
-                True,
-                "extreme",
-                "adult",
-                f"Adult content detected in URL: '{keyword}'",
-                [
-                    "⛔ Adult content detected",
-                    "🔒 Blocked for child protection"
-                ]
-            )
+    keyword = hits.first(ADULT_SET)
+    if keyword:
+        return (
+            True,
+            "extreme",
+            "adult",
+            f"Adult content detected in URL: '{keyword}'",
+            [
+                "⛔ Adult content detected",
+                "🔒 Blocked for child protection"
+            ]
+        )
     
     # Check for gambling keywords
-    for keyword in GAMBLING_KEYWORDS:
-        if keyword in url_lower:
-            return (
-                True,
-                "high",
-                "gambling",
-                f"Gambling content detected: '{keyword}'",
-                [
-                    "⛔ Gambling website blocked",
-                    "💰 Not appropriate for minors"
-                ]
-            )
+    keyword = hits.first(GAMBLING_SET)
+    if keyword:
+        return (
+            True,
+            "high",
+            "gambling",
+            f"Gambling content detected: '{keyword}'",
+            [
+                "⛔ Gambling website blocked",
+                "💰 Not appropriate for minors"
+            ]
+        )
     
     # Age-based restrictions
-    if child_age and child_age < 13:
-        social_media = ["facebook.com", "instagram.com", "tiktok.com", "snapchat.com", "twitter.com"]
-        for social in social_media:
-            if social in url_lower:
-                return (
-                    True,
-                    "moderate",
-                    "social_media",
-                    f"Social media requires age 13+ (child is {child_age})",
-                    [
-                        f"⚠️ Minimum age requirement: 13 years",
-                        f"👶 Child age: {child_age} years",
-                        "👨‍👩‍👧 Consider age-appropriate alternatives"
-                    ]
-                )
+    if child_age and child_age < 13 and domain_category == "social_media":
+        return (
+            True,
+            "moderate",
+            "social_media",
+            f"Social media requires age 13+ (child is {child_age})",
+            [
+                f"⚠️ Minimum age requirement: 13 years",
+                f"👶 Child age: {child_age} years",
+                "👨‍👩‍👧 Consider age-appropriate alternatives"
+            ]
+        )
     
     # Default: Allow but monitor
     return (
@@ -193,37 +264,34 @@ def analyze_app(app_name: str, child_age: Optional[int]) -> tuple[bool, str, Opt
     Analyze app name for inappropriate content
     Returns: (is_blocked, risk_level, category, reason, recommendations)
     """
-    app_lower = app_name.lower()
+    hits = keyword_rules.scan(app_name)
     
     # Check blocked apps
-    for blocked_app in BLOCKED_APPS:
-        if blocked_app in app_lower:
-            return (
-                True,
-                "high",
-                "adult",
-                f"Blocked app: {blocked_app}",
-                [
-                    "⛔ This app is blocked for child safety",
-                    "🔒 Not appropriate for minors"
-                ]
-            )
+    blocked_app = hits.first(BLOCKED_APPS_SET)
+    if blocked_app:
+        return (
+            True,
+            "high",
+            "adult",
+            f"Blocked app: {blocked_app}",
+            [
+                "⛔ This app is blocked for child safety",
+                "🔒 Not appropriate for minors"
+            ]
+        )
     
     # Age-based app restrictions
-    if child_age and child_age < 13:
-        teen_apps = ["tiktok", "snapchat", "instagram", "facebook", "whatsapp"]
-        for teen_app in teen_apps:
-            if teen_app in app_lower:
-                return (
-                    True,
-                    "moderate",
-                    "social_media",
-                    f"App requires age 13+ (child is {child_age})",
-                    [
-                        f"⚠️ Minimum age: 13 years",
-                        f"👶 Child age: {child_age} years"
-                    ]
-                )
+    if child_age and child_age < 13 and TEEN_APPS_SET in hits:
+        return (
+            True,
+            "moderate",
+            "social_media",
+            f"App requires age 13+ (child is {child_age})",
+            [
+                f"⚠️ Minimum age: 13 years",
+                f"👶 Child age: {child_age} years"
+            ]
+        )
     
     # Default: Allow
     return (
@@ -240,24 +308,24 @@ def analyze_text(text: str) -> tuple[bool, str, Optional[str], str, List[str]]:
     Analyze text content for inappropriate material
     Returns: (is_blocked, risk_level, category, reason, recommendations)
     """
-    text_lower = text.lower()
+    hits = keyword_rules.scan(text)
     
     # Check for adult content
-    for keyword in ADULT_KEYWORDS:
-        if keyword in text_lower:
-            return (
-                True,
-                "extreme",
-                "adult",
-                f"Adult content detected: '{keyword}'",
-                [
-                    "⛔ Adult content blocked",
-                    "🔒 Inappropriate for children"
-                ]
-            )
+    keyword = hits.first(ADULT_SET)
+    if keyword:
+        return (
+            True,
+            "extreme",
+            "adult",
+            f"Adult content detected: '{keyword}'",
+            [
+                "⛔ Adult content blocked",
+                "🔒 Inappropriate for children"
+            ]
+        )
     
     # Check for violence
-    violence_count = sum(1 for keyword in VIOLENCE_KEYWORDS if keyword in text_lower)
+    violence_count = hits.count(VIOLENCE_SET)
     if violence_count >= 2:
         return (
             True,
@@ -271,32 +339,32 @@ def analyze_text(text: str) -> tuple[bool, str, Optional[str], str, List[str]]:
         )
     
     # Check for drugs
-    for keyword in DRUGS_KEYWORDS:
-        if keyword in text_lower:
-            return (
-                True,
-                "high",
-                "drugs",
-                f"Drug-related content detected: '{keyword}'",
-                [
-                    "⛔ Drug-related content blocked",
-                    "⚠️ Inappropriate for minors"
-                ]
-            )
+    keyword = hits.first(DRUGS_SET)
+    if keyword:
+        return (
+            True,
+            "high",
+            "drugs",
+            f"Drug-related content detected: '{keyword}'",
+            [
+                "⛔ Drug-related content blocked",
+                "⚠️ Inappropriate for minors"
+            ]
+        )
     
     # Check for hate speech
-    for keyword in HATE_KEYWORDS:
-        if keyword in text_lower:
-            return (
-                True,
-                "extreme",
-                "hate_speech",
-                f"Hate speech detected: '{keyword}'",
-                [
-                    "⛔ Hate speech blocked",
-                    "🚫 Harmful content filtered"
-                ]
-            )
+    keyword = hits.first(HATE_SET)
+    if keyword:
+        return (
+            True,
+            "extreme",
+            "hate_speech",
+            f"Hate speech detected: '{keyword}'",
+            [
+                "⛔ Hate speech blocked",
+                "🚫 Harmful content filtered"
+            ]
+        )
     
     # Default: Safe
     return (
@@ -308,6 +376,37 @@ def analyze_text(text: str) -> tuple[bool, str, Optional[str], str, List[str]]:
     )
 
 
+# Risk level -> rating (AGE_RATINGS maps rating -> minimum age)
+RISK_AGE_RATINGS = {"safe": "G", "moderate": "PG-13", "high": "R", "extreme": "18+"}
+
+
+def _analyzer_kind(content_type: str) -> Optional[str]:
+    """Analyzer used for a content_type; image URLs are judged by their URL"""
+    kind = content_type.lower()
+    if kind == "image_url":
+        return "url"
+    return kind if kind in ("url", "app_name", "text") else None
+
+
+def classify_content(kind: str, content: str, child_age: Optional[int]) -> dict:
+    """Verdict fields (everything but the timestamp) for one analyzer kind"""
+    if kind == "url":
+        result = analyze_url(content, child_age)
+    elif kind == "app_name":
+        result = analyze_app(content, child_age)
+    else:
+        result = analyze_text(content)
+    is_blocked, risk_level, category, reason, recommendations = result
+    return {
+        "is_blocked": is_blocked,
+        "risk_level": risk_level,
+        "category": category,
+        "reason": reason,
+        "age_rating": RISK_AGE_RATINGS.get(risk_level),
+        "recommendations": recommendations,
+    }
+
+
 @router.post("/filter", response_model=ContentFilterResponse)
 async def filter_content(request: ContentFilterRequest):
     """
@@ -322,52 +421,15 @@ async def filter_content(request: ContentFilterRequest):
     Returns blocking decision with risk assessment and recommendations.
     """
     try:
-        content_type = request.content_type.lower()
-        
-        if content_type == "url":
-            is_blocked, risk_level, category, reason, recommendations = analyze_url(
-                request.content, 
-                request.child_age
-            )
-        elif content_type == "app_name":
-            is_blocked, risk_level, category, reason, recommendations = analyze_app(
-                request.content,
-                request.child_age
-            )
-        elif content_type == "text":
-            is_blocked, risk_level, category, reason, recommendations = analyze_text(
-                request.content
-            )
-        elif content_type == "image_url":
-            # For images, analyze the URL first
-            is_blocked, risk_level, category, reason, recommendations = analyze_url(
-                request.content,
-                request.child_age
-            )
-        else:
+        kind = _analyzer_kind(request.content_type)
+        if kind is None:
             raise HTTPException(
                 status_code=400,
                 detail=f"Unsupported content_type: {request.content_type}. Use 'url', 'app_name', 'text', or 'image_url'"
             )
         
-        # Determine age rating
-        age_rating = None
-        if risk_level == "safe":
-            age_rating = "G"
-        elif risk_level == "moderate":
-            age_rating = "PG-13"
-        elif risk_level == "high":
-            age_rating = "R"
-        elif risk_level == "extreme":
-            age_rating = "18+"
-        
         return ContentFilterResponse(
-            is_blocked=is_blocked,
-            risk_level=risk_level,
-            category=category,
-            reason=reason,
-            age_rating=age_rating,
-            recommendations=recommendations,
+            **classify_content(kind, request.content, request.child_age),
             timestamp=datetime.utcnow().isoformat()
         )
     
@@ -377,6 +439,97 @@ async def filter_content(request: ContentFilterRequest):
         raise HTTPException(status_code=500, detail=f"Content filtering failed: {str(e)}")
 
 
+def rules_version() -> str:
+    """Changes when keyword sets are re-registered or a new domain list loads"""
+    return f"{keyword_rules.rules.generation}.{domain_categories.generation()}"
+
+
+def batch_digest(request: ContentFilterBatchRequest) -> str:
+    """Order-independent digest of a batch, used as its ETag"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([rules_version(), request.child_age]).encode("utf-8"))
+    for item in sorted(request.items, key=lambda i: i.id):
+        digest.update(b"\n")
+        digest.update(json.dumps([item.id, item.content_type.lower(), item.content]).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _etag_matches(if_none_match: Optional[str], digest: str) -> bool:
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag.strip('"') == digest:
+            return True
+    return False
+
+
+def classify_batch(items: List[ContentFilterBatchItem], child_age: Optional[int]):
+    """
+    (verdicts by id, errors by id, unique count). Identical (analyzer,
+    content) pairs are classified once and share a verdict.
+    """
+    by_content: Dict[tuple, ContentFilterVerdict] = {}
+    verdicts: Dict[str, ContentFilterVerdict] = {}
+    errors: Dict[str, str] = {}
+    for item in items:
+        kind = _analyzer_kind(item.content_type)
+        if kind is None:
+            errors[item.id] = f"Unsupported content_type: {item.content_type}"
+            continue
+        key = (kind, item.content)
+        verdict = by_content.get(key)
+        if verdict is None:
+            verdict = by_content[key] = ContentFilterVerdict(**classify_content(kind, item.content, child_age))
+        verdicts[item.id] = verdict
+    return verdicts, errors, len(by_content)
+
+
+@router.post("/filter-batch", response_model=ContentFilterBatchResponse)
+async def filter_content_batch(
+    request: ContentFilterBatchRequest,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Filter a batch of mixed content (URLs, app names, text, image URLs)
+    
+    Returns a verdict per item id plus an ETag; send it back as
+    If-None-Match with the same list to get 304 Not Modified.
+    """
+    if len(request.items) > CONTENT_FILTER_BATCH_MAX:
+        raise HTTPException(413, f"Too many items (max {CONTENT_FILTER_BATCH_MAX} per batch)")
+    ids = {item.id for item in request.items}
+    if len(ids) != len(request.items):
+        raise HTTPException(400, "Item ids must be unique within a batch")
+    
+    digest = batch_digest(request)
+    etag = f'"{digest}"'
+    if _etag_matches(if_none_match, digest):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    try:
+        if len(request.items) > INLINE_BATCH_MAX:
+            verdicts, errors, unique = await asyncio.to_thread(classify_batch, request.items, request.child_age)
+        else:
+            verdicts, errors, unique = classify_batch(request.items, request.child_age)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Content filtering failed: {str(e)}")
+    
+    response.headers["ETag"] = etag
+    return ContentFilterBatchResponse(
+        verdicts=verdicts,
+        errors=errors,
+        total=len(request.items),
+        unique=unique,
+        blocked=sum(1 for v in verdicts.values() if v.is_blocked),
+        digest=digest,
+        timestamp=datetime.utcnow().isoformat()
+    )
+
+
 @router.get("/test")
 async def test_endpoint():
     """Test endpoint to verify content filter is working"""
@@ -391,6 +544,7 @@ async def test_endpoint():
             "Age-based restrictions",
             "Category detection (adult, violence, gambling, drugs, hate speech)"
         ],
+        "domain_index": domain_categories.stats(),
         "blocked_categories": [
             "Adult content (18+)",
             "Violence",
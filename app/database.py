@@ -0,0 +1,488 @@
+"""
+Database Layer
+Pooled async engine behind request.app.state.db + shared sync connection pool
+
+Routes keep calling `await db.execute(text(...), params)` exactly as before,
+but the statement now runs on the event loop instead of hopping to the
+AnyIO thread pool. Extra helpers:
+
+    row  = await db.fetch_one(text("SELECT ..."), {...})
+    rows = await db.fetch_all(text("SELECT ..."), {...})
+    n    = await db.fetch_val(text("SELECT COUNT(*) ..."))
+    await db.executemany(text("INSERT ..."), [{...}, {...}])
+
+    async with db.transaction() as tx:
+        await tx.execute(...)
+        await tx.execute(...)   # both commit together, or neither does
+
+Sync helpers (schedulers, AI tools, psycopg-style routers) share one
+bounded psycopg2 pool instead of opening a new connection per call:
+
+    conn = get_db_connection()
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    ...
+    conn.close()            # returns the connection to the pool
+
+    with get_db_connection() as conn:   # commit/rollback, then return
+        ...
+
+Prefer the `with` form: a proxy that is dropped without close() is only
+returned to the pool when it is garbage collected (and logged as leaked).
+On an event loop thread get_db_connection() does not wait for a free
+slot, it raises PoolTimeout at once; `await acquire_db_connection()` waits
+in a worker thread instead.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+
+
+def async_database_url(raw: str, driver: str = "psycopg") -> str:
+    """Rewrite postgres:// / postgresql[+driver]:// into postgresql+<driver>://"""
+    for prefix in ("postgresql+psycopg://", "postgresql+asyncpg://", "postgresql+psycopg2://",
+                   "postgresql://", "postgres://"):
+        if raw.startswith(prefix):
+            return f"postgresql+{driver}://" + raw[len(prefix):]
+    return raw
+
+
+def create_db_engine(database_url: str, settings) -> AsyncEngine:
+    """Build the process-wide async engine from Settings pool options"""
+    return create_async_engine(
+        async_database_url(database_url, settings.DB_ASYNC_DRIVER),
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+
+class Record(Sequence):
+    """
+    Row wrapper returned by fetch_one/fetch_all.
+    Supports row[0], row["column"] and row.column so existing route code
+    written against either style keeps working.
+    """
+
+    __slots__ = ("_row",)
+
+    def __init__(self, row):
+        self._row = row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._row._mapping[key]
+        return self._row[key]
+
+    def __getattr__(self, name):
+        return getattr(self._row, name)
+
+    def __len__(self) -> int:
+        return len(self._row)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._row)
+
+    def __repr__(self) -> str:
+        return f"Record({dict(self._row._mapping)!r})"
+
+    @property
+    def _mapping(self):
+        return self._row._mapping
+
+    def keys(self):
+        return self._row._mapping.keys()
+
+    def get(self, key: str, default=None):
+        return self._row._mapping.get(key, default)
+
+
+def _clause(clause):
+    return text(clause) if isinstance(clause, str) else clause
+
+
+async def _execute(conn: AsyncConnection, clause, params=None):
+    return await conn.execute(_clause(clause), params or {})
+
+
+async def _fetch_one(conn: AsyncConnection, clause, params=None) -> Optional[Record]:
+    row = (await _execute(conn, clause, params)).fetchone()
+    return Record(row) if row is not None else None
+
+
+async def _fetch_all(conn: AsyncConnection, clause, params=None) -> List[Record]:
+    return [Record(r) for r in (await _execute(conn, clause, params)).fetchall()]
+
+
+async def _fetch_val(conn: AsyncConnection, clause, params=None, column: int = 0):
+    row = (await _execute(conn, clause, params)).fetchone()
+    return row[column] if row is not None else None
+
+
+async def _executemany(conn: AsyncConnection, clause, params_seq) -> int:
+    params_seq = list(params_seq)
+    if not params_seq:
+        return 0
+    await conn.execute(_clause(clause), params_seq)
+    return len(params_seq)
+
+
+class DBTransaction:
+    """Statements issued through one connection inside db.transaction()"""
+
+    def __init__(self, conn: AsyncConnection):
+        self._conn = conn
+
+    @property
+    def connection(self) -> AsyncConnection:
+        return self._conn
+
+    async def execute(self, clause, params=None):
+        return await _execute(self._conn, clause, params)
+
+    async def fetch_one(self, clause, params=None) -> Optional[Record]:
+        return await _fetch_one(self._conn, clause, params)
+
+    async def fetch_all(self, clause, params=None) -> List[Record]:
+        return await _fetch_all(self._conn, clause, params)
+
+    async def fetch_val(self, clause, params=None, column: int = 0):
+        return await _fetch_val(self._conn, clause, params, column)
+
+    async def executemany(self, clause, params_seq) -> int:
+        return await _executemany(self._conn, clause, params_seq)
+
+
+class AsyncDB:
+    """
+    request.app.state.db
+
+    Every call outside transaction() checks a connection out of the pool,
+    runs in its own transaction and commits on success (same semantics as
+    the old thread-pool DBShim). commit()/rollback() are kept as no-ops for
+    routes that still call them after execute().
+    """
+
+    def __init__(self, engine: Optional[AsyncEngine]):
+        self._engine = engine
+
+    @property
+    def engine(self) -> AsyncEngine:
+        if self._engine is None:
+            # If someone calls DB in bare mode, fail clearly
+            raise RuntimeError("DB not initialized (APP_BOOT_MODE=bare)")
+        return self._engine
+
+    async def execute(self, clause, params=None):
+        async with self.engine.begin() as conn:
+            return await _execute(conn, clause, params)
+
+    async def fetch_one(self, clause, params=None) -> Optional[Record]:
+        async with self.engine.begin() as conn:
+            return await _fetch_one(conn, clause, params)
+
+    async def fetch_all(self, clause, params=None) -> List[Record]:
+        async with self.engine.begin() as conn:
+            return await _fetch_all(conn, clause, params)
+
+    async def fetch_val(self, clause, params=None, column: int = 0):
+        async with self.engine.begin() as conn:
+            return await _fetch_val(conn, clause, params, column)
+
+    async def executemany(self, clause, params_seq) -> int:
+        async with self.engine.begin() as conn:
+            return await _executemany(conn, clause, params_seq)
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self.engine.begin() as conn:
+            yield DBTransaction(conn)
+
+    async def commit(self):
+        return None
+
+    async def rollback(self):
+        return None
+
+    def pool_status(self) -> dict:
+        if self._engine is None:
+            return {"initialized": False}
+        pool = self._engine.pool
+        return {
+            "initialized": True,
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "idle": pool.checkedin(),
+        }
+
+    async def dispose(self):
+        if self._engine is not None:
+            await self._engine.dispose()
+
+
+# ============================================================================
+# SYNC CONNECTION POOL (psycopg2)
+# ============================================================================
+
+logger = logging.getLogger(__name__)
+
+# Several helpers were written against psycopg 3, which adapts uuid.UUID
+# parameters natively; teach psycopg2 the same (results stay unchanged)
+psycopg2.extensions.register_adapter(
+    uuid.UUID, lambda u: psycopg2.extensions.AsIs(f"'{u}'::uuid")
+)
+
+
+class PoolTimeout(Exception):
+    """No pooled connection became free within DB_SYNC_POOL_TIMEOUT"""
+
+
+def sync_database_url(raw: str) -> str:
+    """psycopg2 only understands postgresql:// ; strip any +driver suffix"""
+    for prefix in ("postgresql+psycopg://", "postgresql+asyncpg://", "postgresql+psycopg2://"):
+        if raw.startswith(prefix):
+            return "postgresql://" + raw[len(prefix):]
+    return raw
+
+
+class PooledConnection:
+    """
+    Proxy around a pooled psycopg2 connection.
+
+    Behaves like the connection callers used to open themselves: cursor(),
+    commit(), rollback() etc. are delegated. close() hands the connection
+    back to the pool instead of tearing down the socket, and the context
+    manager commits (or rolls back on error) before returning it. A proxy
+    garbage collected without close() returns its connection through a
+    finalizer, so a missed close() can't hold a pool slot forever.
+    """
+
+    def __init__(self, pool: "SyncConnectionPool", conn):
+        self._pool = pool
+        self._conn = conn
+        self._finalizer = weakref.finalize(self, pool._reclaim_leaked, conn)
+        self._finalizer.atexit = False
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        return getattr(self._conn, name)
+
+    @property
+    def closed(self) -> int:
+        return 1 if self._conn is None else self._conn.closed
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._finalizer.detach()
+            self._pool.putconn(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self._conn is not None and not self._conn.closed:
+                if exc_type is None:
+                    self._conn.commit()
+                else:
+                    self._conn.rollback()
+        finally:
+            self.close()
+        return False
+
+
+class SyncConnectionPool:
+    """
+    Bounded, thread-safe psycopg2 pool.
+
+    - at most `maxconn` connections checked out; callers wait up to
+      `timeout` seconds for one to free up, then get PoolTimeout
+    - callers on an event loop thread wait at most `loop_timeout`, since
+      the whole loop stalls while they do
+    - connections idle longer than `health_check_interval` are pinged with
+      SELECT 1 on checkout and replaced if the server dropped them
+    - connections come back rolled back and with autocommit reset, so one
+      caller's open transaction never leaks into the next
+    """
+
+    def __init__(self, dsn: str, minconn: int = 1, maxconn: int = 10,
+                 timeout: float = 10.0, health_check_interval: float = 30.0,
+                 loop_timeout: float = 0.5):
+        self.dsn = dsn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.loop_timeout = loop_timeout
+        self.health_check_interval = health_check_interval
+        self._pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, dsn)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        # Reentrant: a leaked proxy's finalizer can run (via GC) while this
+        # thread already holds the lock
+        self._lock = threading.RLock()
+        self._last_used: Dict[int, float] = {}
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "leaked": 0,
+            "health_check_failures": 0,
+            "in_use": 0,
+            "peak_in_use": 0,
+            "wait_ms_total": 0.0,
+        }
+
+    def getconn(self, timeout: Optional[float] = None) -> PooledConnection:
+        """Wait up to `timeout` (default: the pool's) for a slot; 0 means don't wait"""
+        started = time.monotonic()
+        timeout = self.timeout if timeout is None else timeout
+        acquired = self._slots.acquire(timeout=timeout) if timeout > 0 else self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeout(f"no database connection available within {timeout}s")
+        try:
+            conn = self._checkout_healthy()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._stats["in_use"])
+            self._stats["wait_ms_total"] += (time.monotonic() - started) * 1000
+        return PooledConnection(self, conn)
+
+    def _checkout_healthy(self):
+        conn = self._pool.getconn()
+        idle_for = time.monotonic() - self._last_used.get(id(conn), 0.0)
+        if conn.closed or idle_for > self.health_check_interval:
+            try:
+                if conn.closed:
+                    raise psycopg2.InterfaceError("connection closed")
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                with self._lock:
+                    self._stats["health_check_failures"] += 1
+                logger.warning("Discarding dead pooled database connection")
+                self._discard(conn)
+                conn = self._pool.getconn()
+        return conn
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    def _reclaim_leaked(self, conn):
+        """Finalizer of a PooledConnection that was never closed"""
+        with self._lock:
+            self._stats["leaked"] += 1
+        logger.warning("Pooled database connection was not closed; returning it to the pool")
+        self.putconn(conn)
+
+    def putconn(self, conn):
+        try:
+            if conn.closed:
+                self._discard(conn)
+                return
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except psycopg2.Error:
+                self._discard(conn)
+                return
+            self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn)
+        finally:
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["max_size"] = self.maxconn
+        stats["wait_ms_total"] = round(stats["wait_ms_total"], 2)
+        return stats
+
+    def closeall(self):
+        self._pool.closeall()
+
+
+_sync_pool: Optional[SyncConnectionPool] = None
+_sync_pool_lock = threading.Lock()
+
+
+def get_sync_pool() -> SyncConnectionPool:
+    """Process-wide pool, created on first use from DATABASE_URL + Settings"""
+    global _sync_pool
+    if _sync_pool is None:
+        with _sync_pool_lock:
+            if _sync_pool is None:
+                from .deps import get_settings
+                s = get_settings()
+                _sync_pool = SyncConnectionPool(
+                    sync_database_url(s.DATABASE_URL),
+                    minconn=s.DB_SYNC_POOL_MIN,
+                    maxconn=s.DB_SYNC_POOL_MAX,
+                    timeout=s.DB_SYNC_POOL_TIMEOUT,
+                    health_check_interval=s.DB_SYNC_HEALTH_CHECK_INTERVAL,
+                    loop_timeout=s.DB_SYNC_POOL_LOOP_TIMEOUT,
+                )
+    return _sync_pool
+
+
+def _on_event_loop_thread() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def get_db_connection() -> PooledConnection:
+    """
+    Check a connection out of the shared pool; close() returns it.
+    Called from a coroutine it blocks the event loop for at most
+    DB_SYNC_POOL_LOOP_TIMEOUT waiting for a slot; async code should prefer
+    acquire_db_connection().
+    """
+    pool = get_sync_pool()
+    return pool.getconn(timeout=pool.loop_timeout if _on_event_loop_thread() else None)
+
+
+async def acquire_db_connection() -> PooledConnection:
+    """get_db_connection() for async code: waits for a slot in a worker thread"""
+    pool = get_sync_pool()
+    return await asyncio.to_thread(pool.getconn)
+
+
+def sync_pool_stats() -> Dict[str, Any]:
+    if _sync_pool is None:
+        return {"initialized": False}
+    return {"initialized": True, **_sync_pool.stats()}
+
+
+def close_sync_pool():
+    global _sync_pool
+    with _sync_pool_lock:
+        if _sync_pool is not None:
+            _sync_pool.closeall()
+            _sync_pool = None
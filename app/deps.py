@@ -38,6 +38,20 @@ class Settings(BaseSettings):
 
     APP_BOOT_MODE: str = "bare"  # bare/full toggle
 
+    # Async DB pool (app.state.db)
+    DB_ASYNC_DRIVER: str = "psycopg"  # psycopg | asyncpg
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+
+    # Shared psycopg2 pool (database.get_db_connection)
+    DB_SYNC_POOL_MIN: int = 1
+    DB_SYNC_POOL_MAX: int = 10
+    DB_SYNC_POOL_TIMEOUT: float = 10.0
+    DB_SYNC_POOL_LOOP_TIMEOUT: float = 0.5  # get_db_connection() called on the event loop
+    DB_SYNC_HEALTH_CHECK_INTERVAL: float = 30.0
+
     # DEV MODE: Username-only auth (no password/OTP/2FA)
     DEV_AUTH_DISABLED: bool = True
     DEV_SUPER_ADMIN_BYPASS: bool = True
@@ -9,13 +9,30 @@ from datetime import datetime
 from pydantic import BaseModel
 import psycopg
 from .utils import get_current_user, get_db
-import os
-import openai
+from . import keyword_rules
+import json
+from .llm_gateway import llm_gateway
 
 router = APIRouter()
 
-# Initialize OpenAI
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Digital arrest scam keywords
+DIGITAL_ARREST_KEYWORDS = [
+    "arrest warrant",
+    "money laundering",
+    "drug trafficking",
+    "customs violation",
+    "immediate payment",
+    "bank account freeze",
+    "legal action",
+    "court summons",
+    "CBI investigation",
+    "police verification",
+    "suspend your account",
+    "verify your identity",
+    "pay fine immediately",
+    "arrest within 24 hours"
+]
+DIGITAL_ARREST_SET = keyword_rules.register("digital_arrest.call", DIGITAL_ARREST_KEYWORDS)
 
 
 class DigitalArrestAlert(BaseModel):
@@ -50,29 +67,10 @@ async def analyze_call_for_digital_arrest(
     
     user_id = current_user["id"]
     
-    # Digital arrest scam keywords
-    scam_keywords = [
-        "arrest warrant",
-        "money laundering",
-        "drug trafficking",
-        "customs violation",
-        "immediate payment",
-        "bank account freeze",
-        "legal action",
-        "court summons",
-        "CBI investigation",
-        "police verification",
-        "suspend your account",
-        "verify your identity",
-        "pay fine immediately",
-        "arrest within 24 hours"
-    ]
-    
     # Check for keyword matches
     detected_keywords = []
     if request.call_transcript:
-        transcript_lower = request.call_transcript.lower()
-        detected_keywords = [kw for kw in scam_keywords if kw in transcript_lower]
+        detected_keywords = keyword_rules.scan(request.call_transcript).get(DIGITAL_ARREST_SET)
     
     if request.keywords:
         detected_keywords.extend(request.keywords)
@@ -84,7 +82,7 @@ async def analyze_call_for_digital_arrest(
     
     if request.call_transcript and len(request.call_transcript) > 20:
         try:
-            response = openai.ChatCompletion.create(
+            content = await llm_gateway.chat(
                 model="gpt-4",
                 messages=[
                     {
@@ -119,8 +117,7 @@ Respond in JSON format:
                 temperature=0.3
             )
             
-            import json
-            result = json.loads(response.choices[0].message.content)
+            result = json.loads(content)
             is_scam = result.get("is_scam", False)
             confidence_score = result.get("confidence", 0.0)
             caller_identity = result.get("claimed_identity", caller_identity)
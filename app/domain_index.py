@@ -0,0 +1,305 @@
+"""
+Domain Category Index
+Exact host / parent-domain lookups for the child-protection URL filter,
+replacing `domain in url` substring checks (which matched "porn.com" inside
+"notporn.com.example" and "youtube.com/kids" inside query strings).
+
+Two layers, consulted from the most specific host label outwards so
+www.pornhub.com hits the pornhub.com entry in O(labels) lookups:
+- built-in entries from code, kept in a dict; these may carry a path
+  ("youtube.com/kids") for sites where only part of the site is listed
+- an optional category list file (CONTENT_FILTER_DOMAIN_LIST) for large
+  blocklists. It is compiled once into a sorted index file of
+  reversed-host keys ("com.pornhub\\tadult"), which is memory-mapped and
+  binary-searched, so millions of domains cost no Python heap.
+
+The list is loaded in a background thread at startup and rebuilt/swapped
+when the list (or prebuilt index) file changes on disk.
+
+List file format: one "domain category" per line (whitespace or comma
+separated, '#' comments). A bare domain gets the category "blocked".
+Prebuild an index offline with:
+    python -m app.domain_index build domains.txt [domains.txt.idx]
+"""
+
+import bisect
+import logging
+import mmap
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+CONTENT_FILTER_DOMAIN_LIST = os.getenv("CONTENT_FILTER_DOMAIN_LIST")
+CONTENT_FILTER_DOMAIN_INDEX = os.getenv("CONTENT_FILTER_DOMAIN_INDEX")
+CONTENT_FILTER_DOMAIN_RELOAD_SECONDS = float(os.getenv("CONTENT_FILTER_DOMAIN_RELOAD_SECONDS", "30"))
+
+DEFAULT_CATEGORY = "blocked"
+INDEX_SUFFIX = ".idx"
+
+
+def split_url(url: str) -> Tuple[str, str]:
+    """(host, path) of a URL, with or without a scheme; host is lower-cased"""
+    raw = (url or "").strip()
+    if "://" not in raw:
+        raw = "//" + raw
+    try:
+        parts = urlsplit(raw)
+        host = parts.hostname or ""
+    except ValueError:
+        return "", "/"
+    return host.rstrip("."), parts.path or "/"
+
+
+def reversed_key(domain: str) -> bytes:
+    """pornhub.com -> b"com.pornhub" (IDNA-encoded, so keys sort bytewise)"""
+    domain = domain.strip().lower().rstrip(".")
+    if domain.isascii():
+        encoded = domain.encode("ascii")
+    else:
+        try:
+            encoded = domain.encode("idna")
+        except UnicodeError:
+            encoded = domain.encode("utf-8")
+    return b".".join(reversed(encoded.split(b".")))
+
+
+def parse_list_line(line: str) -> Optional[Tuple[str, str]]:
+    line = line.split("#", 1)[0].strip()
+    if not line:
+        return None
+    parts = line.replace(",", " ").split()
+    domain = parts[0].lower().rstrip(".")
+    if domain.startswith("*."):
+        domain = domain[2:]
+    category = parts[1].lower() if len(parts) > 1 else DEFAULT_CATEGORY
+    if not domain or "/" in domain:
+        return None
+    return domain, category
+
+
+def build_index(source_path: str, index_path: str) -> int:
+    """
+    Compile a category list file into a sorted index file (written
+    atomically). Later lines win for duplicate domains. Returns the
+    number of entries.
+    """
+    entries: Dict[bytes, bytes] = {}
+    skipped = 0
+    with open(source_path, "r", encoding="utf-8", errors="replace") as src:
+        for line in src:
+            parsed = parse_list_line(line)
+            if parsed is None:
+                if line.strip() and not line.lstrip().startswith("#"):
+                    skipped += 1
+                continue
+            domain, category = parsed
+            entries[reversed_key(domain)] = category.encode("utf-8")
+    tmp_path = f"{index_path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as out:
+        for key in sorted(entries):
+            out.write(key + b"\t" + entries[key] + b"\n")
+    os.replace(tmp_path, index_path)
+    if skipped:
+        logger.warning("Domain list %s: skipped %d unparseable/path entries", source_path, skipped)
+    return len(entries)
+
+
+class SortedDomainFile:
+    """
+    Memory-mapped prebuilt index: sorted `reversed-host\tcategory` lines.
+    Every BLOCK_LINES-th key is sampled into memory at load; a lookup
+    bisects the samples and then searches one ~1KB block of the mapping.
+    """
+
+    BLOCK_LINES = 64
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._size = size
+        self._block_keys: List[bytes] = []
+        self._block_starts: List[int] = []
+        self.entries = 0
+        mm, pos = self._mm, 0
+        while pos < size:
+            if self.entries % self.BLOCK_LINES == 0:
+                self._block_keys.append(mm[pos:mm.find(b"\t", pos)])
+                self._block_starts.append(pos)
+            end = mm.find(b"\n", pos)
+            pos = size if end < 0 else end + 1
+            self.entries += 1
+        self._block_starts.append(size)
+
+    def get(self, key: bytes) -> Optional[str]:
+        """Category for an exact reversed-host key"""
+        block = bisect.bisect_right(self._block_keys, key) - 1
+        if block < 0:
+            return None
+        mm = self._mm
+        start, end = self._block_starts[block], self._block_starts[block + 1]
+        if self._block_keys[block] == key:
+            value_start = start + len(key) + 1
+        else:
+            hit = mm.find(b"\n" + key + b"\t", start, end)
+            if hit < 0:
+                return None
+            value_start = hit + len(key) + 2
+        value_end = mm.find(b"\n", value_start, end)
+        category = mm[value_start:value_end if value_end >= 0 else end]
+        return category.decode("utf-8", "replace") or DEFAULT_CATEGORY
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+
+class DomainCategoryIndex:
+    """
+    Built-in entries plus an optional hot-reloaded list file.
+    lookup()/lookup_url() return (matched domain, category) or None.
+    """
+
+    def __init__(self, entries: Dict[str, str], list_path: Optional[str] = CONTENT_FILTER_DOMAIN_LIST,
+                 index_path: Optional[str] = CONTENT_FILTER_DOMAIN_INDEX,
+                 reload_seconds: float = CONTENT_FILTER_DOMAIN_RELOAD_SECONDS):
+        self._hosts: Dict[str, str] = {}
+        self._paths: Dict[str, List[Tuple[str, str]]] = {}
+        for entry, category in entries.items():
+            host, _, path = entry.lower().partition("/")
+            if path:
+                self._paths.setdefault(host, []).append(("/" + path.rstrip("/"), category))
+            else:
+                self._hosts[host] = category
+
+        self.list_path = list_path
+        if list_path and not index_path:
+            index_path = list_path if list_path.endswith(INDEX_SUFFIX) else list_path + INDEX_SUFFIX
+        self.index_path = index_path
+        self.reload_seconds = reload_seconds
+        self._file: Optional[SortedDomainFile] = None
+        self._file_stamp = None
+        self._checked_at = 0.0
+        self._loading = False
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.load_errors = 0
+
+    # -- loading -------------------------------------------------------
+
+    def _stamp(self):
+        stamps = []
+        for path in (self.list_path, self.index_path):
+            try:
+                st = os.stat(path)
+                stamps.append((st.st_mtime_ns, st.st_size))
+            except (OSError, TypeError):
+                stamps.append(None)
+        return tuple(stamps)
+
+    def start(self):
+        """Begin loading the list file in the background (no-op without one)"""
+        self._checked_at = time.monotonic()
+        self._schedule_load(self._stamp())
+
+    def _schedule_load(self, stamp):
+        if not self.list_path:
+            return
+        with self._lock:
+            if self._loading or stamp == self._file_stamp:
+                return
+            self._loading = True
+        threading.Thread(target=self._load, args=(stamp,), name="domain-index-load", daemon=True).start()
+
+    def _load(self, stamp):
+        try:
+            list_stamp, index_stamp = stamp
+            if self.list_path != self.index_path and list_stamp is not None and (
+                index_stamp is None or index_stamp[0] < list_stamp[0]
+            ):
+                started = time.monotonic()
+                count = build_index(self.list_path, self.index_path)
+                logger.info("Built domain index %s (%d domains) in %.1fs",
+                            self.index_path, count, time.monotonic() - started)
+                stamp = self._stamp()
+            new_file = SortedDomainFile(self.index_path)
+            # Old mmap is released once in-flight lookups drop their reference
+            self._file, self._file_stamp = new_file, stamp
+            self.loads += 1
+            logger.info("Loaded domain index %s (%d domains)", self.index_path, new_file.entries)
+        except Exception:
+            self.load_errors += 1
+            self._file_stamp = stamp  # don't retry until the files change again
+            logger.exception("Failed to load domain list %s", self.list_path)
+        finally:
+            self._loading = False
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_seconds:
+            return
+        self._checked_at = now
+        stamp = self._stamp()
+        if stamp != self._file_stamp:
+            self._schedule_load(stamp)
+
+    def generation(self) -> int:
+        """Changes whenever a new list file is swapped in"""
+        if self.list_path:
+            self._maybe_reload()
+        return self.loads
+
+    # -- lookups -------------------------------------------------------
+
+    def lookup(self, host: str, path: str = "/") -> Optional[Tuple[str, str]]:
+        if self.list_path:
+            self._maybe_reload()
+        host = (host or "").lower().rstrip(".")
+        if not host:
+            return None
+        file = self._file
+        labels = host.split(".")
+        for i in range(len(labels)):
+            domain = ".".join(labels[i:])
+            for prefix, category in self._paths.get(domain, ()):
+                if path == prefix or path.startswith(prefix + "/"):
+                    return domain + prefix, category
+            category = self._hosts.get(domain)
+            if category is not None:
+                return domain, category
+            if file is not None:
+                category = file.get(reversed_key(domain))
+                if category is not None:
+                    return domain, category
+        return None
+
+    def lookup_url(self, url: str) -> Optional[Tuple[str, str]]:
+        host, path = split_url(url)
+        return self.lookup(host, path)
+
+    def stats(self) -> Dict[str, object]:
+        file = self._file
+        return {
+            "builtin_entries": len(self._hosts) + sum(len(p) for p in self._paths.values()),
+            "list_path": self.list_path,
+            "list_entries": file.entries if file is not None else 0,
+            "loading": self._loading,
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+        }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "build":
+        print("usage: python -m app.domain_index build <list file> [<index file>]")
+        sys.exit(2)
+    source = sys.argv[2]
+    target = sys.argv[3] if len(sys.argv) > 3 else source + INDEX_SUFFIX
+    print(f"{build_index(source, target)} domains written to {target}")
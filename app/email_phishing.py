@@ -1,15 +1,42 @@
 """
 Email Phishing Detection API
 Detects phishing attempts in emails using ML-based analysis
+
+/detect-batch serves the mailbox integration: identical sender domains,
+links and message contents are analyzed once per batch, keyword scoring
+for large batches runs in a process pool, and Block 5 evidence for the
+whole batch goes to the vault in one transaction.
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Dict, Optional, List
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import logging
+import multiprocessing
+import os
 import re
+import threading
+import time
 from datetime import datetime
+from . import keyword_rules
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/email-phishing", tags=["Email Security"])
 
+EMAIL_BATCH_MAX = int(os.getenv("EMAIL_PHISHING_BATCH_MAX", "2000"))
+# Worker processes for batch keyword scoring, leaving a core for the event loop
+# (0 = score in a thread instead)
+EMAIL_BATCH_WORKERS = int(os.getenv("EMAIL_PHISHING_BATCH_WORKERS", str(min(4, (os.cpu_count() or 1) - 1))))
+EMAIL_BATCH_CHUNK = int(os.getenv("EMAIL_PHISHING_BATCH_CHUNK", "100"))
+# Below this many unique emails, pickling to worker processes costs more than it saves
+PROCESS_POOL_MIN_BATCH = int(os.getenv("EMAIL_PHISHING_POOL_MIN_BATCH", "200"))
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
 
 class EmailAnalysisRequest(BaseModel):
     """Request model for email phishing detection"""
@@ -37,6 +64,33 @@ class EmailAnalysisResponse(BaseModel):
     evidence_id: Optional[str] = None  # Block 5: Evidence vault ID if logged
 
 
+class EmailBatchItem(EmailAnalysisRequest):
+    """One email in a batch; `id` is echoed back on its result"""
+    id: str
+
+
+class EmailBatchRequest(BaseModel):
+    """Request model for batch phishing detection"""
+    emails: List[EmailBatchItem]
+    user_id: Optional[int] = None  # Used for emails that don't carry their own
+
+
+class EmailBatchResult(EmailAnalysisResponse):
+    id: str
+
+
+class EmailBatchResponse(BaseModel):
+    """Response model for batch phishing detection (results in request order)"""
+    results: List[EmailBatchResult]
+    total: int
+    phishing: int
+    unique_sender_domains: int
+    unique_links: int
+    unique_contents: int
+    evidence_logged: int
+    elapsed_ms: float
+
+
 # Phishing indicators database
 PHISHING_KEYWORDS = [
     "urgent", "verify", "suspend", "account", "click here", "confirm",
@@ -71,18 +125,34 @@ SELF_HARM_KEYWORDS = [
     "kill myself", "self harm", "cutting guide"
 ]
 
+SUBJECT_URGENCY_KEYWORDS = ["urgent", "immediate", "act now", "expires", "limited time"]
+SENSITIVE_REQUEST_KEYWORDS = ["password", "credit card", "ssn", "social security", "bank account", "pin"]
+LINK_BAIT_KEYWORDS = ["click here", "click this link"]
+
+IP_ADDRESS_RE = re.compile(r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}')
+
+# Keyword sets in the shared rule engine; one scan covers all of them
+PHISHING_SET = keyword_rules.register("email.phishing", PHISHING_KEYWORDS)
+EXTREMISM_SET = keyword_rules.register("email.extremism", EXTREMISM_KEYWORDS)
+SELF_HARM_SET = keyword_rules.register("email.self_harm", SELF_HARM_KEYWORDS)
+SUBJECT_URGENCY_SET = keyword_rules.register("email.subject_urgency", SUBJECT_URGENCY_KEYWORDS)
+SENSITIVE_REQUEST_SET = keyword_rules.register("email.sensitive_request", SENSITIVE_REQUEST_KEYWORDS)
+LINK_BAIT_SET = keyword_rules.register("email.link_bait", LINK_BAIT_KEYWORDS)
+
+
+def sender_domain(sender_email: str) -> str:
+    return sender_email.split('@')[1].lower()
 
-def analyze_sender(sender_email: str, sender_name: Optional[str]) -> tuple[int, List[str]]:
+
+def analyze_sender_domain(domain: str) -> tuple[int, List[str]]:
     """
-    Analyze sender email and name for phishing indicators
+    Domain part of the sender analysis (shared by every email from a domain)
     Returns: (risk_score, indicators)
     """
     risk_score = 0
     indicators = []
     
     # Check if sender domain is suspicious
-    domain = sender_email.split('@')[1].lower()
-    
     if any(susp in domain for susp in SUSPICIOUS_DOMAINS):
         risk_score += 30
         indicators.append(f"Suspicious domain: {domain}")
@@ -94,6 +164,20 @@ def analyze_sender(sender_email: str, sender_name: Optional[str]) -> tuple[int,
             risk_score += 40
             indicators.append(f"Possible domain spoofing: {domain} (looks like {brand})")
     
+    return risk_score, indicators
+
+
+def analyze_sender(sender_email: str, sender_name: Optional[str],
+                   domain_result: Optional[tuple[int, List[str]]] = None) -> tuple[int, List[str]]:
+    """
+    Analyze sender email and name for phishing indicators
+    Pass `domain_result` when the sender domain has already been analyzed.
+    Returns: (risk_score, indicators)
+    """
+    if domain_result is None:
+        domain_result = analyze_sender_domain(sender_domain(sender_email))
+    risk_score, indicators = domain_result[0], list(domain_result[1])
+    
     # Check if sender name doesn't match email
     if sender_name:
         if "@" in sender_name:  # Email in display name is suspicious
@@ -113,12 +197,10 @@ def analyze_subject(subject: str) -> tuple[int, List[str]]:
     subject_lower = subject.lower()
     
     # Check for urgency keywords
-    urgency_words = ["urgent", "immediate", "act now", "expires", "limited time"]
-    for word in urgency_words:
-        if word in subject_lower:
-            risk_score += 15
-            indicators.append(f"Urgency keyword in subject: '{word}'")
-            break
+    word = keyword_rules.scan(subject).first(SUBJECT_URGENCY_SET)
+    if word:
+        risk_score += 15
+        indicators.append(f"Urgency keyword in subject: '{word}'")
     
     # Check for suspicious patterns
     if "re:" in subject_lower and "fwd:" in subject_lower:
@@ -133,17 +215,19 @@ def analyze_subject(subject: str) -> tuple[int, List[str]]:
     return risk_score, indicators
 
 
-def analyze_body(body: str) -> tuple[int, List[str]]:
+def analyze_body(body: str, hits: Optional[keyword_rules.KeywordHits] = None) -> tuple[int, List[str]]:
     """
     Analyze email body for phishing indicators
+    Pass `hits` when the body has already been scanned.
     Returns: (risk_score, indicators)
     """
     risk_score = 0
     indicators = []
-    body_lower = body.lower()
+    if hits is None:
+        hits = keyword_rules.scan(body)
     
     # Count phishing keywords
-    keyword_count = sum(1 for keyword in PHISHING_KEYWORDS if keyword in body_lower)
+    keyword_count = hits.count(PHISHING_SET)
     
     if keyword_count >= 5:
         risk_score += 40
@@ -153,15 +237,13 @@ def analyze_body(body: str) -> tuple[int, List[str]]:
         indicators.append(f"Multiple phishing keywords detected ({keyword_count} found)")
     
     # Check for requests for sensitive information
-    sensitive_requests = ["password", "credit card", "ssn", "social security", "bank account", "pin"]
-    for request in sensitive_requests:
-        if request in body_lower:
-            risk_score += 30
-            indicators.append(f"Requests sensitive information: {request}")
-            break
+    request = hits.first(SENSITIVE_REQUEST_SET)
+    if request:
+        risk_score += 30
+        indicators.append(f"Requests sensitive information: {request}")
     
     # Check for suspicious links
-    if "click here" in body_lower or "click this link" in body_lower:
+    if LINK_BAIT_SET in hits:
         risk_score += 20
         indicators.append("Suspicious link text ('click here')")
     
@@ -173,9 +255,45 @@ def analyze_body(body: str) -> tuple[int, List[str]]:
     return risk_score, indicators
 
 
-def analyze_links(links: List[str]) -> tuple[int, List[str]]:
+def analyze_link(link: str) -> tuple[int, List[str]]:
+    """
+    Analyze a single link for phishing indicators
+    Returns: (risk_score, indicators)
+    """
+    risk_score = 0
+    indicators = []
+    link_lower = link.lower()
+    
+    # Check for IP addresses instead of domains
+    if IP_ADDRESS_RE.search(link):
+        risk_score += 30
+        indicators.append("Link uses IP address instead of domain")
+    
+    # Check for suspicious TLDs
+    for susp_domain in SUSPICIOUS_DOMAINS:
+        if susp_domain in link_lower:
+            risk_score += 25
+            indicators.append(f"Link contains suspicious domain: {susp_domain}")
+            break
+    
+    # Check for URL shorteners
+    if any(shortener in link_lower for shortener in ["bit.ly", "tinyurl", "goo.gl", "t.co"]):
+        risk_score += 15
+        indicators.append("Link uses URL shortener (hides destination)")
+    
+    # Check for excessive subdomains
+    if link_lower.count(".") > 4:
+        risk_score += 15
+        indicators.append("Link has excessive subdomains")
+    
+    return risk_score, indicators
+
+
+def analyze_links(links: List[str],
+                  link_results: Optional[Dict[str, tuple[int, List[str]]]] = None) -> tuple[int, List[str]]:
     """
     Analyze links in email for phishing indicators
+    `link_results` maps already-analyzed links to their analyze_link() result.
     Returns: (risk_score, indicators)
     """
     risk_score = 0
@@ -186,29 +304,11 @@ def analyze_links(links: List[str]) -> tuple[int, List[str]]:
     
     # Check each link
     for link in links:
-        link_lower = link.lower()
-        
-        # Check for IP addresses instead of domains
-        if re.search(r'\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}', link):
-            risk_score += 30
-            indicators.append("Link uses IP address instead of domain")
-        
-        # Check for suspicious TLDs
-        for susp_domain in SUSPICIOUS_DOMAINS:
-            if susp_domain in link_lower:
-                risk_score += 25
-                indicators.append(f"Link contains suspicious domain: {susp_domain}")
-                break
-        
-        # Check for URL shorteners
-        if any(shortener in link_lower for shortener in ["bit.ly", "tinyurl", "goo.gl", "t.co"]):
-            risk_score += 15
-            indicators.append("Link uses URL shortener (hides destination)")
-        
-        # Check for excessive subdomains
-        if link_lower.count(".") > 4:
-            risk_score += 15
-            indicators.append("Link has excessive subdomains")
+        result = link_results.get(link) if link_results is not None else None
+        if result is None:
+            result = analyze_link(link)
+        risk_score += result[0]
+        indicators.extend(result[1])
     
     # Too many links is suspicious
     if len(links) > 10:
@@ -250,6 +350,132 @@ def analyze_attachments(attachments: List[str]) -> tuple[int, List[str]]:
     return risk_score, indicators
 
 
+DANGEROUS_RECOMMENDATIONS = [
+    "⛔ DO NOT click any links in this email",
+    "⛔ DO NOT download any attachments",
+    "⛔ DO NOT reply with personal information",
+    "✅ Delete this email immediately",
+    "✅ Report as phishing to your email provider",
+    "✅ If you clicked any links, change your passwords immediately"
+]
+SUSPICIOUS_RECOMMENDATIONS = [
+    "⚠️ Be very cautious with this email",
+    "⚠️ Verify sender identity through official channels",
+    "⚠️ Do not click links or download attachments",
+    "✅ Contact the organization directly using official contact info",
+    "✅ Report as suspicious if confirmed phishing"
+]
+SAFE_RECOMMENDATIONS = [
+    "✅ Email appears legitimate",
+    "💡 Still verify sender if requesting sensitive actions",
+    "💡 Hover over links before clicking to see destination",
+    "💡 Be cautious with attachments from unknown senders"
+]
+
+
+def analyze_content(subject: str, body: str) -> dict:
+    """
+    Keyword passes over subject and body - the CPU-heavy part of an
+    analysis. Returns plain tuples/lists so it can run in a worker process.
+    """
+    body_hits = keyword_rules.scan(body)
+    return {
+        "subject": analyze_subject(subject),
+        "body": analyze_body(body, body_hits),
+        "extremism": body_hits.get(EXTREMISM_SET),
+        "self_harm": body_hits.get(SELF_HARM_SET),
+    }
+
+
+def _analyze_content_chunk(pairs: List[tuple[str, str]]) -> List[dict]:
+    return [analyze_content(subject, body) for subject, body in pairs]
+
+
+def assess_email(sender_result: tuple[int, List[str]], content: dict,
+                 links_result: tuple[int, List[str]],
+                 attachments_result: tuple[int, List[str]]) -> dict:
+    """Combine component scores into the verdict fields of EmailAnalysisResponse"""
+    sender_score, sender_indicators = sender_result
+    subject_score, subject_indicators = content["subject"]
+    body_score, body_indicators = content["body"]
+    links_score, links_indicators = links_result
+    attachments_score, attachments_indicators = attachments_result
+    
+    # Block 5: Check for extremism / self-harm content
+    violence_or_extremism_risk = 0
+    content_category = "benign"
+    tags = []
+    
+    extremism_count = len(content["extremism"])
+    self_harm_count = len(content["self_harm"])
+    
+    if extremism_count >= 2:
+        violence_or_extremism_risk = min(10, extremism_count * 2)
+        content_category = "harmful_extremist_content"
+        tags.append("extremism")
+    elif self_harm_count >= 1:
+        violence_or_extremism_risk = min(10, self_harm_count * 3)
+        content_category = "self_harm_risk"
+        tags.append("self_harm")
+    
+    # Calculate total risk score (0-100)
+    total_score = min(100, sender_score + subject_score + body_score + links_score + attachments_score)
+    
+    # Combine all indicators
+    all_indicators = (
+        sender_indicators + 
+        subject_indicators + 
+        body_indicators + 
+        links_indicators + 
+        attachments_indicators
+    )
+    
+    # Determine risk level and phishing status
+    if total_score >= 70:
+        risk_level = "dangerous"
+        is_phishing = True
+        recommendations = list(DANGEROUS_RECOMMENDATIONS)
+    elif total_score >= 40:
+        risk_level = "suspicious"
+        is_phishing = True
+        recommendations = list(SUSPICIOUS_RECOMMENDATIONS)
+    else:
+        risk_level = "safe"
+        is_phishing = False
+        recommendations = list(SAFE_RECOMMENDATIONS)
+    
+    # If no indicators found but score is low, add positive note
+    if not all_indicators and total_score < 20:
+        all_indicators.append("No phishing indicators detected")
+    
+    confidence_score = min(1.0, total_score / 100.0)
+    
+    # Block 5: Determine final content category
+    if content_category == "benign" and is_phishing:
+        content_category = "scam_fraud"
+    
+    return {
+        "is_phishing": is_phishing,
+        "confidence_score": confidence_score,
+        "risk_level": risk_level,
+        "threat_indicators": all_indicators,
+        "recommendations": recommendations,
+        "content_category": content_category,
+        "violence_or_extremism_risk": violence_or_extremism_risk,
+        "tags": tags,
+    }
+
+
+def vault_analysis_data(email: EmailAnalysisRequest, content: dict) -> dict:
+    return {
+        "sender_email": email.sender_email,
+        "subject": email.subject,
+        "body_preview": email.body[:200],
+        "extremism_indicators": content["extremism"],
+        "self_harm_indicators": content["self_harm"]
+    }
+
+
 @router.post("/detect", response_model=EmailAnalysisResponse)
 async def detect_phishing(request: EmailAnalysisRequest):
     """
@@ -266,83 +492,14 @@ async def detect_phishing(request: EmailAnalysisRequest):
     """
     try:
         # Analyze all components
-        sender_score, sender_indicators = analyze_sender(request.sender_email, request.sender_name)
-        subject_score, subject_indicators = analyze_subject(request.subject)
-        body_score, body_indicators = analyze_body(request.body)
-        links_score, links_indicators = analyze_links(request.links or [])
-        attachments_score, attachments_indicators = analyze_attachments(request.attachments or [])
-        
-        # Block 5: Check for extremism / self-harm content
-        violence_or_extremism_risk = 0
-        content_category = "benign"
-        tags = []
-        body_lower = request.body.lower()
-        
-        extremism_count = sum(1 for kw in EXTREMISM_KEYWORDS if kw in body_lower)
-        self_harm_count = sum(1 for kw in SELF_HARM_KEYWORDS if kw in body_lower)
-        
-        if extremism_count >= 2:
-            violence_or_extremism_risk = min(10, extremism_count * 2)
-            content_category = "harmful_extremist_content"
-            tags.append("extremism")
-        elif self_harm_count >= 1:
-            violence_or_extremism_risk = min(10, self_harm_count * 3)
-            content_category = "self_harm_risk"
-            tags.append("self_harm")
-        
-        # Calculate total risk score (0-100)
-        total_score = min(100, sender_score + subject_score + body_score + links_score + attachments_score)
-        
-        # Combine all indicators
-        all_indicators = (
-            sender_indicators + 
-            subject_indicators + 
-            body_indicators + 
-            links_indicators + 
-            attachments_indicators
+        content = analyze_content(request.subject, request.body)
+        verdict = assess_email(
+            analyze_sender(request.sender_email, request.sender_name),
+            content,
+            analyze_links(request.links or []),
+            analyze_attachments(request.attachments or [])
         )
-        
-        # Determine risk level and phishing status
-        if total_score >= 70:
-            risk_level = "dangerous"
-            is_phishing = True
-            recommendations = [
-                "⛔ DO NOT click any links in this email",
-                "⛔ DO NOT download any attachments",
-                "⛔ DO NOT reply with personal information",
-                "✅ Delete this email immediately",
-                "✅ Report as phishing to your email provider",
-                "✅ If you clicked any links, change your passwords immediately"
-            ]
-        elif total_score >= 40:
-            risk_level = "suspicious"
-            is_phishing = True
-            recommendations = [
-                "⚠️ Be very cautious with this email",
-                "⚠️ Verify sender identity through official channels",
-                "⚠️ Do not click links or download attachments",
-                "✅ Contact the organization directly using official contact info",
-                "✅ Report as suspicious if confirmed phishing"
-            ]
-        else:
-            risk_level = "safe"
-            is_phishing = False
-            recommendations = [
-                "✅ Email appears legitimate",
-                "💡 Still verify sender if requesting sensitive actions",
-                "💡 Hover over links before clicking to see destination",
-                "💡 Be cautious with attachments from unknown senders"
-            ]
-        
-        # If no indicators found but score is low, add positive note
-        if not all_indicators and total_score < 20:
-            all_indicators.append("No phishing indicators detected")
-        
-        confidence_score = min(1.0, total_score / 100.0)
-        
-        # Block 5: Determine final content category
-        if content_category == "benign" and is_phishing:
-            content_category = "scam_fraud"
+        violence_or_extremism_risk = verdict["violence_or_extremism_risk"]
         
         # Block 5: Log high-risk content to evidence vault
         from .config import block5_config
@@ -356,16 +513,10 @@ async def detect_phishing(request: EmailAnalysisRequest):
                     db=None,  # Will use env DATABASE_URL
                     user_id=str(request.user_id),
                     evidence_type="email",
-                    content_category=content_category,
+                    content_category=verdict["content_category"],
                     violence_or_extremism_risk=violence_or_extremism_risk,
-                    tags=tags,
-                    analysis_data={
-                        "sender_email": request.sender_email,
-                        "subject": request.subject,
-                        "body_preview": request.body[:200],
-                        "extremism_indicators": [kw for kw in EXTREMISM_KEYWORDS if kw in body_lower],
-                        "self_harm_indicators": [kw for kw in SELF_HARM_KEYWORDS if kw in body_lower]
-                    }
+                    tags=verdict["tags"],
+                    analysis_data=vault_analysis_data(request, content)
                 )
                 print(f"✅ Email endpoint: Vault helper returned evidence_id={evidence_id}")
             except Exception as vault_error:
@@ -373,16 +524,8 @@ async def detect_phishing(request: EmailAnalysisRequest):
                 print(f"❌ Email endpoint: Vault logging failed: {vault_error}")
         
         return EmailAnalysisResponse(
-            is_phishing=is_phishing,
-            confidence_score=confidence_score,
-            risk_level=risk_level,
-            threat_indicators=all_indicators,
-            recommendations=recommendations,
+            **verdict,
             analysis_timestamp=datetime.utcnow().isoformat(),
-            # Block 5: New risk dimensions
-            content_category=content_category,
-            violence_or_extremism_risk=violence_or_extremism_risk,
-            tags=tags,
             evidence_id=evidence_id
         )
     
@@ -390,6 +533,152 @@ async def detect_phishing(request: EmailAnalysisRequest):
         raise HTTPException(status_code=500, detail=f"Email analysis failed: {str(e)}")
 
 
+def _get_process_pool() -> Optional[ProcessPoolExecutor]:
+    global _process_pool
+    if EMAIL_BATCH_WORKERS <= 0:
+        return None
+    with _process_pool_lock:
+        if _process_pool is None:
+            # spawn, not fork: the API process has live threads and DB pools
+            _process_pool = ProcessPoolExecutor(
+                max_workers=EMAIL_BATCH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def analyze_contents(pairs: List[tuple[str, str]]) -> List[dict]:
+    """
+    analyze_content() for many (subject, body) pairs. Large batches are
+    split into chunks across the process pool; small ones (or a broken
+    pool) fall back to a worker thread.
+    """
+    pool = _get_process_pool() if len(pairs) >= PROCESS_POOL_MIN_BATCH else None
+    if pool is not None:
+        loop = asyncio.get_running_loop()
+        chunks = [pairs[i:i + EMAIL_BATCH_CHUNK] for i in range(0, len(pairs), EMAIL_BATCH_CHUNK)]
+        try:
+            parts = await asyncio.gather(*(
+                loop.run_in_executor(pool, _analyze_content_chunk, chunk) for chunk in chunks
+            ))
+            return [content for part in parts for content in part]
+        except BrokenProcessPool:
+            logger.exception("Email analysis process pool broke; scoring batch in a thread")
+            shutdown_process_pool()
+    return await asyncio.to_thread(_analyze_content_chunk, pairs)
+
+
+async def analyze_batch(emails: List[EmailAnalysisRequest]) -> tuple[List[dict], List[dict], Dict[str, int]]:
+    """
+    Analyze many emails at once: identical sender domains, links and
+    (subject, body) pairs across the batch are analyzed only once.
+    Returns (verdicts, contents, dedupe counts), both lists in email order.
+    """
+    domain_results: Dict[str, tuple[int, List[str]]] = {}
+    link_results: Dict[str, tuple[int, List[str]]] = {}
+    content_index: Dict[tuple[str, str], int] = {}
+    for email in emails:
+        domain = sender_domain(email.sender_email)
+        if domain not in domain_results:
+            domain_results[domain] = analyze_sender_domain(domain)
+        for link in email.links or []:
+            if link not in link_results:
+                link_results[link] = analyze_link(link)
+        content_index.setdefault((email.subject, email.body), len(content_index))
+    
+    unique_contents = await analyze_contents(list(content_index))
+    
+    verdicts, contents = [], []
+    for email in emails:
+        content = unique_contents[content_index[(email.subject, email.body)]]
+        contents.append(content)
+        verdicts.append(assess_email(
+            analyze_sender(email.sender_email, email.sender_name,
+                           domain_results[sender_domain(email.sender_email)]),
+            content,
+            analyze_links(email.links or [], link_results),
+            analyze_attachments(email.attachments or [])
+        ))
+    counts = {
+        "unique_sender_domains": len(domain_results),
+        "unique_links": len(link_results),
+        "unique_contents": len(content_index),
+    }
+    return verdicts, contents, counts
+
+
+@router.post("/detect-batch", response_model=EmailBatchResponse)
+async def detect_phishing_batch(request: Request, payload: EmailBatchRequest):
+    """
+    Detect phishing in up to EMAIL_PHISHING_BATCH_MAX emails in one call
+    
+    Same analysis as /detect per email; results come back in request order
+    with each email's id echoed. High-risk Block 5 evidence for the whole
+    batch is written to the vault in one transaction.
+    """
+    if len(payload.emails) > EMAIL_BATCH_MAX:
+        raise HTTPException(413, f"Too many emails (max {EMAIL_BATCH_MAX} per batch)")
+    
+    try:
+        started = time.perf_counter()
+        verdicts, contents, counts = await analyze_batch(payload.emails)
+        
+        # Block 5: collect high-risk evidence, then log it in bulk
+        from .config import block5_config
+        evidence_ids: List[Optional[str]] = [None] * len(verdicts)
+        vault_rows = []
+        if block5_config.ENABLE_EXTREMISM_DETECTION_EMAIL:
+            from .block5_vault_helper import build_vault_row
+            for i, (email, verdict, content) in enumerate(zip(payload.emails, verdicts, contents)):
+                user_id = email.user_id or payload.user_id
+                if verdict["violence_or_extremism_risk"] >= block5_config.EXTREMISM_VAULT_THRESHOLD and user_id:
+                    row = build_vault_row(
+                        user_id=str(user_id),
+                        evidence_type="email",
+                        content_category=verdict["content_category"],
+                        violence_or_extremism_risk=verdict["violence_or_extremism_risk"],
+                        tags=verdict["tags"],
+                        analysis_data=vault_analysis_data(email, content)
+                    )
+                    vault_rows.append(row)
+                    evidence_ids[i] = row["evidence_id"]
+        
+        evidence_logged = 0
+        if vault_rows:
+            try:
+                from .block5_vault_helper import log_high_risk_batch_to_vault
+                evidence_logged = await log_high_risk_batch_to_vault(request.app.state.db, vault_rows)
+            except Exception as vault_error:
+                # Don't fail the whole batch if vault logging fails
+                logger.error(f"Batch vault logging failed for {len(vault_rows)} rows: {vault_error}")
+                evidence_ids = [None] * len(verdicts)
+        
+        timestamp = datetime.utcnow().isoformat()
+        results = [
+            EmailBatchResult(id=email.id, **verdict, analysis_timestamp=timestamp, evidence_id=evidence_id)
+            for email, verdict, evidence_id in zip(payload.emails, verdicts, evidence_ids)
+        ]
+        return EmailBatchResponse(
+            results=results,
+            total=len(results),
+            phishing=sum(1 for r in results if r.is_phishing),
+            evidence_logged=evidence_logged,
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 1),
+            **counts
+        )
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch email analysis failed: {str(e)}")
+
+
 @router.get("/test")
 async def test_endpoint():
     """Test endpoint to verify email phishing detection is working"""
@@ -402,6 +691,7 @@ async def test_endpoint():
             "Subject line analysis",
             "Body content analysis",
             "Link analysis",
-            "Attachment analysis"
+            "Attachment analysis",
+            "Batch analysis"
         ]
     }
@@ -40,14 +40,14 @@ async def location_history(
 ):
     """Get user's location history (last 60 days)"""
     db = request.app.state.db
-    rows = (await db.execute(text("""
+    rows = await db.fetch_all(text("""
         SELECT latitude, longitude, accuracy, recorded_at
         FROM gps_locations
         WHERE user_id = :uid
         AND recorded_at >= NOW() - INTERVAL '60 days'
         ORDER BY recorded_at DESC
         LIMIT :lim
-    """), {"uid": user["user_id"], "lim": limit})).fetchall()
+    """), {"uid": user["user_id"], "lim": limit})
     
     return {
         "locations": [dict(r._mapping) for r in rows],
@@ -94,12 +94,12 @@ async def list_geofences(
 ):
     """Get all user geofences"""
     db = request.app.state.db
-    rows = (await db.execute(text("""
+    rows = await db.fetch_all(text("""
         SELECT id, name, latitude, longitude, radius_meters, created_at
         FROM geofences
         WHERE user_id = :uid
         ORDER BY created_at DESC
-    """), {"uid": user["user_id"]})).fetchall()
+    """), {"uid": user["user_id"]})
     
     return {"geofences": [dict(r._mapping) for r in rows]}
 
@@ -118,25 +118,25 @@ async def get_family_member_location(
     db = request.app.state.db
     
     # Check if the requested user is in the same family as the current user
-    family_check = (await db.execute(text("""
+    family_check = await db.fetch_one(text("""
         SELECT 1 FROM family_members fm1
         JOIN family_members fm2 ON fm1.family_id = fm2.family_id
         WHERE fm1.user_id = :current_user_id
         AND fm2.user_id = :target_user_id
         AND fm2.can_view_location = TRUE
-    """), {"current_user_id": user["user_id"], "target_user_id": user_id})).fetchone()
+    """), {"current_user_id": user["user_id"], "target_user_id": user_id})
     
     if not family_check:
         raise HTTPException(403, "Not authorized to view this user's location")
     
     # Get latest location
-    location = (await db.execute(text("""
+    location = await db.fetch_one(text("""
         SELECT latitude, longitude, accuracy, recorded_at
         FROM gps_locations
         WHERE user_id = :uid
         ORDER BY recorded_at DESC
         LIMIT 1
-    """), {"uid": user_id})).fetchone()
+    """), {"uid": user_id})
     
     if not location:
         return {
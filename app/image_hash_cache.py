@@ -0,0 +1,205 @@
+"""
+Perceptual-Hash Verdict Cache
+Scam screenshots and QR posters are forwarded virally, so the image
+endpoints see the same picture (re-compressed, resized, slightly cropped)
+over and over. Each analysed image is remembered under:
+- the SHA-256 of its bytes: an identical upload is answered without
+  decoding anything
+- three 64-bit perceptual hashes computed with NumPy from a small
+  greyscale copy: aHash (mean threshold), dHash (horizontal gradients) and
+  pHash (signs of the low-frequency 2-D DCT). A near-duplicate is an entry
+  whose hashes are all within max_distance bits of the upload's.
+
+pHash lookups go through a multi-index: the 64 bits are split into
+max_distance + 1 bands, and by pigeonhole any hash within max_distance
+bits matches at least one band exactly, so only those buckets are
+compared instead of every entry.
+
+Entries stored without hashes are only ever served to byte-identical
+uploads.
+
+Entries are evicted least-recently-used beyond maxsize and expire after
+ttl seconds.
+"""
+
+import io
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from PIL import Image
+
+HASH_BITS = 64
+MAX_INDEXED_DISTANCE = 15  # beyond this the band index is no longer exact
+FINGERPRINT_SIDE = 64  # JPEGs are decoded at the smallest draft scale covering this
+
+Hashes = Tuple[int, int, int]  # (aHash, dHash, pHash)
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    return np.cos(np.pi / n * (np.arange(n) + 0.5) * k)
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def _pack_bits(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel().astype(np.uint8)).tobytes(), "big")
+
+
+def perceptual_hashes(image: Image.Image) -> Hashes:
+    """(aHash, dHash, pHash) of an image, each a 64-bit int"""
+    grey = image.convert("L")
+    small = np.asarray(grey.resize((8, 8), Image.Resampling.BOX), dtype=np.float32)
+    ahash = _pack_bits(small > small.mean())
+    wide = np.asarray(grey.resize((9, 8), Image.Resampling.BOX), dtype=np.float32)
+    dhash = _pack_bits(wide[:, 1:] > wide[:, :-1])
+    pixels = np.asarray(grey.resize((32, 32), Image.Resampling.BOX), dtype=np.float64)
+    low = (_DCT32 @ pixels @ _DCT32.T)[:8, :8].ravel()
+    # Median of the low band without the DC term, which only tracks brightness
+    phash = _pack_bits(low > np.median(low[1:]))
+    return ahash, dhash, phash
+
+
+def fingerprint(image_data: bytes) -> Dict[str, Any]:
+    """Perceptual hashes and size of an encoded image, decoded at reduced scale"""
+    image = Image.open(io.BytesIO(image_data))
+    size = image.size
+    image.draft("L", (FINGERPRINT_SIDE, FINGERPRINT_SIDE))
+    image.thumbnail((256, 256), reducing_gap=1.0)
+    return {"hashes": perceptual_hashes(image), "size": size}
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class PerceptualHashCache:
+    """
+    Verdicts by exact content hash or perceptual near-duplicate.
+    Thread-safe, in-process; each worker keeps its own copy.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 86400.0, max_distance: int = 6):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_distance = max(0, min(max_distance, MAX_INDEXED_DISTANCE))
+        bands = self.max_distance + 1
+        edges = np.linspace(0, HASH_BITS, bands + 1).astype(int)
+        # (shift, mask) per band of the pHash
+        self._bands = [(HASH_BITS - int(hi), (1 << int(hi - lo)) - 1) for lo, hi in zip(edges[:-1], edges[1:])]
+        self._band_index: List[Dict[int, Set[int]]] = [{} for _ in self._bands]
+        # entry id -> (expires_at, sha256, hashes or None, value)
+        self._entries: "OrderedDict[int, Tuple[float, str, Optional[Hashes], Any]]" = OrderedDict()
+        self._by_sha: Dict[str, int] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _band_keys(self, phash: int):
+        for band, (shift, mask) in enumerate(self._bands):
+            yield band, (phash >> shift) & mask
+
+    def _drop(self, entry_id: int):
+        _, sha, hashes, _ = self._entries.pop(entry_id)
+        if self._by_sha.get(sha) == entry_id:
+            del self._by_sha[sha]
+        if hashes is None:
+            return
+        for band, key in self._band_keys(hashes[2]):
+            bucket = self._band_index[band].get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._band_index[band][key]
+
+    def _live(self, entry_id: int, now: float) -> bool:
+        entry = self._entries.get(entry_id)
+        if entry is None:
+            return False
+        if entry[0] <= now:
+            self._drop(entry_id)
+            return False
+        return True
+
+    def get_exact(self, sha256: str) -> Optional[Any]:
+        """Cached value for byte-identical content"""
+        now = time.monotonic()
+        with self._lock:
+            entry_id = self._by_sha.get(sha256)
+            if entry_id is None or not self._live(entry_id, now):
+                return None
+            self._entries.move_to_end(entry_id)
+            self.exact_hits += 1
+            return self._entries[entry_id][3]
+
+    def get_similar(self, hashes: Hashes) -> Optional[Tuple[Any, int]]:
+        """(cached value, pHash distance) of the closest near-duplicate"""
+        now = time.monotonic()
+        with self._lock:
+            candidates: Set[int] = set()
+            for band, key in self._band_keys(hashes[2]):
+                candidates |= self._band_index[band].get(key, set())
+            best, best_distance = None, None
+            for entry_id in candidates:
+                if not self._live(entry_id, now):
+                    continue
+                stored = self._entries[entry_id][2]
+                distances = [hamming(a, b) for a, b in zip(hashes, stored)]
+                if max(distances) > self.max_distance:
+                    continue
+                if best_distance is None or distances[2] < best_distance:
+                    best, best_distance = entry_id, distances[2]
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self.similar_hits += 1
+            return self._entries[best][3], best_distance
+
+    def set(self, sha256: str, hashes: Optional[Hashes], value: Any):
+        """Store a value; with hashes=None it is never a near-duplicate match"""
+        with self._lock:
+            previous = self._by_sha.get(sha256)
+            if previous is not None and previous in self._entries:
+                self._drop(previous)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (time.monotonic() + self.ttl, sha256, hashes, value)
+            self._by_sha[sha256] = entry_id
+            if hashes is not None:
+                for band, key in self._band_keys(hashes[2]):
+                    self._band_index[band].setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_sha.clear()
+            self._band_index = [{} for _ in self._bands]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.exact_hits + self.similar_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "max_distance": self.max_distance,
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.exact_hits + self.similar_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
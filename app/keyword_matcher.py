@@ -0,0 +1,88 @@
+"""
+Multi-pattern keyword matcher (Aho-Corasick)
+Finds every occurrence of every keyword in one pass over the text,
+including overlapping keywords ("up" inside "update"), so classifiers no
+longer loop `kw in text` over each keyword list.
+"""
+
+from collections import deque
+from typing import Dict, Hashable, Iterable, Iterator, List, Set, Tuple
+
+
+class KeywordAutomaton:
+    """
+    Compiled automaton over a fixed keyword set.
+
+    Keywords are matched exactly as given (callers lower-case both the
+    keywords and the text when they want case-insensitive matching).
+    Each keyword maps to an arbitrary hashable id so several rule sets can
+    share one automaton.
+    """
+
+    def __init__(self, keywords: Iterable[Tuple[str, Hashable]] = ()):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[Hashable, int]]] = [[]]
+        self._size = 0
+        for keyword, key in keywords:
+            self.add(keyword, key)
+        self.build()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, keyword: str, key: Hashable):
+        if not keyword:
+            return
+        state = 0
+        for ch in keyword:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((key, len(keyword)))
+        self._size += 1
+
+    def build(self):
+        """Compute failure links; call after the last add()"""
+        queue = deque()
+        for nxt in self._goto[0].values():
+            self._fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def step(self, state: int, ch: str) -> int:
+        """Advance one character; lets callers carry state across chunks"""
+        goto = self._goto
+        while state and ch not in goto[state]:
+            state = self._fail[state]
+        return goto[state].get(ch, 0)
+
+    def outputs(self, state: int) -> List[Tuple[Hashable, int]]:
+        return self._out[state]
+
+    def iter_matches(self, text: str, state: int = 0) -> Iterator[Tuple[int, Hashable]]:
+        """Yield (start_offset, key) for every keyword occurrence"""
+        goto, fail, out = self._goto, self._fail, self._out
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for key, length in out[state]:
+                yield i - length + 1, key
+
+    def find_keys(self, text: str) -> Set[Hashable]:
+        """Set of keys whose keyword occurs anywhere in text"""
+        return {key for _, key in self.iter_matches(text)}
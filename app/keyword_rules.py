@@ -0,0 +1,205 @@
+"""
+Shared Keyword Rule Engine
+Every text classifier registers its named keyword sets here
+(e.g. "content.adult", "email.phishing") and gets all of them back from a
+single scan(text) call, instead of looping `kw in text` over a dozen lists.
+
+All registered keywords are compiled into one trie-shaped regex, so a text
+is walked once no matter how many sets exist. Matching is case-insensitive
+(lower-cased, NFC-normalised for non-ASCII text) and can require word
+boundaries per set:
+- BOUNDARY_NONE   plain substring, what the classifiers always did
+- BOUNDARY_START  keyword must start a word ("kill" in "killed", not "skill")
+- BOUNDARY_WORD   keyword must be a whole word or phrase
+Word characters include combining marks, so Devanagari matras and the
+virama never count as word breaks.
+"""
+
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+BOUNDARY_NONE = "none"
+BOUNDARY_START = "start"
+BOUNDARY_WORD = "word"
+
+# Zero-width (non-)joiners appear inside Devanagari words
+_JOINERS = {"\u200c", "\u200d"}
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case, and NFC-normalise anything that isn't plain ASCII"""
+    lowered = text.lower()
+    if lowered.isascii():
+        return lowered
+    return unicodedata.normalize("NFC", lowered)
+
+
+def is_word_char(ch: str) -> bool:
+    if ch.isalnum() or ch == "_" or ch in _JOINERS:
+        return True
+    return unicodedata.category(ch) in ("Mn", "Mc")
+
+
+def _at_boundary(text: str, start: int, end: int, boundary: str) -> bool:
+    if start > 0 and is_word_char(text[start - 1]):
+        return False
+    if boundary == BOUNDARY_WORD and end < len(text) and is_word_char(text[end]):
+        return False
+    return True
+
+
+def _trie_pattern(keywords: Iterable[str]) -> str:
+    """
+    Alternation factored into a trie: at any position at most one branch
+    survives each character. Optional tails are greedy, so the match at a
+    position is the longest keyword starting there.
+    """
+    trie: Dict[str, dict] = {}
+    for keyword in keywords:
+        node = trie
+        for ch in keyword:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return "(?:" + body + ")?" if "" in node else body
+
+    return build(trie)
+
+
+class KeywordHits:
+    """Result of one scan: set name -> matched keywords, in declaration order"""
+
+    __slots__ = ("_hits",)
+
+    def __init__(self, hits: Dict[str, List[str]]):
+        self._hits = hits
+
+    def get(self, name: str) -> List[str]:
+        return list(self._hits.get(name, ()))
+
+    def count(self, name: str) -> int:
+        return len(self._hits.get(name, ()))
+
+    def first(self, name: str) -> Optional[str]:
+        found = self._hits.get(name)
+        return found[0] if found else None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._hits
+
+    def categories(self) -> List[str]:
+        return list(self._hits)
+
+    def as_dict(self) -> Dict[str, List[str]]:
+        return {name: list(found) for name, found in self._hits.items()}
+
+
+class _CompiledRules:
+    def __init__(self, sets: Dict[str, Tuple[List[str], str]]):
+        # normalised keyword -> [(set, index in set, keyword as declared)]
+        self.plain: Dict[str, List[Tuple[str, int, str]]] = {}
+        self.bounded: Dict[str, List[Tuple[str, int, str, str]]] = {}
+        for name, (keywords, boundary) in sets.items():
+            for idx, keyword in enumerate(keywords):
+                normalized = normalize_text(keyword)
+                if not normalized:
+                    continue
+                if boundary == BOUNDARY_NONE:
+                    self.plain.setdefault(normalized, []).append((name, idx, keyword))
+                else:
+                    self.bounded.setdefault(normalized, []).append((name, idx, keyword, boundary))
+
+        keywords = set(self.plain) | set(self.bounded)
+        # The regex reports the longest keyword at each position; every
+        # shorter keyword starting there is a prefix of it
+        self.expansions = {
+            keyword: [k for k in keywords if keyword.startswith(k)]
+            for keyword in keywords
+        }
+        self.regex = re.compile("(?=(" + _trie_pattern(keywords) + "))") if keywords else None
+        self.keyword_count = len(keywords)
+
+    def scan(self, text: str) -> KeywordHits:
+        if not text or self.regex is None:
+            return KeywordHits({})
+        normalized = normalize_text(text)
+        found: Dict[str, Dict[int, str]] = {}
+        seen_plain = set()
+        plain, bounded = self.plain, self.bounded
+        for match in self.regex.finditer(normalized):
+            start = match.start()
+            for keyword in self.expansions[match.group(1)]:
+                if keyword not in seen_plain and keyword in plain:
+                    seen_plain.add(keyword)
+                    for name, idx, declared in plain[keyword]:
+                        found.setdefault(name, {})[idx] = declared
+                for name, idx, declared, boundary in bounded.get(keyword, ()):
+                    if _at_boundary(normalized, start, start + len(keyword), boundary):
+                        found.setdefault(name, {})[idx] = declared
+        return KeywordHits({
+            name: [hits[idx] for idx in sorted(hits)]
+            for name, hits in found.items()
+        })
+
+
+class KeywordRuleEngine:
+    """
+    Registry of named keyword sets. Modules register their sets at import
+    time; the combined matcher is (re)compiled on the first scan after a
+    registration.
+    """
+
+    def __init__(self):
+        self._sets: Dict[str, Tuple[List[str], str]] = {}
+        self._compiled: Optional[_CompiledRules] = None
+        self._lock = threading.Lock()
+        # Bumped on every registration so callers can tell the rules changed
+        self.generation = 0
+
+    def register(self, name: str, keywords: Iterable[str], boundary: str = BOUNDARY_NONE) -> str:
+        """Add (or replace) a keyword set; returns the set name for convenience"""
+        if boundary not in (BOUNDARY_NONE, BOUNDARY_START, BOUNDARY_WORD):
+            raise ValueError(f"Unknown boundary mode: {boundary}")
+        with self._lock:
+            self._sets[name] = ([k for k in keywords if k], boundary)
+            self._compiled = None
+            self.generation += 1
+        return name
+
+    def keywords(self, name: str) -> List[str]:
+        return list(self._sets[name][0])
+
+    def _ensure_compiled(self) -> _CompiledRules:
+        compiled = self._compiled
+        if compiled is None:
+            with self._lock:
+                if self._compiled is None:
+                    self._compiled = _CompiledRules(self._sets)
+                compiled = self._compiled
+        return compiled
+
+    def scan(self, text: str) -> KeywordHits:
+        return self._ensure_compiled().scan(text)
+
+    def stats(self) -> Dict[str, int]:
+        compiled = self._ensure_compiled()
+        return {"sets": len(self._sets), "keywords": compiled.keyword_count}
+
+
+rules = KeywordRuleEngine()
+
+
+def register(name: str, keywords: Iterable[str], boundary: str = BOUNDARY_NONE) -> str:
+    return rules.register(name, keywords, boundary)
+
+
+def scan(text: str) -> KeywordHits:
+    """All keyword-set hits for text, from one pass"""
+    return rules.scan(text)
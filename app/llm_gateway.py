@@ -0,0 +1,153 @@
+"""
+Shared async LLM gateway
+All OpenAI chat/transcription calls from request handlers go through one
+AsyncOpenAI client, so they:
+- reuse one pooled HTTP connection set instead of a client per call
+- never block the event loop (the sync SDK froze the worker for the whole
+  model round-trip)
+- are capped at LLM_MAX_CONCURRENCY in-flight calls per process; callers
+  beyond that wait for a slot inside their own timeout
+- are bounded by a per-call timeout (LLM_CHAT_TIMEOUT_SECONDS /
+  LLM_TRANSCRIBE_TIMEOUT_SECONDS), covering the wait for a slot too
+
+Cancelling the calling task (client disconnect, timeout) cancels the
+in-flight HTTP request and frees its slot.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_CHAT_TIMEOUT_SECONDS = float(os.getenv("LLM_CHAT_TIMEOUT_SECONDS", "20"))
+LLM_TRANSCRIBE_TIMEOUT_SECONDS = float(os.getenv("LLM_TRANSCRIBE_TIMEOUT_SECONDS", "60"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+
+
+class LLMGatewayError(Exception):
+    """The model call could not be made or failed"""
+
+
+class LLMTimeoutError(LLMGatewayError):
+    """No slot or no response within the call's timeout"""
+
+
+class LLMGateway:
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 max_connections: int = LLM_MAX_CONNECTIONS):
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self._client = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def _get_client(self):
+        if self._client is None:
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise LLMGatewayError("OpenAI API key not configured")
+            import httpx
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(
+                api_key=api_key,
+                # Timeouts are enforced per call below; SDK retries would overrun them
+                max_retries=0,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                    ),
+                    timeout=httpx.Timeout(max(LLM_CHAT_TIMEOUT_SECONDS, LLM_TRANSCRIBE_TIMEOUT_SECONDS)),
+                ),
+            )
+        return self._client
+
+    async def _call(self, kind: str, timeout: float, make_request):
+        client = self._get_client()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        started = time.monotonic()
+        self.waiting += 1
+        acquired = False
+        try:
+            async with asyncio.timeout(timeout):
+                await self._semaphore.acquire()
+                acquired = True
+                self.waiting -= 1
+                self.in_flight += 1
+                try:
+                    return await make_request(client)
+                finally:
+                    self.in_flight -= 1
+        except TimeoutError:
+            self.timeouts += 1
+            stage = "response" if acquired else "a free slot"
+            raise LLMTimeoutError(f"LLM {kind} timed out after {timeout:g}s waiting for {stage}")
+        except LLMGatewayError:
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.errors += 1
+            raise LLMGatewayError(f"LLM {kind} failed: {e}") from e
+        finally:
+            if acquired:
+                self._semaphore.release()
+            else:
+                self.waiting -= 1
+            self.calls += 1
+            logger.debug("LLM %s finished in %.2fs", kind, time.monotonic() - started)
+
+    async def chat(self, messages: List[Dict[str, str]], model: str = "gpt-4o-mini",
+                   temperature: float = 0.3, response_format: Optional[Dict[str, Any]] = None,
+                   timeout: float = LLM_CHAT_TIMEOUT_SECONDS) -> str:
+        """Content of the first chat completion choice"""
+        kwargs: Dict[str, Any] = {"model": model, "messages": messages, "temperature": temperature}
+        if response_format is not None:
+            kwargs["response_format"] = response_format
+
+        async def request(client):
+            response = await client.chat.completions.create(**kwargs)
+            return response.choices[0].message.content or ""
+
+        return await self._call("chat", timeout, request)
+
+    async def transcribe(self, audio: Tuple[str, bytes], model: str = "whisper-1",
+                         language: Optional[str] = None,
+                         timeout: float = LLM_TRANSCRIBE_TIMEOUT_SECONDS) -> str:
+        """Transcript text for an in-memory (filename, bytes) audio file"""
+        kwargs: Dict[str, Any] = {"model": model, "file": audio}
+        if language:
+            kwargs["language"] = language
+
+        async def request(client):
+            response = await client.audio.transcriptions.create(**kwargs)
+            return response.text
+
+        return await self._call("transcription", timeout, request)
+
+    async def close(self):
+        client, self._client = self._client, None
+        if client is not None:
+            await client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
+
+
+llm_gateway = LLMGateway()
@@ -4,7 +4,6 @@ from . import social, gps, screentime, family, subscription, test_endpoints, tes
 from fastapi import FastAPI, Request, HTTPException
 # REMOVED: execute_sql (security risk - raw SQL execution)
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import create_engine, text
 from . import payment_gateway, ai_assistant, ai_assistant_enhanced, ai_assistant_enhanced_v2, ai_assistant_intelligent, ai_assistant_autonomous, ai_assistant_with_execution, ai_execution_engine, public_content, pending_actions_proxy, pending_actions_ssr
 from .admin import employee_exemptions
@@ -19,6 +18,9 @@ import os
 import psycopg
 
 from .deps import get_settings
+from .database import AsyncDB, create_db_engine, close_sync_pool
+from . import write_behind
+from .llm_gateway import llm_gateway
 from .auth import otp, device, password, reset_admin_password, debug_employees, mobile_auth, signup, verify_otp
 from .ai import voice, image
 from .billing import razorpay_webhooks, stripe_webhooks, invoice_generator, refund_processing
@@ -107,7 +109,7 @@ def make_app():
         def _apply():
             base = Path(__file__).resolve().parents[1]
             mdir = base / "migrations"
-            for fname in ["001_init.sql", "002_rbac.sql", "003_social_time.sql", "004_new_features.sql", "014_employees_table.sql", "009-complete-reset.sql", "010_missing_tables.sql", "011_ai_pending_tasks.sql", "012_payment_gateway_management.sql", "013_auto_alerts_enhanced.sql", "015_vault_and_exemptions.sql", "015_youtube_and_scam_alerts.sql", "021_ai_pending_actions.sql", "add_totp_columns.sql", "add_razorpay_config.sql", "add_whatsapp_chat_settings.sql", "022_mobile_caller_id.sql", "040_user_activity_log_simple.sql", "024_mobile_url_checker.sql", "025_mobile_push_notifications.sql", "027_emergency_contacts.sql", "028_realtime_call_analysis.sql", "029_device_permissions.sql", "030_employee_management_enhanced.sql", "031_vault_management_enhanced.sql", "032_mobile_users_schema.sql", "042_recreate_invoices_table.sql", "034_add_user_kyc_fields.sql", "035_razorpay_tables.sql", "037_gps_and_family_safety.sql", "038_dpdp_compliance.sql", "039_user_activity_log_fix.sql", "043_create_evidence_vault.sql", "044_complaint_drafts.sql", "045_add_extremism_fields.sql", "046_user_consent_log.sql", "047_ai_action_queue.sql", "048_ai_pattern_library.sql", "049_ai_investigation_tasks.sql", "050_ai_learning_center.sql", "052_ai_investigation.sql"]:
+            for fname in ["001_init.sql", "002_rbac.sql", "003_social_time.sql", "004_new_features.sql", "014_employees_table.sql", "009-complete-reset.sql", "010_missing_tables.sql", "011_ai_pending_tasks.sql", "012_payment_gateway_management.sql", "013_auto_alerts_enhanced.sql", "015_vault_and_exemptions.sql", "015_youtube_and_scam_alerts.sql", "021_ai_pending_actions.sql", "add_totp_columns.sql", "add_razorpay_config.sql", "add_whatsapp_chat_settings.sql", "022_mobile_caller_id.sql", "040_user_activity_log_simple.sql", "024_mobile_url_checker.sql", "025_mobile_push_notifications.sql", "027_emergency_contacts.sql", "028_realtime_call_analysis.sql", "029_device_permissions.sql", "030_employee_management_enhanced.sql", "031_vault_management_enhanced.sql", "032_mobile_users_schema.sql", "042_recreate_invoices_table.sql", "034_add_user_kyc_fields.sql", "035_razorpay_tables.sql", "037_gps_and_family_safety.sql", "038_dpdp_compliance.sql", "039_user_activity_log_fix.sql", "043_create_evidence_vault.sql", "044_complaint_drafts.sql", "045_add_extremism_fields.sql", "046_user_consent_log.sql", "047_ai_action_queue.sql", "048_ai_pattern_library.sql", "049_ai_investigation_tasks.sql", "050_ai_learning_center.sql", "052_ai_investigation.sql", "058_incremental_caller_spam_score.sql", "059_readonly_call_analysis.sql", "060_voice_embeddings.sql", "061_call_analysis_jobs.sql"]:
                 sql = (mdir / fname).read_text(encoding="utf-8")
                 with engine.begin() as conn:
                     conn.exec_driver_sql(sql)
@@ -117,29 +119,40 @@ def make_app():
             print("Auto-migrations applied.")
         except Exception as e:
             print("Auto-migrate skipped:", e)
+        # Routes use the async pool below; the sync engine was only for migrations
+        engine.dispose()
     else:
         print("Booting in BARE mode: skipping DB init on startup")
 
     # ------------------------------------------------------------
-    # DB shim so routes can await request.app.state.db.execute(...)
+    # Async DB so routes can await request.app.state.db.execute(...)
     # ------------------------------------------------------------
-    class DBShim:
-        def __init__(self, _engine):
-            self._engine = _engine
-
-        async def execute(self, clause, params=None):
-            if self._engine is None:
-                # If someone calls DB in bare mode, fail clearly
-                raise RuntimeError("DB not initialized (APP_BOOT_MODE=bare)")
-            def _exec():
-                with self._engine.begin() as conn:
-                    return conn.execute(clause, params or {})
-            return await run_in_threadpool(_exec)
+    async_engine = create_db_engine(s.DATABASE_URL, s) if engine is not None else None
+    db = AsyncDB(async_engine)
 
     @app.on_event("startup")
     async def startup():
         # Attach the db handle (exists even in bare mode, but will raise if used)
-        app.state.db = DBShim(engine)
+        app.state.db = db
+        if async_engine is not None:
+            write_behind.start_all(db)
+        # Child-protection domain list loads in the background
+        content_filter.domain_categories.start()
+        # Image analysis workers are spawned processes; start them before traffic
+        image.start_process_pool()
+        if async_engine is not None:
+            # Voice print index streams stored embeddings in the background
+            voice_biometric.voice_index.start()
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        # Flush buffered log rows/counters before the pool goes away
+        await write_behind.close_all()
+        email_phishing.shutdown_process_pool()
+        image.shutdown_process_pool()
+        await llm_gateway.close()
+        await db.dispose()
+        close_sync_pool()
 
     # ------------------------------------------------------------
     # Routers
@@ -260,7 +273,7 @@ def make_app():
         try:
             with psycopg.connect(dsn) as conn:
                 with conn.cursor() as cur:
-                    for fname in ["001_init.sql", "002_rbac.sql", "003_social_time.sql", "004_new_features.sql", "014_employees_table.sql", "009-complete-reset.sql", "010_missing_tables.sql", "011_ai_pending_tasks.sql", "012_payment_gateway_management.sql", "013_auto_alerts_enhanced.sql", "015_vault_and_exemptions.sql", "015_youtube_and_scam_alerts.sql", "021_ai_pending_actions.sql", "add_totp_columns.sql", "add_razorpay_config.sql", "add_whatsapp_chat_settings.sql", "022_mobile_caller_id.sql", "040_user_activity_log_simple.sql", "024_mobile_url_checker.sql", "025_mobile_push_notifications.sql", "027_emergency_contacts.sql", "028_realtime_call_analysis.sql", "029_device_permissions.sql", "030_employee_management_enhanced.sql", "031_vault_management_enhanced.sql", "032_mobile_users_schema.sql", "042_recreate_invoices_table.sql", "034_add_user_kyc_fields.sql", "035_razorpay_tables.sql", "037_gps_and_family_safety.sql", "038_dpdp_compliance.sql", "039_user_activity_log_fix.sql", "043_create_evidence_vault.sql", "044_complaint_drafts.sql", "045_add_extremism_fields.sql", "046_user_consent_log.sql", "047_ai_action_queue.sql", "048_ai_pattern_library.sql", "049_ai_investigation_tasks.sql", "050_ai_learning_center.sql", "051_threat_intelligence.sql"]:
+                    for fname in ["001_init.sql", "002_rbac.sql", "003_social_time.sql", "004_new_features.sql", "014_employees_table.sql", "009-complete-reset.sql", "010_missing_tables.sql", "011_ai_pending_tasks.sql", "012_payment_gateway_management.sql", "013_auto_alerts_enhanced.sql", "015_vault_and_exemptions.sql", "015_youtube_and_scam_alerts.sql", "021_ai_pending_actions.sql", "add_totp_columns.sql", "add_razorpay_config.sql", "add_whatsapp_chat_settings.sql", "022_mobile_caller_id.sql", "040_user_activity_log_simple.sql", "024_mobile_url_checker.sql", "025_mobile_push_notifications.sql", "027_emergency_contacts.sql", "028_realtime_call_analysis.sql", "029_device_permissions.sql", "030_employee_management_enhanced.sql", "031_vault_management_enhanced.sql", "032_mobile_users_schema.sql", "042_recreate_invoices_table.sql", "034_add_user_kyc_fields.sql", "035_razorpay_tables.sql", "037_gps_and_family_safety.sql", "038_dpdp_compliance.sql", "039_user_activity_log_fix.sql", "043_create_evidence_vault.sql", "044_complaint_drafts.sql", "045_add_extremism_fields.sql", "046_user_consent_log.sql", "047_ai_action_queue.sql", "048_ai_pattern_library.sql", "049_ai_investigation_tasks.sql", "050_ai_learning_center.sql", "051_threat_intelligence.sql", "058_incremental_caller_spam_score.sql", "059_readonly_call_analysis.sql", "060_voice_embeddings.sql", "061_call_analysis_jobs.sql"]:
                         sql = (mdir / fname).read_text(encoding="utf-8")
                         cur.execute(sql)
                 conn.commit()
@@ -277,10 +290,7 @@ def make_app():
             # bare boot — app is up, DB intentionally not initialized
             return {"status": "ok", "db": None, "env": s.APP_ENV, "mode": "bare"}
         try:
-            def _ping():
-                with engine.connect() as conn:
-                    conn.execute(text("SELECT 1"))
-            await run_in_threadpool(_ping)
+            await db.fetch_val(text("SELECT 1"))
             db_ok = True
         except Exception:
             db_ok = False
@@ -401,6 +411,12 @@ app.include_router(admin_approvals.router)
 from . import whisper_analysis
 app.include_router(whisper_analysis.router)
 
+# Call recording uploads, queued for run_call_analysis_worker.py. Every route needs
+# the user's JWT and only sees that user's jobs. Included after whisper_analysis so
+# its fixed paths (/stats, /test) win over /{call_id}
+from . import call_analysis
+app.include_router(call_analysis.router)
+
 # Promo Code System (Referral & Commission Tracking)
 from . import promo_codes
 app.include_router(promo_codes.router)
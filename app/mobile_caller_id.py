@@ -8,11 +8,17 @@ from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 from sqlalchemy import text
+import os
 from .utils import get_current_user
 from .deps import get_db
+from .caller_id import lookup_cache, invalidate_caller
+from .database import get_db_connection
 
 router = APIRouter(prefix="/api/mobile/caller-id", tags=["Mobile Caller ID"])
 
+# Upper bound for /lookup-batch (call-log / contact sync)
+MAX_BATCH_LOOKUP = int(os.getenv("CALLER_ID_BATCH_MAX", "500"))
+
 
 # Pydantic Models
 class CallerIDLookupRequest(BaseModel):
@@ -20,6 +26,13 @@ class CallerIDLookupRequest(BaseModel):
     countryCode: Optional[str] = Field(None, description="ISO country code")
 
 
+class CallerIDBatchLookupRequest(BaseModel):
+    phoneNumbers: List[str] = Field(
+        ..., min_length=1, max_length=MAX_BATCH_LOOKUP,
+        description=f"Up to {MAX_BATCH_LOOKUP} phone numbers with country code"
+    )
+
+
 class CallerIDResponse(BaseModel):
     phoneNumber: str
     name: Optional[str] = None
@@ -59,6 +72,95 @@ class CallHistoryRequest(BaseModel):
     callerName: Optional[str] = None
 
 
+CALLER_LOOKUP_COLUMNS = """
+    phone_number,
+    name,
+    carrier,
+    location,
+    number_type,
+    spam_score,
+    total_reports,
+    spam_reports,
+    safe_reports,
+    business_name,
+    is_verified,
+    tags
+"""
+
+
+def build_caller(row) -> dict:
+    """Caller payload (with recommendation) from a caller_id_database row"""
+    spam_score = row[5] or 0
+    
+    # Determine recommendation
+    if spam_score >= 70:
+        recommendation = "block"
+    elif spam_score >= 40:
+        recommendation = "caution"
+    else:
+        recommendation = "safe"
+    
+    return {
+        "phoneNumber": row[0],
+        "name": row[1],
+        "carrier": row[2],
+        "location": row[3],
+        "numberType": row[4],
+        "spamScore": spam_score,
+        "totalReports": row[6] or 0,
+        "spamReports": row[7] or 0,
+        "safeReports": row[8] or 0,
+        "businessName": row[9],
+        "isVerified": row[10] or False,
+        "tags": row[11] or [],
+        "recommendation": recommendation
+    }
+
+
+def unknown_caller(phone: str) -> dict:
+    """Default payload for a number that is not in the database"""
+    return {
+        "phoneNumber": phone,
+        "name": None,
+        "carrier": None,
+        "location": None,
+        "numberType": "unknown",
+        "spamScore": 0,
+        "totalReports": 0,
+        "spamReports": 0,
+        "safeReports": 0,
+        "businessName": None,
+        "isVerified": False,
+        "tags": [],
+        "recommendation": "unknown"
+    }
+
+
+def reconcile_spam_scores(lookback_hours: Optional[int] = 24) -> int:
+    """
+    Recount caller_id_reports and repair drifted caller counters.
+    The insert trigger maintains counters by delta (migration 058), so this
+    only needs to run periodically; lookback_hours=None recounts everything.
+    Returns the number of caller rows corrected.
+    """
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        if lookback_hours is None:
+            cur.execute("SELECT reconcile_caller_spam_scores(NULL)")
+        else:
+            cur.execute(
+                "SELECT reconcile_caller_spam_scores((NOW() - make_interval(hours => %s))::timestamp)",
+                (lookback_hours,)
+            )
+        fixed = cur.fetchone()[0]
+        conn.commit()
+        cur.close()
+        return fixed
+    finally:
+        conn.close()
+
+
 @router.post("/lookup")
 async def lookup_caller_id(
     request: CallerIDLookupRequest,
@@ -72,81 +174,85 @@ async def lookup_caller_id(
     try:
         phone = request.phoneNumber.strip()
         
+        cached = lookup_cache.get(("mobile", phone))
+        if cached is not None:
+            return {"ok": True, "caller": cached}
+        
         # Query caller ID database
-        query = text("""
-            SELECT 
-                phone_number,
-                name,
-                carrier,
-                location,
-                number_type,
-                spam_score,
-                total_reports,
-                spam_reports,
-                safe_reports,
-                business_name,
-                is_verified,
-                tags
+        query = text(f"""
+            SELECT {CALLER_LOOKUP_COLUMNS}
             FROM caller_id_database
             WHERE phone_number = :phone
         """)
         
-        result = db.execute(query, {"phone": phone}).fetchone()
+        result = await db.fetch_one(query, {"phone": phone})
         
         if result:
-            spam_score = result[5] or 0
-            
-            # Determine recommendation
-            if spam_score >= 70:
-                recommendation = "block"
-            elif spam_score >= 40:
-                recommendation = "caution"
-            else:
-                recommendation = "safe"
-            
-            return {
-                "ok": True,
-                "caller": {
-                    "phoneNumber": result[0],
-                    "name": result[1],
-                    "carrier": result[2],
-                    "location": result[3],
-                    "numberType": result[4],
-                    "spamScore": spam_score,
-                    "totalReports": result[6] or 0,
-                    "spamReports": result[7] or 0,
-                    "safeReports": result[8] or 0,
-                    "businessName": result[9],
-                    "isVerified": result[10] or False,
-                    "tags": result[11] or [],
-                    "recommendation": recommendation
-                }
-            }
+            caller = build_caller(result)
+            lookup_cache.set(("mobile", phone), caller)
         else:
             # Number not in database - return default
-            return {
-                "ok": True,
-                "caller": {
-                    "phoneNumber": phone,
-                    "name": None,
-                    "carrier": None,
-                    "location": None,
-                    "numberType": "unknown",
-                    "spamScore": 0,
-                    "totalReports": 0,
-                    "spamReports": 0,
-                    "safeReports": 0,
-                    "businessName": None,
-                    "isVerified": False,
-                    "tags": [],
-                    "recommendation": "unknown"
-                }
-            }
+            caller = unknown_caller(phone)
+            lookup_cache.set(("mobile", phone), caller, negative=True)
+        
+        return {"ok": True, "caller": caller}
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lookup failed: {str(e)}")
 
 
+@router.post("/lookup-batch")
+async def lookup_caller_id_batch(
+    request: CallerIDBatchLookupRequest,
+    db=Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """
+    Lookup many numbers at once (call-log / contact-list sync)
+    Cached numbers are answered from memory, the rest with a single
+    ANY(:phones) query. Results come back in input order.
+    """
+    try:
+        phones = [p.strip() for p in request.phoneNumbers]
+        
+        callers = {}
+        missing = []
+        for phone in dict.fromkeys(phones):
+            cached = lookup_cache.get(("mobile", phone))
+            if cached is not None:
+                callers[phone] = cached
+            else:
+                missing.append(phone)
+        
+        if missing:
+            query = text(f"""
+                SELECT {CALLER_LOOKUP_COLUMNS}
+                FROM caller_id_database
+                WHERE phone_number = ANY(:phones)
+            """)
+            rows = await db.fetch_all(query, {"phones": missing})
+            
+            for row in rows:
+                caller = build_caller(row)
+                callers[row[0]] = caller
+                lookup_cache.set(("mobile", row[0]), caller)
+            
+            for phone in missing:
+                if phone not in callers:
+                    callers[phone] = unknown_caller(phone)
+                    lookup_cache.set(("mobile", phone), callers[phone], negative=True)
+        
+        return {
+            "ok": True,
+            "count": len(phones),
+            "fromCache": len(callers) - len(missing),
+            "callers": [callers[phone] for phone in phones]
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch lookup failed: {str(e)}")
+
+
 @router.post("/report-spam")
 async def report_spam(
     request: ReportSpamRequest,
@@ -161,7 +267,7 @@ async def report_spam(
         # Get client IP
         client_ip = req.client.host
         
-        # Insert report
+        # Insert report and bump the reporter's trust score together
         query = text("""
             INSERT INTO caller_id_reports 
             (phone_number, reported_by, report_type, spam_category, description, confidence, ip_address)
@@ -169,20 +275,6 @@ async def report_spam(
             RETURNING id
         """)
         
-        result = db.execute(query, {
-            "phone": request.phoneNumber,
-            "user_id": current_user["id"],
-            "report_type": request.reportType,
-            "category": request.spamCategory,
-            "description": request.description,
-            "confidence": request.confidence,
-            "ip": client_ip
-        })
-        
-        report_id = result.fetchone()[0]
-        db.commit()
-        
-        # Update user trust score
         trust_query = text("""
             INSERT INTO user_trust_scores (user_id, reports_submitted, trust_score)
             VALUES (:user_id, 1, 50)
@@ -190,8 +282,21 @@ async def report_spam(
             SET reports_submitted = user_trust_scores.reports_submitted + 1,
                 last_updated = CURRENT_TIMESTAMP
         """)
-        db.execute(trust_query, {"user_id": current_user["id"]})
-        db.commit()
+        
+        async with db.transaction() as tx:
+            report_id = await tx.fetch_val(query, {
+                "phone": request.phoneNumber,
+                "user_id": current_user["id"],
+                "report_type": request.reportType,
+                "category": request.spamCategory,
+                "description": request.description,
+                "confidence": request.confidence,
+                "ip": client_ip
+            })
+            await tx.execute(trust_query, {"user_id": current_user["id"]})
+        
+        # The insert trigger just changed this number's spam score
+        invalidate_caller(request.phoneNumber)
         
         return {
             "ok": True,
@@ -200,7 +305,6 @@ async def report_spam(
         }
         
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"Report failed: {str(e)}")
 
 
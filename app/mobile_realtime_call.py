@@ -3,30 +3,65 @@ Mobile Real-Time Call Analysis API
 AI-powered real-time call monitoring and scam detection
 """
 
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, Field, ValidationError
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from sqlalchemy import text
+import json
+import logging
 from .utils import get_current_user
 from .deps import get_db
+from .call_pattern_engine import call_pattern_engine, CallSessionState, record_pattern_hits, live_sessions
+from .write_behind import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/mobile/realtime-call", tags=["Mobile Real-Time Call"])
 
+# Transcript + analysis rows from live sessions are written behind (see write_behind.py)
+transcription_buffer = WriteBehindBuffer(
+    "realtime_call_transcription",
+    insert_query=text("""
+        INSERT INTO realtime_call_transcription 
+        (session_id, speaker, text, language, confidence, timestamp_offset, is_suspicious, flagged_keywords)
+        VALUES (:session_id, :speaker, :text, :language, :confidence, :timestamp_offset,
+                :is_suspicious, CAST(:flagged_keywords AS JSONB))
+    """),
+)
+analysis_buffer = WriteBehindBuffer(
+    "realtime_call_analysis",
+    insert_query=text("""
+        INSERT INTO realtime_call_analysis 
+        (session_id, scam_probability, threat_level, detected_patterns, keywords_detected, confidence_score)
+        VALUES (:session_id, :scam_probability, :threat_level, CAST(:detected_patterns AS JSONB),
+                CAST(:keywords_detected AS JSONB), 85.0)
+    """),
+)
+
+# Threat level -> recommended action for the alert raised when a call reaches it
+ALERT_ACTIONS = {"medium": "monitor", "high": "warn_user", "critical": "block_call"}
+ALERT_ORDER = ["medium", "high", "critical"]
+
 
 class StartCallRequest(BaseModel):
-    phoneNumber: str
-    callerName: Optional[str] = None
-    callDirection: str = Field(..., description="incoming or outgoing")
+    phoneNumber: str = Field(..., max_length=20)
+    callerName: Optional[str] = Field(None, max_length=255)
+    callDirection: str = Field(..., max_length=10, description="incoming or outgoing")
 
 
-class TranscriptionRequest(BaseModel):
-    sessionId: int
-    speaker: str = Field(..., description="user or caller")
+# Bounds match realtime_call_transcription, so a segment the table would reject
+# fails validation here instead of being written behind
+class TranscriptionSegment(BaseModel):
+    speaker: str = Field(..., max_length=20, description="user or caller")
     text: str
-    language: str = "en"
-    confidence: Optional[float] = None
-    timestampOffset: Optional[int] = None  # Milliseconds from call start
+    language: str = Field("en", max_length=10)
+    confidence: Optional[float] = Field(None, ge=0, le=100)  # percent
+    timestampOffset: Optional[int] = Field(None, ge=0, le=2**31 - 1)  # Milliseconds from call start
+
+
+class TranscriptionRequest(TranscriptionSegment):
+    sessionId: int
 
 
 class EndCallRequest(BaseModel):
@@ -37,7 +72,7 @@ class EndCallRequest(BaseModel):
 
 class AlertResponseRequest(BaseModel):
     alertId: int
-    userResponse: str = Field(..., description="dismissed, blocked_call, reported, etc.")
+    userResponse: str = Field(..., max_length=50, description="dismissed, blocked_call, reported, etc.")
 
 
 @router.post("/start")
@@ -91,54 +126,201 @@ async def add_transcription(
         verify_query = text("""
             SELECT user_id FROM realtime_call_sessions WHERE id = :session_id
         """)
-        result = db.execute(verify_query, {"session_id": request.sessionId}).fetchone()
+        result = await db.fetch_one(verify_query, {"session_id": request.sessionId})
         
         if not result or result[0] != current_user["id"]:
             raise HTTPException(status_code=404, detail="Session not found")
         
+        # Match against the session's rolling state (only this segment is scanned)
+        state = live_sessions.get_or_create(request.sessionId, current_user["id"])
+        matched, snapshot, alert = await analyze_segment(db, state, request, alert_shown=False)
+        
         # Insert transcription
         trans_query = text("""
             INSERT INTO realtime_call_transcription 
-            (session_id, speaker, text, language, confidence, timestamp_offset)
-            VALUES (:session_id, :speaker, :text, :language, :confidence, :timestamp_offset)
+            (session_id, speaker, text, language, confidence, timestamp_offset, is_suspicious, flagged_keywords)
+            VALUES (:session_id, :speaker, :text, :language, :confidence, :timestamp_offset,
+                    :is_suspicious, CAST(:flagged_keywords AS JSONB))
             RETURNING id
         """)
         
-        trans_id = db.execute(trans_query, {
+        trans_id = await db.fetch_val(trans_query, {
             "session_id": request.sessionId,
             "speaker": request.speaker,
             "text": request.text,
             "language": request.language,
             "confidence": request.confidence,
-            "timestamp_offset": request.timestampOffset
-        }).fetchone()[0]
-        
-        # Analyze transcription for scam patterns
-        analysis_query = text("""
-            SELECT analyze_call_realtime(:session_id, :text, :speaker)
-        """)
-        
-        analysis_result = db.execute(analysis_query, {
-            "session_id": request.sessionId,
-            "text": request.text,
-            "speaker": request.speaker
-        }).fetchone()[0]
-        
-        db.commit()
+            "timestamp_offset": request.timestampOffset,
+            "is_suspicious": matched["segmentSuspicious"],
+            "flagged_keywords": json.dumps(matched["flaggedKeywords"])
+        })
         
         return {
             "ok": True,
             "transcriptionId": trans_id,
-            "analysis": analysis_result
+            "analysis": {
+                "scamProbability": snapshot["scamProbability"],
+                "threatLevel": snapshot["threatLevel"],
+                "detectedPatterns": snapshot["detectedPatterns"],
+                "keywordsDetected": snapshot["keywordsDetected"],
+                "newKeywords": matched["newKeywords"],
+                "speakers": snapshot["speakers"],
+                "alert": alert
+            }
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def raise_level_alert(db, state: CallSessionState, shown: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Create an alert the first time a live session reaches medium/high/critical.
+    Returns the alert to push, or None if the level was already alerted.
+    """
+    level = state.threat_level
+    if level not in ALERT_ACTIONS or level in state.alerted_levels:
+        return None
+    # Reaching "critical" directly also covers the lower levels
+    for lower in ALERT_ORDER[:ALERT_ORDER.index(level) + 1]:
+        state.alerted_levels.add(lower)
+    
+    alert = {
+        "alertType": "scam_detected",
+        "severity": level,
+        "title": "Potential Scam Detected",
+        "message": "This call shows signs of a scam. Be cautious and do not share personal information.",
+        "recommendedAction": ALERT_ACTIONS[level],
+    }
+    try:
+        alert["alertId"] = await db.fetch_val(text("""
+            INSERT INTO realtime_call_alerts 
+            (session_id, alert_type, severity, title, message, recommended_action, was_shown)
+            VALUES (:session_id, :alert_type, :severity, :title, :message, :recommended_action, :was_shown)
+            RETURNING id
+        """), {
+            "session_id": state.session_id,
+            "was_shown": shown,
+            "alert_type": alert["alertType"],
+            "severity": level,
+            "title": alert["title"],
+            "message": alert["message"],
+            "recommended_action": alert["recommendedAction"],
+        })
+    except Exception:
+        logger.exception("Could not persist live alert for session %s", state.session_id)
+        alert["alertId"] = None
+    return alert
+
+
+async def analyze_segment(db, state: CallSessionState, segment: TranscriptionSegment, alert_shown: bool):
+    """
+    Feed one segment into the session state, count pattern hits, raise a
+    level alert if needed and queue the analysis row.
+    """
+    compiled = await call_pattern_engine.ensure_fresh(db)
+    matched = state.feed(compiled, segment.speaker, segment.text, segment.timestampOffset)
+    snapshot = state.snapshot()
+    await record_pattern_hits(matched["segmentPatterns"])
+    
+    alert = await raise_level_alert(db, state, shown=alert_shown)
+    
+    await analysis_buffer.add(row={
+        "session_id": state.session_id,
+        "scam_probability": snapshot["scamProbability"],
+        "threat_level": snapshot["threatLevel"],
+        "detected_patterns": json.dumps(snapshot["detectedPatterns"]),
+        "keywords_detected": json.dumps(snapshot["keywordsDetected"]),
+    })
+    return matched, snapshot, alert
+
+
+@router.websocket("/ws/{session_id}")
+async def live_call_stream(websocket: WebSocket, session_id: int, token: Optional[str] = None):
+    """
+    Stream transcription segments for a live call over one socket.
+    
+    Auth: `Authorization: Bearer <jwt>` header or `?token=<jwt>`.
+    Client sends JSON {speaker, text, language?, confidence?, timestampOffset?}
+    per segment (or {"type": "ping"}). Each segment is matched incrementally
+    against the compiled pattern automaton (phrases may span segments); the
+    server replies {"type": "analysis", ...} and pushes {"type": "alert", ...}
+    as soon as the call first reaches medium/high/critical. Transcript and
+    analysis rows are persisted in batches behind the stream.
+    """
+    authorization = websocket.headers.get("authorization") or (f"Bearer {token}" if token else None)
+    try:
+        current_user = get_current_user(authorization)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    
+    db = websocket.app.state.db
+    try:
+        result = await db.fetch_one(text("""
+            SELECT user_id FROM realtime_call_sessions WHERE id = :session_id
+        """), {"session_id": session_id})
+    except Exception:
+        logger.exception("Session lookup failed for live call %s", session_id)
+        await websocket.close(code=1011)
+        return
+    if not result or result[0] != current_user["id"]:
+        await websocket.close(code=1008)
+        return
+    
+    await websocket.accept()
+    state = live_sessions.get_or_create(session_id, current_user["id"])
+    await websocket.send_json({"type": "ready", **state.snapshot()})
+    
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                data = json.loads(raw)
+                if isinstance(data, dict) and data.get("type") == "ping":
+                    await websocket.send_json({"type": "pong"})
+                    continue
+                segment = TranscriptionSegment.model_validate(data)
+            except ValidationError as e:
+                err = e.errors()[0]
+                field = ".".join(str(part) for part in err["loc"]) or "segment"
+                await websocket.send_json({"type": "error", "detail": f"Invalid segment ({field}: {err['msg']})"})
+                continue
+            except ValueError:
+                await websocket.send_json({"type": "error", "detail": "Invalid segment (not valid JSON)"})
+                continue
+            
+            matched, snapshot, alert = await analyze_segment(db, state, segment, alert_shown=True)
+            if alert:
+                await websocket.send_json({"type": "alert", **alert})
+            
+            await websocket.send_json({
+                "type": "analysis",
+                "segment": state.segments,
+                "newKeywords": matched["newKeywords"],
+                "scamProbability": snapshot["scamProbability"],
+                "threatLevel": snapshot["threatLevel"],
+                "detectedPatterns": snapshot["detectedPatterns"],
+                "speakers": snapshot["speakers"],
+            })
+            
+            await transcription_buffer.add(row={
+                "session_id": session_id,
+                "speaker": segment.speaker,
+                "text": segment.text,
+                "language": segment.language,
+                "confidence": segment.confidence,
+                "timestamp_offset": segment.timestampOffset,
+                "is_suspicious": matched["segmentSuspicious"],
+                "flagged_keywords": json.dumps(matched["flaggedKeywords"]),
+            })
+    except WebSocketDisconnect:
+        # State stays in the registry for the alerts endpoint / a reconnect
+        pass
+
+
 @router.get("/session/{session_id}/alerts")
 async def get_session_alerts(
     session_id: int,
@@ -147,14 +329,16 @@ async def get_session_alerts(
     current_user=Depends(get_current_user)
 ):
     """
-    Get alerts for a call session
+    Get alerts for a call session, plus the live rolling score
+    (matched patterns, decayed probability, per-speaker attribution)
+    while the session is held in this worker
     """
     try:
         # Verify session belongs to user
         verify_query = text("""
             SELECT user_id FROM realtime_call_sessions WHERE id = :session_id
         """)
-        result = db.execute(verify_query, {"session_id": session_id}).fetchone()
+        result = await db.fetch_one(verify_query, {"session_id": session_id})
         
         if not result or result[0] != current_user["id"]:
             raise HTTPException(status_code=404, detail="Session not found")
@@ -170,7 +354,7 @@ async def get_session_alerts(
             ORDER BY triggered_at DESC
         """)
         
-        results = db.execute(query, {"session_id": session_id}).fetchall()
+        results = await db.fetch_all(query, {"session_id": session_id})
         
         alerts = []
         for row in results:
@@ -186,7 +370,13 @@ async def get_session_alerts(
                 "triggeredAt": row[8].isoformat() if row[8] else None
             })
         
-        return {"ok": True, "alerts": alerts}
+        state = live_sessions.get(session_id)
+        
+        return {
+            "ok": True,
+            "alerts": alerts,
+            "liveState": state.snapshot() if state else None
+        }
         
     except HTTPException:
         raise
@@ -255,12 +445,13 @@ async def end_call_session(
         verify_query = text("""
             SELECT user_id FROM realtime_call_sessions WHERE id = :session_id
         """)
-        result = db.execute(verify_query, {"session_id": request.sessionId}).fetchone()
+        result = await db.fetch_one(verify_query, {"session_id": request.sessionId})
         
         if not result or result[0] != current_user["id"]:
             raise HTTPException(status_code=404, detail="Session not found")
         
         # End session
+        live_sessions.end(request.sessionId)
         query = text("""
             UPDATE realtime_call_sessions
             SET is_active = FALSE,
@@ -272,12 +463,6 @@ async def end_call_session(
             RETURNING id
         """)
         
-        db.execute(query, {
-            "session_id": request.sessionId,
-            "duration": request.callDurationSeconds,
-            "recording_url": request.recordingUrl
-        })
-        
         # Update statistics
         stats_query = text("""
             INSERT INTO call_analysis_statistics (user_id, total_calls_analyzed, last_analysis_at)
@@ -287,16 +472,20 @@ async def end_call_session(
                 last_analysis_at = CURRENT_TIMESTAMP,
                 updated_at = CURRENT_TIMESTAMP
         """)
-        db.execute(stats_query, {"user_id": current_user["id"]})
         
-        db.commit()
+        async with db.transaction() as tx:
+            await tx.execute(query, {
+                "session_id": request.sessionId,
+                "duration": request.callDurationSeconds,
+                "recording_url": request.recordingUrl
+            })
+            await tx.execute(stats_query, {"user_id": current_user["id"]})
         
         return {"ok": True, "message": "Call session ended"}
         
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -3,31 +3,134 @@ Mobile SMS Scam Detection API
 Real-time SMS scanning and threat detection
 """
 
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel, Field
-from typing import Optional, List
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from typing import Optional, List, Any, AsyncIterator, Dict
+from datetime import datetime, timezone
 from sqlalchemy import text
+import asyncio
+import json
+import os
 from .utils import get_current_user
 from .deps import get_db
+from .sms_scam_engine import sms_scam_engine
+from .write_behind import SequenceIdAllocator, WriteBehindBuffer
 
 router = APIRouter(prefix="/api/mobile/sms", tags=["Mobile SMS Detection"])
 
+MAX_BULK_SCAN = int(os.getenv("SMS_BULK_SCAN_MAX", "10000"))
+BULK_SCAN_CHUNK = 200  # messages scored between event-loop yields
+
+
+# Threat log + per-user counters are written behind the request (see write_behind.py);
+# the threat id is reserved up front so the response can still carry threatId. A row
+# the table rejects would leave that id dangling, so every value is validated or
+# clamped to its sms_threats column before it is queued.
+sms_threat_ids = SequenceIdAllocator("sms_threats")
+sms_log_buffer = WriteBehindBuffer(
+    "sms_threats",
+    insert_query=text("""
+        INSERT INTO sms_threats 
+        (id, user_id, sender, message_text, received_at, is_scam, scam_score, scam_type, indicators, action_taken)
+        VALUES (:id, :user_id, :sender, :message, :timestamp, :is_scam, :score, :type, CAST(:indicators AS JSONB), :action)
+    """),
+    upsert_query=text("""
+        INSERT INTO sms_statistics (user_id, total_sms_scanned, threats_detected, threats_blocked, last_scan_at, last_threat_at)
+        VALUES (:user_id, :scanned, :threats, :blocked, :now, CAST(:threat_time AS TIMESTAMP))
+        ON CONFLICT (user_id) DO UPDATE
+        SET total_sms_scanned = sms_statistics.total_sms_scanned + :scanned,
+            threats_detected = sms_statistics.threats_detected + :threats,
+            threats_blocked = sms_statistics.threats_blocked + :blocked,
+            last_scan_at = GREATEST(sms_statistics.last_scan_at, :now),
+            last_threat_at = GREATEST(sms_statistics.last_threat_at, CAST(:threat_time AS TIMESTAMP)),
+            updated_at = :now
+    """),
+)
+
 
 # Pydantic Models
 class SMSScanRequest(BaseModel):
-    sender: str = Field(..., description="SMS sender ID or phone number")
+    sender: str = Field(..., max_length=50, description="SMS sender ID or phone number")
     message: str = Field(..., description="SMS message content")
     timestamp: datetime = Field(default_factory=datetime.utcnow)
+    
+    @field_validator("sender", "message")
+    @classmethod
+    def no_nul_characters(cls, value: str) -> str:
+        # PostgreSQL text columns can't store NUL
+        if "\x00" in value:
+            raise ValueError("must not contain NUL characters")
+        return value
+    
+    @field_validator("timestamp")
+    @classmethod
+    def naive_utc(cls, value: datetime) -> datetime:
+        # sms_threats.received_at is TIMESTAMP (without time zone), in UTC
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+
+class SMSBulkScanItem(SMSScanRequest):
+    id: Optional[str] = Field(None, description="Client-side message id, echoed back in the verdict")
 
 
 class SMSReportRequest(BaseModel):
-    sender: str
+    sender: str = Field(..., max_length=50)
     message: str
-    scamType: str
+    scamType: str = Field(..., max_length=100)
     description: Optional[str] = None
 
 
+def sms_verdict(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Map an engine result to the is_scam / action / recommendation verdict"""
+    scam_score = result["scam_score"]
+    
+    # Determine action
+    if scam_score >= 80:
+        action = "block"
+    elif scam_score >= 60:
+        action = "quarantine"
+    else:
+        action = "allow"
+    
+    return {
+        "isScam": scam_score >= 60,
+        "scamScore": scam_score,
+        "scamType": result["scam_type"],
+        "indicators": result["indicators"],
+        "action": action,
+        "recommendation": "Block this sender" if action == "block" else "Be cautious" if action == "quarantine" else "Safe"
+    }
+
+
+async def queue_sms_result(threat_id: int, user_id, item: SMSScanRequest, verdict: Dict[str, Any]):
+    """Queue the threat log row (as sms_threats.id = threat_id) and the user's counter deltas"""
+    await sms_log_buffer.add(
+        row={
+            "id": threat_id,
+            "user_id": user_id,
+            "sender": item.sender,
+            "message": item.message,
+            "timestamp": item.timestamp,
+            "is_scam": verdict["isScam"],
+            "score": max(0, min(100, int(verdict["scamScore"]))),
+            "type": verdict["scamType"][:100] if verdict["scamType"] else None,
+            "indicators": json.dumps(verdict["indicators"]),
+            "action": verdict["action"]
+        },
+        key=user_id,
+        delta={
+            "scanned": 1,
+            "threats": 1 if verdict["isScam"] else 0,
+            "blocked": 1 if verdict["action"] == "block" else 0,
+            "now": datetime.utcnow(),
+            "threat_time": item.timestamp if verdict["isScam"] else None
+        }
+    )
+
+
 @router.post("/scan")
 async def scan_sms(
     request: SMSScanRequest,
@@ -39,90 +142,138 @@ async def scan_sms(
     Returns scam score and detected threats
     """
     try:
-        # Use the database function to calculate scam score
-        query = text("""
-            SELECT * FROM calculate_sms_scam_score(:message, :sender)
-        """)
+        # Score in-process (same output as calculate_sms_scam_score())
+        result = await sms_scam_engine.score(db, request.message, request.sender)
         
-        result = db.execute(query, {
-            "message": request.message,
-            "sender": request.sender
-        }).fetchone()
-        
-        scam_score = result[0] if result else 0
-        scam_type = result[1] if result else "unknown"
-        indicators = result[2] if result else []
-        
-        is_scam = scam_score >= 60
-        
-        # Determine action
-        if scam_score >= 80:
-            action = "block"
-        elif scam_score >= 60:
-            action = "quarantine"
-        else:
-            action = "allow"
-        
-        # Log the threat
-        log_query = text("""
-            INSERT INTO sms_threats 
-            (user_id, sender, message_text, received_at, is_scam, scam_score, scam_type, indicators, action_taken)
-            VALUES (:user_id, :sender, :message, :timestamp, :is_scam, :score, :type, :indicators, :action)
-            RETURNING id
-        """)
-        
-        threat_id = db.execute(log_query, {
-            "user_id": current_user["id"],
-            "sender": request.sender,
-            "message": request.message,
-            "timestamp": request.timestamp,
-            "is_scam": is_scam,
-            "score": scam_score,
-            "type": scam_type,
-            "indicators": indicators,
-            "action": action
-        }).fetchone()[0]
-        
-        # Update statistics
-        stats_query = text("""
-            INSERT INTO sms_statistics (user_id, total_sms_scanned, threats_detected, threats_blocked, last_scan_at, last_threat_at)
-            VALUES (:user_id, 1, :threats, :blocked, :now, :threat_time)
-            ON CONFLICT (user_id) DO UPDATE
-            SET total_sms_scanned = sms_statistics.total_sms_scanned + 1,
-                threats_detected = sms_statistics.threats_detected + :threats,
-                threats_blocked = sms_statistics.threats_blocked + :blocked,
-                last_scan_at = :now,
-                last_threat_at = CASE WHEN :is_scam THEN :threat_time ELSE sms_statistics.last_threat_at END,
-                updated_at = :now
-        """)
-        
-        db.execute(stats_query, {
-            "user_id": current_user["id"],
-            "threats": 1 if is_scam else 0,
-            "blocked": 1 if action == "block" else 0,
-            "now": datetime.utcnow(),
-            "threat_time": request.timestamp if is_scam else None,
-            "is_scam": is_scam
-        })
-        
-        db.commit()
+        verdict = sms_verdict(result)
+        threat_id = await sms_threat_ids.next_id(db)
+        await queue_sms_result(threat_id, current_user["id"], request, verdict)
         
         return {
             "ok": True,
             "threatId": threat_id,
-            "isScam": is_scam,
-            "scamScore": scam_score,
-            "scamType": scam_type,
-            "indicators": indicators,
-            "action": action,
-            "recommendation": "Block this sender" if action == "block" else "Be cautious" if action == "quarantine" else "Safe"
+            **verdict
         }
         
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"SMS scan failed: {str(e)}")
 
 
+async def _iter_bulk_items(request: Request) -> AsyncIterator[Any]:
+    """
+    Yield raw message objects from either an NDJSON upload (one message per
+    line, parsed as it arrives) or a JSON array / {"messages": [...]} body.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+        return
+    
+    try:
+        body = json.loads(await request.body() or b"null")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if isinstance(body, dict):
+        body = body.get("messages")
+    if not isinstance(body, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of messages or {\"messages\": [...]}")
+    if len(body) > MAX_BULK_SCAN:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_SCAN} messages per bulk scan")
+    for item in body:
+        yield item
+
+
+@router.post("/scan-bulk")
+async def scan_sms_bulk(
+    request: Request,
+    db=Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """
+    Scan an inbox's worth of SMS messages in one request.
+    
+    Body: JSON array of {sender, message, timestamp?, id?}, {"messages": [...]},
+    or NDJSON (Content-Type: application/x-ndjson) with one message per line.
+    Streams one NDJSON verdict per message as it is scored, then a summary line.
+    Results are persisted in bulk through the write-behind buffer.
+    """
+    try:
+        await sms_scam_engine.ensure_fresh(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"SMS scan failed: {str(e)}")
+    compiled = sms_scam_engine.compiled
+    user_id = current_user["id"]
+    items = _iter_bulk_items(request)
+    
+    # Pull the first item before streaming so malformed bodies still get a 4xx
+    try:
+        first = await items.__anext__()
+    except StopAsyncIteration:
+        first = None
+    
+    async def all_items():
+        if first is None:
+            return
+        yield first
+        async for raw in items:
+            yield raw
+    
+    async def generate():
+        scanned = scams = blocked = errors = 0
+        index = 0
+        async for raw in all_items():
+            if index >= MAX_BULK_SCAN:
+                yield json.dumps({"index": index, "error": f"Limit of {MAX_BULK_SCAN} messages reached; rest ignored"}) + "\n"
+                errors += 1
+                break
+            try:
+                data = json.loads(raw) if isinstance(raw, (bytes, str)) else raw
+                item = SMSBulkScanItem.model_validate(data)
+            except ValidationError as e:
+                err = e.errors()[0]
+                field = ".".join(str(part) for part in err["loc"]) or "message"
+                problem = f"{field}: {err['msg']}"
+            except ValueError:
+                problem = "not valid JSON"
+            else:
+                problem = None
+            if problem:
+                errors += 1
+                yield json.dumps({"index": index, "error": f"Invalid message ({problem})"}) + "\n"
+                index += 1
+                continue
+            
+            verdict = sms_verdict(compiled.score(item.message, item.sender))
+            threat_id = await sms_threat_ids.next_id(db)
+            await queue_sms_result(threat_id, user_id, item, verdict)
+            scanned += 1
+            scams += verdict["isScam"]
+            blocked += verdict["action"] == "block"
+            yield json.dumps({"index": index, "id": item.id, "threatId": threat_id, **verdict}) + "\n"
+            
+            index += 1
+            if index % BULK_SCAN_CHUNK == 0:
+                await asyncio.sleep(0)
+        
+        yield json.dumps({
+            "summary": True,
+            "scanned": scanned,
+            "threatsDetected": scams,
+            "threatsBlocked": blocked,
+            "errors": errors
+        }) + "\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
 @router.get("/threats")
 async def get_sms_threats(
     limit: int = 50,
@@ -4,20 +4,57 @@ ScamAdviser-like functionality for URL and email verification
 """
 
 from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, field_validator
 from typing import Optional
 from datetime import datetime
 from urllib.parse import urlparse
 from sqlalchemy import text
 from .utils import get_current_user
 from .deps import get_db
+from .write_behind import SequenceIdAllocator, WriteBehindBuffer
+from .url_reputation_engine import url_reputation_engine
+import json
 import re
 
 router = APIRouter(prefix="/api/mobile/web", tags=["Mobile URL Checker"])
 
 
+# Check log + per-user counters are written behind the request (see write_behind.py);
+# the check id is reserved up front so the response can still carry checkId. A row
+# the table rejects would leave that id dangling, so every value is validated or
+# clamped to its url_check_results column before it is queued.
+url_check_ids = SequenceIdAllocator("url_check_results")
+url_check_buffer = WriteBehindBuffer(
+    "url_check_results",
+    insert_query=text("""
+        INSERT INTO url_check_results 
+        (id, user_id, url, domain, trust_score, is_phishing, is_malware, is_scam, 
+         risk_level, risk_factors, ssl_valid)
+        VALUES (:id, :user_id, :url, :domain, :trust_score, :is_phishing, :is_malware, 
+                :is_scam, :risk_level, CAST(:risk_factors AS JSONB), :ssl_valid)
+    """),
+    upsert_query=text("""
+        INSERT INTO url_check_statistics (user_id, urls_checked, phishing_detected, last_check_at)
+        VALUES (:user_id, :checked, :phishing, :now)
+        ON CONFLICT (user_id) DO UPDATE
+        SET urls_checked = url_check_statistics.urls_checked + :checked,
+            phishing_detected = url_check_statistics.phishing_detected + :phishing,
+            last_check_at = GREATEST(url_check_statistics.last_check_at, :now),
+            updated_at = :now
+    """),
+)
+
+
 class URLCheckRequest(BaseModel):
-    url: str = Field(..., description="URL to check")
+    url: str = Field(..., max_length=2048, description="URL to check")
+    
+    @field_validator("url")
+    @classmethod
+    def no_nul_characters(cls, value: str) -> str:
+        # PostgreSQL text columns can't store NUL
+        if "\x00" in value:
+            raise ValueError("must not contain NUL characters")
+        return value
 
 
 class EmailCheckRequest(BaseModel):
@@ -50,20 +87,15 @@ async def check_url(
             domain = parsed.netloc or parsed.path.split('/')[0]
         except:
             raise HTTPException(status_code=400, detail="Invalid URL format")
+        if len(domain) > 255:  # url_check_results.domain is VARCHAR(255)
+            raise HTTPException(status_code=400, detail="Invalid URL format")
         
-        # Calculate trust score using database function
-        query = text("""
-            SELECT * FROM calculate_url_trust_score(:url, :domain)
-        """)
-        
-        result = db.execute(query, {
-            "url": url,
-            "domain": domain
-        }).fetchone()
+        # Score in-process (same output as calculate_url_trust_score())
+        result = await url_reputation_engine.score(db, url, domain)
         
-        trust_score = result[0] if result else 50
-        risk_level = result[1] if result else "unknown"
-        risk_factors = result[2] if result else []
+        trust_score = result["trust_score"]
+        risk_level = result["risk_level"]
+        risk_factors = result["risk_factors"]
         
         # Determine if phishing/malware/scam
         is_phishing = trust_score < 30
@@ -73,47 +105,29 @@ async def check_url(
         # Check SSL (simplified - in production would use actual SSL check)
         ssl_valid = url.startswith('https://')
         
-        # Save check result
-        save_query = text("""
-            INSERT INTO url_check_results 
-            (user_id, url, domain, trust_score, is_phishing, is_malware, is_scam, 
-             risk_level, risk_factors, ssl_valid)
-            VALUES (:user_id, :url, :domain, :trust_score, :is_phishing, :is_malware, 
-                    :is_scam, :risk_level, :risk_factors, :ssl_valid)
-            RETURNING id
-        """)
-        
-        check_id = db.execute(save_query, {
-            "user_id": current_user["id"],
-            "url": url,
-            "domain": domain,
-            "trust_score": trust_score,
-            "is_phishing": is_phishing,
-            "is_malware": is_malware,
-            "is_scam": is_scam,
-            "risk_level": risk_level,
-            "risk_factors": risk_factors,
-            "ssl_valid": ssl_valid
-        }).fetchone()[0]
-        
-        # Update statistics
-        stats_query = text("""
-            INSERT INTO url_check_statistics (user_id, urls_checked, phishing_detected, last_check_at)
-            VALUES (:user_id, 1, :phishing, :now)
-            ON CONFLICT (user_id) DO UPDATE
-            SET urls_checked = url_check_statistics.urls_checked + 1,
-                phishing_detected = url_check_statistics.phishing_detected + :phishing,
-                last_check_at = :now,
-                updated_at = :now
-        """)
-        
-        db.execute(stats_query, {
-            "user_id": current_user["id"],
-            "phishing": 1 if is_phishing else 0,
-            "now": datetime.utcnow()
-        })
-        
-        db.commit()
+        # Queue the check result and this user's counter deltas
+        check_id = await url_check_ids.next_id(db)
+        await url_check_buffer.add(
+            row={
+                "id": check_id,
+                "user_id": current_user["id"],
+                "url": url,
+                "domain": domain,
+                "trust_score": max(0, min(100, int(trust_score))),
+                "is_phishing": is_phishing,
+                "is_malware": is_malware,
+                "is_scam": is_scam,
+                "risk_level": risk_level[:20],
+                "risk_factors": json.dumps(risk_factors),
+                "ssl_valid": ssl_valid
+            },
+            key=current_user["id"],
+            delta={
+                "checked": 1,
+                "phishing": 1 if is_phishing else 0,
+                "now": datetime.utcnow()
+            }
+        )
         
         # Recommendation
         if trust_score >= 80:
@@ -143,7 +157,6 @@ async def check_url(
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=f"URL check failed: {str(e)}")
 
 
@@ -266,15 +279,13 @@ async def report_phishing(
             RETURNING id
         """)
         
-        result = db.execute(query, {
+        phishing_id = await db.fetch_val(query, {
             "domain": domain,
             "user_id": current_user["id"],
             "phishing_type": request.phishingType,
             "target_brand": request.targetBrand
         })
-        
-        phishing_id = result.fetchone()[0]
-        db.commit()
+        url_reputation_engine.add_phishing_domain(domain)
         
         return {
             "ok": True,
@@ -283,7 +294,6 @@ async def report_phishing(
         }
         
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -420,3 +430,9 @@ async def get_known_phishing(
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """URL verdict cache hit/miss counters for this worker"""
+    return {"ok": True, "cache": url_reputation_engine.cache.stats()}
@@ -1,20 +1,15 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
-import psycopg
-import os
 from datetime import datetime, timedelta
 import random
+from .database import acquire_db_connection
 
 router = APIRouter(prefix="/api/public", tags=["Public Content"])
 
 # Second router without /api prefix for frontend compatibility
 router_public = APIRouter(prefix="/public", tags=["Public Content - Legacy"])
 
-def get_db_connection():
-    """Get database connection"""
-    return psycopg.connect(os.getenv("DATABASE_URL"))
-
 class YouTubeVideo(BaseModel):
     id: int
     title: str
@@ -42,8 +37,9 @@ async def get_current_video():
     Get current YouTube video for homepage
     Rotates every 30 minutes based on server time
     """
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cursor = conn.cursor()
         
         # Get all active videos
@@ -80,7 +76,6 @@ async def get_current_video():
         conn.commit()
         
         cursor.close()
-        conn.close()
         
         return {
             "success": True,
@@ -106,12 +101,16 @@ async def get_current_video():
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching video: {str(e)}")
+    finally:
+        if conn is not None:
+            conn.close()
 
 @router.get("/youtube/all")
 async def get_all_videos():
     """Get all active YouTube videos"""
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -124,7 +123,6 @@ async def get_all_videos():
         
         videos = cursor.fetchall()
         cursor.close()
-        conn.close()
         
         return {
             "success": True,
@@ -146,6 +144,9 @@ async def get_all_videos():
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching videos: {str(e)}")
+    finally:
+        if conn is not None:
+            conn.close()
 
 @router.get("/scam-alerts/live")
 async def get_live_scam_alerts():
@@ -154,8 +155,9 @@ async def get_live_scam_alerts():
     Updates every 12 hours from database
     Returns latest 10 alerts
     """
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -169,7 +171,6 @@ async def get_live_scam_alerts():
         
         alerts = cursor.fetchall()
         cursor.close()
-        conn.close()
         
         # Calculate time since last update
         if alerts:
@@ -206,6 +207,9 @@ async def get_live_scam_alerts():
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching scam alerts: {str(e)}")
+    finally:
+        if conn is not None:
+            conn.close()
 
 @router.post("/scam-alerts/add")
 async def add_scam_alert(
@@ -218,8 +222,9 @@ async def add_scam_alert(
     location: Optional[str] = None
 ):
     """Add a new scam alert (admin only in production)"""
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cursor = conn.cursor()
         
         cursor.execute("""
@@ -232,7 +237,6 @@ async def add_scam_alert(
         alert_id = cursor.fetchone()[0]
         conn.commit()
         cursor.close()
-        conn.close()
         
         return {
             "success": True,
@@ -242,6 +246,9 @@ async def add_scam_alert(
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error adding scam alert: {str(e)}")
+    finally:
+        if conn is not None:
+            conn.close()
 
 @router.post("/youtube/add")
 async def add_youtube_video(
@@ -252,8 +259,9 @@ async def add_youtube_video(
     rotation_priority: int = 1
 ):
     """Add a new YouTube video (admin only in production)"""
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cursor = conn.cursor()
         
         # Generate thumbnail URL
@@ -269,7 +277,6 @@ async def add_youtube_video(
         video_id_db = cursor.fetchone()[0]
         conn.commit()
         cursor.close()
-        conn.close()
         
         return {
             "success": True,
@@ -279,6 +286,9 @@ async def add_youtube_video(
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error adding video: {str(e)}")
+    finally:
+        if conn is not None:
+            conn.close()
 
 def calculate_time_ago(reported_at: datetime) -> str:
     """Calculate human-readable time ago"""
@@ -319,8 +329,9 @@ async def get_scam_alerts_legacy():
 @router.get("/stats")
 async def get_public_stats():
     """Get public statistics for homepage"""
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = await acquire_db_connection()
         cursor = conn.cursor()
         
         # Get total video views
@@ -336,7 +347,6 @@ async def get_public_stats():
         total_users = cursor.fetchone()[0]
         
         cursor.close()
-        conn.close()
         
         return {
             "success": True,
@@ -360,4 +370,7 @@ async def get_public_stats():
                 "active_alerts": 0
             }
         }
+    finally:
+        if conn is not None:
+            conn.close()
 
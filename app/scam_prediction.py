@@ -2,18 +2,109 @@
 """
 Scam Prediction Engine - ML-based Scam Risk Assessment
 Predicts scam likelihood based on multiple factors
+
+Records are scored in batches: every record becomes one row of a feature
+matrix (phone / message / call / amount indicators) and the weighting is
+done with NumPy for the whole batch at once. /predict is a batch of one,
+/predict-batch and rescore_call_history() score thousands of records per
+pass and insert the results in bulk.
 """
 
+import asyncio
+import json
+import logging
+import os
 from fastapi import APIRouter, Request, HTTPException, Depends
 from sqlalchemy import text
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Any, Dict, List, Optional, Sequence
 from pydantic import BaseModel
+import numpy as np
 from .utils import get_current_user
+from . import keyword_rules
 import re
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/scam-prediction", tags=["Scam Prediction"])
 
+MAX_PREDICTION_BATCH = int(os.getenv("SCAM_PREDICTION_BATCH_MAX", "5000"))
+RESCORE_CHUNK_SIZE = int(os.getenv("SCAM_RESCORE_CHUNK_SIZE", "2000"))
+
+PHONE_CLEAN_RE = re.compile(r'[^0-9+]')
+URL_RE = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+VOIP_SUFFIXES = ('0000', '1111', '9999')
+COMMON_SCAM_AMOUNTS = np.array([999, 1999, 4999, 9999, 49999, 99999], dtype=np.float64)
+
+# Message keyword groups, registered with the shared rule engine and
+# matched as substrings of the message
+MESSAGE_KEYWORDS = {
+    "urgency": ('urgent', 'immediately', 'within 24 hours', 'expire', 'last chance', 'act now'),
+    "financial": ('bank account', 'credit card', 'otp', 'pin', 'cvv', 'password', 'transfer money'),
+    "authority": ('police', 'cbi', 'income tax', 'customs', 'rbi', 'government'),
+    "prize": ('won', 'prize', 'lottery', 'congratulations', 'claim'),
+    "investment": ('guaranteed returns', 'risk-free', 'double your money', 'investment opportunity'),
+    "short_url": ('bit.ly', 'tinyurl', 'goo.gl', 't.co', 'ow.ly'),
+}
+_KEYWORD_SETS = [
+    keyword_rules.register(f"prediction.{group}", keywords)
+    for group, keywords in MESSAGE_KEYWORDS.items()
+]
+_GROUP_INDEX = {group: g for g, group in enumerate(MESSAGE_KEYWORDS)}
+
+# (feature, component, weight, factor text); component order matches COMPONENTS
+FEATURES = (
+    ("international", 0, 0.3, "International number"),
+    ("repetitive", 0, 0.2, "Repetitive number pattern"),
+    ("voip", 0, 0.25, "Possible VoIP number"),
+    ("urgency", 1, 0.15, "Urgency tactics ({count} keywords)"),
+    ("financial", 1, 0.3, "Multiple financial keywords"),
+    ("authority", 1, 0.35, "Authority impersonation"),
+    ("prize", 1, 0.3, "Prize/lottery language"),
+    ("investment", 1, 0.4, "Investment fraud indicators"),
+    ("url", 1, 0.2, "Contains URL"),
+    ("short_url", 1, 0.3, "Shortened URL detected"),
+    ("short_call", 2, 0.2, "Very short call duration"),
+    ("long_call", 2, 0.15, "Unusually long call"),
+    ("late_call", 2, 0.2, "Late night/early morning call"),
+    ("round_amount", 3, 0.15, "Round number amount"),
+    ("large_amount", 3, 0.25, "Large amount mentioned"),
+    ("common_amount", 3, 0.2, "Common scam amount pattern"),
+)
+COMPONENTS = ("phone_risk", "message_risk", "call_pattern_risk", "amount_risk")
+COMPONENT_WEIGHTS = np.array([0.2, 0.4, 0.2, 0.2])
+_COL = {name: i for i, (name, _, _, _) in enumerate(FEATURES)}
+
+# (scam type, feature) - later entries win, as in the old if-chain
+SCAM_TYPE_FEATURES = (
+    ("digital_arrest", "authority"),
+    ("lottery_scam", "prize"),
+    ("investment_fraud", "investment"),
+)
+
+RISK_THRESHOLDS = np.array([0.3, 0.5, 0.75])
+RISK_LEVELS = ("low", "medium", "high", "critical")
+RECOMMENDATIONS = {
+    "critical": "🚨 CRITICAL RISK - Block immediately and report to authorities",
+    "high": "⚠️ HIGH RISK - Do not share any information or make payments",
+    "medium": "⚡ MODERATE RISK - Proceed with extreme caution",
+    "low": "✓ LOW RISK - Still verify before sharing sensitive information",
+}
+
+SAVE_PREDICTION_SQL = """
+    INSERT INTO scam_predictions (
+        user_id, caller_phone, caller_email, message_content,
+        risk_score, risk_level, scam_type, confidence,
+        factors, recommendation, created_at
+    ) VALUES (
+        :uid, :phone, :email, :msg,
+        :risk, :level, :type, :conf,
+        CAST(:factors AS jsonb), :rec, NOW()
+    )
+"""
+SAVE_PREDICTION_QUERY = text(SAVE_PREDICTION_SQL)
+SAVE_PREDICTION_RETURNING_QUERY = text(SAVE_PREDICTION_SQL + " RETURNING id")
+
 
 class PredictionRequest(BaseModel):
     caller_phone: Optional[str] = None
@@ -26,6 +117,15 @@ class PredictionRequest(BaseModel):
     caller_location: Optional[str] = None
 
 
+class PredictionBatchItem(PredictionRequest):
+    id: Optional[str] = None  # client-side record id, echoed back
+
+
+class PredictionBatchRequest(BaseModel):
+    records: List[PredictionBatchItem]
+    save: bool = True
+
+
 class PredictionResult(BaseModel):
     risk_score: float  # 0.0 to 1.0
     risk_level: str  # low, medium, high, critical
@@ -35,164 +135,236 @@ class PredictionResult(BaseModel):
     recommendation: str
 
 
-def analyze_phone_number(phone: str) -> dict:
+def _field(record: Any, name: str):
+    if isinstance(record, dict):
+        return record.get(name)
+    return getattr(record, name, None)
+
+
+def _is_late_night(time_of_call: Optional[str]) -> bool:
+    if not time_of_call:
+        return False
+    try:
+        hour = int(time_of_call.split(':')[0])
+    except (ValueError, AttributeError):
+        return False
+    return hour >= 22 or hour <= 6
+
+
+def extract_features(records: Sequence[Any]) -> np.ndarray:
     """
-    Analyze phone number for scam indicators
-    Returns: {risk_score, factors}
+    Feature matrix for a batch: one row per record, one column per FEATURES
+    entry (1.0 / 0.0 flags, urgency holds the keyword count).
+    Records are PredictionRequest-like objects or dicts with the same fields.
     """
-    risk_score = 0.0
-    factors = []
-    
-    if not phone:
-        return {"risk_score": 0.0, "factors": []}
-    
-    # Remove spaces and special characters
-    clean_phone = re.sub(r'[^0-9+]', '', phone)
-    
-    # International number (higher risk)
-    if clean_phone.startswith('+') and not clean_phone.startswith('+91'):
-        risk_score += 0.3
-        factors.append("International number")
-    
-    # Suspicious patterns
-    if len(set(clean_phone[-4:])) == 1:  # Last 4 digits same
-        risk_score += 0.2
-        factors.append("Repetitive number pattern")
-    
-    # VoIP/Virtual numbers (often used by scammers)
-    voip_prefixes = ['0000', '1111', '9999']
-    if any(clean_phone.endswith(prefix) for prefix in voip_prefixes):
-        risk_score += 0.25
-        factors.append("Possible VoIP number")
-    
-    return {"risk_score": min(risk_score, 1.0), "factors": factors}
+    n = len(records)
+    phone_flags = []
+    group_counts = []
+    has_url = []
+    late_night = []
+    durations = []
+    amounts = []
+    no_keywords = [0] * len(_KEYWORD_SETS)
 
+    for record in records:
+        phone = _field(record, "caller_phone")
+        if phone:
+            clean_phone = PHONE_CLEAN_RE.sub('', phone)
+            phone_flags.append((
+                clean_phone.startswith('+') and not clean_phone.startswith('+91'),
+                len(set(clean_phone[-4:])) == 1,
+                clean_phone.endswith(VOIP_SUFFIXES),
+            ))
+        else:
+            phone_flags.append((False, False, False))
+
+        content = _field(record, "message_content")
+        if content:
+            hits = keyword_rules.scan(content)
+            group_counts.append([hits.count(name) for name in _KEYWORD_SETS])
+            has_url.append(URL_RE.search(content) is not None)
+        else:
+            group_counts.append(no_keywords)
+            has_url.append(False)
+
+        durations.append(_field(record, "call_duration") or 0)
+        late_night.append(_is_late_night(_field(record, "time_of_call")))
+        amounts.append(_field(record, "amount_mentioned") or 0)
+
+    features = np.zeros((n, len(FEATURES)))
+    features[:, _COL["international"]:_COL["voip"] + 1] = np.array(phone_flags, dtype=bool).reshape(n, 3)
+
+    groups = np.array(group_counts, dtype=np.float64).reshape(n, len(_KEYWORD_SETS))
+    features[:, _COL["urgency"]] = groups[:, _GROUP_INDEX["urgency"]]
+    features[:, _COL["financial"]] = groups[:, _GROUP_INDEX["financial"]] >= 2
+    for name in ("authority", "prize", "investment", "short_url"):
+        features[:, _COL[name]] = groups[:, _GROUP_INDEX[name]] > 0
+    features[:, _COL["url"]] = has_url
+
+    durations = np.array(durations, dtype=np.float64)
+    features[:, _COL["short_call"]] = (durations != 0) & (durations < 10)
+    features[:, _COL["long_call"]] = durations > 600
+    features[:, _COL["late_call"]] = late_night
 
-def analyze_message_content(content: str) -> dict:
+    amounts = np.array(amounts, dtype=np.float64)
+    features[:, _COL["round_amount"]] = (np.mod(amounts, 1000) == 0) & (amounts >= 10000)
+    features[:, _COL["large_amount"]] = amounts >= 100000
+    features[:, _COL["common_amount"]] = (
+        np.abs(amounts[:, None] - COMMON_SCAM_AMOUNTS[None, :]) < 10
+    ).any(axis=1)
+    return features
+
+
+def predict_batch(records: Sequence[Any]) -> List[Dict[str, Any]]:
     """
-    Analyze message content for scam indicators
-    Returns: {risk_score, scam_type, factors}
+    Score a batch of records; returns one result per record, in order,
+    shaped like the /predict response (without prediction_id).
     """
-    if not content:
-        return {"risk_score": 0.0, "scam_type": None, "factors": []}
-    
-    content_lower = content.lower()
-    risk_score = 0.0
-    factors = []
-    scam_type = None
-    
-    # Urgency keywords
-    urgency_keywords = ['urgent', 'immediately', 'within 24 hours', 'expire', 'last chance', 'act now']
-    urgency_count = sum(1 for kw in urgency_keywords if kw in content_lower)
-    if urgency_count > 0:
-        risk_score += urgency_count * 0.15
-        factors.append(f"Urgency tactics ({urgency_count} keywords)")
-    
-    # Financial keywords
-    financial_keywords = ['bank account', 'credit card', 'otp', 'pin', 'cvv', 'password', 'transfer money']
-    financial_count = sum(1 for kw in financial_keywords if kw in content_lower)
-    if financial_count >= 2:
-        risk_score += 0.3
-        factors.append("Multiple financial keywords")
-    
-    # Authority impersonation
-    authority_keywords = ['police', 'cbi', 'income tax', 'customs', 'rbi', 'government']
-    if any(kw in content_lower for kw in authority_keywords):
-        risk_score += 0.35
-        factors.append("Authority impersonation")
-        scam_type = "digital_arrest"
-    
-    # Prize/Lottery scam
-    prize_keywords = ['won', 'prize', 'lottery', 'congratulations', 'claim']
-    if any(kw in content_lower for kw in prize_keywords):
-        risk_score += 0.3
-        factors.append("Prize/lottery language")
-        scam_type = "lottery_scam"
-    
-    # Investment scam
-    investment_keywords = ['guaranteed returns', 'risk-free', 'double your money', 'investment opportunity']
-    if any(kw in content_lower for kw in investment_keywords):
-        risk_score += 0.4
-        factors.append("Investment fraud indicators")
-        scam_type = "investment_fraud"
-    
-    # Suspicious links
-    if re.search(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', content):
-        risk_score += 0.2
-        factors.append("Contains URL")
-    
-    # Shortened URLs (high risk)
-    short_url_domains = ['bit.ly', 'tinyurl', 'goo.gl', 't.co', 'ow.ly']
-    if any(domain in content_lower for domain in short_url_domains):
-        risk_score += 0.3
-        factors.append("Shortened URL detected")
-    
+    if not records:
+        return []
+    features = extract_features(records)
+
+    # Per-component scores capped at 1.0, then the weighted total. Sums run
+    # column by column in FEATURES order (not a matmul) so the floats match
+    # the old sequential additions bit for bit at the level thresholds.
+    component_risk = np.zeros((len(records), len(COMPONENTS)))
+    for j, (_, component, weight, _) in enumerate(FEATURES):
+        component_risk[:, component] += features[:, j] * weight
+    np.minimum(component_risk, 1.0, out=component_risk)
+    total_risk = component_risk[:, 0] * COMPONENT_WEIGHTS[0]
+    for c in range(1, len(COMPONENTS)):
+        total_risk = total_risk + component_risk[:, c] * COMPONENT_WEIGHTS[c]
+    level_index = np.searchsorted(RISK_THRESHOLDS, total_risk, side="right")
+
+    active = features > 0
+    factor_count = active.sum(axis=1)
+    confidence = np.minimum(0.95, 0.5 + factor_count * 0.1)
+
+    scam_types = np.full(len(records), None, dtype=object)
+    for scam_type, feature in SCAM_TYPE_FEATURES:
+        scam_types[active[:, _COL[feature]]] = scam_type
+
+    # Scores are multiples of 0.01, so NumPy rounding agrees with round()
+    rows = zip(
+        np.round(total_risk, 3).tolist(),
+        level_index.tolist(),
+        scam_types.tolist(),
+        np.round(confidence, 2).tolist(),
+        factor_count.tolist(),
+        np.round(component_risk, 2).tolist(),
+        active.tolist(),
+        features[:, _COL["urgency"]].tolist(),
+    )
+    urgency_col = _COL["urgency"]
+    labels = [label for _, _, _, label in FEATURES]
+    results = []
+    for risk, level, scam_type, conf, count, components, flags, urgency in rows:
+        factors = [
+            labels[j].format(count=int(urgency)) if j == urgency_col else labels[j]
+            for j, flag in enumerate(flags) if flag
+        ]
+        risk_level = RISK_LEVELS[level]
+        results.append({
+            "risk_score": risk,
+            "risk_level": risk_level,
+            "scam_type": scam_type,
+            "confidence": conf,
+            "factors_detected": factors,
+            "factor_count": count,
+            "recommendation": RECOMMENDATIONS[risk_level],
+            "breakdown": dict(zip(COMPONENTS, components)),
+        })
+    return results
+
+
+def prediction_row(user_id: int, record: Any, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Bind parameters for SAVE_PREDICTION_QUERY"""
     return {
-        "risk_score": min(risk_score, 1.0),
-        "scam_type": scam_type,
-        "factors": factors
+        "uid": user_id,
+        "phone": _field(record, "caller_phone"),
+        "email": _field(record, "caller_email"),
+        "msg": _field(record, "message_content"),
+        "risk": result["risk_score"],
+        "level": result["risk_level"],
+        "type": result["scam_type"],
+        "conf": result["confidence"],
+        "factors": json.dumps(result["factors_detected"]),
+        "rec": result["recommendation"],
     }
 
 
-def analyze_call_pattern(duration: int, time_of_call: str) -> dict:
-    """
-    Analyze call patterns for scam indicators
-    Returns: {risk_score, factors}
-    """
-    risk_score = 0.0
-    factors = []
-    
-    # Very short calls (likely robocalls)
-    if duration and duration < 10:
-        risk_score += 0.2
-        factors.append("Very short call duration")
-    
-    # Very long calls (scammers keep victims engaged)
-    if duration and duration > 600:  # 10 minutes
-        risk_score += 0.15
-        factors.append("Unusually long call")
-    
-    # Late night calls (suspicious)
-    if time_of_call:
-        try:
-            hour = int(time_of_call.split(':')[0])
-            if hour >= 22 or hour <= 6:
-                risk_score += 0.2
-                factors.append("Late night/early morning call")
-        except:
-            pass
-    
-    return {"risk_score": min(risk_score, 1.0), "factors": factors}
+async def save_predictions(db, user_id: int, records: Sequence[Any], results: List[Dict[str, Any]]) -> int:
+    """Bulk-insert a scored batch into scam_predictions in one transaction"""
+    rows = [prediction_row(user_id, record, result) for record, result in zip(records, results)]
+    if rows:
+        async with db.transaction() as tx:
+            await tx.executemany(SAVE_PREDICTION_QUERY, rows)
+    return len(rows)
 
 
-def analyze_amount(amount: float) -> dict:
+def rescore_call_history(lookback_hours: Optional[int] = 24, chunk_size: int = RESCORE_CHUNK_SIZE) -> int:
     """
-    Analyze mentioned amount for scam indicators
-    Returns: {risk_score, factors}
+    Score call_history rows from the last lookback_hours (None = all rows)
+    and bulk-insert the predictions. Rows are streamed with a server-side
+    cursor and scored chunk_size at a time. Returns the number scored.
     """
-    risk_score = 0.0
-    factors = []
-    
-    if not amount:
-        return {"risk_score": 0.0, "factors": []}
-    
-    # Suspiciously round numbers
-    if amount % 1000 == 0 and amount >= 10000:
-        risk_score += 0.15
-        factors.append("Round number amount")
-    
-    # Very large amounts
-    if amount >= 100000:
-        risk_score += 0.25
-        factors.append("Large amount mentioned")
-    
-    # Common scam amounts
-    common_scam_amounts = [999, 1999, 4999, 9999, 49999, 99999]
-    if any(abs(amount - scam_amt) < 10 for scam_amt in common_scam_amounts):
-        risk_score += 0.2
-        factors.append("Common scam amount pattern")
-    
-    return {"risk_score": min(risk_score, 1.0), "factors": factors}
+    from psycopg2.extras import execute_values
+    from .database import get_db_connection
+
+    insert_sql = """
+        INSERT INTO scam_predictions (
+            user_id, caller_phone, caller_email, message_content,
+            risk_score, risk_level, scam_type, confidence,
+            factors, recommendation, created_at
+        ) VALUES %s
+    """
+    template = "(%(uid)s, %(phone)s, %(email)s, %(msg)s, %(risk)s, %(level)s, %(type)s, %(conf)s, %(factors)s::jsonb, %(rec)s, NOW())"
+
+    conn = get_db_connection()
+    scored = 0
+    try:
+        read_cur = conn.cursor(name="scam_rescore")
+        read_cur.itersize = chunk_size
+        if lookback_hours is None:
+            read_cur.execute("SELECT user_id, phone_number, duration, timestamp FROM call_history ORDER BY id")
+        else:
+            read_cur.execute(
+                """
+                SELECT user_id, phone_number, duration, timestamp FROM call_history
+                WHERE timestamp >= NOW() - make_interval(hours => %s)
+                ORDER BY id
+                """,
+                (lookback_hours,)
+            )
+        write_cur = conn.cursor()
+        while True:
+            rows = read_cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            records = [
+                {
+                    "caller_phone": phone,
+                    "call_duration": duration,
+                    "time_of_call": called_at.strftime("%H:%M") if called_at else None,
+                }
+                for _, phone, duration, called_at in rows
+            ]
+            results = predict_batch(records)
+            execute_values(
+                write_cur, insert_sql,
+                [prediction_row(row[0], record, result) for row, record, result in zip(rows, records, results)],
+                template=template, page_size=chunk_size,
+            )
+            scored += len(rows)
+        read_cur.close()
+        write_cur.close()
+        conn.commit()
+        return scored
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
 
 @router.post("/predict")
@@ -209,97 +381,62 @@ async def predict_scam(
         user_id = current_user["id"]
         db = request.app.state.db
         
-        # Analyze each factor
-        phone_analysis = analyze_phone_number(payload.caller_phone)
-        message_analysis = analyze_message_content(payload.message_content)
-        call_analysis = analyze_call_pattern(payload.call_duration, payload.time_of_call)
-        amount_analysis = analyze_amount(payload.amount_mentioned)
-        
-        # Combine risk scores (weighted average)
-        total_risk = (
-            phone_analysis["risk_score"] * 0.2 +
-            message_analysis["risk_score"] * 0.4 +
-            call_analysis["risk_score"] * 0.2 +
-            amount_analysis["risk_score"] * 0.2
-        )
+        result = predict_batch([payload])[0]
         
-        # Combine factors
-        all_factors = (
-            phone_analysis["factors"] +
-            message_analysis["factors"] +
-            call_analysis["factors"] +
-            amount_analysis["factors"]
+        # Save prediction to database
+        prediction_id = await db.fetch_val(
+            SAVE_PREDICTION_RETURNING_QUERY,
+            prediction_row(user_id, payload, result)
         )
         
-        # Determine risk level
-        if total_risk >= 0.75:
-            risk_level = "critical"
-            recommendation = "🚨 CRITICAL RISK - Block immediately and report to authorities"
-        elif total_risk >= 0.5:
-            risk_level = "high"
-            recommendation = "⚠️ HIGH RISK - Do not share any information or make payments"
-        elif total_risk >= 0.3:
-            risk_level = "medium"
-            recommendation = "⚡ MODERATE RISK - Proceed with extreme caution"
-        else:
-            risk_level = "low"
-            recommendation = "✓ LOW RISK - Still verify before sharing sensitive information"
-        
-        # Determine scam type
-        scam_type = message_analysis.get("scam_type")
-        
-        # Calculate confidence
-        factor_count = len(all_factors)
-        confidence = min(0.95, 0.5 + (factor_count * 0.1))
+        return {"ok": True, "prediction_id": prediction_id, **result}
+    
+    except Exception as e:
+        raise HTTPException(500, f"Prediction error: {str(e)}")
+
+
+@router.post("/predict-batch")
+async def predict_scam_batch(
+    request: Request,
+    payload: PredictionBatchRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Score up to SCAM_PREDICTION_BATCH_MAX records in one call
+    Results come back in request order, with each record's id echoed;
+    with save=true they are bulk-inserted into the prediction history
+    """
+    if len(payload.records) > MAX_PREDICTION_BATCH:
+        raise HTTPException(413, f"Too many records (max {MAX_PREDICTION_BATCH} per batch)")
+    
+    try:
+        user_id = current_user["id"]
+        db = request.app.state.db
         
-        # Save prediction to database
-        save_query = text("""
-            INSERT INTO scam_predictions (
-                user_id, caller_phone, caller_email, message_content,
-                risk_score, risk_level, scam_type, confidence,
-                factors, recommendation, created_at
-            ) VALUES (
-                :uid, :phone, :email, :msg,
-                :risk, :level, :type, :conf,
-                :factors::jsonb, :rec, NOW()
-            ) RETURNING id
-        """)
+        # Feature extraction is CPU-bound; keep it off the event loop
+        results = await asyncio.to_thread(predict_batch, payload.records)
         
-        result = await db.execute(save_query, {
-            "uid": user_id,
-            "phone": payload.caller_phone,
-            "email": payload.caller_email,
-            "msg": payload.message_content,
-            "risk": total_risk,
-            "level": risk_level,
-            "type": scam_type,
-            "conf": confidence,
-            "factors": str(all_factors),
-            "rec": recommendation
-        })
+        saved = 0
+        if payload.save:
+            saved = await save_predictions(db, user_id, payload.records, results)
         
-        prediction_id = result.fetchone()[0]
+        summary = {level: 0 for level in RISK_LEVELS}
+        for result in results:
+            summary[result["risk_level"]] += 1
         
         return {
             "ok": True,
-            "prediction_id": prediction_id,
-            "risk_score": round(total_risk, 3),
-            "risk_level": risk_level,
-            "scam_type": scam_type,
-            "confidence": round(confidence, 2),
-            "factors_detected": all_factors,
-            "factor_count": factor_count,
-            "recommendation": recommendation,
-            "breakdown": {
-                "phone_risk": round(phone_analysis["risk_score"], 2),
-                "message_risk": round(message_analysis["risk_score"], 2),
-                "call_pattern_risk": round(call_analysis["risk_score"], 2),
-                "amount_risk": round(amount_analysis["risk_score"], 2)
-            }
+            "total": len(results),
+            "saved": saved,
+            "summary": summary,
+            "predictions": [
+                {"id": record.id, **result}
+                for record, result in zip(payload.records, results)
+            ]
         }
     
     except Exception as e:
-        raise HTTPException(500, f"Prediction error: {str(e)}")
+        raise HTTPException(500, f"Batch prediction error: {str(e)}")
 
 
 @router.get("/my-predictions")
@@ -325,7 +462,7 @@ async def get_my_predictions(
             LIMIT :lim
         """)
         
-        predictions = (await db.execute(predictions_query, {"uid": user_id, "lim": limit})).fetchall()
+        predictions = await db.fetch_all(predictions_query, {"uid": user_id, "lim": limit})
         
         return {
             "ok": True,
@@ -369,7 +506,7 @@ async def get_prediction_stats(request: Request, current_user: dict = Depends(ge
             WHERE user_id = :uid
         """)
         
-        stats = (await db.execute(stats_query, {"uid": user_id})).fetchone()
+        stats = await db.fetch_one(stats_query, {"uid": user_id})
         
         return {
             "ok": True,
@@ -0,0 +1,233 @@
+"""
+SMS Scam Scoring Engine
+In-process replacement for the calculate_sms_scam_score() PL/pgSQL function
+(migrations/023_mobile_sms_detection.sql).
+
+sms_scam_patterns is loaded once and compiled:
+- every keyword of every active pattern goes into one Aho-Corasick automaton,
+  so a message is scanned once instead of once per keyword
+- sender patterns are precompiled from their SIMILAR TO form
+
+Output (scam_score / scam_type / indicators) matches the SQL function,
+including indicator order and the quirks of LIKE / SIMILAR TO matching.
+Patterns are re-read every SMS_PATTERN_REFRESH_SECONDS and recompiled only
+when the rows changed.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from itertools import groupby
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from .keyword_matcher import KeywordAutomaton
+
+logger = logging.getLogger(__name__)
+
+SMS_PATTERN_REFRESH_SECONDS = float(os.getenv("SMS_PATTERN_REFRESH_SECONDS", "60"))
+
+URL_RE = re.compile(r"https?://[^\s]+")
+
+PATTERNS_QUERY = text("""
+    SELECT id, pattern_name, scam_type, keywords, sender_patterns, confidence_weight
+    FROM sms_scam_patterns
+    WHERE active = TRUE
+    ORDER BY id
+""")
+
+
+def like_to_regex(pattern: str) -> "re.Pattern":
+    """Regex equivalent of `LIKE '%' || pattern || '%'` (default \\ escape)"""
+    out = []
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        if ch == "%":
+            out.append(".*")
+        elif ch == "_":
+            out.append(".")
+        else:
+            out.append(re.escape(ch))
+        i += 1
+    return re.compile("".join(out), re.DOTALL)
+
+
+def similar_to_regex(pattern: str) -> "re.Pattern":
+    """Regex equivalent of Postgres `value SIMILAR TO pattern` (whole-string match)"""
+    out = []
+    in_bracket = False
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        if in_bracket:
+            out.append(ch)
+            if ch == "]":
+                in_bracket = False
+        elif ch == "[":
+            in_bracket = True
+            out.append(ch)
+        elif ch == "%":
+            out.append(".*")
+        elif ch == "_":
+            out.append(".")
+        elif ch in ".^$":
+            # Not metacharacters in SIMILAR TO
+            out.append("\\" + ch)
+        elif ch in "|*+?{}()":
+            out.append(ch)
+        else:
+            out.append(re.escape(ch))
+        i += 1
+    return re.compile("(?:" + "".join(out) + r")\Z", re.DOTALL)
+
+
+def _pg_int(value: float) -> int:
+    """float -> INTEGER cast as Postgres does it (round half to even)"""
+    return int(round(value))
+
+
+class CompiledSMSPatterns:
+    """Immutable compiled snapshot of the active sms_scam_patterns rows"""
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.patterns = rows
+        self.keyword_count = 0
+        # lowered keyword -> [(pattern index, position, original keyword)]
+        postings: Dict[str, List[Tuple[int, int, str]]] = {}
+        # keywords containing LIKE wildcards cannot go into the automaton
+        self.like_keywords: List[Tuple[int, int, str, "re.Pattern"]] = []
+        self.sender_regexes: List[Tuple[int, int, "re.Pattern"]] = []
+
+        for idx, row in enumerate(rows):
+            for pos, keyword in enumerate(row.get("keywords") or []):
+                if keyword is None:
+                    continue
+                self.keyword_count += 1
+                lowered = keyword.lower()
+                if any(c in lowered for c in "%_\\"):
+                    self.like_keywords.append((idx, pos, keyword, like_to_regex(lowered)))
+                else:
+                    postings.setdefault(lowered, []).append((idx, pos, keyword))
+            for pos, sender_pattern in enumerate(row.get("sender_patterns") or []):
+                if sender_pattern is None:
+                    continue
+                try:
+                    regex = similar_to_regex(sender_pattern.replace("%", ".*"))
+                except re.error:
+                    logger.warning("Skipping invalid sender pattern %r (%s)", sender_pattern, row["pattern_name"])
+                    continue
+                self.sender_regexes.append((idx, pos, regex))
+
+        self.postings = postings
+        self.automaton = KeywordAutomaton((kw, kw) for kw in postings)
+
+    def score(self, message: str, sender: str) -> Dict[str, Any]:
+        lowered = (message or "").lower()
+        # (pattern index, 0=keyword/1=sender, position, increment, indicator)
+        hits = []
+
+        for kw in self.automaton.find_keys(lowered):
+            for idx, pos, original in self.postings[kw]:
+                hits.append((idx, 0, pos, original))
+        for idx, pos, original, regex in self.like_keywords:
+            if regex.search(lowered):
+                hits.append((idx, 0, pos, original))
+        if sender is not None:
+            for idx, pos, regex in self.sender_regexes:
+                if regex.match(sender):
+                    hits.append((idx, 1, pos, sender))
+        hits.sort(key=lambda h: (h[0], h[1], h[2]))
+
+        score = 0
+        scam_type = "unknown"
+        indicators = []
+        for idx, pattern_hits in groupby(hits, key=lambda h: h[0]):
+            pattern = self.patterns[idx]
+            weight = pattern.get("confidence_weight") or 0.0
+            for _, kind, _, value in pattern_hits:
+                if kind == 0:
+                    score += _pg_int(10 * weight)
+                    indicators.append({"type": "keyword", "value": value, "pattern": pattern["pattern_name"]})
+                else:
+                    score += _pg_int(15 * weight)
+                    indicators.append({"type": "sender", "value": value, "pattern": pattern["pattern_name"]})
+            # If score increased, update type
+            if score > 0 and scam_type == "unknown":
+                scam_type = pattern["scam_type"]
+
+        # Check for suspicious URLs
+        if message and URL_RE.search(message):
+            score += 10
+            indicators.append({"type": "url", "value": "Contains URL", "pattern": "URL Detection"})
+
+        return {
+            "scam_score": min(score, 100),
+            "scam_type": scam_type,
+            "indicators": indicators,
+        }
+
+
+class SMSScamEngine:
+    """Process-wide holder that refreshes the compiled patterns from the DB"""
+
+    def __init__(self, refresh_seconds: float = SMS_PATTERN_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._compiled: Optional[CompiledSMSPatterns] = None
+        self._rows_key = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def compiled(self) -> Optional[CompiledSMSPatterns]:
+        return self._compiled
+
+    def load_rows(self, rows: List[Dict[str, Any]]):
+        key = tuple(
+            (r["id"], r["pattern_name"], r["scam_type"], tuple(r.get("keywords") or ()),
+             tuple(r.get("sender_patterns") or ()), r.get("confidence_weight"))
+            for r in rows
+        )
+        if key != self._rows_key:
+            self._compiled = CompiledSMSPatterns(rows)
+            self._rows_key = key
+            logger.info("Compiled %d SMS scam patterns (%d keywords)", len(rows), self._compiled.keyword_count)
+        self._loaded_at = time.monotonic()
+
+    async def ensure_fresh(self, db):
+        if self._compiled is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return
+        async with self._lock:
+            if self._compiled is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+                return
+            try:
+                rows = await db.fetch_all(PATTERNS_QUERY)
+            except Exception:
+                if self._compiled is None:
+                    raise
+                logger.exception("SMS pattern refresh failed; keeping previous patterns")
+                self._loaded_at = time.monotonic()
+                return
+            self.load_rows([dict(r._mapping) for r in rows])
+
+    def invalidate(self):
+        """Force a reload on the next scan (call after editing sms_scam_patterns)"""
+        self._loaded_at = 0.0
+
+    async def score(self, db, message: str, sender: str) -> Dict[str, Any]:
+        await self.ensure_fresh(db)
+        return self._compiled.score(message, sender)
+
+
+sms_scam_engine = SMSScamEngine()
@@ -4,13 +4,12 @@ Sets up 12-hour cron job for automated threat intelligence scans
 """
 
 import logging
-import os
-import psycopg2
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from datetime import datetime
 
 from app.threat_intelligence_scanner import run_threat_intelligence_scan
+from .database import get_db_connection
 
 logger = logging.getLogger(__name__)
 
@@ -18,11 +17,6 @@ logger = logging.getLogger(__name__)
 scheduler = None
 
 
-def get_db_connection():
-    """Get database connection using DATABASE_URL environment variable"""
-    return psycopg2.connect(os.getenv("DATABASE_URL"))
-
-
 def start_threat_intel_scheduler():
     """
     Start the threat intelligence scheduler
@@ -89,6 +83,7 @@ def stop_threat_intel_scheduler():
 
 def generate_daily_statistics():
     """Generate daily statistics for threat intelligence"""
+    conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
@@ -98,12 +93,14 @@ def generate_daily_statistics():
         conn.commit()
         
         cur.close()
-        conn.close()
         
         logger.info("✅ Daily threat intelligence statistics generated")
         
     except Exception as e:
         logger.error(f"❌ Failed to generate daily statistics: {e}")
+    finally:
+        if conn is not None:
+            conn.close()
 
 
 def get_scheduler_status():
@@ -3,7 +3,6 @@ Threat Intelligence Scanner - Block 15 v2
 Performs 12-hour internet scans to detect new scam patterns and threats
 """
 
-import os
 import re
 import json
 from datetime import datetime, timedelta
@@ -12,16 +11,12 @@ import logging
 
 import requests
 from bs4 import BeautifulSoup
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from .database import get_db_connection
+from . import keyword_rules
 
 logger = logging.getLogger(__name__)
 
-# Database connection helper
-def get_db_connection():
-    """Get database connection using DATABASE_URL environment variable"""
-    return psycopg2.connect(os.getenv("DATABASE_URL"))
-
 # Scam type keywords for classification
 SCAM_KEYWORDS = {
     "digital_arrest": ["digital arrest", "cyber police", "cbi call", "courier scam", "customs fraud", "parcel scam"],
@@ -33,6 +28,10 @@ SCAM_KEYWORDS = {
     "otp_fraud": ["otp scam", "otp sharing", "verification code", "one time password fraud"],
     "kyc_fraud": ["kyc update", "kyc verification scam", "aadhaar fraud", "pan card scam"]
 }
+SCAM_KEYWORD_SETS = {
+    scam_type: keyword_rules.register(f"threat_intel.{scam_type}", keywords)
+    for scam_type, keywords in SCAM_KEYWORDS.items()
+}
 
 # Phone number patterns
 PHONE_PATTERNS = [
@@ -161,10 +160,11 @@ class ThreatIntelligenceScanner:
             urls = list(set(urls))[:10]  # Limit to 10 unique URLs
             
             # Classify scam type
-            scam_type = self._classify_scam_type(text_content)
+            hits = keyword_rules.scan(text_content)
+            scam_type = self._classify_scam_type(text_content, hits)
             
             # Extract keywords
-            keywords = self._extract_keywords(text_content, source.get('source_config', {}).get('keywords', []))
+            keywords = self._extract_keywords(text_content, source.get('source_config', {}).get('keywords', []), hits)
             
             # Calculate severity (1-10)
             severity = self._calculate_severity(scam_type, len(phones), len(urls))
@@ -197,21 +197,24 @@ class ThreatIntelligenceScanner:
         
         return items
     
-    def _classify_scam_type(self, text: str) -> str:
+    def _classify_scam_type(self, text: str, hits: Optional[keyword_rules.KeywordHits] = None) -> str:
         """Classify scam type based on keywords"""
-        text_lower = text.lower()
+        if hits is None:
+            hits = keyword_rules.scan(text)
         
-        for scam_type, keywords in SCAM_KEYWORDS.items():
-            for keyword in keywords:
-                if keyword in text_lower:
-                    return scam_type
+        for scam_type, keyword_set in SCAM_KEYWORD_SETS.items():
+            if keyword_set in hits:
+                return scam_type
         
         return "unknown"
     
-    def _extract_keywords(self, text: str, source_keywords: List[str]) -> List[str]:
+    def _extract_keywords(self, text: str, source_keywords: List[str],
+                          hits: Optional[keyword_rules.KeywordHits] = None) -> List[str]:
         """Extract relevant keywords from text"""
         keywords = []
         text_lower = text.lower()
+        if hits is None:
+            hits = keyword_rules.scan(text)
         
         # Check source-specific keywords
         for keyword in source_keywords:
@@ -219,9 +222,9 @@ class ThreatIntelligenceScanner:
                 keywords.append(keyword)
         
         # Check scam keywords
-        for scam_type, scam_keywords in SCAM_KEYWORDS.items():
-            for keyword in scam_keywords:
-                if keyword in text_lower and keyword not in keywords:
+        for keyword_set in SCAM_KEYWORD_SETS.values():
+            for keyword in hits.get(keyword_set):
+                if keyword not in keywords:
                     keywords.append(keyword)
         
         return keywords[:20]  # Limit to 20 keywords
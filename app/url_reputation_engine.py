@@ -0,0 +1,384 @@
+"""
+URL Reputation Engine
+In-process replacement for the calculate_url_trust_score() PL/pgSQL function
+(migrations/024_mobile_url_checker.sql).
+
+- active malicious_url_patterns are compiled once (rewritten for
+  unanchored search) instead of being evaluated with `~` row by row
+- active phishing_domains are held in a suffix-aware index: a host matches
+  if it, or any parent domain of it, is a known phishing domain
+  (login.evil.com matches a report for evil.com)
+
+Verdicts are cached per (URL, domain) in a TTL/LRU cache. Cached entries
+are dropped when patterns are recompiled, and per registrable domain when
+a phishing domain under it is added or taken down, so a new report takes
+effect on the next check.
+
+Trust score / risk level / risk factors match the SQL function. Patterns
+are re-read every URL_REPUTATION_REFRESH_SECONDS; phishing domains are
+refreshed incrementally (new ids / re-reported rows) on the same cadence,
+with a full reload every URL_PHISHING_FULL_RELOAD_SECONDS to pick up
+takedowns.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+from sqlalchemy import text
+
+from .sms_scam_engine import _pg_int
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+URL_REPUTATION_REFRESH_SECONDS = float(os.getenv("URL_REPUTATION_REFRESH_SECONDS", "60"))
+URL_PHISHING_FULL_RELOAD_SECONDS = float(os.getenv("URL_PHISHING_FULL_RELOAD_SECONDS", "900"))
+
+# Verdict cache; "negative" verdicts are the ones with no scam signal (trust >= 40)
+URL_VERDICT_CACHE_SIZE = int(os.getenv("URL_VERDICT_CACHE_SIZE", "100000"))
+URL_VERDICT_CACHE_TTL = float(os.getenv("URL_VERDICT_CACHE_TTL", "600"))
+URL_VERDICT_CACHE_NEGATIVE_TTL = float(os.getenv("URL_VERDICT_CACHE_NEGATIVE_TTL", os.getenv("URL_VERDICT_CACHE_TTL", "600")))
+
+# Second-level labels under which registrations happen (example.co.in, example.com.au)
+_SECOND_LEVEL_LABELS = {"ac", "co", "com", "edu", "gov", "ltd", "net", "nic", "org", "res", "mil", "gen", "firm", "ind"}
+
+HTTPS_RE = re.compile(r"^https://")
+
+PATTERNS_QUERY = text("""
+    SELECT id, pattern_type, pattern_regex, description, severity, confidence_weight
+    FROM malicious_url_patterns
+    WHERE active = TRUE
+    ORDER BY id
+""")
+
+PHISHING_FULL_QUERY = text("""
+    SELECT id, domain, last_reported_at
+    FROM phishing_domains
+    WHERE status = 'active'
+""")
+
+PHISHING_DELTA_QUERY = text("""
+    SELECT id, domain, status, last_reported_at
+    FROM phishing_domains
+    WHERE id > :max_id OR last_reported_at >= :since
+""")
+
+_QUANTIFIER_START = tuple("*+?{")
+
+
+def search_form(pattern: str) -> str:
+    """
+    Drop leading/trailing `.*` from a pattern that is only ever used with
+    unanchored search (`url ~ pattern`). The result matches the same URLs
+    but avoids Python's backtracking over `.*` from every start offset.
+    """
+    while True:
+        for prefix in (".*?", ".*"):
+            rest = pattern[len(prefix):]
+            if pattern.startswith(prefix) and not rest.startswith(_QUANTIFIER_START):
+                pattern = rest
+                break
+        else:
+            break
+    while pattern.endswith(".*"):
+        backslashes = len(pattern[:-2]) - len(pattern[:-2].rstrip("\\"))
+        if backslashes % 2:
+            break
+        pattern = pattern[:-2]
+    return pattern
+
+
+def normalize_host(domain: str) -> str:
+    """Lower-cased host without userinfo, port or trailing dot"""
+    host = (domain or "").strip().lower()
+    if "://" in host:
+        host = urlparse(host).netloc
+    host = host.rsplit("@", 1)[-1].split("/", 1)[0]
+    if not host.startswith("["):
+        host = host.split(":", 1)[0]
+    return host.rstrip(".")
+
+
+def registrable_domain(host: str) -> str:
+    """
+    Approximate registrable domain (eTLD+1) of a normalized host:
+    login.evil.com -> evil.com, a.b.example.co.in -> example.co.in.
+    IP addresses are returned unchanged.
+    """
+    labels = host.split(".")
+    if len(labels) <= 2 or host.replace(".", "").isdigit() or host.startswith("["):
+        return host
+    if len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL_LABELS:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def url_domain(url: str) -> str:
+    """Domain the way the check-url endpoint derives it (netloc or first path segment)"""
+    parsed = urlparse(url)
+    return parsed.netloc or parsed.path.split('/')[0]
+
+
+class CompiledURLPatterns:
+    """
+    Immutable compiled snapshot of the active malicious_url_patterns rows.
+
+    Patterns stay separate regexes evaluated in one pass: Python's re has
+    no DFA, so an alternation/lookahead union of them is slower than
+    running the rewritten (search_form) patterns back to back.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.patterns: List[Dict[str, Any]] = []
+        self._searches = []
+
+        for row in rows:
+            source = row.get("pattern_regex") or ""
+            try:
+                regex = re.compile(search_form(source), re.DOTALL)
+            except re.error as e:
+                logger.warning("Skipping invalid URL pattern %r (%s): %s", source, row.get("pattern_type"), e)
+                continue
+            self.patterns.append(row)
+            self._searches.append(regex.search)
+
+    def matches(self, url: str) -> List[int]:
+        """Indices (in id order) of every pattern that matches url, like `url ~ pattern_regex`"""
+        return [idx for idx, search in enumerate(self._searches) if search(url)]
+
+
+class PhishingDomainIndex:
+    """
+    Hash index over normalized phishing domains with parent-domain lookup.
+
+    Lookup walks the host's label suffixes (a.b.evil.com -> b.evil.com ->
+    evil.com) so it costs one set probe per label. Single-label suffixes
+    (bare TLDs) are never matched as parents.
+    """
+
+    def __init__(self, domains=()):
+        self._domains: Set[str] = set()
+        for domain in domains:
+            self.add(domain)
+
+    def __len__(self) -> int:
+        return len(self._domains)
+
+    def __iter__(self):
+        return iter(self._domains)
+
+    def add(self, domain: str) -> bool:
+        """Add a domain; True if it was not indexed yet"""
+        host = normalize_host(domain)
+        if not host or host in self._domains:
+            return False
+        self._domains.add(host)
+        return True
+
+    def discard(self, domain: str) -> bool:
+        """Remove a domain; True if it was indexed"""
+        host = normalize_host(domain)
+        if host not in self._domains:
+            return False
+        self._domains.discard(host)
+        return True
+
+    def match(self, domain: str) -> Optional[str]:
+        """The reported domain that `domain` falls under, or None"""
+        host = normalize_host(domain)
+        if not host:
+            return None
+        if host in self._domains:
+            return host
+        labels = host.split(".")
+        for i in range(1, len(labels) - 1):
+            parent = ".".join(labels[i:])
+            if parent in self._domains:
+                return parent
+        return None
+
+
+def score_url(patterns: CompiledURLPatterns, phishing: PhishingDomainIndex, url: str, domain: str) -> Dict[str, Any]:
+    """Same result as `SELECT * FROM calculate_url_trust_score(url, domain)`"""
+    score = 100
+    factors = []
+
+    # Check against malicious patterns
+    for idx in patterns.matches(url):
+        pattern = patterns.patterns[idx]
+        score -= _pg_int(20 * (pattern.get("confidence_weight") or 0.0))
+        factors.append({
+            "type": pattern["pattern_type"],
+            "severity": pattern.get("severity"),
+            "description": pattern.get("description"),
+        })
+
+    # Check if domain (or a parent domain) is in phishing database
+    if phishing.match(domain):
+        score = 0
+        factors.append({
+            "type": "Known Phishing Domain",
+            "severity": "critical",
+            "description": "This domain is reported as phishing",
+        })
+
+    # Check for HTTPS
+    if not HTTPS_RE.search(url):
+        score -= 10
+        factors.append({
+            "type": "No HTTPS",
+            "severity": "low",
+            "description": "Website does not use secure connection",
+        })
+
+    score = max(0, min(100, score))
+
+    if score >= 80:
+        risk_level = "safe"
+    elif score >= 60:
+        risk_level = "low"
+    elif score >= 40:
+        risk_level = "medium"
+    elif score >= 20:
+        risk_level = "high"
+    else:
+        risk_level = "critical"
+
+    return {"trust_score": score, "risk_level": risk_level, "risk_factors": factors}
+
+
+class URLReputationEngine:
+    """Process-wide holder that keeps patterns and phishing domains fresh"""
+
+    def __init__(self, refresh_seconds: float = URL_REPUTATION_REFRESH_SECONDS,
+                 full_reload_seconds: float = URL_PHISHING_FULL_RELOAD_SECONDS,
+                 cache: Optional[TTLCache] = None):
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self._patterns: Optional[CompiledURLPatterns] = None
+        self._patterns_key = None
+        self._phishing: Optional[PhishingDomainIndex] = None
+        self._max_id = 0
+        self._since: Optional[datetime] = None
+        self._loaded_at = 0.0
+        self._full_loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self.cache = cache if cache is not None else TTLCache(
+            maxsize=URL_VERDICT_CACHE_SIZE,
+            ttl=URL_VERDICT_CACHE_TTL,
+            negative_ttl=URL_VERDICT_CACHE_NEGATIVE_TTL,
+        )
+        # registrable domain -> generation; bumped when its phishing status changes
+        self._domain_gen: Dict[str, int] = {}
+
+    @property
+    def patterns(self) -> Optional[CompiledURLPatterns]:
+        return self._patterns
+
+    @property
+    def phishing_domains(self) -> Optional[PhishingDomainIndex]:
+        return self._phishing
+
+    def load_patterns(self, rows: List[Dict[str, Any]]):
+        key = tuple(
+            (r["id"], r["pattern_type"], r["pattern_regex"], r.get("description"),
+             r.get("severity"), r.get("confidence_weight"))
+            for r in rows
+        )
+        if key != self._patterns_key:
+            self._patterns = CompiledURLPatterns(rows)
+            self._patterns_key = key
+            self.cache.clear()
+            logger.info("Compiled %d malicious URL patterns", len(self._patterns.patterns))
+
+    def load_phishing_domains(self, rows: List[Dict[str, Any]]):
+        """Replace the index with a full snapshot of active rows"""
+        index = PhishingDomainIndex(r["domain"] for r in rows)
+        if self._phishing is not None and set(index) != set(self._phishing):
+            self.cache.clear()
+            self._domain_gen.clear()
+        self._phishing = index
+        self._max_id = max((r["id"] for r in rows), default=0)
+        self._since = max((r["last_reported_at"] for r in rows if r.get("last_reported_at")), default=None)
+        self._full_loaded_at = time.monotonic()
+        logger.info("Loaded %d phishing domains", len(self._phishing))
+
+    def apply_phishing_delta(self, rows: List[Dict[str, Any]]):
+        for r in rows:
+            if r.get("status", "active") == "active":
+                changed = self._phishing.add(r["domain"])
+            else:
+                changed = self._phishing.discard(r["domain"])
+            if changed:
+                self._bump_domain(r["domain"])
+            self._max_id = max(self._max_id, r["id"])
+            if r.get("last_reported_at") and (self._since is None or r["last_reported_at"] > self._since):
+                self._since = r["last_reported_at"]
+
+    def add_phishing_domain(self, domain: str):
+        """Make a just-reported domain visible immediately in this process"""
+        if self._phishing is not None and self._phishing.add(domain):
+            self._bump_domain(domain)
+
+    def _bump_domain(self, domain: str):
+        """Expire cached verdicts for every URL under domain's registrable domain"""
+        reg = registrable_domain(normalize_host(domain))
+        self._domain_gen[reg] = self._domain_gen.get(reg, 0) + 1
+
+    def _is_fresh(self) -> bool:
+        return self._patterns is not None and time.monotonic() - self._loaded_at < self.refresh_seconds
+
+    async def ensure_fresh(self, db):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if self._is_fresh():
+                return
+            try:
+                rows = await db.fetch_all(PATTERNS_QUERY)
+                self.load_patterns([dict(r._mapping) for r in rows])
+                if self._phishing is None or time.monotonic() - self._full_loaded_at >= self.full_reload_seconds:
+                    rows = await db.fetch_all(PHISHING_FULL_QUERY)
+                    self.load_phishing_domains([dict(r._mapping) for r in rows])
+                else:
+                    rows = await db.fetch_all(PHISHING_DELTA_QUERY, {
+                        "max_id": self._max_id,
+                        "since": self._since or datetime(1970, 1, 1),
+                    })
+                    self.apply_phishing_delta([dict(r._mapping) for r in rows])
+            except Exception:
+                if self._patterns is None or self._phishing is None:
+                    raise
+                logger.exception("URL reputation refresh failed; keeping previous data")
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        """Force a full reload on the next check (call after editing the tables)"""
+        self._loaded_at = 0.0
+        self._full_loaded_at = 0.0
+
+    async def score(self, db, url: str, domain: Optional[str] = None) -> Dict[str, Any]:
+        await self.ensure_fresh(db)
+        if domain is None:
+            domain = url_domain(url)
+
+        # Patterns are case-sensitive and see the whole URL, so the key is
+        # the URL as checked; invalidation works on the registrable domain.
+        key = (url, domain)
+        gen = self._domain_gen.get(registrable_domain(normalize_host(domain)), 0)
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] == gen:
+            return cached[1]
+
+        result = score_url(self._patterns, self._phishing, url, domain)
+        self.cache.set(key, (gen, result), negative=result["trust_score"] >= 40)
+        return result
+
+
+url_reputation_engine = URLReputationEngine()
@@ -7,7 +7,7 @@ Single endpoint for both web and mobile apps
 from fastapi import APIRouter, HTTPException, Depends, Header
 from pydantic import BaseModel
 from app.deps import get_settings
-import psycopg
+from app.database import acquire_db_connection
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 import jwt
@@ -47,14 +47,12 @@ async def get_user_dashboard(current_user: dict = Depends(get_current_user_from_
     Get user dashboard data based on subscription plan
     Returns different data for Basic, Personal, and Family plans
     """
-    settings = get_settings()
-    dsn = settings.DATABASE_URL
-    
     user_id = current_user.get('user_id')
     
     try:
-        # Use autocommit mode to prevent transaction abort issues
-        with psycopg.connect(dsn, autocommit=True) as conn:
+        with await acquire_db_connection() as conn:
+            # Use autocommit mode to prevent transaction abort issues (the pool resets it on return)
+            conn.set_session(autocommit=True)
             with conn.cursor() as cur:
                 # Get user details
                 cur.execute("""
@@ -2,6 +2,14 @@
 """
 Voice Biometric - Voice Fingerprinting for Caller Identification
 Creates unique voice signatures to identify known scammers
+
+Each registered voice gets a fixed-length embedding (EMBEDDING_DIM float32,
+stored packed in voice_biometrics.voice_embedding). Matching looks the
+caller's embedding up in the in-memory nearest-neighbour index
+(voice_index.py) and only fetches the top candidates' rows.
+
+Features and embeddings come from the streaming DSP pipeline in
+voice_features.py, which reads the upload in chunks on its own thread pool.
 """
 
 from fastapi import APIRouter, Request, HTTPException, Depends, File, UploadFile
@@ -10,11 +18,23 @@ from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel
 from .utils import get_current_user
-import hashlib
-import numpy as np
+from .voice_features import (
+    EMBEDDING_DIM, EMBEDDING_VERSION, VoiceDSPBusyError, extract_features_async, raw_pcm_rate
+)
+from .voice_index import VoiceIndex, pack_embedding
+import asyncio
+import json
+import os
 
 router = APIRouter(prefix="/api/voice-biometric", tags=["Voice Biometric"])
 
+MATCH_THRESHOLD = 0.7
+MATCH_CANDIDATES = int(os.getenv("VOICE_MATCH_CANDIDATES", "50"))
+# How long a match waits for the startup index load before answering from what's loaded
+INDEX_LOAD_WAIT_SECONDS = 10.0
+
+voice_index = VoiceIndex(EMBEDDING_DIM, EMBEDDING_VERSION)
+
 
 class VoiceMatch(BaseModel):
     caller_phone: str
@@ -23,65 +43,20 @@ class VoiceMatch(BaseModel):
     previous_reports: int
 
 
-def extract_voice_features(audio_data: bytes) -> dict:
+async def extract_upload_features(file: UploadFile) -> dict:
     """
-    Extract voice features for biometric matching
-    In production, use advanced audio processing libraries
+    Voice features for an uploaded recording, read straight from the
+    spooled upload in chunks rather than loaded into memory. WAV uploads
+    are accepted, and headerless PCM sent as audio/pcm (;rate=...); other
+    formats get 400.
     """
+    await file.seek(0)
     try:
-        # Simple feature extraction (placeholder)
-        # In production, use librosa, pyAudioAnalysis, or cloud services
-        
-        # Create a simple hash-based fingerprint
-        voice_hash = hashlib.sha256(audio_data).hexdigest()[:32]
-        
-        # Extract basic features (mock)
-        features = {
-            "voice_hash": voice_hash,
-            "sample_length": len(audio_data),
-            "pitch_estimate": 150.0,  # Mock pitch in Hz
-            "energy_level": 0.75,  # Mock energy
-            "spectral_centroid": 2000.0  # Mock spectral centroid
-        }
-        
-        return features
-    
-    except Exception as e:
-        print(f"Feature extraction error: {e}")
-        return None
-
-
-def calculate_voice_similarity(features1: dict, features2: dict) -> float:
-    """
-    Calculate similarity score between two voice samples
-    Returns: similarity score (0.0 to 1.0)
-    """
-    try:
-        # Simple similarity calculation (placeholder)
-        # In production, use advanced voice comparison algorithms
-        
-        # Compare voice hashes
-        if features1["voice_hash"] == features2["voice_hash"]:
-            return 1.0
-        
-        # Compare features
-        pitch_diff = abs(features1["pitch_estimate"] - features2["pitch_estimate"])
-        energy_diff = abs(features1["energy_level"] - features2["energy_level"])
-        spectral_diff = abs(features1["spectral_centroid"] - features2["spectral_centroid"])
-        
-        # Normalize and combine
-        pitch_similarity = max(0, 1 - (pitch_diff / 200))
-        energy_similarity = max(0, 1 - energy_diff)
-        spectral_similarity = max(0, 1 - (spectral_diff / 3000))
-        
-        # Weighted average
-        similarity = (pitch_similarity * 0.4) + (energy_similarity * 0.3) + (spectral_similarity * 0.3)
-        
-        return round(similarity, 3)
-    
-    except Exception as e:
-        print(f"Similarity calculation error: {e}")
-        return 0.0
+        return await extract_features_async(file.file, raw_rate=raw_pcm_rate(file.content_type))
+    except VoiceDSPBusyError as e:
+        raise HTTPException(503, str(e), headers={"Retry-After": "2"})
+    except ValueError as e:
+        raise HTTPException(400, f"Unsupported audio: {e}")
 
 
 @router.post("/register-voice")
@@ -101,40 +76,45 @@ async def register_voice(
         user_id = current_user["id"]
         db = request.app.state.db
         
-        # Read audio file
-        audio_data = await file.read()
+        # Extract voice features (streaming NumPy DSP, off the event loop)
+        features = await extract_upload_features(file)
         
-        # Extract voice features
-        features = extract_voice_features(audio_data)
-        
-        if not features:
-            raise HTTPException(500, "Failed to extract voice features")
+        embedding = features.pop("embedding")
+        if embedding is None:
+            raise HTTPException(400, "Voice sample is too short or silent")
         
         # Save voice biometric
         insert_query = text("""
             INSERT INTO voice_biometrics (
                 user_id, caller_phone, caller_name, voice_hash,
-                voice_features, is_scammer, sample_count, created_at, updated_at
+                voice_features, voice_embedding, voice_embedding_version,
+                is_scammer, sample_count, created_at, updated_at
             ) VALUES (
                 :uid, :phone, :name, :hash,
-                :features::jsonb, :scammer, 1, NOW(), NOW()
+                CAST(:features AS jsonb), :embedding, :version,
+                :scammer, 1, NOW(), NOW()
             )
             ON CONFLICT (voice_hash) DO UPDATE SET
                 sample_count = voice_biometrics.sample_count + 1,
+                voice_embedding = EXCLUDED.voice_embedding,
+                voice_embedding_version = EXCLUDED.voice_embedding_version,
                 updated_at = NOW()
             RETURNING id
         """)
         
-        result = await db.execute(insert_query, {
+        biometric_id = await db.fetch_val(insert_query, {
             "uid": user_id,
             "phone": caller_phone,
             "name": caller_name,
             "hash": features["voice_hash"],
-            "features": str(features),
+            "features": json.dumps(features),
+            "embedding": pack_embedding(embedding),
+            "version": EMBEDDING_VERSION,
             "scammer": is_scammer
         })
         
-        biometric_id = result.fetchone()[0]
+        # Searchable immediately on this worker; others pick it up on refresh
+        voice_index.add(biometric_id, embedding)
         
         return {
             "ok": True,
@@ -165,51 +145,43 @@ async def match_voice(
         user_id = current_user["id"]
         db = request.app.state.db
         
-        # Read audio file
-        audio_data = await file.read()
-        
         # Extract voice features
-        features = extract_voice_features(audio_data)
-        
-        if not features:
-            raise HTTPException(500, "Failed to extract voice features")
-        
-        # Get all registered voices
-        voices_query = text("""
-            SELECT 
-                id, caller_phone, caller_name, voice_hash,
-                voice_features, is_scammer, sample_count
-            FROM voice_biometrics
-            ORDER BY created_at DESC
-            LIMIT 1000
-        """)
-        
-        voices = (await db.execute(voices_query)).fetchall()
-        
-        # Find matches
+        features = await extract_upload_features(file)
+        
+        # Nearest registered voices from the in-memory index
+        if voice_index.loading:
+            await asyncio.to_thread(voice_index.wait_loaded, INDEX_LOAD_WAIT_SECONDS)
+        candidates = []
+        if features["embedding"] is not None:
+            candidates = voice_index.search(features["embedding"], k=MATCH_CANDIDATES, min_score=MATCH_THRESHOLD)
+        
+        voices = {}
+        if candidates:
+            voices_query = text("""
+                SELECT id, caller_phone, caller_name, is_scammer, sample_count
+                FROM voice_biometrics
+                WHERE id = ANY(:ids)
+            """)
+            rows = await db.fetch_all(voices_query, {"ids": [voice_id for voice_id, _ in candidates]})
+            voices = {row[0]: row for row in rows}
+        
+        # Find matches (candidates deleted by another worker have no row)
         matches = []
         
-        for voice in voices:
-            # Parse stored features
-            try:
-                stored_features = eval(voice[4])  # In production, use json.loads
-            except:
+        for voice_id, score in candidates:
+            voice = voices.get(voice_id)
+            if voice is None:
                 continue
-            
-            # Calculate similarity
-            similarity = calculate_voice_similarity(features, stored_features)
-            
-            # Consider it a match if similarity > 0.7
-            if similarity >= 0.7:
-                matches.append({
-                    "biometric_id": voice[0],
-                    "caller_phone": voice[1],
-                    "caller_name": voice[2],
-                    "match_score": similarity,
-                    "is_scammer": voice[5],
-                    "confidence": "high" if similarity >= 0.9 else "medium" if similarity >= 0.8 else "low",
-                    "sample_count": voice[6]
-                })
+            similarity = round(score, 3)
+            matches.append({
+                "biometric_id": voice[0],
+                "caller_phone": voice[1],
+                "caller_name": voice[2],
+                "match_score": similarity,
+                "is_scammer": voice[3],
+                "confidence": "high" if similarity >= 0.9 else "medium" if similarity >= 0.8 else "low",
+                "sample_count": voice[4]
+            })
         
         # Sort by match score
         matches.sort(key=lambda x: x["match_score"], reverse=True)
@@ -223,7 +195,8 @@ async def match_voice(
             "matches": matches[:10],  # Top 10 matches
             "is_known_scammer": is_scammer,
             "recommendation": "🚨 BLOCK - Known scammer detected!" if is_scammer else "✓ No scammer match found",
-            "voice_hash": features["voice_hash"]
+            "voice_hash": features["voice_hash"],
+            "analysis_truncated": features["truncated"]
         }
     
     except HTTPException:
@@ -308,6 +281,7 @@ async def delete_voice(
         await db.execute(text("""
             DELETE FROM voice_biometrics WHERE id = :bid
         """), {"bid": biometric_id})
+        voice_index.remove(biometric_id)
         
         return {
             "ok": True,
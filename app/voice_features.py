@@ -0,0 +1,473 @@
+"""
+Voice Feature Extraction
+Streaming NumPy DSP for voice biometrics: uploads are decoded (WAV, or raw
+16-bit PCM when the client declares it) a chunk at a time, framed, and
+reduced to running statistics, so memory stays flat however long the
+recording is. Compressed containers (MP3, M4A, OGG, AMR...) are rejected:
+read as PCM they are noise, and noise still yields an embedding.
+
+Per frame (32 ms, 10 ms hop, Hann window), one zero-padded FFT gives:
+- the power spectrum -> 40 mel bands (100-3800 Hz, the telephone band, so
+  8 kHz and 16 kHz recordings of the same voice stay comparable) -> log ->
+  DCT -> MFCCs
+- its inverse -> the autocorrelation -> pitch and voicing
+  (window-corrected, parabolic peak interpolation)
+- RMS energy, spectral centroid and zero-crossing rate
+
+The embedding (EMBEDDING_DIM float32, L2-normalised) concatenates the
+mean (liftered by sqrt(k), so c1 doesn't dominate) and the relative spread
+of MFCCs 1-31 over speech frames with the median pitch and its
+variability, each block scaled to a fixed weight.
+
+extract_features_async() runs extraction on a small dedicated thread pool
+with a per-upload CPU budget; when the pool's queue is full it raises
+VoiceDSPBusyError instead of queueing without bound.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+EMBEDDING_DIM = 64
+EMBEDDING_VERSION = 2  # bump when the embedding changes; older prints stop matching
+
+VOICE_DSP_WORKERS = int(os.getenv("VOICE_DSP_WORKERS", "2"))
+VOICE_DSP_MAX_PENDING = int(os.getenv("VOICE_DSP_MAX_PENDING", "16"))  # queued + running uploads
+VOICE_DSP_CPU_BUDGET_MS = float(os.getenv("VOICE_DSP_CPU_BUDGET_MS", "3000"))  # per upload
+VOICE_MAX_AUDIO_SECONDS = float(os.getenv("VOICE_MAX_AUDIO_SECONDS", "300"))
+
+DEFAULT_SAMPLE_RATE = 16000  # for raw (headerless) 16-bit PCM uploads without a rate
+# Content types under which a client declares headerless 16-bit little-endian mono PCM
+RAW_PCM_CONTENT_TYPES = {"audio/pcm", "audio/x-pcm", "audio/raw"}
+MIN_RAW_PCM_RATE = 8000
+MAX_RAW_PCM_RATE = 48000
+READ_SAMPLES = 32768  # decoded per chunk
+BLOCK_FRAMES = 256  # frames per vectorised FFT block
+FRAME_SECONDS = 0.032
+HOP_SECONDS = 0.010
+
+N_MELS = 40
+N_MFCC = 32  # c0..c31; c0 (overall loudness) is left out of the embedding
+MIN_BAND_HZ = 100.0
+MAX_BAND_HZ = 3800.0
+PRE_EMPHASIS = 0.97
+
+MIN_PITCH_HZ = 60.0
+MAX_PITCH_HZ = 400.0
+VOICING_THRESHOLD = 0.45  # normalised autocorrelation peak
+SPEECH_FLOOR_DBFS = -50.0
+PITCH_BINS_PER_SEMITONE = 4
+
+# Embedding block weights: MFCC mean, MFCC spread, pitch
+MFCC_MEAN_WEIGHT = 1.0
+MFCC_SPREAD_WEIGHT = 0.5
+PITCH_WEIGHT = 1.0
+PITCH_REFERENCE_HZ = 150.0
+
+
+class VoiceDSPBusyError(Exception):
+    """Too many uploads already waiting for feature extraction"""
+
+
+# -- decoding ---------------------------------------------------------------
+
+def raw_pcm_rate(content_type: Optional[str]) -> Optional[int]:
+    """
+    Sample rate of a declared raw PCM upload ("audio/pcm;rate=8000"), or
+    None when the content type doesn't declare raw PCM
+    """
+    if not content_type:
+        return None
+    media_type, *params = [part.strip() for part in content_type.split(";")]
+    if media_type.lower() not in RAW_PCM_CONTENT_TYPES:
+        return None
+    for param in params:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "rate":
+            value = value.strip().strip('"')
+            if not value.isdigit() or not MIN_RAW_PCM_RATE <= int(value) <= MAX_RAW_PCM_RATE:
+                raise ValueError(f"Unsupported PCM sample rate: {value}")
+            return int(value)
+    return DEFAULT_SAMPLE_RATE
+
+
+def _pcm_to_float(raw: bytes, width: int) -> np.ndarray:
+    if width == 1:
+        return (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    if width == 2:
+        return np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    if width == 3:
+        padded = np.zeros((len(raw) // 3, 4), dtype=np.uint8)
+        padded[:, 1:] = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        return padded.view("<i4").ravel().astype(np.float32) / 2147483648.0
+    if width == 4:
+        return np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    raise ValueError(f"Unsupported sample width: {width * 8} bits")
+
+
+class _HashingReader:
+    """File wrapper that hashes and counts everything read through it"""
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, n: int = -1) -> bytes:
+        data = self._stream.read(n)
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+    def drain(self, chunk: int = 1 << 20):
+        while self.read(chunk):
+            pass
+
+    # wave.open() only needs read(); tell() lets it report positions
+    def tell(self) -> int:
+        return self.size
+
+
+def iter_pcm_chunks(stream: BinaryIO, read_samples: int = READ_SAMPLES,
+                    raw_rate: Optional[int] = None) -> Tuple[int, Iterator[np.ndarray]]:
+    """
+    (sample rate, iterator of mono float32 chunks in [-1, 1]) for a WAV
+    stream, or for raw 16-bit PCM at raw_rate when the caller declares it.
+    Raises ValueError for anything else. Nothing beyond one chunk is held
+    in memory.
+    """
+    head = stream.read(12)
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        class _Rewound:
+            # wave.open() wants to read the header itself
+            def __init__(self):
+                self.pending = head
+
+            def read(self, n: int = -1) -> bytes:
+                if self.pending:
+                    if n < 0:
+                        data, self.pending = self.pending + stream.read(), b""
+                        return data
+                    data, self.pending = self.pending[:n], self.pending[n:]
+                    if len(data) < n:
+                        data += stream.read(n - len(data))
+                    return data
+                return stream.read(n)
+
+        try:
+            wav = wave.open(_Rewound())
+        except (wave.Error, EOFError) as e:
+            raise ValueError(f"Unreadable WAV file: {e}")
+        rate, channels, width = wav.getframerate(), wav.getnchannels(), wav.getsampwidth()
+
+        def wav_chunks():
+            with wav:
+                while True:
+                    raw = wav.readframes(read_samples)
+                    usable = len(raw) - len(raw) % (width * channels)
+                    if usable <= 0:
+                        return
+                    samples = _pcm_to_float(raw[:usable], width)
+                    if channels > 1:
+                        samples = samples.reshape(-1, channels).mean(axis=1)
+                    yield samples
+
+        return rate, wav_chunks()
+
+    if raw_rate is None:
+        raise ValueError("expected a WAV file, or raw 16-bit PCM declared as audio/pcm")
+
+    def raw_chunks():
+        carry = head
+        while True:
+            data = stream.read(read_samples * 2)
+            buffered = carry + data
+            usable = len(buffered) - len(buffered) % 2
+            if usable:
+                yield _pcm_to_float(buffered[:usable], 2)
+            carry = buffered[usable:]
+            if not data:
+                return
+
+    return raw_rate, raw_chunks()
+
+
+# -- analysis ---------------------------------------------------------------
+
+def _mel_filters(n_fft: int, rate: int) -> np.ndarray:
+    """Triangular mel filters mapping an rfft power spectrum to N_MELS bands"""
+    mel = lambda hz: 2595.0 * np.log10(1.0 + hz / 700.0)
+    hz = lambda m: 700.0 * (10 ** (m / 2595.0) - 1.0)
+    top = min(MAX_BAND_HZ, 0.95 * rate / 2)
+    edges = hz(np.linspace(mel(MIN_BAND_HZ), mel(top), N_MELS + 2))
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / rate)
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (freqs - lower) / np.maximum(center - lower, 1e-6)
+    falling = (upper - freqs) / np.maximum(upper - center, 1e-6)
+    return np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+
+
+def _dct_matrix() -> np.ndarray:
+    """Orthonormal DCT-II rows for MFCCs 0..N_MFCC-1"""
+    n = np.arange(N_MELS)
+    k = np.arange(N_MFCC)[:, None]
+    dct = np.cos(np.pi / N_MELS * (n + 0.5) * k) * np.sqrt(2.0 / N_MELS)
+    dct[0] /= np.sqrt(2.0)
+    return dct.astype(np.float32)
+
+
+class _Analysis:
+    """Per-sample-rate constants, built once and shared"""
+
+    _cache: Dict[int, "_Analysis"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, rate: int):
+        self.rate = rate
+        self.frame = int(round(rate * FRAME_SECONDS))
+        self.hop = int(round(rate * HOP_SECONDS))
+        # Zero-padded to >= 2x the frame so the inverse FFT is a linear autocorrelation
+        self.n_fft = 1 << int(np.ceil(np.log2(2 * self.frame)))
+        self.window = np.hanning(self.frame).astype(np.float32)
+        freqs = np.fft.rfftfreq(self.n_fft, 1.0 / rate)
+        # Pre-emphasis (1 - a z^-1) applied as a spectral tilt, so it needs no
+        # sample carried across chunks
+        tilt = np.abs(1.0 - PRE_EMPHASIS * np.exp(-2j * np.pi * freqs / rate)) ** 2
+        self.mel = (_mel_filters(self.n_fft, rate) * tilt).T.astype(np.float32)
+        self.dct = _dct_matrix().T
+        self.freqs = freqs.astype(np.float32)
+        self.min_lag = max(2, int(rate / MAX_PITCH_HZ))
+        self.max_lag = min(self.frame - 2, int(np.ceil(rate / MIN_PITCH_HZ)))
+        window_acf = np.fft.irfft(np.abs(np.fft.rfft(self.window, self.n_fft)) ** 2)[:self.max_lag + 2]
+        self.window_acf = (window_acf / window_acf[0]).astype(np.float32)
+
+    @classmethod
+    def for_rate(cls, rate: int) -> "_Analysis":
+        analysis = cls._cache.get(rate)
+        if analysis is None:
+            with cls._lock:
+                analysis = cls._cache.setdefault(rate, cls(rate))
+        return analysis
+
+
+class VoiceFeatureExtractor:
+    """
+    Streaming accumulator: feed() decoded chunks in order, then features().
+    Only running sums (and a leftover partial frame) are kept.
+    """
+
+    def __init__(self, rate: int):
+        if rate < 4000:
+            raise ValueError(f"Sample rate too low for voice analysis: {rate} Hz")
+        self.a = _Analysis.for_rate(rate)
+        self._tail = np.zeros(0, dtype=np.float32)
+        self.samples = 0
+        self.frames = 0
+        self.speech_frames = 0
+        self.voiced_frames = 0
+        self._mfcc_sum = np.zeros(N_MFCC, dtype=np.float64)
+        self._mfcc_sq = np.zeros(N_MFCC, dtype=np.float64)
+        self._rms_sum = 0.0
+        self._centroid_sum = 0.0
+        self._zcr_sum = 0.0
+        # Pitch histogram in quarter-semitones above MIN_PITCH_HZ, for a streaming median
+        bins = int(np.ceil(12 * np.log2(MAX_PITCH_HZ / MIN_PITCH_HZ) * PITCH_BINS_PER_SEMITONE)) + 1
+        self._pitch_hist = np.zeros(bins, dtype=np.int64)
+        self._semitone_sum = 0.0
+        self._semitone_sq = 0.0
+
+    def feed(self, chunk: np.ndarray):
+        a = self.a
+        self.samples += len(chunk)
+        buffered = np.concatenate((self._tail, chunk)) if len(self._tail) else chunk
+        if len(buffered) < a.frame:
+            self._tail = buffered
+            return
+        count = 1 + (len(buffered) - a.frame) // a.hop
+        frames = np.lib.stride_tricks.sliding_window_view(buffered, a.frame)[::a.hop][:count]
+        for start in range(0, count, BLOCK_FRAMES):
+            self._analyze(frames[start:start + BLOCK_FRAMES])
+        self._tail = buffered[count * a.hop:].copy()
+
+    def _analyze(self, frames: np.ndarray):
+        a = self.a
+        self.frames += len(frames)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        speech = rms >= 10 ** (SPEECH_FLOOR_DBFS / 20)
+        if not speech.any():
+            return
+        frames, rms = frames[speech], rms[speech]
+        self.speech_frames += len(frames)
+
+        spectrum = np.fft.rfft(frames * a.window, a.n_fft, axis=1)
+        power = (spectrum.real ** 2 + spectrum.imag ** 2).astype(np.float32)
+
+        mfcc = np.log(power @ a.mel + 1e-10) @ a.dct
+        self._mfcc_sum += mfcc.sum(axis=0)
+        self._mfcc_sq += (mfcc.astype(np.float64) ** 2).sum(axis=0)
+        self._rms_sum += float(rms.sum())
+        total = power.sum(axis=1)
+        self._centroid_sum += float(((power @ a.freqs) / np.maximum(total, 1e-20)).sum())
+        signs = np.signbit(frames)
+        self._zcr_sum += float((signs[:, 1:] != signs[:, :-1]).mean(axis=1).sum())
+
+        # Autocorrelation, normalised and corrected for the window's own taper
+        acf = np.fft.irfft(power, a.n_fft, axis=1)[:, :a.max_lag + 2]
+        acf = acf / np.maximum(acf[:, :1], 1e-20) / a.window_acf
+        search = acf[:, a.min_lag:a.max_lag + 1]
+        peak = np.argmax(search, axis=1)
+        strength = search[np.arange(len(search)), peak]
+        voiced = strength >= VOICING_THRESHOLD
+        if not voiced.any():
+            return
+        lag = peak[voiced] + a.min_lag
+        rows = np.flatnonzero(voiced)
+        left, centre, right = acf[rows, lag - 1], acf[rows, lag], acf[rows, lag + 1]
+        curvature = left - 2 * centre + right
+        offset = np.where(curvature < 0, 0.5 * (left - right) / np.where(curvature < 0, curvature, -1), 0.0)
+        pitch = a.rate / (lag + np.clip(offset, -0.5, 0.5))
+        semitones = 12 * np.log2(np.clip(pitch, MIN_PITCH_HZ, MAX_PITCH_HZ) / MIN_PITCH_HZ)
+        self.voiced_frames += len(semitones)
+        self._pitch_hist += np.bincount(
+            np.round(semitones * PITCH_BINS_PER_SEMITONE).astype(np.int64),
+            minlength=len(self._pitch_hist),
+        )[:len(self._pitch_hist)]
+        self._semitone_sum += float(semitones.sum())
+        self._semitone_sq += float((semitones ** 2).sum())
+
+    def _median_pitch(self) -> Optional[float]:
+        if self.voiced_frames == 0:
+            return None
+        middle = np.searchsorted(np.cumsum(self._pitch_hist), (self.voiced_frames + 1) / 2)
+        return float(MIN_PITCH_HZ * 2 ** (middle / PITCH_BINS_PER_SEMITONE / 12))
+
+    def embedding(self) -> Optional[np.ndarray]:
+        """EMBEDDING_DIM float32 voice print, or None without enough (voiced) speech"""
+        if self.speech_frames < 10 or self.voiced_frames == 0:
+            return None
+        n = self.speech_frames
+        mean = self._mfcc_sum / n
+        spread = np.sqrt(np.maximum(self._mfcc_sq / n - mean ** 2, 1e-12))
+
+        def unit(block):
+            norm = np.linalg.norm(block)
+            return block / norm if norm > 0 else block
+
+        mean_block = unit(mean[1:] * np.sqrt(np.arange(1, N_MFCC)))
+        # Relative spread across coefficients (the absolute level mostly tracks loudness changes)
+        log_spread = np.log(spread[1:])
+        spread_block = unit(log_spread - log_spread.mean())
+        median = self._median_pitch()
+        if median is not None and self.voiced_frames >= 5:
+            v = self.voiced_frames
+            semitone_std = np.sqrt(max(self._semitone_sq / v - (self._semitone_sum / v) ** 2, 0.0))
+            pitch_block = np.array([np.log2(median / PITCH_REFERENCE_HZ), semitone_std / 12 - 0.25])
+        else:
+            pitch_block = np.zeros(2)
+        vector = np.concatenate((
+            MFCC_MEAN_WEIGHT * mean_block,
+            MFCC_SPREAD_WEIGHT * spread_block,
+            PITCH_WEIGHT * pitch_block,
+        ))
+        norm = np.linalg.norm(vector)
+        if not np.isfinite(norm) or norm == 0:
+            return None
+        return (vector / norm).astype(np.float32)
+
+    def features(self) -> Dict[str, object]:
+        n = max(self.speech_frames, 1)
+        pitch = self._median_pitch()
+        v = max(self.voiced_frames, 1)
+        semitone_std = np.sqrt(max(self._semitone_sq / v - (self._semitone_sum / v) ** 2, 0.0))
+        return {
+            "sample_rate": self.a.rate,
+            "duration_seconds": round(self.samples / self.a.rate, 3),
+            "frames": self.frames,
+            "speech_frames": self.speech_frames,
+            "voiced_frames": self.voiced_frames,
+            "pitch_estimate": round(pitch, 1) if pitch is not None else None,
+            "pitch_variability": round(float(semitone_std), 2) if self.voiced_frames else None,
+            "energy_level": round(self._rms_sum / n, 4),
+            "spectral_centroid": round(self._centroid_sum / n, 1),
+            "zero_crossing_rate": round(self._zcr_sum / n, 4),
+            "embedding": self.embedding(),
+        }
+
+
+def extract_features(stream: BinaryIO, cpu_budget_ms: Optional[float] = VOICE_DSP_CPU_BUDGET_MS,
+                     max_seconds: float = VOICE_MAX_AUDIO_SECONDS,
+                     raw_rate: Optional[int] = None) -> Dict[str, object]:
+    """
+    Voice features for an audio stream (see the module docstring), plus
+    voice_hash / sample_length over the full upload. Analysis stops early
+    (truncated=True) at max_seconds of audio or once the CPU budget is used.
+    raw_rate: sample rate of a declared headerless PCM stream (see
+    raw_pcm_rate()). Raises ValueError for audio that can't be decoded.
+    """
+    reader = _HashingReader(stream)
+    started = time.thread_time()
+    rate, chunks = iter_pcm_chunks(reader, raw_rate=raw_rate)
+    extractor = VoiceFeatureExtractor(rate)
+    max_samples = int(max_seconds * rate)
+    truncated = False
+    for chunk in chunks:
+        extractor.feed(chunk[:max_samples - extractor.samples])
+        if extractor.samples >= max_samples:
+            truncated = True
+            break
+        if cpu_budget_ms is not None and (time.thread_time() - started) * 1000 >= cpu_budget_ms:
+            truncated = True
+            break
+    # The voice hash identifies the upload, so it always covers all of it
+    reader.drain()
+    features = extractor.features()
+    features.update({
+        "voice_hash": reader.sha256.hexdigest()[:32],
+        "sample_length": reader.size,
+        "truncated": truncated,
+        "cpu_ms": round((time.thread_time() - started) * 1000, 1),
+    })
+    return features
+
+
+# Dedicated pool: a burst of long uploads can't starve the default executor
+_dsp_pool = ThreadPoolExecutor(max_workers=VOICE_DSP_WORKERS, thread_name_prefix="voice-dsp")
+_pending = 0  # queued + running; released when the extraction really finishes
+_pending_lock = threading.Lock()
+
+
+def _release_pending(_future=None):
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+def _reserve_pending() -> bool:
+    global _pending
+    with _pending_lock:
+        if _pending >= VOICE_DSP_MAX_PENDING:
+            return False
+        _pending += 1
+        return True
+
+
+async def extract_features_async(stream: BinaryIO, raw_rate: Optional[int] = None) -> Dict[str, object]:
+    """extract_features() on the DSP pool; VoiceDSPBusyError when it is saturated"""
+    if not _reserve_pending():
+        raise VoiceDSPBusyError("Voice analysis is busy, retry shortly")
+    try:
+        future = _dsp_pool.submit(extract_features, stream, raw_rate=raw_rate)
+    except Exception:
+        _release_pending()
+        raise
+    # The slot stays taken until the DSP thread is really done, even if the
+    # request is cancelled: a running extraction can't be stopped
+    future.add_done_callback(_release_pending)
+    return await asyncio.wrap_future(future)
@@ -0,0 +1,341 @@
+"""
+Voice Print Index
+In-memory nearest-neighbour index over voice embeddings (fixed-length,
+L2-normalised float32 vectors, stored in voice_biometrics.voice_embedding
+as packed little-endian float32 bytes). Scores are cosine similarity.
+
+- Up to VOICE_INDEX_IVF_THRESHOLD prints, search is one brute-force
+  matrix-vector product over all of them.
+- Beyond that an IVF (inverted file) layer is trained in a background
+  thread: spherical k-means centroids (~sqrt(N) lists), each print filed
+  under its nearest centroid. A query scores the centroids, then only the
+  prints in the VOICE_INDEX_NPROBE closest lists.
+- register-voice inserts incrementally (filed under the nearest existing
+  centroid); the IVF layer is retrained once the index has doubled in size
+  since the last training (and not while the startup load is running).
+
+The index loads from the database in a background thread at startup and
+catches up on rows registered by other workers every
+VOICE_INDEX_REFRESH_SECONDS. Deleted prints are dropped locally at once;
+deletes made by other workers are filtered out when match metadata is
+fetched from the database.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VOICE_INDEX_IVF_THRESHOLD = int(os.getenv("VOICE_INDEX_IVF_THRESHOLD", "20000"))
+VOICE_INDEX_NPROBE = int(os.getenv("VOICE_INDEX_NPROBE", "32"))
+VOICE_INDEX_REFRESH_SECONDS = float(os.getenv("VOICE_INDEX_REFRESH_SECONDS", "60"))
+VOICE_INDEX_LOAD_CHUNK = 10000
+
+KMEANS_ITERATIONS = 8
+KMEANS_SAMPLE_PER_LIST = 64
+ASSIGN_CHUNK = 8192
+
+
+def pack_embedding(vector: np.ndarray) -> bytes:
+    return np.asarray(vector, dtype="<f4").tobytes()
+
+
+def unpack_embedding(data: bytes, dim: int) -> Optional[np.ndarray]:
+    """Stored embedding, or None if it was written with a different dimension"""
+    if data is None or len(data) != dim * 4:
+        return None
+    return np.frombuffer(bytes(data), dtype="<f4").astype(np.float32)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (by dot product) for each row, in memory-bounded chunks"""
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK):
+        out[start:start + ASSIGN_CHUNK] = np.argmax(vectors[start:start + ASSIGN_CHUNK] @ centroids.T, axis=1)
+    return out
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of the (normalised) vectors"""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * KMEANS_SAMPLE_PER_LIST)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        labels = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        # Re-seed empty lists from random sample points
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+class _IVF:
+    """Centroids plus, per list, the matrix rows filed under it"""
+
+    def __init__(self, centroids: np.ndarray, labels: np.ndarray, trained_rows: int):
+        self.centroids = centroids
+        order = np.argsort(labels, kind="stable").astype(np.int64)
+        bounds = np.searchsorted(labels[order], np.arange(len(centroids) + 1))
+        self.lists: List[np.ndarray] = [order[bounds[i]:bounds[i + 1]] for i in range(len(centroids))]
+        # Rows inserted since training, as appended row-array chunks per list
+        self.extra: List[List[np.ndarray]] = [[] for _ in range(len(centroids))]
+        self.trained_rows = trained_rows
+
+    def add_rows(self, first_row: int, vectors: np.ndarray):
+        labels = _assign(vectors, self.centroids)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(len(self.centroids) + 1))
+        for c in np.flatnonzero(bounds[1:] > bounds[:-1]):
+            self.extra[c].append(first_row + order[bounds[c]:bounds[c + 1]].astype(np.int64))
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        scores = self.centroids @ query
+        nprobe = min(nprobe, len(scores))
+        probe = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        parts = [self.lists[c] for c in probe]
+        for c in probe:
+            parts.extend(self.extra[c])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+
+class VoiceIndex:
+    def __init__(self, dim: int, version: int, ivf_threshold: int = VOICE_INDEX_IVF_THRESHOLD,
+                 nprobe: int = VOICE_INDEX_NPROBE):
+        self.dim = dim
+        self.version = version  # only prints from this embedding version are comparable
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self._vectors = np.zeros((1024, dim), dtype=np.float32)
+        self._ids = np.full(1024, -1, dtype=np.int64)
+        self._size = 0  # rows used, including tombstones
+        self._live = 0
+        self._ivf: Optional[_IVF] = None
+        self._training = False
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._started = False
+        self._max_loaded_id = 0
+        self._refreshed_at = 0.0
+        self._refreshing = False
+        self.load_error: Optional[str] = None
+
+    def __len__(self) -> int:
+        return self._live
+
+    # -- mutation --------------------------------------------------------
+
+    def _grow(self, needed: int):
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        ids = np.full(capacity, -1, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._vectors, self._ids = vectors, ids
+
+    def _tombstone(self, voice_ids: np.ndarray) -> int:
+        rows = np.flatnonzero(np.isin(self._ids[:self._size], voice_ids))
+        self._ids[rows] = -1
+        self._live -= len(rows)
+        return len(rows)
+
+    def add_many(self, voice_ids: np.ndarray, vectors: np.ndarray, replace: bool = True):
+        """Insert (or, with replace, overwrite) prints; vectors are normalised here"""
+        voice_ids = np.asarray(voice_ids, dtype=np.int64)
+        if len(voice_ids) == 0:
+            return
+        vectors = normalize(np.asarray(vectors, dtype=np.float32).reshape(len(voice_ids), self.dim))
+        with self._lock:
+            if replace:
+                self._tombstone(voice_ids)
+            start = self._size
+            self._grow(start + len(voice_ids))
+            self._vectors[start:start + len(voice_ids)] = vectors
+            self._ids[start:start + len(voice_ids)] = voice_ids
+            self._size += len(voice_ids)
+            self._live += len(voice_ids)
+            if self._ivf is not None:
+                self._ivf.add_rows(start, vectors)
+        self._maybe_train()
+
+    def add(self, voice_id: int, vector: np.ndarray):
+        self.add_many(np.array([voice_id]), np.asarray(vector).reshape(1, -1))
+
+    def remove(self, voice_id: int) -> bool:
+        with self._lock:
+            return self._tombstone(np.array([voice_id])) > 0
+
+    # -- IVF training ----------------------------------------------------
+
+    def _maybe_train(self):
+        ivf = self._ivf
+        if self._live < self.ivf_threshold or self._training or self.loading:
+            return
+        if ivf is not None and self._size < 2 * ivf.trained_rows:
+            return
+        self._training = True
+        threading.Thread(target=self._train, name="voice-index-train", daemon=True).start()
+
+    def _train(self):
+        try:
+            started = time.monotonic()
+            with self._lock:
+                vectors, ids, size = self._vectors, self._ids, self._size
+            live_rows = np.flatnonzero(ids[:size] >= 0)
+            nlist = int(min(4096, max(16, np.sqrt(len(live_rows)))))
+            centroids = train_centroids(vectors[live_rows], nlist)
+            labels = np.full(size, 0, dtype=np.int32)
+            labels[live_rows] = _assign(vectors[live_rows], centroids)
+            ivf = _IVF(centroids, labels, size)
+            with self._lock:
+                # File rows inserted while training ran, then swap in
+                if self._size > size:
+                    ivf.add_rows(size, self._vectors[size:self._size])
+                self._ivf = ivf
+            logger.info("Voice index: trained %d IVF lists over %d prints in %.1fs",
+                        nlist, len(live_rows), time.monotonic() - started)
+        except Exception:
+            logger.exception("Voice index IVF training failed; staying on the previous layout")
+        finally:
+            self._training = False
+
+    # -- search ----------------------------------------------------------
+
+    def search(self, query: np.ndarray, k: int = 10, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """Up to k (voice id, cosine score) pairs with score >= min_score, best first"""
+        self._maybe_refresh()
+        query = normalize(np.asarray(query, dtype=np.float32).reshape(self.dim))
+        with self._lock:
+            vectors, ids, size, ivf = self._vectors, self._ids, self._size, self._ivf
+        if size == 0:
+            return []
+        if ivf is None:
+            scores = vectors[:size] @ query
+            rows = None
+        else:
+            rows = ivf.candidates(query, self.nprobe)
+            rows = rows[rows < size]
+            scores = vectors[rows] @ query
+        candidate_ids = ids[:size] if rows is None else ids[rows]
+        scores = np.where(candidate_ids >= 0, scores, -np.inf)
+        keep = np.flatnonzero(scores >= min_score)
+        if len(keep) > k:
+            keep = keep[np.argpartition(-scores[keep], k - 1)[:k]]
+        keep = keep[np.argsort(-scores[keep], kind="stable")]
+        results, seen = [], set()
+        for i in keep:
+            voice_id = int(candidate_ids[i])
+            if voice_id not in seen:  # a print registered while the initial load ran
+                seen.add(voice_id)
+                results.append((voice_id, float(scores[i])))
+        return results
+
+    # -- loading from the database ----------------------------------------
+
+    def start(self):
+        """Load stored embeddings in the background"""
+        self._started = True
+        threading.Thread(target=self._load, name="voice-index-load", daemon=True).start()
+
+    def _fetch_since(self, last_id: int, replace: bool) -> int:
+        from .database import get_db_connection
+        conn = get_db_connection()
+        loaded = 0
+        try:
+            cur = conn.cursor(name="voice_index_load")
+            cur.itersize = VOICE_INDEX_LOAD_CHUNK
+            cur.execute(
+                "SELECT id, voice_embedding FROM voice_biometrics "
+                "WHERE id > %s AND voice_embedding_version = %s AND voice_embedding IS NOT NULL ORDER BY id",
+                (last_id, self.version)
+            )
+            while True:
+                rows = cur.fetchmany(VOICE_INDEX_LOAD_CHUNK)
+                if not rows:
+                    break
+                self._max_loaded_id = max(self._max_loaded_id, rows[-1][0])
+                ids, blobs = [], []
+                for voice_id, blob in rows:
+                    if blob is not None and len(blob) == self.dim * 4:
+                        ids.append(voice_id)
+                        blobs.append(bytes(blob))
+                if ids:
+                    vectors = np.frombuffer(b"".join(blobs), dtype="<f4").reshape(len(ids), self.dim)
+                    self.add_many(np.array(ids), vectors, replace=replace)
+                    loaded += len(ids)
+            cur.close()
+            conn.commit()
+        finally:
+            conn.close()
+        return loaded
+
+    def _load(self):
+        started = time.monotonic()
+        try:
+            loaded = self._fetch_since(0, replace=False)
+            logger.info("Voice index: loaded %d prints in %.1fs", loaded, time.monotonic() - started)
+        except Exception as e:
+            self.load_error = str(e)
+            logger.exception("Voice index load failed; matching against prints registered from now on")
+        finally:
+            self._refreshed_at = time.monotonic()
+            self._loaded.set()
+            self._maybe_train()
+
+    def wait_loaded(self, timeout: float) -> bool:
+        return self._loaded.wait(timeout)
+
+    @property
+    def loading(self) -> bool:
+        return self._started and not self._loaded.is_set()
+
+    def _maybe_refresh(self):
+        """Pick up prints registered through other workers"""
+        if not self._loaded.is_set() or self._refreshing:  # also: never started (no DB)
+            return
+        if time.monotonic() - self._refreshed_at < VOICE_INDEX_REFRESH_SECONDS:
+            return
+        self._refreshing = True
+        self._refreshed_at = time.monotonic()
+        threading.Thread(target=self._refresh, name="voice-index-refresh", daemon=True).start()
+
+    def _refresh(self):
+        try:
+            # Rows this worker registered itself come back too; replace, don't duplicate
+            self._fetch_since(self._max_loaded_id, replace=True)
+        except Exception:
+            logger.exception("Voice index refresh failed")
+        finally:
+            self._refreshing = False
+
+    def stats(self) -> Dict[str, Any]:
+        ivf = self._ivf
+        return {
+            "prints": self._live,
+            "dim": self.dim,
+            "version": self.version,
+            "mode": "ivf" if ivf is not None else "brute_force",
+            "ivf_lists": len(ivf.centroids) if ivf is not None else 0,
+            "nprobe": self.nprobe,
+            "loaded": self._loaded.is_set(),
+            "load_error": self.load_error,
+            "training": self._training,
+        }
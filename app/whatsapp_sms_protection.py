@@ -8,13 +8,29 @@ WhatsApp/SMS/Telegram Protection System
 """
 
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy import text
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import AsyncIterator
+import asyncio
+import os
 import re
 import json
+import time
+from . import keyword_rules
 
 router = APIRouter(prefix="/api/messaging", tags=["messaging-protection"])
 
+MAX_BULK_SCAN = int(os.getenv("MESSAGING_BULK_SCAN_MAX", "5000"))
+BULK_SCAN_CHUNK = int(os.getenv("MESSAGING_BULK_SCAN_CHUNK", "200"))  # messages per worker task
+BULK_SCAN_CPU_BUDGET_MS = float(os.getenv("MESSAGING_BULK_SCAN_CPU_BUDGET_MS", "5000"))  # per request
+BULK_SCAN_WORKERS = int(os.getenv("MESSAGING_BULK_SCAN_WORKERS", "2"))
+
+# Dedicated pool so bulk scans queue behind each other, not behind (or in
+# front of) the default executor used by asyncio.to_thread elsewhere
+_bulk_scan_pool = ThreadPoolExecutor(max_workers=BULK_SCAN_WORKERS, thread_name_prefix="messaging-bulk-scan")
+
 # Scam pattern database
 SCAM_PATTERNS = {
     "digital_arrest": [
@@ -68,6 +84,17 @@ THREAT_KEYWORDS = [
     "fine", "penalty", "blocked", "suspended"
 ]
 
+# Compiled once at import instead of per message
+COMPILED_SCAM_PATTERNS = {
+    scam_type: [re.compile(pattern) for pattern in patterns]
+    for scam_type, patterns in SCAM_PATTERNS.items()
+}
+PHONE_RE = re.compile(r'\+?\d[\d\s-]{8,}\d')
+URL_RE = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+
+URGENCY_SET = keyword_rules.register("messaging.urgency", URGENCY_KEYWORDS)
+THREAT_SET = keyword_rules.register("messaging.threat", THREAT_KEYWORDS)
+
 def analyze_message(message_text: str, sender_info: dict) -> dict:
     """
     Analyze message for scam patterns
@@ -78,35 +105,35 @@ def analyze_message(message_text: str, sender_info: dict) -> dict:
     - red_flags: list of suspicious elements
     - confidence: 0-100%
     """
-    message_lower = message_text.lower()
+    hits = keyword_rules.scan(message_text)
     red_flags = []
     scam_types_detected = []
     
     # Check scam patterns
-    for scam_type, patterns in SCAM_PATTERNS.items():
+    for scam_type, patterns in COMPILED_SCAM_PATTERNS.items():
         for pattern in patterns:
-            if re.search(pattern, message_text):
+            if pattern.search(message_text):
                 scam_types_detected.append(scam_type)
                 red_flags.append(f"Matches {scam_type} pattern")
                 break
     
     # Check urgency
-    urgency_count = sum(1 for keyword in URGENCY_KEYWORDS if keyword in message_lower)
+    urgency_count = hits.count(URGENCY_SET)
     if urgency_count > 0:
         red_flags.append(f"Contains {urgency_count} urgency keywords")
     
     # Check threats
-    threat_count = sum(1 for keyword in THREAT_KEYWORDS if keyword in message_lower)
+    threat_count = hits.count(THREAT_SET)
     if threat_count > 0:
         red_flags.append(f"Contains {threat_count} threat keywords")
     
     # Check for phone numbers
-    phone_numbers = re.findall(r'\+?\d[\d\s-]{8,}\d', message_text)
+    phone_numbers = PHONE_RE.findall(message_text)
     if phone_numbers:
         red_flags.append(f"Contains {len(phone_numbers)} phone numbers")
     
     # Check for URLs
-    urls = re.findall(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', message_text)
+    urls = URL_RE.findall(message_text)
     if urls:
         red_flags.append(f"Contains {len(urls)} URLs")
     
@@ -260,8 +287,62 @@ async def scan_message(payload: dict, request: Request):
         }
     }
 
+def _bulk_result(msg: dict) -> dict:
+    try:
+        analysis = analyze_message(
+            msg.get("message_text", ""),
+            msg.get("sender", {})
+        )
+        return {
+            "message_id": msg.get("id"),
+            "threat_level": analysis["threat_level"],
+            "is_scam": analysis["is_scam"],
+            "scam_type": analysis["scam_type"],
+            "confidence": analysis["confidence"]
+        }
+    except Exception as e:
+        return {
+            "message_id": msg.get("id"),
+            "error": str(e)
+        }
+
+
+def _scan_chunk(messages: list, cpu_budget: float) -> tuple:
+    """
+    Runs on a bulk-scan worker thread. Stops early once the chunk has used
+    cpu_budget seconds of CPU; returns (results, cpu seconds used).
+    """
+    started = time.thread_time()
+    results = []
+    for msg in messages:
+        results.append(_bulk_result(msg if isinstance(msg, dict) else {}))
+        if time.thread_time() - started >= cpu_budget:
+            break
+    return results, time.thread_time() - started
+
+
+async def _bulk_scan_chunks(messages: list, cpu_budget: float) -> AsyncIterator[tuple]:
+    """
+    Scan messages in BULK_SCAN_CHUNK-sized chunks on the worker pool,
+    yielding (offset, results) per chunk and handing control back to the
+    event loop in between. Stops when the request's CPU budget is spent;
+    messages after that point get no result.
+    """
+    loop = asyncio.get_running_loop()
+    used = 0.0
+    for offset in range(0, len(messages), BULK_SCAN_CHUNK):
+        remaining = cpu_budget - used
+        if remaining <= 0:
+            return
+        chunk = messages[offset:offset + BULK_SCAN_CHUNK]
+        results, cpu = await loop.run_in_executor(_bulk_scan_pool, _scan_chunk, chunk, remaining)
+        used += cpu
+        yield offset, results
+        await asyncio.sleep(0)
+
+
 @router.post("/bulk-scan")
-async def bulk_scan_messages(payload: dict):
+async def bulk_scan_messages(payload: dict, request: Request):
     """
     Scan multiple messages at once
     
@@ -271,43 +352,73 @@ async def bulk_scan_messages(payload: dict):
             {"message_text": "...", "sender": {...}, ...},
             ...
         ],
-        "user_id": "customer_id"
+        "user_id": "customer_id",
+        "stream": false,
+        "cpu_budget_ms": 1000
     }
     
-    Returns list of scan results
+    Messages are scanned in chunks on a worker pool, so a large payload
+    doesn't hold up other requests. At most MESSAGING_BULK_SCAN_MAX messages
+    per call; scanning stops once the request has used its CPU budget
+    (MESSAGING_BULK_SCAN_CPU_BUDGET_MS, or a lower cpu_budget_ms) and the
+    rest are reported as skipped.
+    
+    Returns list of scan results, or with "stream": true (or Accept:
+    application/x-ndjson) one NDJSON result per message as each chunk
+    completes, followed by a summary line.
     """
     messages = payload.get("messages", [])
     user_id = payload.get("user_id")
     
     if not messages:
         raise HTTPException(400, "messages array required")
+    if not isinstance(messages, list):
+        raise HTTPException(400, "messages must be an array")
+    if len(messages) > MAX_BULK_SCAN:
+        raise HTTPException(413, f"At most {MAX_BULK_SCAN} messages per bulk scan")
     
-    results = []
-    for msg in messages:
+    budget_ms = BULK_SCAN_CPU_BUDGET_MS
+    if payload.get("cpu_budget_ms") is not None:
         try:
-            analysis = analyze_message(
-                msg.get("message_text", ""),
-                msg.get("sender", {})
-            )
-            results.append({
-                "message_id": msg.get("id"),
-                "threat_level": analysis["threat_level"],
-                "is_scam": analysis["is_scam"],
-                "scam_type": analysis["scam_type"],
-                "confidence": analysis["confidence"]
-            })
-        except Exception as e:
-            results.append({
-                "message_id": msg.get("id"),
-                "error": str(e)
-            })
+            budget_ms = min(budget_ms, float(payload["cpu_budget_ms"]))
+        except (TypeError, ValueError):
+            raise HTTPException(400, "cpu_budget_ms must be a number")
+    cpu_budget = budget_ms / 1000.0
+    
+    stream = bool(payload.get("stream")) or "ndjson" in request.headers.get("accept", "")
+    
+    def summary(scanned: int, scams: int) -> dict:
+        return {
+            "total_scanned": scanned,
+            "scams_detected": scams,
+            "skipped": len(messages) - scanned,
+            "budget_exhausted": scanned < len(messages)
+        }
+    
+    if stream:
+        async def generate():
+            scanned = scams = 0
+            async for offset, results in _bulk_scan_chunks(messages, cpu_budget):
+                lines = []
+                for i, result in enumerate(results):
+                    scams += bool(result.get("is_scam"))
+                    lines.append(json.dumps({"index": offset + i, **result}))
+                scanned += len(results)
+                yield "\n".join(lines) + "\n"
+            yield json.dumps({"summary": True, **summary(scanned, scams)}) + "\n"
+        
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+    
+    results = []
+    async for _, chunk_results in _bulk_scan_chunks(messages, cpu_budget):
+        results.extend(chunk_results)
     
     return {
-        "total_scanned": len(messages),
-        "scams_detected": sum(1 for r in results if r.get("is_scam")),
+        **summary(len(results), sum(1 for r in results if r.get("is_scam"))),
         "results": results
     }
 
+
 @router.get("/scan-history/{user_id}")
 async def get_scan_history(user_id: str, request: Request, limit: int = 50):
     """Get message scan history for a user"""
@@ -7,26 +7,13 @@ from fastapi import APIRouter, HTTPException, BackgroundTasks
 from pydantic import BaseModel
 from typing import Dict, Any, Optional, List
 from datetime import datetime
-import os
 import uuid
 import json
+from .llm_gateway import llm_gateway
 
 router = APIRouter(prefix="/api/calls", tags=["call-analysis"])
 
 
-# Lazy import OpenAI to prevent startup crashes
-def get_openai_client():
-    """Get OpenAI client with lazy import"""
-    try:
-        from openai import OpenAI
-        return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    except ImportError:
-        raise HTTPException(
-            status_code=503,
-            detail="OpenAI package not available. Please contact support."
-        )
-
-
 # Request Models
 class CallAnalysisRequest(BaseModel):
     audio_url: str
@@ -42,7 +29,7 @@ class QuickScamCheck(BaseModel):
 
 
 # Analysis Functions
-def analyze_text_for_scam(client, text: str) -> Dict[str, Any]:
+async def analyze_text_for_scam(text: str) -> Dict[str, Any]:
     """
     Analyze text for scam indicators using GPT-4
     """
@@ -67,7 +54,7 @@ Provide analysis in JSON format:
 }}"""
 
     try:
-        response = client.chat.completions.create(
+        content = await llm_gateway.chat(
             model="gpt-4o-mini",  # Use mini for cost efficiency
             messages=[
                 {"role": "system", "content": "You are an expert scam detection AI."},
@@ -77,7 +64,7 @@ Provide analysis in JSON format:
             temperature=0.3
         )
         
-        return json.loads(response.choices[0].message.content)
+        return json.loads(content)
     except Exception as e:
         return {
             "is_scam": False,
@@ -106,8 +93,7 @@ async def analyze_call_text(request: QuickScamCheck):
     Quick scam analysis from text (for testing without audio)
     """
     try:
-        client = get_openai_client()
-        analysis = analyze_text_for_scam(client, request.text)
+        analysis = await analyze_text_for_scam(request.text)
         
         # Generate alert message
         alert = None
@@ -137,8 +123,7 @@ async def quick_scam_check(request: QuickScamCheck):
     Returns instant threat assessment
     """
     try:
-        client = get_openai_client()
-        analysis = analyze_text_for_scam(client, request.text)
+        analysis = await analyze_text_for_scam(request.text)
         
         return {
             "is_scam": analysis.get("is_scam", False),
@@ -159,8 +144,6 @@ async def test_whisper_api():
     Test endpoint to verify Whisper API is configured
     """
     try:
-        client = get_openai_client()
-        
         # Test with sample scam text
         test_text = """
         Hello sir, this is Officer Kumar from Delhi Police Cyber Crime Department.
@@ -170,7 +153,7 @@ async def test_whisper_api():
         Do not disconnect this call or we will send police to your home.
         """
         
-        analysis = analyze_text_for_scam(client, test_text)
+        analysis = await analyze_text_for_scam(test_text)
         
         return {
             "status": "success",
@@ -202,30 +185,4 @@ async def get_analysis_stats():
     }
 
 
-# Placeholder endpoints for future implementation
-@router.post("/upload")
-async def upload_call_recording(request: CallAnalysisRequest):
-    """
-    Upload call recording for analysis
-    TODO: Implement S3 upload and Whisper transcription
-    """
-    return {
-        "call_id": f"CALL-{uuid.uuid4().hex[:12].upper()}",
-        "status": "pending",
-        "message": "Audio upload endpoint will be implemented when S3 is configured",
-        "created_at": datetime.now().isoformat()
-    }
-
-
-@router.get("/{call_id}")
-async def get_call_analysis(call_id: str):
-    """
-    Get analysis results
-    TODO: Connect to database
-    """
-    return {
-        "call_id": call_id,
-        "status": "not_found",
-        "message": "Database integration pending"
-    }
-
+# Recording upload and GET /{call_id} are served by call_analysis.py (queued analysis)
@@ -0,0 +1,321 @@
+"""
+Write-behind buffers for hot logging paths
+Scan endpoints append their log rows and per-user counter deltas here
+instead of writing them inline. A background task flushes every
+WRITE_BEHIND_FLUSH_MS:
+- log rows go out as one executemany per table
+- counter deltas are coalesced per key first, so a user bulk-scanning
+  their inbox touches their statistics row once per flush instead of
+  once per message
+
+Memory is bounded by WRITE_BEHIND_MAX_PENDING rows per buffer; when a
+buffer fills up the caller awaits an inline flush (backpressure) rather
+than growing the queue. Buffers are flushed on shutdown via close_all().
+
+A batch that fails on a transient error (connection lost, timeout) is
+re-queued whole. One that fails on bad data (constraint, type or length
+violation) is bisected until the offending rows are isolated; those are
+dead-lettered (logged, counted, last few kept for the platform status)
+and everything else is written, so one bad row never blocks the buffer.
+
+Log rows whose id the client needs straight away take it from a
+SequenceIdAllocator, which reserves ids from the table's serial sequence
+a block at a time.
+"""
+
+import asyncio
+import logging
+import os
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from sqlalchemy import exc as sa_exc
+from sqlalchemy import text
+
+from .database import AsyncDB
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "250"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "5000"))
+WRITE_BEHIND_DEAD_LETTER_KEEP = int(os.getenv("WRITE_BEHIND_DEAD_LETTER_KEEP", "50"))
+WRITE_BEHIND_ID_BLOCK = int(os.getenv("WRITE_BEHIND_ID_BLOCK", "100"))
+
+_buffers: List["WriteBehindBuffer"] = []
+
+
+def is_data_error(error: BaseException) -> bool:
+    """
+    True if retrying the same statement can't succeed: the database rejected
+    the values (DataError, IntegrityError) or they couldn't be bound at all.
+    Connection/timeout failures are False and worth retrying.
+    """
+    if isinstance(error, (sa_exc.DataError, sa_exc.IntegrityError)):
+        return True
+    return isinstance(error, sa_exc.StatementError) and not isinstance(error, sa_exc.DBAPIError)
+
+
+class SequenceIdAllocator:
+    """
+    Ids for written-behind rows, known before the INSERT runs.
+    Reserves `block` values of table.column's serial sequence per round trip
+    and hands them out from memory; unused ids are simply skipped (gaps are
+    normal for SERIAL columns).
+    """
+
+    def __init__(self, table: str, column: str = "id", block: int = WRITE_BEHIND_ID_BLOCK):
+        self.table = table
+        self.column = column
+        self.block = max(1, block)
+        self._ids: Deque[int] = deque()
+        self._lock = asyncio.Lock()
+
+    async def next_id(self, db: AsyncDB) -> int:
+        if not self._ids:
+            async with self._lock:
+                if not self._ids:
+                    rows = await db.fetch_all(
+                        text("SELECT nextval(pg_get_serial_sequence(:table, :column)) FROM generate_series(1, :n)"),
+                        {"table": self.table, "column": self.column, "n": self.block},
+                    )
+                    self._ids.extend(row[0] for row in rows)
+        return self._ids.popleft()
+
+
+def merge_counters(current: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Default delta merge: numbers are summed, timestamps keep the latest
+    value, anything else is overwritten unless the new value is None.
+    """
+    for field, value in delta.items():
+        old = current.get(field)
+        if value is None:
+            continue
+        if old is None:
+            current[field] = value
+        elif isinstance(value, bool) or not isinstance(value, (int, float, datetime)):
+            current[field] = value
+        elif isinstance(value, datetime):
+            try:
+                current[field] = max(old, value)
+            except TypeError:  # naive vs aware client timestamps
+                current[field] = value
+        else:
+            current[field] = old + value
+    return current
+
+
+class WriteBehindBuffer:
+    """
+    One buffered table pair: an append-only log table (insert_query, one
+    params dict per row) and a counters table (upsert_query, one params
+    dict per coalesced key, with the key bound as `key_field`). Either
+    query may be None.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        insert_query=None,
+        upsert_query=None,
+        key_field: str = "user_id",
+        merge: Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]] = merge_counters,
+        flush_interval: float = WRITE_BEHIND_FLUSH_MS / 1000.0,
+        max_pending: int = WRITE_BEHIND_MAX_PENDING,
+    ):
+        self.name = name
+        self.insert_query = insert_query
+        self.upsert_query = upsert_query
+        self.key_field = key_field
+        self.merge = merge
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._rows: List[Dict[str, Any]] = []
+        self._deltas: Dict[Hashable, Dict[str, Any]] = {}
+        self._db: Optional[AsyncDB] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.rows_written = 0
+        self.deltas_written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0
+        self.dead_lettered = 0
+        self.dead_letters: Deque[Dict[str, Any]] = deque(maxlen=WRITE_BEHIND_DEAD_LETTER_KEEP)
+        _buffers.append(self)
+
+    @property
+    def pending(self) -> int:
+        return len(self._rows) + len(self._deltas)
+
+    def start(self, db: AsyncDB):
+        self._db = db
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name=f"write-behind:{self.name}")
+
+    async def add(self, row: Optional[Dict[str, Any]] = None, key: Hashable = None,
+                  delta: Optional[Dict[str, Any]] = None):
+        """Queue a log row and/or a counter delta for `key`"""
+        if row is not None:
+            self._rows.append(row)
+        if delta is not None:
+            current = self._deltas.get(key)
+            self._deltas[key] = self.merge(current, delta) if current is not None else dict(delta)
+        if self.pending >= self.max_pending:
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write everything queued so far; returns the number of rows + deltas written"""
+        async with self._flush_lock:
+            if not self._rows and not self._deltas:
+                return 0
+            if self._db is None:
+                self._shed()
+                return 0
+            rows, self._rows = self._rows, []
+            deltas, self._deltas = self._deltas, {}
+            # Stable key order so concurrent workers lock stat rows in the same order
+            delta_params = [{**deltas[k], self.key_field: k} for k in sorted(deltas, key=repr)]
+            try:
+                async with self._db.transaction() as tx:
+                    if rows and self.insert_query is not None:
+                        await tx.executemany(self.insert_query, rows)
+                    if delta_params and self.upsert_query is not None:
+                        await tx.executemany(self.upsert_query, delta_params)
+            except Exception as e:
+                self.failures += 1
+                if not is_data_error(e):
+                    logger.exception("Write-behind flush failed for %s (%d rows, %d deltas)",
+                                     self.name, len(rows), len(deltas))
+                    self._requeue(rows, deltas)
+                    return 0
+                logger.warning("Write-behind flush for %s rejected by the database (%s); isolating bad rows",
+                               self.name, e.__class__.__name__)
+                return await self._flush_isolating(rows, delta_params)
+            self.flushes += 1
+            self.rows_written += len(rows)
+            self.deltas_written += len(delta_params)
+            return len(rows) + len(delta_params)
+
+    async def _flush_isolating(self, rows: List[Dict[str, Any]], delta_params: List[Dict[str, Any]]) -> int:
+        """Write a rejected batch part by part; dead-letter what still fails, re-queue on transient errors"""
+        rows_written = deltas_written = 0
+        unwritten_rows: List[Dict[str, Any]] = []
+        unwritten_deltas: List[Dict[str, Any]] = []
+        if rows and self.insert_query is not None:
+            rows_written, unwritten_rows = await self._write_bisecting(self.insert_query, rows)
+        if delta_params and self.upsert_query is not None:
+            if unwritten_rows:
+                unwritten_deltas = delta_params  # database is failing; don't keep hammering it
+            else:
+                deltas_written, unwritten_deltas = await self._write_bisecting(self.upsert_query, delta_params)
+        if unwritten_rows or unwritten_deltas:
+            self._requeue(unwritten_rows, {
+                p[self.key_field]: {k: v for k, v in p.items() if k != self.key_field} for p in unwritten_deltas
+            })
+        self.flushes += 1
+        self.rows_written += rows_written
+        self.deltas_written += deltas_written
+        return rows_written + deltas_written
+
+    async def _write_bisecting(self, query, params: List[Dict[str, Any]]) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        executemany `params` in halves until every data error is pinned to a
+        single row, which is dead-lettered. Returns (written, unwritten): a
+        transient error stops the walk and leaves the rest unwritten, in order.
+        """
+        written = 0
+        stack = [params]
+        while stack:
+            chunk = stack.pop()
+            try:
+                async with self._db.transaction() as tx:
+                    await tx.executemany(query, chunk)
+            except Exception as e:
+                if not is_data_error(e):
+                    logger.exception("Write-behind flush failed for %s while isolating bad rows", self.name)
+                    return written, chunk + [p for rest in reversed(stack) for p in rest]
+                if len(chunk) == 1:
+                    self._dead_letter(chunk[0], e)
+                else:
+                    mid = len(chunk) // 2
+                    stack.append(chunk[mid:])
+                    stack.append(chunk[:mid])
+                continue
+            written += len(chunk)
+        return written, []
+
+    def _dead_letter(self, params: Dict[str, Any], error: BaseException):
+        self.dead_lettered += 1
+        reason = str(getattr(error, "orig", None) or error).splitlines()[0][:300]
+        # Text values (message bodies, URLs) are summarised by length; they may be personal data
+        summary = {k: f"<str len={len(v)}>" if isinstance(v, str) else repr(v)[:50] for k, v in params.items()}
+        self.dead_letters.append({"params": summary, "error": reason, "at": datetime.utcnow().isoformat()})
+        logger.error("Write-behind %s dropped a row the database rejected: %s", self.name, reason)
+
+    def _requeue(self, rows: List[Dict[str, Any]], deltas: Dict[Hashable, Dict[str, Any]]):
+        """Put a failed batch back in front of newer writes, within the memory bound"""
+        for key, delta in deltas.items():
+            current = self._deltas.get(key)
+            self._deltas[key] = self.merge(dict(delta), current) if current is not None else delta
+        self._rows = rows + self._rows
+        self._shed()
+
+    def _shed(self):
+        overflow = self.pending - self.max_pending
+        if overflow > 0:
+            shed = min(overflow, len(self._rows))
+            del self._rows[:shed]
+            self.dropped += shed
+            logger.warning("Write-behind buffer %s full; dropped %d oldest rows", self.name, shed)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Write-behind flusher for %s crashed; continuing", self.name)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending_rows": len(self._rows),
+            "pending_deltas": len(self._deltas),
+            "max_pending": self.max_pending,
+            "flush_interval_ms": int(self.flush_interval * 1000),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "deltas_written": self.deltas_written,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "dead_lettered": self.dead_lettered,
+            "recent_dead_letters": list(self.dead_letters),
+        }
+
+
+def start_all(db: AsyncDB):
+    for buffer in _buffers:
+        buffer.start(db)
+
+
+async def close_all():
+    for buffer in _buffers:
+        try:
+            await buffer.close()
+        except Exception:
+            logger.exception("Final flush failed for write-behind buffer %s", buffer.name)
+
+
+def write_behind_stats() -> Dict[str, Dict[str, Any]]:
+    return {buffer.name: buffer.stats() for buffer in _buffers}
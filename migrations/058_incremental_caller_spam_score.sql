@@ -0,0 +1,82 @@
+-- Migration 058: Incremental caller spam-score maintenance
+-- Purpose: Replace the per-insert COUNT(*) recount in update_caller_spam_score()
+--          (022_mobile_caller_id.sql) with O(1) counter deltas
+-- Must run after 022_mobile_caller_id.sql, which redefines the old function
+
+-- Apply one report as a delta on the caller's counters.
+-- Upsert also closes the UPDATE-then-INSERT race on a brand new number.
+CREATE OR REPLACE FUNCTION update_caller_spam_score()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_spam INTEGER := CASE WHEN NEW.report_type IN ('spam', 'scam', 'telemarketer') THEN 1 ELSE 0 END;
+    v_safe INTEGER := CASE WHEN NEW.report_type = 'safe' THEN 1 ELSE 0 END;
+BEGIN
+    INSERT INTO caller_id_database (
+        phone_number, country_code, spam_score, total_reports, spam_reports, safe_reports,
+        first_reported_at, last_reported_at
+    )
+    VALUES (
+        NEW.phone_number,
+        SUBSTRING(NEW.phone_number FROM 1 FOR 3),
+        LEAST(100, GREATEST(0, v_spam * 10 - v_safe * 5)),
+        1,
+        v_spam,
+        v_safe,
+        NEW.reported_at,
+        NEW.reported_at
+    )
+    ON CONFLICT (phone_number) DO UPDATE
+    SET
+        total_reports = COALESCE(caller_id_database.total_reports, 0) + 1,
+        spam_reports = COALESCE(caller_id_database.spam_reports, 0) + v_spam,
+        safe_reports = COALESCE(caller_id_database.safe_reports, 0) + v_safe,
+        spam_score = LEAST(100, GREATEST(0,
+            (COALESCE(caller_id_database.spam_reports, 0) + v_spam) * 10 -
+            (COALESCE(caller_id_database.safe_reports, 0) + v_safe) * 5
+        )),
+        last_reported_at = NEW.reported_at,
+        updated_at = CURRENT_TIMESTAMP;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Periodic reconciliation: recount numbers reported since p_since (all numbers
+-- when NULL) and fix any counters that drifted, e.g. after reports were deleted.
+-- Returns the number of caller rows corrected.
+CREATE OR REPLACE FUNCTION reconcile_caller_spam_scores(p_since TIMESTAMP DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_fixed INTEGER;
+BEGIN
+    WITH counts AS (
+        SELECT
+            phone_number,
+            COUNT(*) AS total,
+            COUNT(*) FILTER (WHERE report_type IN ('spam', 'scam', 'telemarketer')) AS spam,
+            COUNT(*) FILTER (WHERE report_type = 'safe') AS safe
+        FROM caller_id_reports
+        WHERE p_since IS NULL
+           OR phone_number IN (SELECT phone_number FROM caller_id_reports WHERE reported_at >= p_since)
+        GROUP BY phone_number
+    )
+    UPDATE caller_id_database c
+    SET
+        total_reports = counts.total,
+        spam_reports = counts.spam,
+        safe_reports = counts.safe,
+        spam_score = LEAST(100, GREATEST(0, counts.spam * 10 - counts.safe * 5)),
+        updated_at = CURRENT_TIMESTAMP
+    FROM counts
+    WHERE c.phone_number = counts.phone_number
+      AND (c.total_reports IS DISTINCT FROM counts.total
+           OR c.spam_reports IS DISTINCT FROM counts.spam
+           OR c.safe_reports IS DISTINCT FROM counts.safe);
+
+    GET DIAGNOSTICS v_fixed = ROW_COUNT;
+    RETURN v_fixed;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION update_caller_spam_score() IS 'O(1) per report: applies report deltas to caller_id_database counters';
+COMMENT ON FUNCTION reconcile_caller_spam_scores(TIMESTAMP) IS 'Recounts caller_id_reports and repairs drifted caller counters';
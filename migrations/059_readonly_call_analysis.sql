@@ -0,0 +1,114 @@
+-- Migration 059: Read-only realtime call analysis
+-- Purpose: Drop the per-match UPDATE scam_pattern_library SET detection_count
+--          from analyze_call_realtime() (028_realtime_call_analysis.sql).
+--          Concurrent calls serialized on the same few pattern rows; counts are
+--          now aggregated in the app and flushed in one UPDATE per pattern.
+-- Must run after 028_realtime_call_analysis.sql, which redefines the old function
+
+CREATE OR REPLACE FUNCTION analyze_call_realtime(
+    p_session_id INTEGER,
+    p_transcription_text TEXT,
+    p_speaker VARCHAR(20)
+) RETURNS JSONB AS $$
+DECLARE
+    v_scam_probability DECIMAL(5, 2) := 0;
+    v_threat_level VARCHAR(20) := 'none';
+    v_detected_patterns JSONB := '[]'::jsonb;
+    v_keywords_detected JSONB := '[]'::jsonb;
+    v_pattern RECORD;
+    v_keyword TEXT;
+    v_pattern_match BOOLEAN;
+BEGIN
+    -- Check against scam patterns
+    FOR v_pattern IN 
+        SELECT * FROM scam_pattern_library WHERE is_active = TRUE ORDER BY id
+    LOOP
+        v_pattern_match := FALSE;
+        
+        -- Check keywords
+        IF v_pattern.pattern_type = 'keyword' THEN
+            FOR v_keyword IN SELECT jsonb_array_elements_text(v_pattern.pattern_data->'keywords')
+            LOOP
+                IF LOWER(p_transcription_text) LIKE '%' || LOWER(v_keyword) || '%' THEN
+                    v_pattern_match := TRUE;
+                    v_keywords_detected := v_keywords_detected || jsonb_build_object('keyword', v_keyword, 'pattern', v_pattern.pattern_name);
+                END IF;
+            END LOOP;
+        END IF;
+        
+        -- Check phrases
+        IF v_pattern.pattern_type = 'phrase' THEN
+            FOR v_keyword IN SELECT jsonb_array_elements_text(v_pattern.pattern_data->'phrases')
+            LOOP
+                IF LOWER(p_transcription_text) LIKE '%' || LOWER(v_keyword) || '%' THEN
+                    v_pattern_match := TRUE;
+                    v_keywords_detected := v_keywords_detected || jsonb_build_object('phrase', v_keyword, 'pattern', v_pattern.pattern_name);
+                END IF;
+            END LOOP;
+        END IF;
+        
+        -- If pattern matched, add to detected patterns and increase scam probability
+        IF v_pattern_match THEN
+            v_detected_patterns := v_detected_patterns || jsonb_build_object(
+                'patternName', v_pattern.pattern_name,
+                'severity', v_pattern.severity,
+                'weight', v_pattern.confidence_weight
+            );
+            v_scam_probability := v_scam_probability + v_pattern.confidence_weight;
+            -- detection_count is aggregated by the app (call_pattern_engine) and
+            -- flushed periodically; no per-match UPDATE on the pattern row
+        END IF;
+    END LOOP;
+    
+    -- Cap scam probability at 100
+    IF v_scam_probability > 100 THEN
+        v_scam_probability := 100;
+    END IF;
+    
+    -- Determine threat level
+    IF v_scam_probability >= 80 THEN
+        v_threat_level := 'critical';
+    ELSIF v_scam_probability >= 60 THEN
+        v_threat_level := 'high';
+    ELSIF v_scam_probability >= 40 THEN
+        v_threat_level := 'medium';
+    ELSIF v_scam_probability >= 20 THEN
+        v_threat_level := 'low';
+    ELSE
+        v_threat_level := 'none';
+    END IF;
+    
+    -- Insert analysis result
+    INSERT INTO realtime_call_analysis 
+    (session_id, scam_probability, threat_level, detected_patterns, keywords_detected, confidence_score)
+    VALUES (p_session_id, v_scam_probability, v_threat_level, v_detected_patterns, v_keywords_detected, 85.0);
+    
+    -- Create alert if threat level is medium or higher
+    IF v_threat_level IN ('medium', 'high', 'critical') THEN
+        INSERT INTO realtime_call_alerts 
+        (session_id, alert_type, severity, title, message, recommended_action)
+        VALUES (
+            p_session_id,
+            'scam_detected',
+            v_threat_level,
+            'Potential Scam Detected',
+            'This call shows signs of a scam. Be cautious and do not share personal information.',
+            CASE 
+                WHEN v_threat_level = 'critical' THEN 'block_call'
+                WHEN v_threat_level = 'high' THEN 'warn_user'
+                ELSE 'monitor'
+            END
+        );
+    END IF;
+    
+    RETURN jsonb_build_object(
+        'scamProbability', v_scam_probability,
+        'threatLevel', v_threat_level,
+        'detectedPatterns', v_detected_patterns,
+        'keywordsDetected', v_keywords_detected
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION analyze_call_realtime(INTEGER, TEXT, VARCHAR) IS
+    'Scores one transcription segment; read-only on scam_pattern_library (detection_count is flushed by the app)';
@@ -0,0 +1,15 @@
+-- Migration 060: Voice print embeddings
+-- Purpose: Store a fixed-length embedding per registered voice so matching can
+--          use the in-memory nearest-neighbour index (app/voice_index.py)
+--          instead of re-scoring every voice_features row in Python.
+--          voice_embedding holds packed little-endian float32 values;
+--          voice_embedding_version identifies the extractor that produced it
+--          (prints from different versions are not comparable).
+
+ALTER TABLE voice_biometrics ADD COLUMN IF NOT EXISTS voice_embedding BYTEA;
+ALTER TABLE voice_biometrics ADD COLUMN IF NOT EXISTS voice_embedding_version SMALLINT;
+
+-- Index loader streams rows in id order, filtered by version
+CREATE INDEX IF NOT EXISTS idx_voice_biometrics_embedding_version
+    ON voice_biometrics(voice_embedding_version, id)
+    WHERE voice_embedding IS NOT NULL;
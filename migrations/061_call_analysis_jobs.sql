@@ -0,0 +1,56 @@
+-- Migration 061: Call recording analysis job queue
+-- Purpose: Persist call analysis jobs so uploads survive restarts and are
+--          processed by the separate worker (run_call_analysis_worker.py)
+--          instead of FastAPI BackgroundTasks in the web process.
+--          Workers claim due jobs with SELECT ... FOR UPDATE SKIP LOCKED;
+--          status moves pending -> processing -> completed / failed, and a
+--          failed attempt goes back to pending with run_after pushed out
+--          (exponential backoff) until max_attempts is reached.
+--          user_id is the uploading user; jobs are only visible to them.
+--          idempotency_key (optional, from the Idempotency-Key header) makes
+--          client retries of an upload return the original job; keys are
+--          scoped per user.
+
+CREATE TABLE IF NOT EXISTS call_analysis_jobs (
+    call_id VARCHAR(32) PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    idempotency_key VARCHAR(255),
+    audio_url TEXT NOT NULL,
+    language VARCHAR(10) NOT NULL DEFAULT 'en',
+    caller_id VARCHAR(50),
+    call_duration INTEGER,
+    call_direction VARCHAR(20),
+    metadata JSONB,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'processing', 'completed', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_after TIMESTAMP NOT NULL DEFAULT NOW(),
+    locked_by VARCHAR(100),
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    transcription JSONB,
+    analysis JSONB,
+    alert_message TEXT,
+    evidence_report TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    analyzed_at TIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_call_analysis_jobs_idempotency_key
+    ON call_analysis_jobs(user_id, idempotency_key)
+    WHERE idempotency_key IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_call_analysis_jobs_user
+    ON call_analysis_jobs(user_id, created_at DESC);
+
+-- Claim query: due pending jobs in run_after order
+CREATE INDEX IF NOT EXISTS idx_call_analysis_jobs_due
+    ON call_analysis_jobs(run_after)
+    WHERE status = 'pending';
+
+-- Lease expiry sweep: jobs whose worker died mid-analysis
+CREATE INDEX IF NOT EXISTS idx_call_analysis_jobs_leased
+    ON call_analysis_jobs(locked_at)
+    WHERE status = 'processing';
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Call Analysis Worker
+Processes call recordings queued by /api/calls/upload and /api/calls/bulk-analyze
+(call_analysis_jobs table, see app/call_analysis_queue.py).
+
+Runs as its own long-lived service next to the web process:
+- Command: python3 run_call_analysis_worker.py
+- Needs the same DATABASE_URL and OPENAI_API_KEY as the main backend
+- Scale out by running more instances; jobs are claimed with SKIP LOCKED,
+  so each one is processed by a single worker
+
+Tuning (environment):
+- CALL_ANALYSIS_WORKER_CONCURRENCY: analyses in flight per instance (default 4)
+- CALL_ANALYSIS_POLL_SECONDS: idle poll interval (default 2)
+- CALL_ANALYSIS_MAX_ATTEMPTS / CALL_ANALYSIS_RETRY_BASE_SECONDS: retry policy
+
+SIGTERM/SIGINT stop claiming new jobs; in-flight ones get a grace period
+and are otherwise handed back to the queue.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import sys
+
+# Add app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.deps import get_settings
+from app.database import AsyncDB, create_db_engine
+from app.call_analysis_queue import CallAnalysisWorker
+
+
+async def main():
+    s = get_settings()
+    db = AsyncDB(create_db_engine(s.DATABASE_URL, s))
+    worker = CallAnalysisWorker(db)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        print(f"📊 Worker stats: {worker.stats()}")
+        await db.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    print("🚀 Starting Call Analysis Worker")
+    try:
+        asyncio.run(main())
+        print("✅ Call analysis worker stopped")
+        sys.exit(0)
+    except Exception as e:
+        print(f"❌ Call analysis worker failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Nightly Scam Re-scoring Cron Job Script
+
+Scores recent call_history rows with the batch scam prediction engine and
+bulk-inserts the results into scam_predictions.
+
+Railway Cron Configuration:
+- Schedule: "0 4 * * *" (daily, after the reconciliation job)
+- Command: python3 run_scam_rescoring.py
+
+Set SCAM_RESCORE_LOOKBACK_HOURS=0 to re-score the whole call history.
+"""
+
+import sys
+import os
+
+# Add app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.scam_prediction import rescore_call_history
+
+if __name__ == "__main__":
+    print("🚀 Starting Railway Cron Job: Scam Re-scoring")
+    try:
+        lookback = int(os.getenv("SCAM_RESCORE_LOOKBACK_HOURS", "24"))
+        scored = rescore_call_history(lookback or None)
+        print(f"✅ Cron job completed successfully ({scored} calls scored)")
+        sys.exit(0)
+    except Exception as e:
+        print(f"❌ Cron job failed: {e}")
+        sys.exit(1)
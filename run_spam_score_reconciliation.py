@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Caller Spam-Score Reconciliation Cron Job Script
+
+The caller_id_reports insert trigger keeps caller_id_database counters up
+to date by delta. This job recounts recently reported numbers and repairs
+any counters that drifted (deleted reports, manual edits).
+
+Railway Cron Configuration:
+- Schedule: "30 3 * * *" (daily, after the AI analysis job)
+- Command: python3 run_spam_score_reconciliation.py
+
+Set SPAM_RECONCILE_LOOKBACK_HOURS=0 to recount every number.
+"""
+
+import sys
+import os
+
+# Add app directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.mobile_caller_id import reconcile_spam_scores
+
+if __name__ == "__main__":
+    print("🚀 Starting Railway Cron Job: Caller Spam-Score Reconciliation")
+    try:
+        lookback = int(os.getenv("SPAM_RECONCILE_LOOKBACK_HOURS", "48"))
+        fixed = reconcile_spam_scores(lookback or None)
+        print(f"✅ Cron job completed successfully ({fixed} callers corrected)")
+        sys.exit(0)
+    except Exception as e:
+        print(f"❌ Cron job failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,121 @@
+"""
+Benchmark: batch email phishing analysis throughput
+
+Compares analyzing a synthetic mailbox feed one email at a time (what
+/detect does per request) against analyze_batch() scoring in a thread and
+in the process pool.
+
+Usage:
+    python scripts/benchmark_email_batch.py [--emails 5000] [--batch 1000] [--workers 4]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app import email_phishing  # noqa: E402
+
+FILLER = (
+    "Please find the quarterly report attached. Let me know if the meeting "
+    "time works for you and whether we should invite the wider team. "
+)
+PHISHING_LINES = [
+    "URGENT: your bank account has been suspended due to unusual activity.",
+    "Click here to verify identity and update payment details before it expires.",
+    "Congratulations, you are the winner of our lottery prize! Act now.",
+    "Confirm your password and credit card number to unlock your account.",
+]
+SENDER_DOMAINS = [
+    "gmail.com", "outlook.com", "corp-mail.example.com", "paypal-secure.tk",
+    "amazon-support.ml", "microsoft-verify.co", "newsletter.example.org",
+]
+LINKS = [
+    "https://example.com/report", "https://intranet.example.com/wiki",
+    "http://bit.ly/3xYzAb", "http://192.168.10.5/login", "https://paypal.com.verify.tk/signin",
+    "https://a.b.c.d.e.example.com/track", "https://news.example.org/unsubscribe",
+]
+
+
+def make_feed(count: int, seed: int = 7):
+    """Mailbox-like feed: most mail is unique, campaigns repeat the same content"""
+    rnd = random.Random(seed)
+    campaigns = [
+        (f"Action required #{i}", " ".join(rnd.sample(PHISHING_LINES, 2)) + " " + FILLER)
+        for i in range(20)
+    ]
+    feed = []
+    for i in range(count):
+        if rnd.random() < 0.3:
+            subject, body = rnd.choice(campaigns)
+        else:
+            lines = rnd.sample(PHISHING_LINES, rnd.randint(0, 2))
+            subject = f"Re: thread {i}"
+            body = FILLER * rnd.randint(2, 20) + " ".join(lines)
+        feed.append(email_phishing.EmailBatchItem(
+            id=str(i),
+            sender_email=f"user{rnd.randint(0, 500)}@{rnd.choice(SENDER_DOMAINS)}",
+            sender_name=rnd.choice([None, "Accounts Team", "alerts@bank.example"]),
+            subject=subject,
+            body=body,
+            links=rnd.sample(LINKS, rnd.randint(0, 4)),
+            attachments=rnd.choice([[], ["report.pdf"], ["invoice.pdf.exe"]]),
+        ))
+    return feed
+
+
+def analyze_sequential(feed):
+    """One email at a time, no sharing across emails (the /detect path)"""
+    for email in feed:
+        email_phishing.assess_email(
+            email_phishing.analyze_sender(email.sender_email, email.sender_name),
+            email_phishing.analyze_content(email.subject, email.body),
+            email_phishing.analyze_links(email.links or []),
+            email_phishing.analyze_attachments(email.attachments or []),
+        )
+
+
+async def analyze_batched(feed, batch_size: int):
+    for start in range(0, len(feed), batch_size):
+        await email_phishing.analyze_batch(feed[start:start + batch_size])
+
+
+def report(label: str, count: int, seconds: float):
+    print(f"{label:<28} {seconds:8.2f}s  {count / seconds:10.0f} emails/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--emails", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=email_phishing.EMAIL_BATCH_WORKERS)
+    args = parser.parse_args()
+
+    feed = make_feed(args.emails)
+    print(f"{len(feed)} emails, batch size {args.batch}, {args.workers} worker processes")
+
+    started = time.perf_counter()
+    analyze_sequential(feed)
+    report("sequential (/detect)", len(feed), time.perf_counter() - started)
+
+    email_phishing.EMAIL_BATCH_WORKERS = 0
+    started = time.perf_counter()
+    asyncio.run(analyze_batched(feed, args.batch))
+    report("batch, thread", len(feed), time.perf_counter() - started)
+
+    if args.workers > 0:
+        email_phishing.EMAIL_BATCH_WORKERS = args.workers
+        # Start the workers outside the timed run
+        asyncio.run(analyze_batched(feed[:email_phishing.PROCESS_POOL_MIN_BATCH], args.batch))
+        started = time.perf_counter()
+        asyncio.run(analyze_batched(feed, args.batch))
+        report("batch, process pool", len(feed), time.perf_counter() - started)
+        email_phishing.shutdown_process_pool()
+
+
+if __name__ == "__main__":
+    main()
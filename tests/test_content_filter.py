@@ -0,0 +1,76 @@
+"""
+Unit tests for bulk child-protection filtering (app/content_filter.py),
+in a TestClient app
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import content_filter
+
+pytestmark = pytest.mark.unit
+
+ITEMS = [
+    {"id": "h1", "content_type": "url", "content": "https://www.pornhub.com/video"},
+    {"id": "h2", "content_type": "url", "content": "https://www.wikipedia.org"},
+    {"id": "a1", "content_type": "app_name", "content": "Tinder"},
+    {"id": "t1", "content_type": "text", "content": "homework is due tomorrow"},
+    {"id": "h3", "content_type": "url", "content": "https://www.pornhub.com/video"},
+]
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(content_filter.router)
+    return TestClient(app)
+
+
+class TestFilterBatch:
+
+    def test_verdicts_keyed_by_id(self, client):
+        response = client.post("/api/child-protection/filter-batch", json={"child_age": 10, "items": ITEMS})
+        assert response.status_code == 200
+        body = response.json()
+        assert set(body["verdicts"]) == {"h1", "h2", "a1", "t1", "h3"}
+        assert body["total"] == 5
+        # The repeated URL is classified once
+        assert body["unique"] == 4
+        assert body["verdicts"]["h1"]["is_blocked"] and body["verdicts"]["h3"]["is_blocked"]
+        assert not body["verdicts"]["h2"]["is_blocked"]
+        assert body["blocked"] == sum(v["is_blocked"] for v in body["verdicts"].values())
+        assert response.headers["ETag"] == f'"{body["digest"]}"'
+
+    def test_matches_single_item_filter(self, client):
+        body = client.post("/api/child-protection/filter-batch", json={"child_age": 10, "items": ITEMS}).json()
+        for item in ITEMS:
+            single = client.post("/api/child-protection/filter", json={**item, "child_age": 10}).json()
+            verdict = body["verdicts"][item["id"]]
+            assert (verdict["is_blocked"], verdict["risk_level"]) == (single["is_blocked"], single["risk_level"])
+
+    def test_unchanged_batch_not_modified(self, client):
+        first = client.post("/api/child-protection/filter-batch", json={"child_age": 10, "items": ITEMS})
+        etag = first.headers["ETag"]
+        # Order does not change the digest
+        again = client.post("/api/child-protection/filter-batch", json={"child_age": 10, "items": ITEMS[::-1]},
+                            headers={"If-None-Match": etag})
+        assert again.status_code == 304
+        assert again.headers["ETag"] == etag
+        older = client.post("/api/child-protection/filter-batch", json={"child_age": 16, "items": ITEMS},
+                            headers={"If-None-Match": etag})
+        assert older.status_code == 200
+
+    def test_unsupported_items_reported(self, client):
+        items = ITEMS[:1] + [{"id": "x", "content_type": "video", "content": "clip.mp4"}]
+        body = client.post("/api/child-protection/filter-batch", json={"items": items}).json()
+        assert list(body["verdicts"]) == ["h1"]
+        assert "video" in body["errors"]["x"]
+
+    def test_duplicate_ids_rejected(self, client):
+        items = [ITEMS[0], {**ITEMS[1], "id": "h1"}]
+        assert client.post("/api/child-protection/filter-batch", json={"items": items}).status_code == 400
+
+    def test_oversized_batch_rejected(self, client, monkeypatch):
+        monkeypatch.setattr(content_filter, "CONTENT_FILTER_BATCH_MAX", 2)
+        assert client.post("/api/child-protection/filter-batch", json={"items": ITEMS}).status_code == 413
@@ -0,0 +1,131 @@
+"""
+Unit tests for the child-protection domain index (app/domain_index.py)
+"""
+
+import os
+import time
+
+import pytest
+
+from app.domain_index import DomainCategoryIndex, SortedDomainFile, build_index, parse_list_line, reversed_key, split_url
+
+pytestmark = pytest.mark.unit
+
+BUILTIN = {
+    "pornhub.com": "adult",
+    "bet365.com": "gambling",
+    "youtube.com/kids": "safe",
+}
+
+
+def wait_for_load(index: DomainCategoryIndex, loads: int = 1, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while index.loads < loads and index.load_errors == 0:
+        assert time.monotonic() < deadline, "domain list was not loaded in time"
+        time.sleep(0.01)
+
+
+class TestHelpers:
+
+    @pytest.mark.parametrize("url,expected", [
+        ("https://WWW.Pornhub.com/video?x=1", ("www.pornhub.com", "/video")),
+        ("pornhub.com", ("pornhub.com", "/")),
+        ("example.com./path", ("example.com", "/path")),
+        ("http://[invalid", ("", "/")),
+    ])
+    def test_split_url(self, url, expected):
+        assert split_url(url) == expected
+
+    def test_reversed_key(self):
+        assert reversed_key("WWW.PornHub.com.") == b"com.pornhub.www"
+        assert reversed_key("bücher.de") == b"de.xn--bcher-kva"
+
+    @pytest.mark.parametrize("line,expected", [
+        ("casino.example gambling", ("casino.example", "gambling")),
+        ("casino.example,Gambling  # comment", ("casino.example", "gambling")),
+        ("*.tracker.example", ("tracker.example", "blocked")),
+        ("# only a comment", None),
+        ("example.com/path adult", None),
+        ("", None),
+    ])
+    def test_parse_list_line(self, line, expected):
+        assert parse_list_line(line) == expected
+
+
+class TestBuiltinLookups:
+
+    @pytest.fixture
+    def index(self):
+        return DomainCategoryIndex(BUILTIN, list_path=None, index_path=None)
+
+    def test_exact_and_parent_domain(self, index):
+        assert index.lookup_url("https://pornhub.com/") == ("pornhub.com", "adult")
+        assert index.lookup_url("https://www.pornhub.com/x") == ("pornhub.com", "adult")
+
+    def test_no_substring_matches(self, index):
+        assert index.lookup_url("https://notpornhub.com/") is None
+        assert index.lookup_url("https://pornhub.com.example/") is None
+        assert index.lookup_url("https://example.com/?q=pornhub.com") is None
+
+    def test_path_entries(self, index):
+        assert index.lookup_url("https://www.youtube.com/kids/show") == ("youtube.com/kids", "safe")
+        assert index.lookup_url("https://youtube.com/kids") == ("youtube.com/kids", "safe")
+        assert index.lookup_url("https://youtube.com/kidsfoo") is None
+        assert index.lookup_url("https://youtube.com/watch") is None
+
+    def test_empty_host(self, index):
+        assert index.lookup("") is None
+        assert index.lookup_url("") is None
+
+
+class TestListFile:
+
+    def test_build_index_sorts_and_dedupes(self, tmp_path):
+        source = tmp_path / "domains.txt"
+        source.write_text("zeta.example adult\nalpha.example\nzeta.example gambling\nbad/path x\n")
+        target = tmp_path / "domains.txt.idx"
+        assert build_index(str(source), str(target)) == 2
+        assert target.read_bytes() == b"example.alpha\tblocked\nexample.zeta\tgambling\n"
+
+    def test_sorted_file_lookup_across_blocks(self, tmp_path):
+        source = tmp_path / "domains.txt"
+        source.write_text("".join(f"site{i:04d}.example cat{i % 3}\n" for i in range(500)))
+        target = tmp_path / "domains.idx"
+        build_index(str(source), str(target))
+        index_file = SortedDomainFile(str(target))
+        try:
+            assert index_file.entries == 500
+            for i in (0, 63, 64, 65, 250, 499):
+                assert index_file.get(reversed_key(f"site{i:04d}.example")) == f"cat{i % 3}"
+            assert index_file.get(reversed_key("site0500.example")) is None
+            assert index_file.get(b"aaa") is None
+        finally:
+            index_file.close()
+
+    def test_list_file_loads_and_reloads(self, tmp_path):
+        source = tmp_path / "domains.txt"
+        source.write_text("casino.example gambling\n")
+        index = DomainCategoryIndex(BUILTIN, list_path=str(source), index_path=None, reload_seconds=0)
+        index.start()
+        wait_for_load(index)
+        assert index.lookup_url("https://m.casino.example/") == ("casino.example", "gambling")
+        # Built-in entries are still consulted alongside the list
+        assert index.lookup_url("https://pornhub.com/") == ("pornhub.com", "adult")
+
+        source.write_text("casino.example gambling\nchat.example social\n")
+        # Make sure the new list looks newer than the index built from the old one
+        stamp = time.time() + 5
+        os.utime(source, (stamp, stamp))
+        index.generation()
+        wait_for_load(index, loads=2)
+        assert index.lookup_url("https://chat.example/") == ("chat.example", "social")
+        assert index.stats()["list_entries"] == 2
+
+    def test_broken_list_counts_error(self, tmp_path):
+        index = DomainCategoryIndex({}, list_path=str(tmp_path / "missing.txt"), index_path=None)
+        index.start()
+        deadline = time.monotonic() + 5
+        while index.load_errors == 0:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        assert index.lookup_url("https://casino.example/") is None
@@ -0,0 +1,56 @@
+"""
+Unit tests for batch phishing detection (app/email_phishing.py), in a
+TestClient app. No email carries a user_id, so nothing reaches the vault.
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import email_phishing
+
+pytestmark = pytest.mark.unit
+
+PHISH_BODY = "Unusual activity detected. Verify identity and update payment now or your account will be suspended."
+EMAILS = [
+    {"id": "m1", "sender_email": "security@paypa1-alerts.xyz", "subject": "URGENT: account suspended",
+     "body": PHISH_BODY, "links": ["http://192.168.4.20/login"]},
+    {"id": "m2", "sender_email": "friend@gmail.com", "subject": "Dinner on Friday",
+     "body": "Are we still on for dinner?", "links": []},
+    {"id": "m3", "sender_email": "billing@paypa1-alerts.xyz", "subject": "URGENT: account suspended",
+     "body": PHISH_BODY, "links": ["http://192.168.4.20/login"]},
+]
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(email_phishing.router)
+    return TestClient(app)
+
+
+class TestDetectBatch:
+
+    def test_results_in_request_order_with_shared_analysis(self, client):
+        response = client.post("/api/email-phishing/detect-batch", json={"emails": EMAILS})
+        assert response.status_code == 200
+        body = response.json()
+        assert [r["id"] for r in body["results"]] == ["m1", "m2", "m3"]
+        assert body["total"] == 3
+        assert body["unique_sender_domains"] == 2
+        assert body["unique_links"] == 1
+        assert body["unique_contents"] == 2
+        assert body["evidence_logged"] == 0
+        assert body["phishing"] == sum(r["is_phishing"] for r in body["results"])
+        assert body["results"][0]["confidence_score"] > body["results"][1]["confidence_score"]
+
+    def test_matches_single_email_detection(self, client):
+        body = client.post("/api/email-phishing/detect-batch", json={"emails": EMAILS}).json()
+        for email, result in zip(EMAILS, body["results"]):
+            single = client.post("/api/email-phishing/detect", json={k: v for k, v in email.items() if k != "id"}).json()
+            for field in ("is_phishing", "confidence_score", "risk_level", "threat_indicators"):
+                assert result[field] == single[field]
+
+    def test_oversized_batch_rejected(self, client, monkeypatch):
+        monkeypatch.setattr(email_phishing, "EMAIL_BATCH_MAX", 2)
+        assert client.post("/api/email-phishing/detect-batch", json={"emails": EMAILS}).status_code == 413
@@ -0,0 +1,186 @@
+"""
+Unit tests for the perceptual-hash verdict cache (app/image_hash_cache.py)
+and the image endpoints' use of it (app/ai/image.py)
+"""
+
+import io
+import random
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.ai import image as image_ai
+from app.image_hash_cache import PerceptualHashCache, fingerprint, hamming, perceptual_hashes
+
+pytestmark = pytest.mark.unit
+
+
+def flip_bits(value: int, bits) -> int:
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def random_hashes(rng: random.Random):
+    return tuple(rng.getrandbits(64) for _ in range(3))
+
+
+def poster_image(size=(320, 240), seed=7) -> Image.Image:
+    """Coarse random blocks: enough structure that every hash bit is decisive"""
+    blocks = np.random.default_rng(seed).integers(0, 256, (6, 8, 3), dtype=np.uint8)
+    return Image.fromarray(blocks, "RGB").resize(size, Image.Resampling.NEAREST)
+
+
+def encode(image: Image.Image, fmt="JPEG", **kwargs) -> bytes:
+    out = io.BytesIO()
+    image.save(out, fmt, **kwargs)
+    return out.getvalue()
+
+
+class TestPerceptualHashes:
+
+    def test_recompressed_copy_stays_close(self):
+        image = poster_image()
+        original = fingerprint(encode(image, quality=95))
+        recompressed = fingerprint(encode(image.resize((200, 150)), quality=40))
+        assert original["size"] == (320, 240)
+        assert all(hamming(a, b) <= 6 for a, b in zip(original["hashes"], recompressed["hashes"]))
+
+    def test_different_image_is_far(self):
+        image = poster_image()
+        inverted = Image.fromarray(255 - np.asarray(image))
+        distances = [hamming(a, b) for a, b in zip(perceptual_hashes(image), perceptual_hashes(inverted))]
+        assert max(distances) > 20
+
+
+class TestPerceptualHashCache:
+
+    def test_exact_hit(self):
+        cache = PerceptualHashCache(maxsize=10, ttl=60, max_distance=6)
+        cache.set("sha-a", (1, 2, 3), {"verdict": "scam"})
+        assert cache.get_exact("sha-a") == {"verdict": "scam"}
+        assert cache.get_exact("sha-b") is None
+        assert cache.stats()["exact_hits"] == 1
+
+    @pytest.mark.parametrize("max_distance", [0, 3, 6, 15])
+    def test_band_index_finds_every_hash_within_distance(self, max_distance):
+        rng = random.Random(max_distance)
+        cache = PerceptualHashCache(maxsize=1000, ttl=60, max_distance=max_distance)
+        stored = random_hashes(rng)
+        cache.set("sha", stored, "hit")
+        for _ in range(200):
+            # Up to max_distance flipped bits anywhere, including across band edges
+            bits = rng.sample(range(64), rng.randint(0, max_distance))
+            query = tuple(flip_bits(h, bits) for h in stored)
+            assert cache.get_similar(query) == ("hit", len(bits))
+
+    def test_beyond_distance_misses(self):
+        cache = PerceptualHashCache(maxsize=10, ttl=60, max_distance=4)
+        stored = (0, 0, 0)
+        cache.set("sha", stored, "hit")
+        far_phash = flip_bits(0, range(5))
+        assert cache.get_similar((0, 0, far_phash)) is None
+        # Every hash must be within range, not just the pHash
+        assert cache.get_similar((flip_bits(0, range(10)), 0, 0)) is None
+        assert cache.stats()["misses"] == 2
+
+    def test_closest_entry_wins(self):
+        cache = PerceptualHashCache(maxsize=10, ttl=60, max_distance=6)
+        cache.set("far", (0, 0, flip_bits(0, range(5))), "far")
+        cache.set("near", (0, 0, flip_bits(0, [63])), "near")
+        assert cache.get_similar((0, 0, 0)) == ("near", 1)
+
+    def test_entries_without_hashes_are_exact_only(self):
+        cache = PerceptualHashCache(maxsize=10, ttl=60, max_distance=6)
+        cache.set("sha-qr", None, "payload")
+        assert cache.get_exact("sha-qr") == "payload"
+        assert cache.get_similar((0, 0, 0)) is None
+        cache.set("sha-qr", None, "again")
+        assert len(cache) == 1
+
+    def test_replacing_sha_drops_old_hashes(self):
+        cache = PerceptualHashCache(maxsize=10, ttl=60, max_distance=2)
+        cache.set("sha", (0, 0, 0), "old")
+        cache.set("sha", (2 ** 64 - 1,) * 3, "new")
+        assert len(cache) == 1
+        assert cache.get_similar((0, 0, 0)) is None
+        assert cache.get_similar((2 ** 64 - 1,) * 3) == ("new", 0)
+
+    def test_lru_eviction(self):
+        rng = random.Random(1)
+        cache = PerceptualHashCache(maxsize=2, ttl=60, max_distance=0)
+        first, second, third = (random_hashes(rng) for _ in range(3))
+        cache.set("1", first, 1)
+        cache.set("2", second, 2)
+        assert cache.get_exact("1") == 1  # 2 is now least recently used
+        cache.set("3", third, 3)
+        assert cache.get_exact("2") is None
+        assert cache.get_similar(second) is None
+        assert cache.get_exact("1") == 1 and cache.get_exact("3") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_ttl_expiry(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(time, "monotonic", lambda: now[0])
+        cache = PerceptualHashCache(maxsize=10, ttl=30, max_distance=0)
+        cache.set("sha", (1, 2, 3), "value")
+        now[0] += 29
+        assert cache.get_exact("sha") == "value"
+        now[0] += 2
+        assert cache.get_similar((1, 2, 3)) is None
+        assert cache.get_exact("sha") is None
+        assert len(cache) == 0
+
+    def test_clear(self):
+        cache = PerceptualHashCache(maxsize=10, ttl=60, max_distance=0)
+        cache.set("sha", (1, 2, 3), "value")
+        cache.clear()
+        assert cache.get_exact("sha") is None
+        assert cache.get_similar((1, 2, 3)) is None
+
+
+class FakeUpload:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def read(self, size=-1):
+        return self.data
+
+
+class TestAnalyzeUploadCached:
+
+    @pytest.fixture
+    def jobs(self, monkeypatch):
+        """Runs the image job inline and records the bytes each job saw"""
+        seen = []
+
+        async def run_job(job, kind, image_data):
+            seen.append(image_data)
+            return {"extracted_text": f"upload {len(seen)}"}, {"queue": 0.0}
+
+        monkeypatch.setattr(image_ai, "_run_job", run_job)
+        return seen
+
+    @pytest.mark.asyncio
+    async def test_identical_bytes_are_served_from_cache(self, jobs):
+        cache = PerceptualHashCache(maxsize=10, ttl=60, max_distance=0)
+        data = encode(poster_image())
+        first, _, status = await image_ai.analyze_upload_cached("scan", FakeUpload(data), cache)
+        assert status["hit"] is None
+        again, _, status = await image_ai.analyze_upload_cached("scan", FakeUpload(data), cache)
+        assert status == {"hit": "exact", "distance": 0}
+        assert again == first
+        assert len(jobs) == 1
+
+    @pytest.mark.asyncio
+    async def test_near_duplicate_is_analysed_afresh(self, jobs):
+        cache = PerceptualHashCache(maxsize=10, ttl=60, max_distance=0)
+        image = poster_image()
+        first, _, _ = await image_ai.analyze_upload_cached("scan", FakeUpload(encode(image, quality=95)), cache)
+        # Same picture, different bytes: must never get the first upload's OCR text
+        second, _, status = await image_ai.analyze_upload_cached("scan", FakeUpload(encode(image, quality=60)), cache)
+        assert status["hit"] is None
+        assert second["extracted_text"] != first["extracted_text"]
+        assert len(jobs) == 2
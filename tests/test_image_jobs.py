@@ -0,0 +1,76 @@
+"""
+Unit tests for the image analysis job slots (app/ai/image.py), run on the
+in-process thread fallback (IMAGE_ANALYSIS_WORKERS=0)
+"""
+
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.ai import image as image_ai
+
+pytestmark = pytest.mark.unit
+
+
+def quick_job(value):
+    return value, {"worker": 0.0}
+
+
+@pytest.fixture
+def single_slot(monkeypatch):
+    monkeypatch.setattr(image_ai, "IMAGE_WORKERS", 0)
+    monkeypatch.setattr(image_ai, "IMAGE_QUEUE_DEPTH", 0)
+    monkeypatch.setattr(image_ai, "IMAGE_JOB_TIMEOUT_SECONDS", 0.05)
+    assert image_ai._jobs_in_flight == 0
+
+
+def wait_for_slots(timeout=2):
+    deadline = time.monotonic() + timeout
+    while image_ai._jobs_in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return image_ai._jobs_in_flight
+
+
+class TestJobSlots:
+
+    @pytest.mark.asyncio
+    async def test_result_and_timings(self, single_slot):
+        result, timings = await image_ai._run_job(quick_job, "ok")
+        assert result == "ok"
+        assert "worker" not in timings and timings["queue"] >= 0
+        assert wait_for_slots() == 0
+
+    @pytest.mark.asyncio
+    async def test_timed_out_job_keeps_its_slot_until_it_finishes(self, single_slot):
+        unblock = threading.Event()
+
+        def stuck_job():
+            unblock.wait(5)
+            return "late", {"worker": 0.0}
+
+        try:
+            with pytest.raises(HTTPException) as timed_out:
+                await image_ai._run_job(stuck_job)
+            assert timed_out.value.status_code == 503
+            # The thread is still running, so the next upload is turned away
+            with pytest.raises(HTTPException) as busy:
+                await image_ai._run_job(quick_job, "ok")
+            assert busy.value.status_code == 429
+            assert busy.value.headers["Retry-After"] == image_ai.RETRY_AFTER_SECONDS
+            assert image_ai._jobs_in_flight == 1
+        finally:
+            unblock.set()
+        assert wait_for_slots() == 0
+        result, _ = await image_ai._run_job(quick_job, "ok")
+        assert result == "ok"
+
+    @pytest.mark.asyncio
+    async def test_failed_job_releases_its_slot(self, single_slot):
+        def broken_job():
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await image_ai._run_job(broken_job)
+        assert wait_for_slots() == 0
@@ -0,0 +1,39 @@
+"""
+Unit tests for the Aho-Corasick keyword automaton (app/keyword_matcher.py)
+"""
+
+import pytest
+
+from app.keyword_matcher import KeywordAutomaton
+
+pytestmark = pytest.mark.unit
+
+
+class TestKeywordAutomaton:
+
+    def test_overlapping_matches(self):
+        automaton = KeywordAutomaton([("up", "up"), ("update", "update"), ("date", "date")])
+        assert sorted(automaton.iter_matches("update")) == [(0, "up"), (0, "update"), (2, "date")]
+        assert automaton.find_keys("please update now") == {"up", "update", "date"}
+
+    def test_shared_keys_and_failure_links(self):
+        automaton = KeywordAutomaton([("he", 1), ("she", 1), ("hers", 2), ("his", 3)])
+        assert len(automaton) == 4
+        assert automaton.find_keys("ushers") == {1, 2}
+        assert automaton.find_keys("ahishers") == {1, 2, 3}
+        assert automaton.find_keys("xyz") == set()
+
+    def test_empty_keywords_ignored(self):
+        automaton = KeywordAutomaton([("", "empty"), ("a", "a")])
+        assert len(automaton) == 1
+        assert automaton.find_keys("banana") == {"a"}
+
+    def test_state_carries_across_chunks(self):
+        automaton = KeywordAutomaton([("lottery", "lottery")])
+        state = 0
+        for ch in "you won the lot":
+            state = automaton.step(state, ch)
+        assert automaton.outputs(state) == []
+        for ch in "tery":
+            state = automaton.step(state, ch)
+        assert automaton.outputs(state) == [("lottery", 7)]
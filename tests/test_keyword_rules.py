@@ -0,0 +1,70 @@
+"""
+Unit tests for the shared keyword rule engine (app/keyword_rules.py)
+"""
+
+import pytest
+
+from app.keyword_rules import BOUNDARY_START, BOUNDARY_WORD, KeywordRuleEngine, normalize_text
+
+pytestmark = pytest.mark.unit
+
+
+class TestKeywordRuleEngine:
+
+    @pytest.fixture
+    def engine(self):
+        engine = KeywordRuleEngine()
+        engine.register("test.plain", ["Gift Card", "otp", "up"])
+        engine.register("test.start", ["kill"], boundary=BOUNDARY_START)
+        engine.register("test.word", ["bet", "free money"], boundary=BOUNDARY_WORD)
+        return engine
+
+    def test_plain_substrings_case_insensitive(self, engine):
+        hits = engine.scan("Buy a GIFT CARD, share your OTP to update")
+        # Declaration order, not text order; keywords as declared
+        assert hits.get("test.plain") == ["Gift Card", "otp", "up"]
+        assert hits.count("test.plain") == 3
+        assert hits.first("test.plain") == "Gift Card"
+
+    def test_start_boundary(self, engine):
+        assert "test.start" in engine.scan("they killed it")
+        assert "test.start" not in engine.scan("a new skill")
+
+    def test_word_boundary(self, engine):
+        assert engine.scan("place a bet now").get("test.word") == ["bet"]
+        assert "test.word" not in engine.scan("alphabet betting")
+        assert engine.scan("get FREE MONEY!").get("test.word") == ["free money"]
+
+    def test_prefix_keywords_found_at_same_position(self):
+        engine = KeywordRuleEngine()
+        engine.register("a", ["pay"])
+        engine.register("b", ["paytm"], boundary=BOUNDARY_WORD)
+        hits = engine.scan("open paytm")
+        assert hits.get("a") == ["pay"]
+        assert hits.get("b") == ["paytm"]
+
+    def test_devanagari_marks_are_word_characters(self):
+        engine = KeywordRuleEngine()
+        engine.register("hi", ["इनाम"], boundary=BOUNDARY_WORD)
+        assert engine.scan("आपने इनाम जीता").get("hi") == ["इनाम"]
+        # A following matra continues the word
+        assert "hi" not in engine.scan("इनामी योजना")
+
+    def test_registration_recompiles(self, engine):
+        generation = engine.generation
+        assert "test.plain" not in engine.scan("lottery")
+        engine.register("test.plain", ["lottery"])
+        assert engine.generation == generation + 1
+        assert engine.scan("lottery").get("test.plain") == ["lottery"]
+        assert engine.stats()["sets"] == 3
+
+    def test_empty_input_and_unknown_boundary(self, engine):
+        assert engine.scan("").categories() == []
+        assert engine.scan(None).as_dict() == {}
+        with pytest.raises(ValueError):
+            engine.register("bad", ["x"], boundary="middle")
+
+    def test_normalize_text(self):
+        assert normalize_text("ABC") == "abc"
+        # Decomposed e + combining acute becomes the composed character
+        assert normalize_text("Cafe\u0301") == "caf\u00e9"
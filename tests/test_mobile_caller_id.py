@@ -0,0 +1,71 @@
+"""
+Unit tests for the mobile caller-ID endpoints (app/mobile_caller_id.py),
+in a TestClient app with the user and database dependencies overridden
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import mobile_caller_id
+from app.caller_id import lookup_cache
+from app.deps import get_db
+from app.utils import get_current_user
+
+pytestmark = pytest.mark.unit
+
+KNOWN = {
+    "+919876543210": ("+919876543210", "Fraud Desk", "Jio", "Mumbai", "mobile", 85, 40, 38, 2, None, False, ["scam"]),
+    "+911234567890": ("+911234567890", "City Clinic", None, "Pune", "landline", 0, 1, 0, 1, "City Clinic", True, []),
+}
+
+
+class CallerDB:
+    def __init__(self):
+        self.queries = []
+
+    async def fetch_all(self, query, params):
+        self.queries.append(list(params["phones"]))
+        return [KNOWN[phone] for phone in params["phones"] if phone in KNOWN]
+
+
+@pytest.fixture
+def db():
+    return CallerDB()
+
+
+@pytest.fixture
+def client(db):
+    lookup_cache.clear()
+    app = FastAPI()
+    app.include_router(mobile_caller_id.router)
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_current_user] = lambda: {"id": 42}
+    yield TestClient(app)
+    lookup_cache.clear()
+
+
+class TestLookupBatch:
+
+    def test_results_in_input_order_with_one_query(self, client, db):
+        phones = ["+911234567890", " +919876543210", "+910000000000", "+911234567890"]
+        response = client.post("/api/mobile/caller-id/lookup-batch", json={"phoneNumbers": phones})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["count"] == 4
+        assert [c["phoneNumber"] for c in body["callers"]] == [p.strip() for p in phones]
+        assert [c["recommendation"] for c in body["callers"]] == ["safe", "block", "unknown", "safe"]
+        # Duplicates and whitespace collapse into one lookup per number
+        assert db.queries == [["+911234567890", "+919876543210", "+910000000000"]]
+
+    def test_second_batch_is_answered_from_cache(self, client, db):
+        phones = ["+919876543210", "+910000000000"]
+        client.post("/api/mobile/caller-id/lookup-batch", json={"phoneNumbers": phones})
+        response = client.post("/api/mobile/caller-id/lookup-batch", json={"phoneNumbers": phones + ["+911234567890"]})
+        assert response.json()["fromCache"] == 2
+        assert db.queries[-1] == ["+911234567890"]
+
+    @pytest.mark.parametrize("phones", [[], ["+91"] * (mobile_caller_id.MAX_BATCH_LOOKUP + 1)])
+    def test_batch_size_is_bounded(self, client, phones):
+        response = client.post("/api/mobile/caller-id/lookup-batch", json={"phoneNumbers": phones})
+        assert response.status_code == 422
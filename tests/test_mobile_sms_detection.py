@@ -0,0 +1,136 @@
+"""
+Unit tests for the mobile SMS scan endpoints (app/mobile_sms_detection.py).
+The endpoints run in a TestClient app with the user and database
+dependencies overridden; nothing leaves the process.
+"""
+
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from app import mobile_sms_detection as sms
+from app.deps import get_db
+from app.mobile_sms_detection import SMSScanRequest
+from app.sms_scam_engine import SMSScamEngine
+from app.utils import get_current_user
+from app.write_behind import SequenceIdAllocator
+
+pytestmark = pytest.mark.unit
+
+
+class TestThreatRowBounds:
+    """Threat ids go out before the row is written, so the row must fit sms_threats"""
+
+    @pytest.mark.parametrize("field", ["sender", "message"])
+    def test_nul_rejected(self, field):
+        data = {"sender": "VK-HDFCBK", "message": "hello"}
+        data[field] += "\x00"
+        with pytest.raises(ValidationError):
+            SMSScanRequest(**data)
+
+    def test_sender_length(self):
+        with pytest.raises(ValidationError):
+            SMSScanRequest(sender="x" * 51, message="hello")
+
+    def test_aware_timestamp_stored_as_naive_utc(self):
+        item = SMSScanRequest(sender="VK-HDFCBK", message="hello", timestamp="2024-05-01T10:00:00+05:30")
+        assert item.timestamp == datetime(2024, 5, 1, 4, 30)
+
+    @pytest.mark.asyncio
+    async def test_queued_row_clamped_to_columns(self, monkeypatch):
+        queued = []
+
+        async def add(row=None, key=None, delta=None):
+            queued.append(row)
+
+        monkeypatch.setattr(sms.sms_log_buffer, "add", add)
+        verdict = sms.sms_verdict({"scam_score": 140, "scam_type": "t" * 150, "indicators": []})
+        await sms.queue_sms_result(7, 1, SMSScanRequest(sender="VK-HDFCBK", message="hello"), verdict)
+        assert queued[0]["id"] == 7
+        assert queued[0]["score"] == 100
+        assert len(queued[0]["type"]) == 100
+
+
+class SequenceDB:
+    """Hands out ids for SequenceIdAllocator; nothing else is read"""
+
+    def __init__(self):
+        self.next = 1
+
+    async def fetch_all(self, query, params):
+        ids = [(i,) for i in range(self.next, self.next + params["n"])]
+        self.next += params["n"]
+        return ids
+
+
+@pytest.fixture
+def client(monkeypatch):
+    engine = SMSScamEngine(refresh_seconds=3600)
+    engine.load_rows([{
+        "id": 1, "pattern_name": "KYC", "scam_type": "kyc_fraud",
+        "keywords": ["kyc", "update"], "sender_patterns": [], "confidence_weight": 3.0,
+    }])
+    queued = []
+
+    async def add(row=None, key=None, delta=None):
+        queued.append(row)
+
+    monkeypatch.setattr(sms, "sms_scam_engine", engine)
+    monkeypatch.setattr(sms, "sms_threat_ids", SequenceIdAllocator("sms_threats"))
+    monkeypatch.setattr(sms.sms_log_buffer, "add", add)
+    app = FastAPI()
+    app.include_router(sms.router)
+    db = SequenceDB()
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_current_user] = lambda: {"id": 42}
+    client = TestClient(app)
+    client.queued = queued
+    return client
+
+
+def verdict_lines(response):
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+class TestScanBulk:
+
+    def test_json_body_streams_a_verdict_per_message(self, client):
+        response = client.post("/api/mobile/sms/scan-bulk", json={"messages": [
+            {"id": "a", "sender": "VK-HDFCBK", "message": "Your KYC is pending, update now"},
+            {"id": "b", "sender": "+919876543210", "message": "See you at 5"},
+            {"id": "c", "sender": "x" * 60, "message": "too long a sender"},
+        ]})
+        assert response.status_code == 200
+        *verdicts, summary = verdict_lines(response)
+        assert [v.get("id") for v in verdicts] == ["a", "b", None]
+        assert verdicts[0]["scamScore"] == 60 and verdicts[0]["action"] == "quarantine"
+        assert not verdicts[1]["isScam"]
+        assert "sender" in verdicts[2]["error"]
+        assert summary["scanned"] == 2
+        # Each scored message is queued under the threat id it was answered with
+        assert [row["id"] for row in client.queued] == [verdicts[0]["threatId"], verdicts[1]["threatId"]]
+        assert all(row["user_id"] == 42 for row in client.queued)
+
+    def test_ndjson_body(self, client):
+        body = "\n".join(json.dumps({"sender": "AD-SHOP", "message": f"offer {i}"}) for i in range(5))
+        response = client.post("/api/mobile/sms/scan-bulk", content=body,
+                               headers={"Content-Type": "application/x-ndjson"})
+        *verdicts, summary = verdict_lines(response)
+        assert [v["index"] for v in verdicts] == list(range(5))
+        assert summary["scanned"] == 5
+
+    @pytest.mark.parametrize("body", [b"not json", b'{"messages": "nope"}'])
+    def test_malformed_body_is_a_400(self, client, body):
+        response = client.post("/api/mobile/sms/scan-bulk", content=body,
+                               headers={"Content-Type": "application/json"})
+        assert response.status_code == 400
+
+    def test_too_many_messages_is_a_413(self, client, monkeypatch):
+        monkeypatch.setattr(sms, "MAX_BULK_SCAN", 2)
+        messages = [{"sender": "AD-SHOP", "message": "hi"}] * 3
+        assert client.post("/api/mobile/sms/scan-bulk", json=messages).status_code == 413
@@ -0,0 +1,83 @@
+"""
+Unit tests for batch scam prediction (app/scam_prediction.py), in a TestClient
+app with the user dependency overridden and an in-memory transaction stand-in
+"""
+
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import scam_prediction
+from app.utils import get_current_user
+
+pytestmark = pytest.mark.unit
+
+RECORDS = [
+    {"id": "a", "caller_phone": "+919876543210", "message_content": "Share your OTP now to unblock your KYC"},
+    {"id": "b", "caller_phone": "+911234567890", "call_duration": 30},
+    {"id": "c", "message_content": "Lunch at noon?"},
+]
+
+
+class PredictionDB:
+    def __init__(self):
+        self.batches = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield self
+
+    async def executemany(self, query, params):
+        self.batches.append(list(params))
+
+
+@pytest.fixture
+def db():
+    return PredictionDB()
+
+
+@pytest.fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(scam_prediction.router)
+    app.state.db = db
+    app.dependency_overrides[get_current_user] = lambda: {"id": 42}
+    return TestClient(app)
+
+
+class TestPredictBatch:
+
+    def test_results_in_request_order(self, client, db):
+        response = client.post("/api/scam-prediction/predict-batch", json={"records": RECORDS, "save": False})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["total"] == 3
+        assert body["saved"] == 0
+        assert [p["id"] for p in body["predictions"]] == ["a", "b", "c"]
+        assert sum(body["summary"].values()) == 3
+        for prediction in body["predictions"]:
+            assert 0.0 <= prediction["risk_score"] <= 1.0
+            assert body["summary"][prediction["risk_level"]] >= 1
+        assert db.batches == []
+
+    def test_matches_single_record_scoring(self, client):
+        body = client.post("/api/scam-prediction/predict-batch", json={"records": RECORDS, "save": False}).json()
+        for record, prediction in zip(RECORDS, body["predictions"]):
+            single = scam_prediction.predict_batch([scam_prediction.PredictionBatchItem(**record)])[0]
+            assert prediction["risk_score"] == single["risk_score"]
+            assert prediction["risk_level"] == single["risk_level"]
+
+    def test_save_bulk_inserts_one_batch(self, client, db):
+        body = client.post("/api/scam-prediction/predict-batch", json={"records": RECORDS}).json()
+        assert body["saved"] == 3
+        assert len(db.batches) == 1
+        rows = db.batches[0]
+        assert [row["phone"] for row in rows] == ["+919876543210", "+911234567890", None]
+        assert all(row["uid"] == 42 for row in rows)
+
+    def test_oversized_batch_rejected(self, client, monkeypatch):
+        monkeypatch.setattr(scam_prediction, "MAX_PREDICTION_BATCH", 2)
+        response = client.post("/api/scam-prediction/predict-batch", json={"records": RECORDS})
+        assert response.status_code == 413
@@ -0,0 +1,165 @@
+"""
+Unit tests for the in-process SMS scam scorer (app/sms_scam_engine.py):
+LIKE / SIMILAR TO emulation and parity with calculate_sms_scam_score()
+"""
+
+import pytest
+
+from app.sms_scam_engine import CompiledSMSPatterns, SMSScamEngine, like_to_regex, similar_to_regex
+
+pytestmark = pytest.mark.unit
+
+
+def pattern(id, name, scam_type, keywords=(), sender_patterns=(), weight=1.0):
+    return {
+        "id": id,
+        "pattern_name": name,
+        "scam_type": scam_type,
+        "keywords": list(keywords),
+        "sender_patterns": list(sender_patterns),
+        "confidence_weight": weight,
+    }
+
+
+class TestLikeEmulation:
+    """`message LIKE '%' || keyword || '%'`"""
+
+    @pytest.mark.parametrize("keyword,text,expected", [
+        ("kyc", "update your kyc now", True),
+        ("k_c", "update your kyc now", True),
+        ("k_c", "update your kc now", False),
+        ("win%prize", "you win a big prize", True),
+        ("win%prize", "prize: you win", False),
+        ("100\\%", "100% cashback", True),
+        ("100\\%", "1000 cashback", False),
+        ("a\\_b", "a_b", True),
+        ("a\\_b", "axb", False),
+        ("a.b", "axb", False),
+    ])
+    def test_like_to_regex(self, keyword, text, expected):
+        assert bool(like_to_regex(keyword).search(text)) is expected
+
+    def test_like_matches_across_newlines(self):
+        assert like_to_regex("click%link").search("click\nthe link")
+
+
+class TestSimilarToEmulation:
+    """`sender SIMILAR TO pattern` is a whole-string match"""
+
+    @pytest.mark.parametrize("pattern_text,sender,expected", [
+        ("VK-%", "VK-HDFCBK", True),
+        ("VK-%", "XVK-HDFCBK", False),
+        ("AD-_____", "AD-PAYTM", True),
+        ("AD-_____", "AD-PAYTMX", False),
+        ("(VM|VK)-%", "VM-SBIINB", True),
+        ("(VM|VK)-%", "AX-SBIINB", False),
+        ("[0-9]+", "919876543210", True),
+        ("[0-9]+", "9198765x", False),
+        ("a.b", "a.b", True),
+        ("a.b", "axb", False),
+        ("\\+91%", "+919876543210", True),
+    ])
+    def test_similar_to_regex(self, pattern_text, sender, expected):
+        assert bool(similar_to_regex(pattern_text).match(sender)) is expected
+
+
+class TestCompiledSMSPatterns:
+
+    def test_keyword_hits_in_pattern_order(self):
+        compiled = CompiledSMSPatterns([
+            pattern(1, "KYC Update", "kyc_fraud", ["kyc", "blocked"]),
+            pattern(2, "Lottery", "lottery", ["won", "prize"], weight=0.5),
+        ])
+        result = compiled.score("You WON a prize, update KYC or account blocked", "AB-123456")
+
+        assert result["scam_type"] == "kyc_fraud"
+        # 2 x round(10 * 1.0) + 2 x round(10 * 0.5)
+        assert result["scam_score"] == 30
+        assert [i["value"] for i in result["indicators"]] == ["kyc", "blocked", "won", "prize"]
+        assert {i["type"] for i in result["indicators"]} == {"keyword"}
+
+    def test_overlapping_keywords_all_count(self):
+        compiled = CompiledSMSPatterns([pattern(1, "Update", "phishing", ["up", "update"])])
+        result = compiled.score("please update", None)
+        assert result["scam_score"] == 20
+        assert [i["value"] for i in result["indicators"]] == ["up", "update"]
+
+    def test_wildcard_keywords_use_like_semantics(self):
+        compiled = CompiledSMSPatterns([pattern(1, "OTP", "otp_fraud", ["share%otp", "o_p"])])
+        assert compiled.score("Share the OTP", None)["scam_score"] == 20
+        assert compiled.score("otp", None)["scam_score"] == 10
+        assert compiled.score("share", None)["scam_score"] == 0
+
+    def test_sender_patterns_and_rounding(self):
+        compiled = CompiledSMSPatterns([
+            pattern(1, "Spoofed bank", "bank_fraud", ["account"], ["VK-[A-Z]+", "AD-[A-Z]+"], weight=0.7),
+        ])
+        result = compiled.score("Your account is on hold", "VK-HDFCBK")
+        # round(10 * 0.7) + round(15 * 0.7) = 7 + 10 (10.5 rounds half to even)
+        assert result["scam_score"] == 17
+        assert result["indicators"][-1] == {"type": "sender", "value": "VK-HDFCBK", "pattern": "Spoofed bank"}
+
+    def test_sender_percent_becomes_literal_dots(self):
+        # The SQL function runs SIMILAR TO REPLACE(pattern, '%', '.*'), and '.'
+        # is not a metacharacter in SIMILAR TO
+        compiled = CompiledSMSPatterns([pattern(1, "Spoofed", "bank_fraud", [], ["VK-%"])])
+        assert compiled.score("hello", "VK-HDFCBK")["scam_score"] == 0
+        assert compiled.score("hello", "VK-...")["scam_score"] == 15
+
+    def test_no_sender_skips_sender_patterns(self):
+        compiled = CompiledSMSPatterns([pattern(1, "Spoofed", "bank_fraud", [], ["_*"])])
+        assert compiled.score("hello", None)["scam_score"] == 0
+        assert compiled.score("hello", "anything")["scam_score"] == 15
+
+    def test_url_bonus_and_cap(self):
+        compiled = CompiledSMSPatterns([pattern(1, "Many", "phishing", [f"kw{i}" for i in range(12)])])
+        message = " ".join(f"kw{i}" for i in range(12)) + " https://bit.ly/x"
+        result = compiled.score(message, None)
+        assert result["scam_score"] == 100
+        assert result["indicators"][-1]["type"] == "url"
+
+    def test_clean_message(self):
+        compiled = CompiledSMSPatterns([pattern(1, "KYC", "kyc_fraud", ["kyc"])])
+        assert compiled.score("See you at 5", "friend") == {
+            "scam_score": 0, "scam_type": "unknown", "indicators": []
+        }
+
+    def test_invalid_sender_pattern_is_skipped(self):
+        compiled = CompiledSMSPatterns([pattern(1, "Broken", "x", ["kyc"], ["(unclosed"])])
+        assert compiled.sender_regexes == []
+        assert compiled.score("kyc", "(unclosed")["scam_score"] == 10
+
+
+class TestSMSScamEngine:
+
+    def test_load_rows_recompiles_only_on_change(self):
+        engine = SMSScamEngine(refresh_seconds=60)
+        rows = [pattern(1, "KYC", "kyc_fraud", ["kyc"])]
+        engine.load_rows(rows)
+        first = engine.compiled
+        engine.load_rows([dict(r) for r in rows])
+        assert engine.compiled is first
+        engine.load_rows([pattern(1, "KYC", "kyc_fraud", ["kyc", "pan"])])
+        assert engine.compiled is not first
+        assert engine.compiled.score("update pan", None)["scam_score"] == 10
+
+    @pytest.mark.asyncio
+    async def test_failed_refresh_keeps_previous_patterns(self):
+        class FailingDB:
+            async def fetch_all(self, *args, **kwargs):
+                raise ConnectionError("db down")
+
+        engine = SMSScamEngine(refresh_seconds=60)
+        engine.load_rows([pattern(1, "KYC", "kyc_fraud", ["kyc"])])
+        engine.invalidate()
+        result = await engine.score(FailingDB(), "kyc", None)
+        assert result["scam_score"] == 10
+
+    @pytest.mark.asyncio
+    async def test_first_load_failure_raises(self):
+        class FailingDB:
+            async def fetch_all(self, *args, **kwargs):
+                raise ConnectionError("db down")
+
+        with pytest.raises(ConnectionError):
+            await SMSScamEngine().score(FailingDB(), "kyc", None)
@@ -0,0 +1,253 @@
+"""
+Unit tests for the shared psycopg2 pool (app/database.py): slot accounting,
+connection reset on return, leak reclaim and the bounded wait on the event loop.
+psycopg2's ThreadedConnectionPool is replaced by an in-memory one.
+"""
+
+import asyncio
+import gc
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+import pytest
+
+from app import database
+from app.database import PoolTimeout, SyncConnectionPool, sync_database_url
+
+pytestmark = pytest.mark.unit
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query, params=None):
+        if self.conn.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+        self.conn.in_transaction = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = False
+        self.in_transaction = False
+        self.broken = False
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+        self.in_transaction = False
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def get_transaction_status(self):
+        if self.in_transaction:
+            return psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        return psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakeThreadedPool:
+    def __init__(self, minconn, maxconn, dsn):
+        self.idle = [FakeConnection() for _ in range(minconn)]
+        self.discarded = []
+
+    def getconn(self):
+        return self.idle.pop() if self.idle else FakeConnection()
+
+    def putconn(self, conn, close=False):
+        if close:
+            conn.closed = 1
+            self.discarded.append(conn)
+        else:
+            self.idle.append(conn)
+
+    def closeall(self):
+        self.idle.clear()
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(psycopg2.pool, "ThreadedConnectionPool", FakeThreadedPool)
+    return SyncConnectionPool("postgresql://test", minconn=1, maxconn=2, timeout=0.05)
+
+
+def test_sync_database_url():
+    assert sync_database_url("postgresql+asyncpg://u:p@h/db") == "postgresql://u:p@h/db"
+    assert sync_database_url("postgresql://u:p@h/db") == "postgresql://u:p@h/db"
+
+
+class TestSlotAccounting:
+
+    def test_exhausted_pool_times_out(self, pool):
+        first, second = pool.getconn(), pool.getconn()
+        with pytest.raises(PoolTimeout):
+            pool.getconn()
+        with pytest.raises(PoolTimeout):
+            pool.getconn(timeout=0)
+        first.close()
+        third = pool.getconn(timeout=0)
+        stats = pool.stats()
+        assert stats["in_use"] == 2
+        assert stats["peak_in_use"] == 2
+        assert stats["timeouts"] == 2
+        assert stats["checkouts"] == 3
+        second.close()
+        third.close()
+        assert pool.stats()["in_use"] == 0
+
+    def test_close_is_idempotent(self, pool):
+        conn = pool.getconn()
+        conn.close()
+        conn.close()
+        assert conn.closed == 1
+        assert pool.stats()["in_use"] == 0
+        with pytest.raises(psycopg2.InterfaceError):
+            conn.cursor()
+
+    def test_waiter_gets_released_slot(self, pool):
+        held = [pool.getconn(), pool.getconn()]
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(pool.getconn(timeout=2)))
+        waiter.start()
+        held.pop().close()
+        waiter.join(2)
+        assert len(got) == 1
+        got[0].close()
+        held[0].close()
+        assert pool.stats()["in_use"] == 0
+
+    def test_failed_checkout_releases_slot(self, pool, monkeypatch):
+        def broken_checkout():
+            raise psycopg2.OperationalError("could not connect to server")
+
+        healthy = pool._checkout_healthy
+        monkeypatch.setattr(pool, "_checkout_healthy", broken_checkout)
+        for _ in range(3):
+            with pytest.raises(psycopg2.OperationalError):
+                pool.getconn()
+        monkeypatch.setattr(pool, "_checkout_healthy", healthy)
+        pool.getconn().close()
+        assert pool.stats()["in_use"] == 0
+
+
+class TestConnectionReset:
+
+    def test_context_manager_commits_or_rolls_back(self, pool):
+        with pool.getconn() as conn:
+            raw = conn._conn
+            rollbacks = raw.rollbacks
+            conn.cursor().execute("INSERT ...")
+        assert raw.commits == 1 and raw.rollbacks == rollbacks
+
+        with pytest.raises(RuntimeError):
+            with pool.getconn() as conn:
+                raw = conn._conn
+                rollbacks = raw.rollbacks
+                conn.cursor().execute("INSERT ...")
+                raise RuntimeError("boom")
+        assert raw.rollbacks == rollbacks + 1
+        assert pool.stats()["in_use"] == 0
+
+    def test_open_transaction_and_autocommit_reset_on_return(self, pool):
+        conn = pool.getconn()
+        raw = conn._conn
+        rollbacks = raw.rollbacks
+        conn.cursor().execute("SELECT 1")
+        raw.autocommit = True
+        conn.close()
+        assert raw.rollbacks == rollbacks + 1
+        assert raw.autocommit is False
+
+    def test_closed_connection_is_discarded(self, pool):
+        conn = pool.getconn()
+        raw = conn._conn
+        raw.closed = 2
+        conn.close()
+        assert raw in pool._pool.discarded
+        assert pool.stats()["in_use"] == 0
+
+    def test_dead_idle_connection_replaced_on_checkout(self, pool):
+        pool.health_check_interval = -1  # ping on every checkout
+        dead = pool._pool.idle[0]
+        dead.broken = True
+        conn = pool.getconn()
+        assert conn._conn is not dead
+        assert dead in pool._pool.discarded
+        assert pool.stats()["health_check_failures"] == 1
+        conn.close()
+
+
+class TestLeakReclaim:
+
+    def test_unclosed_proxy_returns_connection_when_collected(self, pool):
+        def leak():
+            pool.getconn().cursor()
+
+        leak()
+        leak()
+        gc.collect()
+        stats = pool.stats()
+        assert stats["leaked"] == 2
+        assert stats["in_use"] == 0
+        pool.getconn(timeout=0).close()
+
+    def test_closed_proxy_is_not_reclaimed_twice(self, pool):
+        conn = pool.getconn()
+        conn.close()
+        del conn
+        gc.collect()
+        assert pool.stats()["leaked"] == 0
+        assert pool.stats()["in_use"] == 0
+
+
+class TestEventLoopAccess:
+
+    @pytest.fixture
+    def shared_pool(self, pool, monkeypatch):
+        monkeypatch.setattr(database, "_sync_pool", pool)
+        return pool
+
+    @pytest.mark.asyncio
+    async def test_get_db_connection_waits_briefly_on_event_loop(self, shared_pool):
+        held = [shared_pool.getconn(), shared_pool.getconn()]
+        shared_pool.timeout = 5
+        shared_pool.loop_timeout = 0.05
+        started = time.monotonic()
+        with pytest.raises(PoolTimeout):
+            database.get_db_connection()
+        assert 0.04 <= time.monotonic() - started < 1
+        # A slot freed by another thread within the wait is handed over
+        threading.Timer(0.02, held.pop().close).start()
+        shared_pool.loop_timeout = 2
+        database.get_db_connection().close()
+        held[0].close()
+        assert shared_pool.stats()["in_use"] == 0
+
+    @pytest.mark.asyncio
+    async def test_acquire_db_connection_waits_off_the_loop(self, shared_pool):
+        held = [shared_pool.getconn(), shared_pool.getconn()]
+        shared_pool.timeout = 2
+        waiter = asyncio.ensure_future(database.acquire_db_connection())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        held.pop().close()
+        conn = await asyncio.wait_for(waiter, 2)
+        conn.close()
+        held[0].close()
+        assert shared_pool.stats()["in_use"] == 0
@@ -0,0 +1,87 @@
+"""
+Unit tests for the LRU + TTL lookup cache (app/ttl_cache.py) and the
+caller-ID cache built on it (app/caller_id.py)
+"""
+
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import caller_id
+from app.ttl_cache import TTLCache
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+class TestTTLCache:
+
+    def test_hit_and_miss_counters(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.get("b", "default") == "default"
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+    def test_negative_entries_expire_sooner(self, clock):
+        cache = TTLCache(maxsize=10, ttl=300, negative_ttl=60)
+        cache.set("known", "caller")
+        cache.set("unknown", "not found", negative=True)
+        clock[0] += 61
+        assert cache.get("unknown") is None
+        assert cache.get("known") == "caller"
+        clock[0] += 240
+        assert cache.get("known") is None
+        assert len(cache) == 0
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("1", 1)
+        cache.set("2", 2)
+        cache.get("1")  # 2 is now least recently used
+        cache.set("3", 3)
+        assert cache.get("2") is None
+        assert cache.get("1") == 1 and cache.get("3") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_invalidate_counts_only_present_keys(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1)
+        assert cache.invalidate("a", "b") == 1
+        assert cache.get("a") is None
+        assert cache.stats()["invalidations"] == 1
+
+
+class TestCallerIDCache:
+
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        caller_id.lookup_cache.clear()
+        yield
+        caller_id.lookup_cache.clear()
+
+    def test_report_invalidates_both_routers_and_spellings(self):
+        cache = caller_id.lookup_cache
+        for key in [("legacy", "9876543210"), ("legacy", "+919876543210"),
+                    ("mobile", "9876543210"), ("mobile", "+919876543210"), ("mobile", "+911111111111")]:
+            cache.set(key, "cached")
+        caller_id.invalidate_caller(" 9876543210 ")
+        assert len(cache) == 1
+        assert cache.get(("mobile", "+911111111111")) == "cached"
+
+    def test_cache_stats_endpoint(self):
+        app = FastAPI()
+        app.include_router(caller_id.router)
+        caller_id.lookup_cache.set(("legacy", "+919876543210"), "cached")
+        response = TestClient(app).get("/api/caller-id/cache/stats")
+        assert response.status_code == 200
+        assert response.json()["cache"]["size"] == 1
@@ -0,0 +1,73 @@
+"""
+Unit tests for the URL verdict cache (app/url_reputation_engine.py) and
+its stats endpoint (app/mobile_url_checker.py)
+"""
+
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import mobile_url_checker
+from app.ttl_cache import TTLCache
+from app.url_reputation_engine import URLReputationEngine
+
+pytestmark = pytest.mark.unit
+
+PATTERNS = [{"id": 1, "pattern_type": "IP Address URL", "pattern_regex": r".*://\d+\.\d+\.\d+\.\d+.*",
+             "description": "Raw IP", "severity": "high", "confidence_weight": 2.0}]
+
+
+@pytest.fixture
+def engine():
+    engine = URLReputationEngine(refresh_seconds=3600, full_reload_seconds=3600,
+                                 cache=TTLCache(maxsize=100, ttl=600))
+    engine.load_patterns(PATTERNS)
+    engine.load_phishing_domains([{"id": 1, "domain": "evil.com", "last_reported_at": None}])
+    engine._loaded_at = time.monotonic()  # loaded above, so no database refresh
+    return engine
+
+
+async def check(engine, url):
+    return await engine.score(None, url)
+
+
+class TestVerdictCache:
+
+    @pytest.mark.asyncio
+    async def test_repeat_check_is_a_hit(self, engine):
+        first = await check(engine, "https://shop.example.com/cart")
+        again = await check(engine, "https://shop.example.com/cart")
+        assert again is first
+        assert engine.cache.stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_new_report_expires_verdicts_under_the_domain(self, engine):
+        before = await check(engine, "https://login.paypa1.com/verify")
+        other = await check(engine, "https://shop.example.com/")
+        engine.add_phishing_domain("paypa1.com")
+        after = await check(engine, "https://login.paypa1.com/verify")
+        assert before["trust_score"] == 100 and after["trust_score"] == 0
+        # Verdicts for other domains stay cached
+        assert await check(engine, "https://shop.example.com/") is other
+
+    @pytest.mark.asyncio
+    async def test_takedown_in_full_reload_clears_cache(self, engine):
+        assert (await check(engine, "https://login.evil.com/"))["trust_score"] == 0
+        engine.load_phishing_domains([])
+        assert (await check(engine, "https://login.evil.com/"))["trust_score"] == 100
+
+    @pytest.mark.asyncio
+    async def test_pattern_change_clears_cache(self, engine):
+        assert (await check(engine, "http://10.0.0.1/login"))["trust_score"] == 50
+        engine.load_patterns([])
+        assert (await check(engine, "http://10.0.0.1/login"))["trust_score"] == 90
+
+    def test_stats_endpoint(self, engine, monkeypatch):
+        monkeypatch.setattr(mobile_url_checker, "url_reputation_engine", engine)
+        app = FastAPI()
+        app.include_router(mobile_url_checker.router)
+        response = TestClient(app).get("/api/mobile/web/cache/stats")
+        assert response.status_code == 200
+        assert response.json()["cache"]["maxsize"] == 100
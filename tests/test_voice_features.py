@@ -0,0 +1,133 @@
+"""
+Unit tests for the streaming voice DSP (app/voice_features.py): upload
+decoding, embeddings and the DSP pool's pending-upload bound
+"""
+
+import asyncio
+import io
+import threading
+import wave
+
+import numpy as np
+import pytest
+
+from app import voice_features
+from app.voice_features import VoiceDSPBusyError, extract_features, extract_features_async, iter_pcm_chunks, raw_pcm_rate
+
+pytestmark = pytest.mark.unit
+
+RATE = 16000
+
+
+def voiced(seconds=1.0, pitch=140.0, rate=RATE) -> np.ndarray:
+    """A vowel-like harmonic tone with a slow pitch wobble"""
+    t = np.arange(int(seconds * rate)) / rate
+    phase = 2 * np.pi * np.cumsum(pitch * (1 + 0.03 * np.sin(2 * np.pi * 3 * t))) / rate
+    return 0.3 * sum(np.sin(k * phase) / k for k in range(1, 12))
+
+
+def pcm16(samples: np.ndarray) -> bytes:
+    return (np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes()
+
+
+def wav_bytes(samples: np.ndarray, rate=RATE) -> bytes:
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm16(samples))
+    return out.getvalue()
+
+
+class TestRawPCMRate:
+
+    @pytest.mark.parametrize("content_type, rate", [
+        ("audio/pcm", 16000),
+        ("audio/PCM; rate=8000", 8000),
+        ('audio/x-pcm;rate="44100"', 44100),
+        ("audio/wav", None),
+        ("audio/mpeg", None),
+        ("application/octet-stream", None),
+        (None, None),
+    ])
+    def test_declared_rate(self, content_type, rate):
+        assert raw_pcm_rate(content_type) == rate
+
+    @pytest.mark.parametrize("content_type", ["audio/pcm;rate=abc", "audio/pcm;rate=1000", "audio/pcm;rate=10000000"])
+    def test_bad_rate_rejected(self, content_type):
+        with pytest.raises(ValueError):
+            raw_pcm_rate(content_type)
+
+
+class TestDecoding:
+
+    def test_wav(self):
+        samples = voiced(0.5)
+        rate, chunks = iter_pcm_chunks(io.BytesIO(wav_bytes(samples)), read_samples=1000)
+        decoded = np.concatenate(list(chunks))
+        assert rate == RATE
+        assert len(decoded) == len(samples)
+        assert np.abs(decoded - samples).max() < 1e-3
+
+    def test_declared_raw_pcm(self):
+        samples = voiced(0.5)
+        rate, chunks = iter_pcm_chunks(io.BytesIO(pcm16(samples)), read_samples=999, raw_rate=8000)
+        assert rate == 8000
+        assert len(np.concatenate(list(chunks))) == len(samples)
+
+    @pytest.mark.parametrize("head", [
+        b"ID3\x04\x00\x00\x00\x00\x00\x00",  # MP3 with ID3 tag
+        b"\x00\x00\x00\x20ftypM4A ",  # M4A
+        b"OggS\x00\x02\x00\x00\x00\x00",  # OGG
+        b"#!AMR\n",  # AMR
+    ])
+    def test_other_containers_rejected(self, head):
+        with pytest.raises(ValueError):
+            iter_pcm_chunks(io.BytesIO(head + bytes(range(256)) * 64))
+
+
+class TestEmbedding:
+
+    def test_voice_gives_embedding(self):
+        features = extract_features(io.BytesIO(wav_bytes(voiced(1.0))))
+        assert features["voiced_frames"] > 0
+        assert features["embedding"].shape == (64,)
+
+    def test_noise_has_no_embedding(self):
+        noise = np.random.default_rng(0).uniform(-0.5, 0.5, RATE)
+        features = extract_features(io.BytesIO(wav_bytes(noise)))
+        assert features["speech_frames"] > 10
+        assert features["voiced_frames"] == 0
+        assert features["embedding"] is None
+
+
+class TestPendingBound:
+
+    @pytest.mark.asyncio
+    async def test_cancelled_request_holds_slot_until_extraction_finishes(self, monkeypatch):
+        release = threading.Event()
+        started = threading.Event()
+
+        def slow_extract(stream, raw_rate=None):
+            started.set()
+            release.wait(5)
+            return {"embedding": None}
+
+        monkeypatch.setattr(voice_features, "extract_features", slow_extract)
+        monkeypatch.setattr(voice_features, "VOICE_DSP_MAX_PENDING", 1)
+        task = asyncio.ensure_future(extract_features_async(io.BytesIO()))
+        await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The DSP thread is still running, so its slot is still taken
+        with pytest.raises(VoiceDSPBusyError):
+            await extract_features_async(io.BytesIO())
+        release.set()
+        for _ in range(100):
+            if voice_features._pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert await extract_features_async(io.BytesIO()) == {"embedding": None}
+        assert voice_features._pending == 0
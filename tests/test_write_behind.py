@@ -0,0 +1,174 @@
+"""
+Unit tests for the write-behind log/counter buffers (app/write_behind.py),
+against an in-memory stand-in for AsyncDB transactions
+"""
+
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import pytest
+from sqlalchemy import exc as sa_exc
+
+from app.write_behind import SequenceIdAllocator, WriteBehindBuffer, _buffers, is_data_error, merge_counters
+
+pytestmark = pytest.mark.unit
+
+
+class FakeTransaction:
+    def __init__(self, db):
+        self.db = db
+        self.pending = []
+
+    async def executemany(self, query, params):
+        for p in params:
+            if self.db.down:
+                raise sa_exc.OperationalError(query, p, ConnectionError("server closed the connection"))
+            if len(p.get("sender", "")) > 50:
+                raise sa_exc.DataError(query, p, ValueError("value too long for type character varying(50)"))
+        self.pending.append((query, list(params)))
+
+
+class FakeDB:
+    """Commits a transaction's executemany calls only if the whole block succeeds"""
+
+    def __init__(self):
+        self.written = {}
+        self.down = False
+        self.transactions = 0
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.transactions += 1
+        tx = FakeTransaction(self)
+        yield tx
+        for query, params in tx.pending:
+            self.written.setdefault(query, []).extend(params)
+
+    async def fetch_all(self, query, params):
+        start = getattr(self, "_next_seq", 1)
+        self._next_seq = start + params["n"]
+        return [(i,) for i in range(start, start + params["n"])]
+
+
+@pytest.fixture
+def db():
+    return FakeDB()
+
+
+@pytest.fixture
+def make_buffer(db):
+    created = []
+
+    def make(**kwargs):
+        buffer = WriteBehindBuffer("test", insert_query="INSERT", upsert_query="UPSERT", **kwargs)
+        buffer._db = db
+        created.append(buffer)
+        return buffer
+
+    yield make
+    for buffer in created:
+        _buffers.remove(buffer)
+
+
+class TestMergeCounters:
+
+    def test_sums_numbers_keeps_latest_timestamp(self):
+        early, late = datetime(2024, 1, 1), datetime(2024, 6, 1)
+        merged = merge_counters({"scans": 2, "last_scan": late, "label": "a"},
+                                {"scans": 3, "last_scan": early, "label": "b", "flag": None})
+        assert merged == {"scans": 5, "last_scan": late, "label": "b"}
+
+    def test_booleans_overwrite(self):
+        assert merge_counters({"blocked": True}, {"blocked": False}) == {"blocked": False}
+
+
+class TestIsDataError:
+
+    def test_classification(self):
+        assert is_data_error(sa_exc.DataError("q", {}, ValueError()))
+        assert is_data_error(sa_exc.IntegrityError("q", {}, ValueError()))
+        assert is_data_error(sa_exc.StatementError("bind failed", "q", {}, ValueError()))
+        assert not is_data_error(sa_exc.OperationalError("q", {}, ConnectionError()))
+        assert not is_data_error(TimeoutError())
+
+
+class TestWriteBehindBuffer:
+
+    @pytest.mark.asyncio
+    async def test_flush_writes_rows_and_coalesced_deltas(self, db, make_buffer):
+        buffer = make_buffer()
+        for i in range(10):
+            await buffer.add(row={"sender": "x", "i": i}, key=i % 2, delta={"scans": 1})
+        assert buffer.pending == 12
+        assert await buffer.flush() == 12
+        assert [r["i"] for r in db.written["INSERT"]] == list(range(10))
+        assert db.written["UPSERT"] == [{"scans": 5, "user_id": 0}, {"scans": 5, "user_id": 1}]
+        assert db.transactions == 1
+        assert buffer.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_bad_rows_are_dead_lettered(self, db, make_buffer):
+        buffer = make_buffer()
+        for i in range(100):
+            sender = "x" * (60 if i in (3, 77) else 5)
+            await buffer.add(row={"sender": sender, "i": i}, key=i % 3, delta={"scans": 1})
+        assert await buffer.flush() == 98 + 3
+        assert sorted(r["i"] for r in db.written["INSERT"]) == [i for i in range(100) if i not in (3, 77)]
+        assert len(db.written["UPSERT"]) == 3
+        assert buffer.dead_lettered == 2
+        assert buffer.pending == 0
+        dead = buffer.stats()["recent_dead_letters"][0]
+        # Text values are summarised, never stored
+        assert dead["params"]["sender"] == "<str len=60>"
+        assert "too long" in dead["error"]
+
+    @pytest.mark.asyncio
+    async def test_transient_failure_requeues_in_order(self, db, make_buffer):
+        buffer = make_buffer()
+        await buffer.add(row={"sender": "a", "i": 1}, key=7, delta={"scans": 1})
+        db.down = True
+        assert await buffer.flush() == 0
+        assert buffer.failures == 1
+        # Newer writes queue behind the failed batch and merge into its deltas
+        await buffer.add(row={"sender": "b", "i": 2}, key=7, delta={"scans": 2})
+        db.down = False
+        assert await buffer.flush() == 3
+        assert [r["i"] for r in db.written["INSERT"]] == [1, 2]
+        assert db.written["UPSERT"] == [{"scans": 3, "user_id": 7}]
+
+    @pytest.mark.asyncio
+    async def test_requeue_sheds_oldest_rows_beyond_bound(self, db, make_buffer):
+        buffer = make_buffer(max_pending=5)
+        db.down = True
+        for i in range(8):
+            await buffer.add(row={"sender": "a", "i": i})
+        assert buffer.pending == 5
+        assert buffer.dropped == 3
+        assert [r["i"] for r in buffer._rows] == [3, 4, 5, 6, 7]
+
+    @pytest.mark.asyncio
+    async def test_full_buffer_flushes_inline(self, db, make_buffer):
+        buffer = make_buffer(max_pending=3)
+        for i in range(3):
+            await buffer.add(row={"sender": "a", "i": i})
+        assert buffer.pending == 0
+        assert len(db.written["INSERT"]) == 3
+
+    @pytest.mark.asyncio
+    async def test_without_db_sheds_to_bound(self, make_buffer):
+        buffer = make_buffer(max_pending=10)
+        buffer._db = None
+        buffer._rows = [{"sender": "a", "i": i} for i in range(15)]
+        assert await buffer.flush() == 0
+        assert buffer.pending == 10
+        assert buffer.dropped == 5
+
+
+class TestSequenceIdAllocator:
+
+    @pytest.mark.asyncio
+    async def test_ids_reserved_a_block_at_a_time(self, db):
+        allocator = SequenceIdAllocator("sms_threats", block=3)
+        ids = [await allocator.next_id(db) for _ in range(7)]
+        assert ids == list(range(1, 8))
+        assert db._next_seq == 10